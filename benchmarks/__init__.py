@@ -0,0 +1 @@
+"""Throughput benchmarks for school-labels."""
@@ -0,0 +1,72 @@
+"""Deterministic synthetic student rosters for benchmarking."""
+
+import csv
+import random
+from collections.abc import Iterator
+from pathlib import Path
+
+COLUMNS = ["admin", "last_name", "first_name", "group", "email", "password"]
+
+FIRST_NAMES = [
+    "Amy", "Ben", "Chloe", "Daniel", "Ella", "Freddie", "Grace", "Harry",
+    "Isla", "Jack", "Khadija", "Leo", "Mia", "Noah", "Olivia", "Priya",
+    "Quinn", "Ruby", "Sami", "Theo", "Uzma", "Victor", "Willow", "Yusuf",
+    "Zara", "Muhammad", "Oluwaseun", "Aleksandra", "Maximilian",
+]  # fmt: skip
+
+LAST_NAMES = [
+    "Smith", "Jones", "Taylor", "Brown", "Williams", "Wilson", "Johnson",
+    "Davies", "Patel", "Robinson", "Wright", "Thompson", "Evans", "Walker",
+    "Khan", "Ahmed", "Nowak", "Kowalski", "Nguyen", "O'Connor",
+    "Featherstonehaugh", "Fitzgerald-Montgomery",
+]  # fmt: skip
+
+# Rare names long enough that _fit_text truncates them
+LONG_FIRST_NAMES = ["Bartholomew-Alexander", "Maximiliano-Sebastian"]
+LONG_LAST_NAMES = ["Wolfeschlegelsteinhausenbergerdorff", "Montgomery-Fotheringham"]
+
+GROUPS = [f"{year}{form}" for year in range(7, 12) for form in "ABCDEF"]
+
+DOMAIN = "students.outwood.com"
+LONG_DOMAIN = "students.outwood-academy-ormesby-and-redcar.outwood.com"
+
+# Share of rows with a truncated name, and with an email that must shrink
+LONG_NAME_RATE = 0.05
+LONG_EMAIL_RATE = 0.10
+
+PASSWORD_CHARS = "abcdefghjkmnpqrstuvwxyzABCDEFGHJKLMNPQRSTUVWXYZ23456789"  # noqa: S105
+
+
+def iter_roster(rows: int, seed: int = 7160) -> Iterator[dict[str, str]]:
+    """Yield ``rows`` synthetic students, grouped by tutor group.
+
+    The same ``rows`` and ``seed`` always give the same roster. Rows are
+    sorted by group, as ``--break group`` expects.
+    """
+    rng = random.Random(seed)  # noqa: S311 - reproducible test data
+    per_group = -(-rows // len(GROUPS))
+    for index in range(rows):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        if rng.random() < LONG_NAME_RATE:
+            first = rng.choice(LONG_FIRST_NAMES)
+            last = rng.choice(LONG_LAST_NAMES)
+        domain = LONG_DOMAIN if rng.random() < LONG_EMAIL_RATE else DOMAIN
+        local = f"{first}.{last}".lower().replace("'", "")
+        yield {
+            "admin": str(100000 + index),
+            "last_name": last,
+            "first_name": first,
+            "group": GROUPS[index // per_group],
+            "email": f"{local}{index}@{domain}",
+            "password": "".join(rng.choices(PASSWORD_CHARS, k=10)),
+        }
+
+
+def write_roster(path: Path, rows: int, seed: int = 7160) -> Path:
+    """Write a synthetic roster CSV to ``path``."""
+    with path.open("w", newline="") as f:
+        writer = csv.DictWriter(f, COLUMNS)
+        writer.writeheader()
+        writer.writerows(iter_roster(rows, seed))
+    return path
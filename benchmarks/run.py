@@ -0,0 +1,265 @@
+"""Run the label generation benchmarks and compare them against a baseline.
+
+Each case generates a synthetic roster (see :mod:`benchmarks.roster`) and
+runs it in a fresh process, so peak RSS is measured per case:
+
+    python -m benchmarks.run
+    python -m benchmarks.run --sizes 1000 10000 --output results.json
+    python -m benchmarks.run --update-baseline
+
+The no-break case of each size also writes the roster in every output
+mode of :data:`FORMATS`, recording the size and time of each, to show
+what compression, object streams and linearization cost and save.
+
+Results are written as JSON. Throughput, peak RSS and output size are
+compared against ``benchmarks/baseline.json``; the run exits with status 1
+if any case regressed by more than the threshold.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from benchmarks.roster import write_roster
+from school_labels.generator import generate_labels_to, iter_csv_data, read_csv_data
+from school_labels.writer import PdfOptions
+
+STYLE = "email-password"
+BREAK_COLUMN = "group"
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+DEFAULT_THRESHOLD = 0.25
+BASELINE = Path(__file__).with_name("baseline.json")
+
+# Output modes timed in the no-break case, by name
+FORMATS = {
+    "default": PdfOptions(),
+    "uncompressed": PdfOptions(compress_level=0),
+    "fastest": PdfOptions(compress_level=1),
+    "smallest": PdfOptions(compress_level=9),
+    "object-streams": PdfOptions(object_streams=True),
+    "smallest-object-streams": PdfOptions(compress_level=9, object_streams=True),
+    "linearized": PdfOptions(linearize=True),
+}
+
+# Metric name -> True if bigger is better
+METRICS = {
+    "rows_per_second": True,
+    "peak_rss_mb": False,
+    "output_bytes": False,
+}
+
+
+def _discard() -> BinaryIO:
+    """Binary sink that discards what is written, for timing rendering alone."""
+    return Path(os.devnull).open("wb")
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def _stream(csv_path: Path, out: BinaryIO, break_column: str | None) -> int:
+    with csv_path.open(newline="") as f:
+        return generate_labels_to(
+            iter_csv_data(f), STYLE, out, break_column=break_column
+        )
+
+
+def _run_case(csv_path: Path, rows: int, break_column: str | None) -> dict[str, Any]:
+    """Measure one case. Runs in its own process."""
+    # End to end first, while peak RSS reflects only the streaming path
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = Path(tmp) / "labels.pdf"
+        start = time.perf_counter()
+        with out_path.open("wb") as out:
+            pages = _stream(csv_path, out, break_column)
+        total = time.perf_counter() - start
+        output_bytes = out_path.stat().st_size
+    peak_rss = _peak_rss_mb()
+
+    # Then each stage on its own
+    start = time.perf_counter()
+    with csv_path.open(newline="") as f:
+        data = read_csv_data(f)
+    parse = time.perf_counter() - start
+    start = time.perf_counter()
+    with _discard() as sink:
+        generate_labels_to(data, STYLE, sink, break_column=break_column)
+    render = time.perf_counter() - start
+    start = time.perf_counter()
+    with _discard() as sink:
+        generate_labels_to(
+            data, STYLE, sink, break_column=break_column, backend="direct"
+        )
+    render_direct = time.perf_counter() - start
+
+    result = {
+        "rows": rows,
+        "break_column": break_column,
+        "pages": pages,
+        "seconds": round(total, 4),
+        "rows_per_second": round(rows / total, 1),
+        "peak_rss_mb": round(peak_rss, 1),
+        "output_bytes": output_bytes,
+        "stages": {
+            "parse_seconds": round(parse, 4),
+            "render_seconds": round(render, 4),
+            "render_direct_seconds": round(render_direct, 4),
+        },
+    }
+    if break_column is None:
+        result["formats"] = _run_formats(data)
+    return result
+
+
+def _run_formats(data: list[dict[str, str]]) -> dict[str, dict[str, Any]]:
+    """Write ``data`` in each of :data:`FORMATS`, timing each to a real file."""
+    formats = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = Path(tmp) / "labels.pdf"
+        for name, options in FORMATS.items():
+            start = time.perf_counter()
+            with out_path.open("wb") as out:
+                generate_labels_to(data, STYLE, out, pdf_options=options)
+            formats[name] = {
+                "seconds": round(time.perf_counter() - start, 4),
+                "output_bytes": out_path.stat().st_size,
+            }
+    return formats
+
+
+def _case_name(rows: int, break_column: str | None) -> str:
+    return f"{rows}-{'break' if break_column else 'nobreak'}"
+
+
+def run(sizes: list[int]) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Run every case, yielding ``(name, result)`` as each finishes."""
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in sizes:
+            csv_path = write_roster(Path(tmp) / f"roster-{rows}.csv", rows)
+            for break_column in (None, BREAK_COLUMN):
+                # A fresh interpreter per case keeps peak RSS and caches separate
+                with context.Pool(1, maxtasksperchild=1) as pool:
+                    result = pool.apply(_run_case, (csv_path, rows, break_column))
+                yield _case_name(rows, break_column), result
+
+
+def compare(
+    results: dict[str, dict[str, Any]],
+    baseline: dict[str, dict[str, Any]],
+    threshold: float = DEFAULT_THRESHOLD,
+) -> list[str]:
+    """List the metrics that are worse than the baseline by over ``threshold``.
+
+    Cases missing from the baseline are not compared.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            now, then = result[metric], base[metric]
+            change = (now - then) / then if then else 0.0
+            worse = -change if higher_is_better else change
+            if worse > threshold:
+                regressions.append(f"{name}: {metric} {then} -> {now} ({change:+.1%})")
+    return regressions
+
+
+def create_parser() -> argparse.ArgumentParser:
+    """Create the benchmark argument parser."""
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="Benchmark label generation on synthetic rosters.",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        metavar="ROWS",
+        help="Roster sizes to run (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        help="Write the results JSON here (default: stdout)",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=BASELINE,
+        help="Baseline results to compare against (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Relative change that counts as a regression (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Save these results as the new baseline instead of comparing",
+    )
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Benchmark entry point."""
+    args = create_parser().parse_args(argv)
+    results = {}
+    for name, result in run(args.sizes):
+        results[name] = result
+        sys.stderr.write(
+            f"{name}: {result['rows_per_second']:.0f} rows/s, "
+            f"{result['peak_rss_mb']} MiB peak, {result['output_bytes']} bytes\n"
+        )
+        for mode, measured in result.get("formats", {}).items():
+            sys.stderr.write(
+                f"  {mode}: {measured['seconds']:.2f} s, "
+                f"{measured['output_bytes']} bytes\n"
+            )
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cases": results,
+    }
+    text = json.dumps(report, indent=2) + "\n"
+    if args.update_baseline:
+        args.baseline.write_text(text)
+        sys.stderr.write(f"Baseline saved to {args.baseline}\n")
+        return 0
+    if args.output:
+        args.output.write_text(text)
+    else:
+        sys.stdout.write(text)
+
+    if not args.baseline.exists():
+        sys.stderr.write(f"No baseline at {args.baseline}; nothing to compare\n")
+        return 0
+    baseline = json.loads(args.baseline.read_text())["cases"]
+    regressions = compare(results, baseline, args.threshold)
+    for line in regressions:
+        sys.stderr.write(f"Regression: {line}\n")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
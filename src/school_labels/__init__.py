@@ -4,6 +4,7 @@ from .generator import (
     TEMPLATES,
     detect_template,
     generate_labels,
+    generate_labels_to,
     validate_columns,
 )
 
@@ -11,5 +12,6 @@ __all__ = [
     "TEMPLATES",
     "detect_template",
     "generate_labels",
+    "generate_labels_to",
     "validate_columns",
 ]
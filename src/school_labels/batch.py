@@ -0,0 +1,192 @@
+"""Generate labels for many CSV or .xlsx files in one warm process."""
+
+import contextlib
+import itertools
+import time
+from collections.abc import Generator, Iterable, Iterator, Mapping
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+from . import generator, xlsx
+from .validation import Issue, RowValidator
+
+if TYPE_CHECKING:
+    from .templates import LabelTemplate
+
+
+class BatchResult(NamedTuple):
+    """Outcome of generating labels for one input file.
+
+    ``issues`` are the problems found in the rows, as the CLI reports them.
+    They do not fail the file: unprintable characters are printed as ``?``.
+    """
+
+    input_path: Path
+    output_path: Path | None
+    rows: int
+    pages: int
+    seconds: float
+    error: str | None = None
+    issues: tuple[Issue, ...] = ()
+
+
+# Suffixes of the files a directory source yields
+INPUT_SUFFIXES = frozenset({".csv", *xlsx.SUFFIXES})
+
+
+def find_inputs(source: Path) -> list[Path]:
+    """List the input files named by a directory or a manifest file.
+
+    A directory yields every ``*.csv`` and ``*.xlsx`` file in it, sorted by
+    name, leaving out Excel's ``~$`` lock files. A manifest lists one input
+    path per line; blank lines and lines starting with ``#`` are ignored,
+    and relative paths are resolved against the manifest's directory.
+    """
+    if source.is_dir():
+        return sorted(
+            p
+            for p in source.iterdir()
+            if p.suffix.lower() in INPUT_SUFFIXES
+            and not p.name.startswith("~$")
+            and p.is_file()
+        )
+    lines = source.read_text().splitlines()
+    return [
+        source.parent / line.strip()
+        for line in lines
+        if line.strip() and not line.lstrip().startswith("#")
+    ]
+
+
+@contextlib.contextmanager
+def _read_rows(input_path: Path) -> Generator[Iterator[Mapping[str, str]]]:
+    """Open a CSV file or workbook, yielding a lazy iterator over its rows."""
+    if xlsx.is_xlsx(input_path):
+        with xlsx.XlsxReader(input_path) as reader:
+            yield generator.iter_xlsx_rows(reader)
+    else:
+        with input_path.open(newline="") as f:
+            yield generator.iter_csv_data(f)
+
+
+def _counted[T](rows: Iterable[T], counter: list[int]) -> Iterator[T]:
+    """Yield rows unchanged, counting them in ``counter[0]``."""
+    for row in rows:
+        counter[0] += 1
+        yield row
+
+
+def _resolve_template(style: str | None, columns: list[str]) -> "LabelTemplate":
+    """Look up ``style`` or auto-detect from columns, raising ValueError."""
+    if style:
+        template = generator.TEMPLATES.get(style)
+        if template is None:
+            msg = f"Unknown template style {style!r}"
+            raise ValueError(msg)
+        return template
+    template = generator.detect_template(columns)
+    if template is None:
+        msg = f"Could not auto-detect template from columns: {columns}"
+        raise ValueError(msg)
+    return template
+
+
+def generate_file(
+    input_path: Path,
+    output_path: Path,
+    *,
+    style: str | None = None,
+    break_column: str | None = None,
+) -> BatchResult:
+    """Generate a labels PDF for one CSV file or workbook, capturing any error.
+
+    The template is auto-detected from the columns unless ``style`` is
+    given. Rows are checked by a :class:`~school_labels.validation.RowValidator`
+    for the template, as the CLI checks them. If ``output_path`` exists, a
+    numbered name is used instead. Any error, including one raised by fpdf2
+    while drawing, is returned as the result's ``error`` rather than raised,
+    and no output file is left behind.
+    """
+    start = time.perf_counter()
+    counter = [0]
+    issues: list[Issue] = []
+    written: Path | None = None
+    try:
+        with _read_rows(input_path) as rows:
+            first = next(rows, None)
+            if first is None:
+                msg = "No data found in input"
+                raise ValueError(msg)  # noqa: TRY301
+            template = _resolve_template(style, list(first.keys()))
+            validator = RowValidator(
+                template.required_columns,
+                template.unique_columns,
+                template.charset,
+                checks=template.value_checks,
+            )
+            issues = validator.issues
+            written = Path(generator.generate_filename(str(output_path)))
+            with written.open("wb") as out:
+                pages = generator.generate_labels_to(
+                    _counted(
+                        validator.validated(itertools.chain([first], rows)), counter
+                    ),
+                    template.name,
+                    out,
+                    break_column=break_column,
+                )
+    except Exception as e:  # noqa: BLE001 - one file must not stop a batch
+        if written:
+            written.unlink(missing_ok=True)
+        seconds = time.perf_counter() - start
+        return BatchResult(
+            input_path, None, counter[0], 0, seconds, str(e), tuple(issues)
+        )
+    seconds = time.perf_counter() - start
+    return BatchResult(
+        input_path, written, counter[0], pages, seconds, issues=tuple(issues)
+    )
+
+
+def _generate_file_task(
+    task: tuple[Path, Path, str | None, str | None],
+) -> BatchResult:
+    input_path, output_path, style, break_column = task
+    return generate_file(
+        input_path, output_path, style=style, break_column=break_column
+    )
+
+
+def generate_batch(
+    inputs: Iterable[Path],
+    output_dir: Path | None = None,
+    *,
+    style: str | None = None,
+    break_column: str | None = None,
+    workers: int = 1,
+) -> Iterator[BatchResult]:
+    """Generate one labels PDF per input file, yielding results in input order.
+
+    Each output is named after its input with a ``.pdf`` suffix, in
+    ``output_dir`` or next to the input. A failing file is reported in its
+    result and does not stop the others. With ``workers`` above 1, files are
+    processed concurrently by a pool of processes, each of which keeps its
+    templates and measurement caches warm across the files it handles.
+    """
+    tasks = [
+        (
+            path,
+            (output_dir or path.parent) / path.with_suffix(".pdf").name,
+            style,
+            break_column,
+        )
+        for path in inputs
+    ]
+    if workers > 1:
+        # Only needed here, and slow to import for every CLI call
+        from concurrent.futures import ProcessPoolExecutor  # noqa: PLC0415
+
+        with ProcessPoolExecutor(workers) as pool:
+            yield from pool.map(_generate_file_task, tasks)
+    else:
+        yield from map(_generate_file_task, tasks)
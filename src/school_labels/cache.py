@@ -0,0 +1,137 @@
+"""Content-addressed on-disk cache of rendered pages."""
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import warnings
+from pathlib import Path
+from typing import NamedTuple
+
+# Default size bound for a page cache directory
+DEFAULT_MAX_BYTES = 256 * 2**20
+
+
+class CachedPage(NamedTuple):
+    """A rendered page's content stream and the fonts it selects.
+
+    ``fonts`` maps each font resource name in ``content`` to its
+    ``(family, style)``, so the page can be reused in a document that
+    numbers its fonts differently.
+    """
+
+    content: bytes
+    fonts: dict[str, tuple[str, str]]
+
+
+class PageCache:
+    """Rendered pages stored on disk under a hash of everything they depend on.
+
+    Entries are files named by their key. Reading an entry marks it as
+    recently used, and :meth:`prune` evicts the least recently used entries
+    until the directory fits in ``max_bytes``. Entries are written
+    atomically, so several processes can share a directory.
+
+    A cache is never worth failing a run for: if an entry cannot be written,
+    say on a full disk or in a read-only directory, :meth:`put` warns once,
+    keeps the error in ``write_error`` and stores nothing more.
+    """
+
+    def __init__(
+        self, directory: Path | str, max_bytes: int = DEFAULT_MAX_BYTES
+    ) -> None:
+        """Use ``directory`` as the cache, creating it if needed."""
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.write_error: OSError | None = None
+
+    @staticmethod
+    def key(*parts: bytes) -> str:
+        """Hash ``parts`` into a cache key."""
+        digest = hashlib.sha256()
+        for part in parts:
+            # Length-prefixed so that part boundaries are part of the key
+            digest.update(len(part).to_bytes(8, "big"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def get(self, key: str) -> CachedPage | None:
+        """Return the page stored under ``key``, or None."""
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            header, content = data.split(b"\n", 1)
+            fonts = {
+                name: (family, style)
+                for name, (family, style) in json.loads(header).items()
+            }
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        # A read-only cache still serves its pages
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        self.hits += 1
+        return CachedPage(content, fonts)
+
+    def put(self, key: str, page: CachedPage) -> None:
+        """Store ``page`` under ``key``, unless the cache cannot be written."""
+        if self.write_error is not None:
+            return
+        header = json.dumps(page.fonts, separators=(",", ":")).encode()
+        try:
+            write_atomic(self._path(key), header + b"\n" + page.content)
+        except OSError as e:
+            self.write_error = e
+            warnings.warn(
+                f"Page cache {self.directory} cannot be written, "
+                f"continuing without storing pages: {e}",
+                RuntimeWarning,
+                stacklevel=2,
+            )
+
+    def prune(self) -> int:
+        """Evict least recently used entries until the cache fits its bound.
+
+        Returns the number of entries evicted.
+        """
+        entries = []
+        for path in self.directory.glob("*/*"):
+            with contextlib.suppress(OSError):
+                stat = path.stat()
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink(missing_ok=True)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        return evicted
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """Write ``data`` to ``path`` so that readers never see a partial file.
+
+    Creates the parent directory if needed.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        Path(tmp).replace(path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
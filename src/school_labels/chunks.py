@@ -0,0 +1,262 @@
+"""Parse a large CSV file on several processes.
+
+The file is memory-mapped and split into byte ranges that end at line
+ends outside quoted fields, so every range holds whole records and can be
+parsed on its own. Each range is read and parsed by a worker process,
+which keeps only the wanted columns, and the records come back in file
+order with their line numbers, as from :func:`csv.reader`.
+"""
+
+import codecs
+import csv
+import io
+import itertools
+import locale
+from array import array
+from collections import deque
+from collections.abc import Iterator, Sequence
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+from .rows import projector
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor, Future
+    from mmap import mmap
+
+# Smallest range handed to a worker; smaller files are parsed serially
+MIN_CHUNK_SIZE = 2**20
+
+# Largest range handed to a worker, bounding the memory of parsed records
+MAX_CHUNK_SIZE = 8 * 2**20
+
+# A record that cannot be mistaken for data: one field without delimiters,
+# quotes or line ends. Appended to a range to check it ended between records
+_SENTINEL = "\x00school-labels-end-of-range\x00"
+
+# Encodings in which '"' and line ends are single bytes that never appear
+# inside other characters pass this round trip; stateful ones are excluded
+_MARKERS = '\n\r",'
+_STATEFUL = ("iso2022", "utf-7", "hz")
+
+
+# Characters that may join values sent back from a worker: control
+# characters first, then private-use ones, whichever is not in the range
+_SEPARATORS = "\x1f\x1e\x1d\x1c" + "".join(map(chr, range(0xE000, 0xF900)))
+
+
+class Chunk(NamedTuple):
+    """Records parsed from one range of a CSV file.
+
+    ``values`` holds the kept values of every record, one after another,
+    joined by ``separator``, a character found nowhere in the range: one
+    string pickles far faster than many. ``lines`` holds the line each
+    record ends on, counted from the start of the range. ``complete`` is
+    false if the range ended inside a quoted field, so that its last record
+    and the next range were not split cleanly, or if no separator was free.
+    """
+
+    values: str
+    separator: str
+    lines: array[int]
+    line_count: int
+    complete: bool
+
+    def records(self, width: int) -> Iterator[tuple[int, tuple[str, ...]]]:
+        """Yield each record's line and its ``width`` values."""
+        if not self.lines:
+            return
+        values = self.values.split(self.separator)
+        yield from zip(
+            self.lines, itertools.batched(values, width, strict=True), strict=True
+        )
+
+
+def default_encoding() -> str:
+    """The encoding ``open()`` reads text files in when none is given."""
+    encoding = io.text_encoding(None)
+    return locale.getencoding() if encoding == "locale" else encoding
+
+
+def is_splittable(encoding: str) -> bool:
+    """Whether text in ``encoding`` can be split at byte offsets of line ends."""
+    name = codecs.lookup(encoding).name
+    return (
+        not name.startswith(_STATEFUL)
+        and _MARKERS.encode(encoding, errors="replace") == _MARKERS.encode()
+    )
+
+
+def record_end(data: "mmap | bytes", start: int, target: int) -> int:
+    """Offset just past the first record end at or after ``target``.
+
+    ``start`` must be the start of a record. A line end ends a record when
+    an even number of quote characters lie between ``start`` and it, as
+    quotes within quoted fields are doubled. Returns the length of
+    ``data`` if no record ends after ``target``.
+    """
+    quotes = data[start:target].count(b'"')
+    position = target
+    while (newline := data.find(b"\n", position)) >= 0:
+        quotes += data[position:newline].count(b'"')
+        if quotes % 2 == 0:
+            return newline + 1
+        position = newline + 1
+    return len(data)
+
+
+def split(data: "mmap | bytes", start: int, size: int) -> Iterator[tuple[int, int]]:
+    """Split ``data`` from ``start`` into ranges of whole records.
+
+    Each range is about ``size`` bytes, running on to the end of the record
+    it would otherwise cut.
+    """
+    end = len(data)
+    while start < end:
+        stop = end if start + size >= end else record_end(data, start, start + size)
+        yield start, stop
+        start = stop
+
+
+def parse_chunk(  # noqa: PLR0913
+    path: Path,
+    start: int,
+    end: int,
+    *,
+    encoding: str,
+    positions: Sequence[int],
+    width: int,
+) -> Chunk:
+    """Read and parse the records of ``path`` between two byte offsets.
+
+    Blank lines are skipped, and short records are padded to ``width``
+    before the values at ``positions`` are kept. Runs in a worker process.
+    """
+    with path.open("rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode(encoding)
+    separator = next((c for c in _SEPARATORS if c not in text), "")
+    if not separator:
+        return Chunk("", "", array("q"), 0, complete=False)
+    # At the end of the file, the range ends however the file does
+    checked = text.endswith("\n")
+    if checked:
+        text += _SENTINEL + "\n"
+    reader = csv.reader(io.StringIO(text, newline=""))
+    values: list[str] = []
+    lines = array("q")
+    complete = not checked
+    project = projector(positions)
+    for record in reader:
+        if not record:
+            continue
+        if record[0] == _SENTINEL and len(record) == 1:
+            complete = True
+            continue
+        if len(record) < width:
+            record.extend([""] * (width - len(record)))
+        values.extend(project(record))
+        lines.append(reader.line_num)
+    line_count = reader.line_num - 1 if checked else reader.line_num
+    return Chunk(separator.join(values), separator, lines, line_count, complete)
+
+
+class ChunkedReader:
+    """Records after the header of a CSV file, parsed by a pool of processes.
+
+    Like :func:`csv.reader`, iterating gives each record, here only its
+    values at ``positions``, and :attr:`line_num` is the line the last one
+    ended on. Blank lines are skipped. At most two ranges per worker are
+    parsed ahead of the records being read, so memory stays bounded.
+
+    Should a range turn out to end inside a quoted field, which can only
+    happen if a quote character appears inside an unquoted field, the rest
+    of the file is parsed here, serially, so the records are always those
+    :func:`csv.reader` would give.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        executor: "Executor",
+        workers: int,
+        path: Path,
+        data: "mmap | bytes",
+        start: int,
+        *,
+        encoding: str,
+        positions: Sequence[int],
+        width: int,
+        line_num: int,
+    ) -> None:
+        """Read ``path``, mapped as ``data``, from the record at byte ``start``.
+
+        ``line_num`` is the number of lines before ``start``.
+        """
+        self.line_num = line_num
+        self._executor = executor
+        self._workers = workers
+        self._path = path
+        self._data = data
+        self._start = start
+        self._encoding = encoding
+        self._positions = positions
+        self._width = width
+        self._size = min(
+            max(len(data) // (4 * workers), MIN_CHUNK_SIZE), MAX_CHUNK_SIZE
+        )
+
+    def __iter__(self) -> Iterator[Sequence[str]]:
+        """Yield each record's kept values, in file order."""
+        ranges = split(self._data, self._start, self._size)
+        pending: deque[tuple[int, Future[Chunk]]] = deque(
+            self._submit(begin, end)
+            for begin, end in itertools.islice(ranges, 2 * self._workers)
+        )
+        width = len(self._positions)
+        try:
+            while pending:
+                begin, future = pending.popleft()
+                chunk = future.result()
+                if not chunk.complete:
+                    yield from self._parse_serially(begin)
+                    return
+                pending.extend(self._submit(*r) for r in itertools.islice(ranges, 1))
+                base = self.line_num
+                for line, record in chunk.records(width):
+                    self.line_num = base + line
+                    yield record
+                self.line_num = base + chunk.line_count
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def _submit(self, begin: int, end: int) -> tuple[int, "Future[Chunk]"]:
+        future = self._executor.submit(
+            parse_chunk,
+            self._path,
+            begin,
+            end,
+            encoding=self._encoding,
+            positions=self._positions,
+            width=self._width,
+        )
+        return begin, future
+
+    def _parse_serially(self, begin: int) -> Iterator[Sequence[str]]:
+        """Parse the records from byte ``begin`` to the end of the file here."""
+        base = self.line_num
+        width = self._width
+        project = projector(self._positions)
+        with (
+            self._path.open("rb") as f,
+            io.TextIOWrapper(f, encoding=self._encoding, newline="") as text,
+        ):
+            f.seek(begin)
+            reader = csv.reader(text)
+            for record in reader:
+                if not record:
+                    continue
+                if len(record) < width:
+                    record.extend([""] * (width - len(record)))
+                self.line_num = base + reader.line_num
+                yield project(record)
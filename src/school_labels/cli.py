@@ -1,24 +1,86 @@
 """Command-line interface for school-labels."""
 
 import argparse
+import cProfile
 import csv
+import io
+import itertools
+import json
 import sys
-from importlib.metadata import version
+from collections.abc import Iterator, Sequence
+from contextlib import AbstractContextManager, ExitStack, nullcontext
 from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Self, TextIO, override
 
-from . import generator
-from .templates import LabelTemplate
+from . import batch, generator, progress, sorting, timings, watch, xlsx
+from .cache import DEFAULT_MAX_BYTES, PageCache
+from .rows import Row
+from .validation import Issue, RowValidator
+from .writer import DEFAULT_COMPRESS_LEVEL, PdfOptions
+
+if TYPE_CHECKING:
+    from .templates import LabelTemplate
+
+
+def _positive_int(value: str) -> int:
+    """Parse a positive integer argument."""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        msg = f"must be a positive integer, got {value!r}"
+        raise argparse.ArgumentTypeError(msg)
+    return number
+
+
+class _VersionAction(argparse.Action):
+    """Print the version and exit, reading package metadata only when asked."""
+
+    @override
+    def __call__(
+        self,
+        parser: argparse.ArgumentParser,
+        namespace: argparse.Namespace,
+        values: object,
+        option_string: str | None = None,
+    ) -> None:
+        # importlib.metadata is slow to import, so keep it off other paths
+        from importlib.metadata import version  # noqa: PLC0415
+
+        parser.exit(message=f"{parser.prog} {version('school-labels')}\n")
+
+
+def _column_list(value: str) -> list[str]:
+    """Parse a comma-separated list of column names or values."""
+    return [column.strip() for column in value.split(",") if column.strip()]
 
 
 def create_parser() -> argparse.ArgumentParser:
     """Create and configure the argument parser."""
     parser = argparse.ArgumentParser(
-        description="Generate printable PDF labels from CSV data", prog="school-labels"
+        description="Generate printable PDF labels from CSV or Excel .xlsx data",
+        prog="school-labels",
+        epilog=(
+            "Run 'school-labels batch --help' to process many CSV files at once, "
+            "'school-labels watch --help' to process files dropped into a "
+            "folder, or 'school-labels serve --help' to generate labels over HTTP."
+        ),
+    )
+    parser.add_argument(
+        "--version",
+        action=_VersionAction,
+        nargs=0,
+        default=argparse.SUPPRESS,
+        help="show program's version number and exit",
+    )
+    parser.add_argument(
+        "input", nargs="?", help="CSV or .xlsx input file (default: stdin)"
     )
     parser.add_argument(
-        "--version", action="version", version=f"%(prog)s {version('school-labels')}"
+        "--sheet",
+        help="Worksheet to read from an .xlsx input (default: the first)",
     )
-    parser.add_argument("input", nargs="?", help="CSV input file (default: stdin)")
     parser.add_argument(
         "--style", choices=list(generator.TEMPLATES.keys()), help="Label template style"
     )
@@ -33,36 +95,432 @@ def create_parser() -> argparse.ArgumentParser:
         dest="break_column",
         help="Column name to trigger page breaks on value changes",
     )
+    parser.add_argument(
+        "--group-by",
+        metavar="COLUMN",
+        help=(
+            "Sort rows by COLUMN and start a new page when it changes, so the "
+            "input need not be pre-sorted (implies --break COLUMN)"
+        ),
+    )
+    parser.add_argument(
+        "--sort-by",
+        metavar="COLUMNS",
+        type=_column_list,
+        action="extend",
+        default=[],
+        help=(
+            "Sort rows by these comma-separated columns (within each group "
+            "with --group-by). Numbers such as admin numbers sort by value, "
+            "after empty values and before text. May be repeated"
+        ),
+    )
+    parser.add_argument(
+        "--split-by",
+        metavar="COLUMN",
+        help=(
+            "Write one PDF per value of COLUMN. The output name may contain "
+            "{value}; otherwise -{value} is added before the extension"
+        ),
+    )
+    parser.add_argument(
+        "--only-admin",
+        metavar="ADMINS",
+        type=_column_list,
+        action="extend",
+        default=[],
+        help=(
+            "Print only the labels of these comma-separated admin numbers, "
+            "e.g. for a reprint. May be repeated"
+        ),
+    )
+    parser.add_argument(
+        "--only-group",
+        metavar="GROUPS",
+        type=_column_list,
+        action="extend",
+        default=[],
+        help="Print only the labels of these comma-separated groups. May be repeated",
+    )
+    parser.add_argument(
+        "--rows-from",
+        metavar="FILE",
+        help=(
+            "Print only the labels of the admin numbers listed in FILE, one "
+            "per line or in the first column of a CSV file"
+        ),
+    )
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        help=(
+            "Keep an index of a CSV file's rows beside it (FILE.labels-index), "
+            "so that --only-admin, --only-group and --rows-from read just the "
+            "rows they pick. It is rebuilt when the file changes"
+        ),
+    )
+    parser.add_argument(
+        "--font",
+        metavar="[ROLE=]FILE",
+        action="append",
+        default=[],
+        help=(
+            "Draw text in the TrueType font FILE instead of the built-in "
+            "Latin-1 fonts, e.g. for Polish, Greek or Vietnamese names. Text "
+            "is not shaped, so right-to-left scripts such as Arabic and Hebrew "
+            "are reported as unprintable. ROLE picks which text "
+            "(email-password: sans, mono); without it, FILE is used for all "
+            "text. May be repeated"
+        ),
+    )
+    parser.add_argument(
+        "--compress-level",
+        metavar="LEVEL",
+        type=int,
+        choices=range(10),
+        default=DEFAULT_COMPRESS_LEVEL,
+        help=(
+            "Compression level for page content, from 1 (fastest) to 9 "
+            "(smallest), or 0 for none (default: %(default)s)"
+        ),
+    )
+    encoding = parser.add_mutually_exclusive_group()
+    encoding.add_argument(
+        "--object-streams",
+        action="store_true",
+        help=(
+            "Pack page dictionaries and other small objects into compressed "
+            "object streams (PDF 1.5), for a smaller file"
+        ),
+    )
+    encoding.add_argument(
+        "--linearize",
+        action="store_true",
+        help=(
+            "Write a linearized (fast web view) PDF, so print servers and "
+            "viewers can start on the first page before the rest has arrived"
+        ),
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=_positive_int,
+        default=1,
+        help="Number of processes to render pages with (default: 1)",
+    )
+    parser.add_argument(
+        "--parse-jobs",
+        type=_positive_int,
+        default=1,
+        metavar="N",
+        help=(
+            "Number of processes to parse a large CSV file with, while pages "
+            "are rendered (default: 1)"
+        ),
+    )
+    parser.add_argument(
+        "--backend",
+        choices=generator.BACKENDS,
+        default="fpdf",
+        help=(
+            "How labels are drawn: through fpdf2, or by writing the same PDF "
+            "operators directly, several times faster (core fonts only; "
+            "default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--cache-dir",
+        metavar="DIR",
+        help=(
+            "Reuse pages rendered by earlier runs from DIR, and store new ones "
+            "there; only pages whose rows changed are laid out again"
+        ),
+    )
+    parser.add_argument(
+        "--cache-size",
+        metavar="MB",
+        type=_positive_int,
+        default=DEFAULT_MAX_BYTES // 2**20,
+        help=(
+            "Evict least recently used pages when the cache exceeds MB "
+            "megabytes (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help=(
+            "Stop without writing output at the first empty, duplicate or "
+            "unprintable value"
+        ),
+    )
+    parser.add_argument(
+        "--report",
+        metavar="FILE",
+        help=(
+            "Write every empty, duplicate or unprintable value found to FILE "
+            "as CSV, and print the labels anyway"
+        ),
+    )
+    parser.add_argument(
+        "--progress",
+        action="store_true",
+        help=(
+            "Show labels and pages written, the rate and the time left on "
+            "stderr while labels are generated"
+        ),
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print time and memory per stage and operation counts to stderr",
+    )
+    parser.add_argument(
+        "--timings-json",
+        metavar="FILE",
+        help="Write time and memory per stage and operation counts to FILE as JSON",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="Write a cProfile dump of the run to FILE (view with pstats)",
+    )
 
     return parser
 
 
-def _load_csv_data(args: argparse.Namespace) -> list[dict[str, str]] | None:
-    """Read CSV data from file or stdin, returning None on error."""
-    try:
-        if args.input:
-            with Path(args.input).open(newline="") as f:
-                data = generator.read_csv_data(f)
-        elif sys.stdin.isatty():
-            sys.stderr.write("Error: input file required (or pipe CSV to stdin).\n")
+def _open_input(
+    args: argparse.Namespace, stack: ExitStack
+) -> TextIO | xlsx.XlsxReader | None:
+    """Open the CSV or .xlsx input file or stdin, returning None on error.
+
+    A workbook is recognised by its suffix or, as on stdin, its first bytes.
+    """
+    if args.input:
+        path = Path(args.input)
+        try:
+            if xlsx.is_xlsx(path):
+                return stack.enter_context(xlsx.XlsxReader(path, args.sheet))
+            return stack.enter_context(path.open(newline=""))
+        except FileNotFoundError:
+            sys.stderr.write(f"Error: Input file '{args.input}' not found\n")
+        except xlsx.XlsxError as e:
+            sys.stderr.write(f"Error reading spreadsheet: {e}\n")
+        except OSError as e:
+            sys.stderr.write(f"Error reading CSV data: {e}\n")
+        return None
+    if sys.stdin.isatty():
+        sys.stderr.write("Error: input file required (or pipe CSV to stdin).\n")
+        return None
+    return _open_stdin(args, stack)
+
+
+def _open_stdin(
+    args: argparse.Namespace, stack: ExitStack
+) -> TextIO | xlsx.XlsxReader | None:
+    """Read stdin as CSV, or as a workbook if it starts as one."""
+    stdin = getattr(sys.stdin, "buffer", None)
+    if stdin is not None and stdin.peek(4)[:4] == xlsx.ZIP_MAGIC:
+        # Reading a zip archive needs seeking, which pipes cannot do
+        try:
+            return stack.enter_context(
+                xlsx.XlsxReader(io.BytesIO(stdin.read()), args.sheet)
+            )
+        except (xlsx.XlsxError, OSError) as e:
+            sys.stderr.write(f"Error reading spreadsheet: {e}\n")
             return None
+    return sys.stdin
+
+
+def _read_error(input_file: TextIO | xlsx.XlsxReader, error: Exception) -> None:
+    """Report an error reading the input."""
+    kind = "spreadsheet" if isinstance(input_file, xlsx.XlsxReader) else "CSV data"
+    sys.stderr.write(f"Error reading {kind}: {error}\n")
+
+
+def _read_header(input_file: TextIO | xlsx.XlsxReader) -> list[str] | None:
+    """Read the header row, returning None on error."""
+    try:
+        if isinstance(input_file, xlsx.XlsxReader):
+            header = next(input_file, [])
+        else:
+            header = generator.read_csv_header(input_file)
+    except (csv.Error, OSError, ValueError) as e:
+        _read_error(input_file, e)
+        return None
+    if not header:
+        sys.stderr.write("Error: No data found in input\n")
+        return None
+    return header
+
+
+def _option_columns(args: argparse.Namespace) -> list[str]:
+    """Columns named by the break, group, sort, split and select options, in order."""
+    named = [
+        args.break_column,
+        args.group_by,
+        *args.sort_by,
+        args.split_by,
+        *_selection_columns(args),
+    ]
+    return list(dict.fromkeys(column for column in named if column))
+
+
+def _selection_columns(args: argparse.Namespace) -> list[str]:
+    """Columns the ``--only-admin``, ``--only-group`` and ``--rows-from`` pick by."""
+    columns = []
+    if args.only_admin or args.rows_from:
+        columns.append(ADMIN_COLUMN)
+    if args.only_group:
+        columns.append(GROUP_COLUMN)
+    return columns
+
+
+def _read_selection(args: argparse.Namespace) -> dict[str, set[str]] | None:
+    """Values to pick rows by, by column, from the selection options.
+
+    Empty without selection options. Returns None if ``--rows-from`` cannot
+    be read.
+    """
+    selection: dict[str, set[str]] = {}
+    if args.only_admin or args.rows_from:
+        admins = selection[ADMIN_COLUMN] = set(args.only_admin)
+        if args.rows_from:
+            try:
+                admins.update(_read_admins(Path(args.rows_from)))
+            except (OSError, UnicodeDecodeError, csv.Error) as e:
+                sys.stderr.write(f"Error reading {args.rows_from}: {e}\n")
+                return None
+    if args.only_group:
+        selection[GROUP_COLUMN] = set(args.only_group)
+    return selection
+
+
+def _read_admins(path: Path) -> set[str]:
+    """Admin numbers listed in ``path``, one per line.
+
+    Only the first comma-separated value of a line counts, so a CSV file
+    with admin numbers in its first column will do; a header naming the
+    column is skipped.
+    """
+    with path.open(newline="") as f:
+        values = [record[0].strip() for record in csv.reader(f) if record]
+    if values and values[0] == ADMIN_COLUMN:
+        del values[0]
+    return {value for value in values if value}
+
+
+def _load_csv_data(
+    args: argparse.Namespace,
+    input_file: TextIO | xlsx.XlsxReader,
+    header: list[str],
+    template: "LabelTemplate",
+    validator: RowValidator,
+) -> tuple[Row, Iterator[Row]] | None:
+    """Read the first data row, returning it and a lazy iterator over all rows.
+
+    Returns None on error. Rows keep only the columns the template and the
+    options use, and are checked by ``validator`` as they are read. Only the
+    first row is parsed up front; the rest are parsed as the renderer
+    consumes them.
+    """
+    selection = _read_selection(args)
+    if selection is None:
+        return None
+    columns = _option_columns(args)
+    missing = [column for column in columns if column not in header]
+    if missing:
+        sys.stderr.write(
+            f"Error: Columns not found in CSV: {', '.join(missing)}. "
+            f"Available columns: {header}\n"
+        )
+        return None
+    grouping = [args.break_column, args.group_by, args.split_by]
+    kept = {*template.required_columns, *columns}
+    intern = [column for column in grouping if column]
+    try:
+        if isinstance(input_file, xlsx.XlsxReader):
+            rows = generator.iter_xlsx_rows(
+                input_file,
+                kept,
+                fieldnames=header,
+                intern=intern,
+                validator=validator,
+                select=selection,
+            )
+        elif args.input and (args.parse_jobs > 1 or (selection and args.index)):
+            # Parsed afresh from the file, by offsets in its bytes
+            rows = generator.iter_csv_file_rows(
+                Path(args.input),
+                kept,
+                intern=intern,
+                validator=validator,
+                jobs=args.parse_jobs,
+                select=selection,
+                use_index=args.index,
+            )
         else:
-            data = generator.read_csv_data(sys.stdin)
-    except FileNotFoundError:
-        sys.stderr.write(f"Error: Input file '{args.input}' not found\n")
+            rows = generator.iter_csv_rows(
+                input_file,
+                kept,
+                fieldnames=header,
+                intern=intern,
+                validator=validator,
+                select=selection,
+            )
+        first = next(rows, None)
+    except (csv.Error, OSError, ValueError) as e:
+        _read_error(input_file, e)
         return None
-    except (csv.Error, OSError) as e:
-        sys.stderr.write(f"Error reading CSV data: {e}\n")
+    if first is None and selection:
+        sys.stderr.write(
+            "Error: No rows match --only-admin, --only-group or --rows-from\n"
+        )
         return None
-    if not data:
+    if first is None:
         sys.stderr.write("Error: No data found in input\n")
         return None
-    return data
+    return first, itertools.chain([first], rows)
+
+
+def _font_paths(args: argparse.Namespace, template: "LabelTemplate") -> dict[str, str]:
+    """Font files by role from ``--font`` options.
+
+    A file given without a role is used for every role not given one. A
+    role the template does not have is kept, for ``with_fonts`` to reject;
+    only text before ``=`` that cannot be a role, such as a directory, makes
+    the whole option a file name.
+    """
+    default = None
+    paths = {}
+    for spec in args.font:
+        role, sep, path = spec.partition("=")
+        if sep and role.isidentifier():
+            paths[role] = path
+        else:
+            default = spec
+    if default:
+        return dict.fromkeys(template.FONTS, default) | paths
+    return paths
 
 
 def _resolve_template(
-    args: argparse.Namespace, data: list[dict[str, str]]
-) -> LabelTemplate | None:
+    args: argparse.Namespace, columns: list[str]
+) -> "LabelTemplate | None":
+    """Determine the template and apply ``--font``, returning None on error."""
+    template = _find_template(args, columns)
+    if template is None or not args.font:
+        return template
+    try:
+        return template.with_fonts(_font_paths(args, template))
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f"Error loading font: {e}\n")
+        return None
+
+
+def _find_template(
+    args: argparse.Namespace, columns: list[str]
+) -> "LabelTemplate | None":
     """Determine template from args or auto-detect, returning None on error."""
     if args.style:
         template = generator.TEMPLATES.get(args.style)
@@ -70,7 +528,6 @@ def _resolve_template(
             sys.stderr.write(f"Error: Unknown template style '{args.style}'\n")
             return None
         return template
-    columns = list(data[0].keys())
     template = generator.detect_template(columns)
     if not template:
         sys.stderr.write(
@@ -83,51 +540,661 @@ def _resolve_template(
     return template
 
 
-def main(argv: list[str] | None = None) -> int:
-    """Main CLI entry point."""
-    parser = create_parser()
-    args = parser.parse_args(argv)
+# Columns --only-admin and --rows-from, and --only-group, pick rows by
+ADMIN_COLUMN = "admin"
+GROUP_COLUMN = "group"
 
-    data = _load_csv_data(args)
-    if data is None:
-        return 1
+# Issues listed on stderr when no --report file is given
+MAX_LISTED_ISSUES = 5
 
-    template = _resolve_template(args, data)
-    if template is None:
-        return 1
 
-    missing = generator.validate_columns(data, template)
-    if missing:
+def _report_issues(args: argparse.Namespace, validator: RowValidator) -> int:
+    """Write the issues ``validator`` found to ``--report`` or stderr.
+
+    Returns 1 if the report could not be written, otherwise 0.
+    """
+    if args.report:
+        try:
+            with Path(args.report).open("w", newline="") as f:
+                validator.write_report(f)
+        except OSError as e:
+            sys.stderr.write(f"Error writing report: {e}\n")
+            return 1
+    issues = validator.issues
+    if not issues:
+        return 0
+    sys.stderr.write(f"Warning: {len(issues)} problems found in input")
+    if args.report:
+        sys.stderr.write(f", listed in {args.report}\n")
+        return 0
+    sys.stderr.write(":\n")
+    for issue in issues[:MAX_LISTED_ISSUES]:
+        sys.stderr.write(f"  {issue.format()}\n")
+    if len(issues) > MAX_LISTED_ISSUES:
         sys.stderr.write(
-            f"Error: CSV is missing required columns: {', '.join(missing)}\n"
+            f"  ... and {len(issues) - MAX_LISTED_ISSUES} more "
+            "(use --report FILE to list them all)\n"
+        )
+    return 0
+
+
+def _sorted_rows(args: argparse.Namespace, rows: Iterator[Row]) -> Iterator[Row]:
+    """Sort rows for ``--group-by`` and ``--sort-by``."""
+    columns = ([args.group_by] if args.group_by else []) + args.sort_by
+    if not columns:
+        return rows
+    return sorting.sort_rows(rows, columns)
+
+
+def _pdf_options(args: argparse.Namespace) -> PdfOptions:
+    """PDF encoding options from the parsed arguments."""
+    return PdfOptions(args.compress_level, args.object_streams, args.linearize)
+
+
+def _split_pattern(output: str) -> str:
+    """Derive a per-value output filename pattern from ``--output``."""
+    if "{value}" in output:
+        return output
+    path = Path(output.replace("{", "{{").replace("}", "}}"))
+    return str(path.with_stem(f"{path.stem}-{{value}}"))
+
+
+class _ProgressDisplay:
+    """Progress of a run on stderr: redrawn in place on a terminal, else logged.
+
+    With the number of rows expected, the share done and the time left at
+    the current rate are shown too.
+    """
+
+    # Seconds between updates on a terminal and in a log
+    TERMINAL_INTERVAL = 0.1
+    LOG_INTERVAL = 5.0
+
+    def __init__(self, total_rows: int | None) -> None:
+        """Show progress towards ``total_rows`` labels, if known."""
+        self._total = total_rows
+        self._terminal = sys.stderr.isatty()
+        self._interval = self.TERMINAL_INTERVAL if self._terminal else self.LOG_INTERVAL
+        self._shown_at = -self._interval
+        self._width = 0
+        self._last: progress.Progress | None = None
+
+    def __enter__(self) -> Self:
+        """Return the display, ending its line on exit."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """End the line, as :meth:`close` does."""
+        self.close()
+
+    def __call__(self, event: progress.Progress) -> None:
+        """Take an update, showing it unless one was shown very recently."""
+        self._last = event
+        if event.elapsed - self._shown_at >= self._interval:
+            self._show(event)
+
+    def close(self) -> None:
+        """Show the last update, if it was not, and end the line."""
+        last, self._last = self._last, None
+        if last is None:
+            return
+        if self._shown_at != last.elapsed:
+            self._show(last)
+        if self._terminal:
+            sys.stderr.write("\n")
+
+    def _show(self, event: progress.Progress) -> None:
+        self._shown_at = event.elapsed
+        line = (
+            f"{event.rows:,} labels, {event.pages:,} pages, {event.rate:,.0f} labels/s"
         )
+        if self._total:
+            eta = event.eta(self._total)
+            line += f", {min(event.rows / self._total, 1):.0%}"
+            if eta is not None:
+                line += f", {_duration(eta)} left"
+        if self._terminal:
+            # Blank out what is left of a longer line before
+            sys.stderr.write(f"\r{line:<{self._width}}")
+            self._width = max(self._width, len(line))
+        else:
+            sys.stderr.write(f"{line}\n")
+        sys.stderr.flush()
+
+
+def _showing_progress(
+    args: argparse.Namespace,
+) -> AbstractContextManager[_ProgressDisplay | None]:
+    """The ``--progress`` display for a run, or None without the option."""
+    if not args.progress:
+        return nullcontext()
+    return _ProgressDisplay(_estimate_rows(args))
+
+
+def _duration(seconds: float) -> str:
+    """``seconds`` as minutes and seconds, or hours, minutes and seconds."""
+    minutes, secs = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{secs:02}" if hours else f"{minutes}:{secs:02}"
+
+
+# Bytes of the input whose lines are counted to estimate its rows
+_ESTIMATE_SAMPLE = 2**20
+
+
+def _estimate_rows(args: argparse.Namespace) -> int | None:
+    """Rows in the CSV input file, estimated from its size, for an ETA.
+
+    Lines are counted in the first MiB and scaled up to the file's size, so
+    a large input is not read an extra time. Blank lines and line breaks
+    within quoted values are counted too, so it errs high. None for stdin,
+    workbooks, files that cannot be read and runs printing only some rows.
+    """
+    if not args.input or _selection_columns(args):
+        return None
+    path = Path(args.input)
+    try:
+        if xlsx.is_xlsx(path):
+            return None
+        size = path.stat().st_size
+        with path.open("rb") as f:
+            sample = f.read(_ESTIMATE_SAMPLE)
+    except OSError:
+        return None
+    if not sample:
+        return 0
+    # A last line without a line end counts too
+    lines = sample.count(b"\n") + (not sample.endswith(b"\n"))
+    if len(sample) < size:
+        lines = round(lines * size / len(sample))
+    # Less the header
+    return max(lines - 1, 0)
+
+
+def _write_split_labels(
+    args: argparse.Namespace,
+    rows: Iterator[Row],
+    template: "LabelTemplate",
+    page_cache: PageCache | None,
+) -> int:
+    """Write one labels PDF per ``--split-by`` value. Returns an exit code."""
+    if args.output == "-":
+        sys.stderr.write("Error: --split-by cannot write to stdout\n")
         return 1
+    try:
+        with _showing_progress(args) as show_progress:
+            results = generator.generate_labels_split(
+                rows,
+                template.name,
+                args.split_by,
+                _split_pattern(args.output),
+                break_column=args.break_column,
+                jobs=args.jobs,
+                page_cache=page_cache,
+                fonts=_font_paths(args, template),
+                pdf_options=_pdf_options(args),
+                backend=args.backend,
+                progress=show_progress,
+            )
+    except (ValueError, csv.Error, RuntimeError) as e:
+        sys.stderr.write(f"Error generating labels: {e}\n")
+        return 1
+    except OSError as e:
+        sys.stderr.write(f"Error writing output: {e}\n")
+        return 1
+    for value, filename, pages in results:
+        sys.stderr.write(f"{args.split_by}={value}: {filename} ({pages} pages)\n")
+    return 0
+
+
+def _write_labels(
+    args: argparse.Namespace,
+    rows: Iterator[Row],
+    template: "LabelTemplate",
+) -> int:
+    """Stream labels to the output file or stdout. Returns an exit code."""
+    page_cache = None
+    if args.cache_dir:
+        try:
+            page_cache = PageCache(args.cache_dir, args.cache_size * 2**20)
+        except OSError as e:
+            sys.stderr.write(f"Error opening page cache: {e}\n")
+            return 1
+
+    if args.split_by:
+        return _write_split_labels(args, rows, template, page_cache)
+
+    output_path = (
+        None if args.output == "-" else Path(generator.generate_filename(args.output))
+    )
 
     try:
-        pdf_bytes = generator.generate_labels(
-            data, template.name, break_column=args.break_column
+        output: AbstractContextManager[BinaryIO] = (
+            output_path.open("wb") if output_path else nullcontext(sys.stdout.buffer)
         )
-    except (ValueError, OSError) as e:
+        with output as out, _showing_progress(args) as show_progress:
+            generator.generate_labels_to(
+                rows,
+                template.name,
+                out,
+                break_column=args.break_column,
+                jobs=args.jobs,
+                page_cache=page_cache,
+                fonts=_font_paths(args, template),
+                pdf_options=_pdf_options(args),
+                backend=args.backend,
+                progress=show_progress,
+            )
+    except (ValueError, csv.Error) as e:
         sys.stderr.write(f"Error generating labels: {e}\n")
-        return 1
+    except OSError as e:
+        sys.stderr.write(f"Error writing output: {e}\n")
+    else:
+        if output_path and str(output_path) != args.output:
+            sys.stderr.write(
+                f"Output written to {output_path} (original filename existed)\n"
+            )
+        return 0
+
+    # Don't leave a truncated PDF behind
+    if output_path:
+        output_path.unlink(missing_ok=True)
+    return 1
+
+
+def create_batch_parser() -> argparse.ArgumentParser:
+    """Create the argument parser for the ``batch`` command."""
+    parser = argparse.ArgumentParser(
+        description=(
+            "Generate one labels PDF per CSV or .xlsx file in a directory or manifest"
+        ),
+        prog="school-labels batch",
+    )
+    parser.add_argument(
+        "source",
+        help=(
+            "Directory of CSV and .xlsx files, or a manifest listing one "
+            "input path per line"
+        ),
+    )
+    parser.add_argument(
+        "--output-dir",
+        "-d",
+        help="Directory for the PDFs (default: next to each input)",
+    )
+    parser.add_argument(
+        "--style", choices=list(generator.TEMPLATES.keys()), help="Label template style"
+    )
+    parser.add_argument(
+        "--break",
+        dest="break_column",
+        help="Column name to trigger page breaks on value changes",
+    )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=_positive_int,
+        default=1,
+        help="Number of files to process concurrently (default: 1)",
+    )
+    return parser
+
 
+def batch_main(argv: list[str]) -> int:
+    """Entry point for ``school-labels batch``."""
+    args = create_batch_parser().parse_args(argv)
+    source = Path(args.source)
     try:
-        if args.output == "-":
-            sys.stdout.buffer.write(pdf_bytes)
+        inputs = batch.find_inputs(source)
+    except OSError as e:
+        sys.stderr.write(f"Error reading {source}: {e}\n")
+        return 1
+    if not inputs:
+        sys.stderr.write(f"Error: No CSV or .xlsx files found in {source}\n")
+        return 1
+    output_dir = Path(args.output_dir) if args.output_dir else None
+    if output_dir:
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    failed = 0
+    for result in batch.generate_batch(
+        inputs,
+        output_dir,
+        style=args.style,
+        break_column=args.break_column,
+        workers=args.workers,
+    ):
+        if result.error:
+            failed += 1
+            sys.stdout.write(f"{result.input_path}: FAILED: {result.error}\n")
         else:
-            output_filename = generator.generate_filename(args.output)
-            Path(output_filename).write_bytes(pdf_bytes)
-            if output_filename != args.output:
-                sys.stderr.write(
-                    f"Output written to {output_filename} (original filename existed)\n"
-                )
+            sys.stdout.write(
+                f"{result.input_path} -> {result.output_path}: {result.rows} rows, "
+                f"{result.pages} pages, {result.seconds:.2f}s\n"
+            )
+        _list_issues(result.issues)
+    sys.stdout.write(
+        f"{len(inputs)} files: {len(inputs) - failed} ok, {failed} failed\n"
+    )
+    return 1 if failed else 0
+
+
+def _list_issues(issues: Sequence[Issue]) -> None:
+    """List the first of a batch file's issues on stdout, under its result."""
+    if not issues:
+        return
+    sys.stdout.write(f"  {len(issues)} problems found in input:\n")
+    for issue in issues[:MAX_LISTED_ISSUES]:
+        sys.stdout.write(f"    {issue.format()}\n")
+    if len(issues) > MAX_LISTED_ISSUES:
+        sys.stdout.write(f"    ... and {len(issues) - MAX_LISTED_ISSUES} more\n")
+
+
+def _non_negative_float(value: str) -> float:
+    """Parse a number of seconds that may be zero."""
+    try:
+        number = float(value)
+    except ValueError:
+        number = -1.0
+    if not number >= 0:
+        msg = f"must be a number of seconds, got {value!r}"
+        raise argparse.ArgumentTypeError(msg)
+    return number
+
+
+def create_watch_parser() -> argparse.ArgumentParser:
+    """Create the argument parser for the ``watch`` command."""
+    parser = argparse.ArgumentParser(
+        description=(
+            "Watch a folder and generate a labels PDF for each CSV or .xlsx file "
+            "dropped into it. Inputs are moved to done/ or failed/ inside "
+            "the folder once processed"
+        ),
+        prog="school-labels watch",
+    )
+    parser.add_argument("in_dir", help="Folder to watch for CSV and .xlsx files")
+    parser.add_argument("out_dir", help="Folder to write the PDFs to")
+    parser.add_argument(
+        "--style", choices=list(generator.TEMPLATES.keys()), help="Label template style"
+    )
+    parser.add_argument(
+        "--break",
+        dest="break_column",
+        help="Column name to trigger page breaks on value changes",
+    )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=_positive_int,
+        default=1,
+        help="Number of files to process concurrently (default: 1)",
+    )
+    parser.add_argument(
+        "--interval",
+        type=_non_negative_float,
+        default=watch.DEFAULT_INTERVAL,
+        metavar="SECONDS",
+        help="Time between looks at the folder (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--settle",
+        type=_non_negative_float,
+        default=watch.DEFAULT_SETTLE,
+        metavar="SECONDS",
+        help=(
+            "Only read a file once its size and modification time have not "
+            "changed for this long, so files still being copied are skipped "
+            "(default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--debounce",
+        type=_non_negative_float,
+        default=watch.DEFAULT_DEBOUNCE,
+        metavar="SECONDS",
+        help=(
+            "Wait until nothing in the folder has changed for this long, so "
+            "a burst of files is handled together (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Exit once every file in the folder has been processed",
+    )
+    return parser
+
+
+def _format_watch_result(result: watch.WatchResult) -> str:
+    """One line of ``watch`` output for a processed file."""
+    name = result.input_path.name
+    if result.unchanged:
+        line = f"{name}: unchanged since {result.output_path}, not regenerated"
+    elif result.output_path is None:
+        return f"{name}: FAILED: {result.error}"
+    else:
+        line = (
+            f"{name} -> {result.output_path}: {result.rows} rows, "
+            f"{result.pages} pages, {result.seconds:.2f}s"
+        )
+    return f"{line} ({result.error})" if result.error else line
+
+
+def watch_main(argv: list[str]) -> int:
+    """Entry point for ``school-labels watch``."""
+    args = create_watch_parser().parse_args(argv)
+    in_dir = Path(args.in_dir)
+    if not in_dir.is_dir():
+        sys.stderr.write(f"Error: {in_dir} is not a folder\n")
+        return 1
+    try:
+        watcher = watch.FolderWatcher(
+            in_dir,
+            Path(args.out_dir),
+            style=args.style,
+            break_column=args.break_column,
+            settle=args.settle,
+            debounce=args.debounce,
+        )
     except OSError as e:
-        sys.stderr.write(f"Error writing output: {e}\n")
+        sys.stderr.write(f"Error preparing folders: {e}\n")
         return 1
 
+    with ExitStack() as stack:
+        executor = None
+        if args.workers > 1:
+            # Only needed here, and slow to import for every CLI call
+            from concurrent.futures import ProcessPoolExecutor  # noqa: PLC0415
+
+            executor = stack.enter_context(ProcessPoolExecutor(args.workers))
+        if not args.once:
+            sys.stderr.write(f"Watching {in_dir} (Ctrl+C to stop)\n")
+        try:
+            for result in watcher.run(executor, interval=args.interval, once=args.once):
+                sys.stdout.write(_format_watch_result(result) + "\n")
+                sys.stdout.flush()
+        except KeyboardInterrupt:
+            sys.stderr.write("Stopped\n")
+        except OSError as e:
+            sys.stderr.write(f"Error watching {in_dir}: {e}\n")
+            return 1
     return 0
 
 
+def create_serve_parser() -> argparse.ArgumentParser:
+    """Create the argument parser for the ``serve`` command."""
+    # http.server is only needed here, and slow to import for every CLI call
+    from . import server  # noqa: PLC0415
+
+    parser = argparse.ArgumentParser(
+        description=(
+            "Generate labels over HTTP: POST a CSV (or JSON rows) to /labels "
+            "with optional style and break parameters to get the PDF back"
+        ),
+        prog="school-labels serve",
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Address to listen on (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--port",
+        "-p",
+        type=int,
+        default=8000,
+        help="Port to listen on (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=_positive_int,
+        default=server.DEFAULT_WORKERS,
+        help="Number of requests to render at once (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=server.DEFAULT_QUEUE_SIZE,
+        help=(
+            "Number of requests that may wait for a worker; more are answered "
+            "with 503 (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--max-body",
+        metavar="MB",
+        type=_positive_int,
+        default=server.DEFAULT_MAX_BODY // 2**20,
+        help="Largest upload accepted, in megabytes (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--quiet",
+        "-q",
+        action="store_true",
+        help="Don't log each request to stderr",
+    )
+    return parser
+
+
+def serve_main(argv: list[str]) -> int:
+    """Entry point for ``school-labels serve``."""
+    from . import server  # noqa: PLC0415
+
+    parser = create_serve_parser()
+    args = parser.parse_args(argv)
+    if args.queue_size < 0:
+        parser.error("--queue-size must not be negative")
+    try:
+        httpd = server.LabelServer(
+            (args.host, args.port),
+            workers=args.workers,
+            queue_size=args.queue_size,
+            max_body=args.max_body * 2**20,
+            quiet=args.quiet,
+        )
+    except OSError as e:
+        sys.stderr.write(f"Error listening on {args.host}:{args.port}: {e}\n")
+        return 1
+    with httpd:
+        sys.stderr.write(f"Serving labels on {httpd.url}\n")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            sys.stderr.write("Shutting down\n")
+    return 0
+
+
+# Subcommands, dispatched on the first argument before the default parser runs
+COMMANDS = {
+    "batch": batch_main,
+    "serve": serve_main,
+    "watch": watch_main,
+}
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Main CLI entry point."""
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+
+    parser = create_parser()
+    args = parser.parse_args(argv)
+    if args.group_by:
+        if args.break_column and args.break_column != args.group_by:
+            parser.error("--break and --group-by must name the same column")
+        args.break_column = args.group_by
+    if args.timings or args.timings_json or args.profile:
+        return _generate_instrumented(args)
+    return _generate(args)
+
+
+def _generate_instrumented(args: argparse.Namespace) -> int:
+    """Run :func:`_generate` under the timings recorder and profiler."""
+    profiler = cProfile.Profile() if args.profile else None
+    with timings.record() as recorder:
+        if profiler:
+            profiler.enable()
+        try:
+            exit_code = _generate(args)
+        finally:
+            if profiler:
+                profiler.disable()
+
+    try:
+        if profiler:
+            profiler.dump_stats(args.profile)
+        if args.timings_json:
+            Path(args.timings_json).write_text(
+                json.dumps(recorder.as_dict(), indent=2) + "\n"
+            )
+    except OSError as e:
+        sys.stderr.write(f"Error writing timings: {e}\n")
+        return 1
+    if args.timings:
+        sys.stderr.write(recorder.format())
+    return exit_code
+
+
+def _generate(args: argparse.Namespace) -> int:
+    """Generate labels as the parsed arguments say. Returns an exit code."""
+    with ExitStack() as stack:
+        input_file = _open_input(args, stack)
+        if input_file is None:
+            return 1
+
+        header = _read_header(input_file)
+        if header is None:
+            return 1
+        template = _resolve_template(args, header)
+        if template is None:
+            return 1
+
+        validator = RowValidator(
+            template.required_columns,
+            template.unique_columns,
+            template.charset,
+            checks=template.value_checks,
+            strict=args.strict,
+        )
+        loaded = _load_csv_data(args, input_file, header, template, validator)
+        if loaded is None:
+            return 1
+        first, rows = loaded
+
+        missing = generator.validate_columns([first], template)
+        if missing:
+            sys.stderr.write(
+                f"Error: CSV is missing required columns: {', '.join(missing)}\n"
+            )
+            return 1
+
+        exit_code = _write_labels(args, _sorted_rows(args, rows), template)
+        return _report_issues(args, validator) or exit_code
+
+
 def cli() -> None:
     """Console script entry point."""
     sys.exit(main())
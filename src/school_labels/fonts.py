@@ -0,0 +1,242 @@
+"""TrueType font metrics, cached on disk, and per-document font subsets."""
+
+import contextlib
+import functools
+import hashlib
+import io
+import json
+import os
+import re
+import unicodedata
+from collections.abc import Collection
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from .cache import write_atomic
+
+# Part of every metrics cache entry. Bump it when FontMetrics changes.
+METRICS_VERSION = 1
+
+# PDF font descriptor flags
+_FIXED_PITCH = 1
+_SYMBOLIC = 4
+_ITALIC = 64
+_FORCE_BOLD = 1 << 18
+
+# hmtx advance width some fonts use for "none"
+_NO_WIDTH = 0xFFFF
+
+# Bidirectional classes of right-to-left letters, none of which come before
+# the Hebrew block
+_RIGHT_TO_LEFT = frozenset({"R", "AL"})
+_FIRST_RIGHT_TO_LEFT = 0x0590
+
+
+class FontMetrics(NamedTuple):
+    """What laying out and embedding text in a TrueType font needs from the file.
+
+    Lengths are in thousandths of an em, as PDF font dictionaries use.
+    """
+
+    path: str
+    digest: str
+    name: str
+    ascent: int
+    descent: int
+    cap_height: int
+    bbox: tuple[int, int, int, int]
+    italic_angle: int
+    flags: int
+    stem_v: int
+    underline_position: int
+    underline_thickness: int
+    strikeout_position: int
+    strikeout_size: int
+    cmap: dict[int, int]
+    widths: list[int]
+
+    @property
+    def default_width(self) -> int:
+        """Advance width of the ``.notdef`` glyph."""
+        return self.widths[0]
+
+    @property
+    def family(self) -> str:
+        """FPDF family name for this font, distinct for every font file."""
+        return f"ttf-{self.digest[:16]}"
+
+
+def is_right_to_left(code: int) -> bool:
+    """Whether code point ``code`` is a letter of a right-to-left script.
+
+    Text in TrueType fonts is drawn one glyph per character, left to right,
+    without shaping, so Arabic or Hebrew would come out backwards with its
+    letters unjoined. Such letters are treated as unprintable instead.
+    """
+    return (
+        code >= _FIRST_RIGHT_TO_LEFT
+        and unicodedata.bidirectional(chr(code)) in _RIGHT_TO_LEFT
+    )
+
+
+def default_cache_dir() -> Path:
+    """Directory for cached font metrics, under ``$XDG_CACHE_HOME``."""
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "school-labels" / "fonts"
+
+
+def load_font(path: Path | str, cache_dir: Path | str | None = None) -> FontMetrics:
+    """Return the metrics of the TrueType font at ``path``.
+
+    Parsing a large font with fontTools takes much longer than the rest of
+    a small run, so metrics are cached in ``cache_dir`` (default
+    :func:`default_cache_dir`) under a hash of the font file and reused by
+    later runs. Within a process, a font is read once until its file
+    changes.
+
+    Raises:
+        OSError: If the font file cannot be read.
+        ValueError: If the file is not a TrueType-outline font.
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+    return _load_font(path, stat.st_size, stat.st_mtime_ns, cache_dir)
+
+
+@functools.cache
+def _load_font(path: Path, _size: int, _mtime_ns: int, cache_dir: Path) -> FontMetrics:
+    """Load metrics from the disk cache, or parse and cache them."""
+    data = path.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    entry = cache_dir / f"{digest}.json"
+    with contextlib.suppress(OSError, ValueError, KeyError, TypeError):
+        return _from_json(json.loads(entry.read_bytes()), path, digest)
+
+    metrics = _parse(data, path, digest)
+    # A read-only cache directory only costs the next run a parse
+    with contextlib.suppress(OSError):
+        write_atomic(entry, json.dumps(_to_json(metrics)).encode())
+    return metrics
+
+
+def _parse(data: bytes, path: Path, digest: str) -> FontMetrics:
+    """Read the metrics of a font file's bytes with fontTools."""
+    # fontTools is slow to import, and only needed on a cache miss
+    from fontTools.ttLib import TTFont, TTLibError  # noqa: PLC0415
+
+    try:
+        font = TTFont(io.BytesIO(data), lazy=True, recalcTimestamp=False)
+    except TTLibError as e:
+        msg = f"{path} is not a font file: {e}"
+        raise ValueError(msg) from e
+    if "glyf" not in font:
+        msg = f"{path} is not a TrueType-outline font"
+        raise ValueError(msg)
+
+    # fontTools sets table fields as it decompiles them, so they are untyped
+    head: Any = font["head"]
+    hhea: Any = font["hhea"]
+    os2: Any = font["OS/2"]
+    post: Any = font["post"]
+    scale = 1000 / head.unitsPerEm
+    order = font.getGlyphOrder()
+    gids = {name: gid for gid, name in enumerate(order)}
+    hmtx = font["hmtx"].metrics
+    widths = [
+        0 if hmtx[name][0] == _NO_WIDTH else round(hmtx[name][0] * scale + 0.001)
+        for name in order
+    ]
+    cmap = {code: gids[name] for code, name in (font.getBestCmap() or {}).items()}
+    if not cmap:
+        msg = f"{path} has no Unicode character map"
+        raise ValueError(msg)
+
+    flags = _SYMBOLIC
+    if post.isFixedPitch:
+        flags |= _FIXED_PITCH
+    if post.italicAngle:
+        flags |= _ITALIC
+    if os2.usWeightClass >= 600:  # noqa: PLR2004 - semi-bold and heavier
+        flags |= _FORCE_BOLD
+    name = font["name"].getDebugName(6) or font["name"].getBestFullName() or path.stem
+
+    return FontMetrics(
+        path=str(path),
+        digest=digest,
+        name=re.sub(r"[^A-Za-z0-9_.-]", "", name),
+        ascent=round(hhea.ascent * scale),
+        descent=round(hhea.descent * scale),
+        cap_height=round(getattr(os2, "sCapHeight", hhea.ascent) * scale),
+        bbox=(
+            round(head.xMin * scale),
+            round(head.yMin * scale),
+            round(head.xMax * scale),
+            round(head.yMax * scale),
+        ),
+        italic_angle=int(post.italicAngle),
+        flags=flags,
+        stem_v=round(50 + int((os2.usWeightClass / 65) ** 2)),
+        underline_position=round(post.underlinePosition * scale),
+        underline_thickness=round(post.underlineThickness * scale),
+        strikeout_position=round(os2.yStrikeoutPosition * scale),
+        strikeout_size=round(os2.yStrikeoutSize * scale),
+        cmap=cmap,
+        widths=widths,
+    )
+
+
+def _to_json(metrics: FontMetrics) -> dict[str, Any]:
+    """Metrics as a JSON-serializable cache entry."""
+    data = metrics._asdict()
+    del data["path"], data["digest"]
+    data["cmap"] = [list(metrics.cmap), list(metrics.cmap.values())]
+    data["version"] = METRICS_VERSION
+    return data
+
+
+def _from_json(data: dict[str, Any], path: Path, digest: str) -> FontMetrics:
+    """Metrics from a cache entry written by :func:`_to_json`."""
+    if data.pop("version") != METRICS_VERSION:
+        msg = "Stale font metrics cache entry"
+        raise ValueError(msg)
+    codes, gids = data.pop("cmap")
+    return FontMetrics(
+        path=str(path),
+        digest=digest,
+        cmap=dict(zip(codes, gids, strict=True)),
+        bbox=tuple(data.pop("bbox")),
+        **data,
+    )
+
+
+def subset_font(metrics: FontMetrics, glyphs: Collection[int]) -> bytes:
+    """Return a TrueType font program holding only ``glyphs`` of ``metrics``.
+
+    Glyph ids are kept, with unused glyphs left empty, so text encoded as
+    the original font's glyph ids draws correctly with the subset.
+
+    Raises:
+        OSError: If the font file cannot be read.
+        ValueError: If the font file changed since ``metrics`` were read.
+    """
+    from fontTools import subset  # noqa: PLC0415
+    from fontTools.ttLib import TTFont  # noqa: PLC0415
+
+    data = Path(metrics.path).read_bytes()
+    if hashlib.sha256(data).hexdigest() != metrics.digest:
+        msg = f"Font file {metrics.path} changed while the PDF was being written"
+        raise ValueError(msg)
+    font = TTFont(io.BytesIO(data), recalcTimestamp=False)
+    options = subset.Options()
+    options.retain_gids = True
+    options.notdef_outline = True
+    # Text is positioned by the PDF, so layout tables are not needed
+    options.layout_features = []
+    options.drop_tables += ["GDEF", "GPOS", "GSUB", "FFTM", "hdmx", "meta"]
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(gids=sorted({0, *glyphs}))
+    subsetter.subset(font)
+    out = io.BytesIO()
+    font.save(out)
+    return out.getvalue()
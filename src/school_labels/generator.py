@@ -1,23 +1,78 @@
 """Label generator core functionality."""
 
 import csv
+import importlib
+import io
+import itertools
+import mmap
+import pickle
+import re
+import tempfile
+from collections.abc import Collection, Iterable, Iterator, Mapping, Sequence
 from pathlib import Path
-from typing import TextIO
+from typing import TYPE_CHECKING, BinaryIO, Protocol, TextIO
 
-from .templates import (
-    EmailPasswordTemplate,
-    LabelTemplate,
-)
+from . import chunks, progress, timings
+from .rows import Row, is_columnar, projector, rows_from_columns
 
-TEMPLATES: dict[str, LabelTemplate] = {
-    t.name: t
-    for t in [
-        EmailPasswordTemplate(),
-    ]
-}
+if TYPE_CHECKING:
+    from .cache import PageCache
+    from .progress import CancelToken, ProgressCallback
+    from .templates import LabelTemplate
+    from .validation import RowValidator
+    from .writer import PdfOptions
+    from .xlsx import XlsxReader
+
+
+class TemplateRegistry(Mapping[str, "LabelTemplate"]):
+    """Templates by name, imported and instantiated on first lookup.
+
+    Names are known up front, so listing them (e.g. for ``--help``) does not
+    import the templates or fpdf2. Each template is created once, the first
+    time it is looked up.
+    """
+
+    def __init__(self, classes: Mapping[str, str]) -> None:
+        """Create a registry from template names to ``module:Class`` paths.
+
+        Module paths may be relative to this package.
+        """
+        self._classes = dict(classes)
+        self._loaded: dict[str, LabelTemplate] = {}
+
+    def __getitem__(self, name: str) -> "LabelTemplate":
+        """Return the template called ``name``, loading it if needed."""
+        template = self._loaded.get(name)
+        if template is None:
+            module_name, class_name = self._classes[name].split(":")
+            module = importlib.import_module(module_name, __package__)
+            template = self._loaded[name] = getattr(module, class_name)()
+        return template
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over template names without loading any template."""
+        return iter(self._classes)
+
+    def __len__(self) -> int:
+        """Return the number of registered templates."""
+        return len(self._classes)
 
 
-def detect_template(columns: list[str]) -> LabelTemplate | None:
+# Ways of drawing labels. Every template offers "fpdf"; see
+# LabelTemplate.BACKENDS for the others each one offers.
+BACKENDS = ("fpdf", "direct")
+
+TEMPLATES = TemplateRegistry(
+    {
+        "email-password": ".templates.email_password:EmailPasswordTemplate",
+        "email-password-codes": (
+            ".templates.email_password:EmailPasswordCodesTemplate"
+        ),
+    }
+)
+
+
+def detect_template(columns: list[str]) -> "LabelTemplate | None":
     """Auto-detect template based on CSV columns."""
     for template in TEMPLATES.values():
         if all(col in columns for col in template.required_columns):
@@ -25,27 +80,411 @@ def detect_template(columns: list[str]) -> LabelTemplate | None:
     return None
 
 
+def _filename_candidates(path: Path, max_attempts: int) -> Iterator[Path]:
+    """Yield ``path`` and then its numbered alternatives in order."""
+    yield path
+    for counter in range(1, max_attempts + 1):
+        yield path.with_stem(f"{path.stem}-{counter}")
+
+
 def generate_filename(base_filename: str, max_attempts: int = 1000) -> str:
     """Generate output filename with conflict resolution."""
     path = Path(base_filename)
-    if not path.exists():
-        return base_filename
-
-    for counter in range(1, max_attempts + 1):
-        candidate = path.with_stem(f"{path.stem}-{counter}")
+    for candidate in _filename_candidates(path, max_attempts):
         if not candidate.exists():
-            return str(candidate)
+            return base_filename if candidate == path else str(candidate)
     msg = f"Could not find available filename after {max_attempts} attempts"
     raise RuntimeError(msg)
 
 
+class FilenameAllocator:
+    """Resolve output filename conflicts for many files at once.
+
+    Each output directory is listed once, on first use. Conflicts are then
+    resolved against that listing and the names already handed out, using
+    the same numbering as :func:`generate_filename` but without probing the
+    filesystem for every candidate.
+    """
+
+    def __init__(self, max_attempts: int = 1000) -> None:
+        """Create an allocator trying at most ``max_attempts`` numbered names."""
+        self.max_attempts = max_attempts
+        self._taken: dict[Path, set[str]] = {}
+
+    def allocate(self, base_filename: str) -> str:
+        """Return an unused filename for ``base_filename`` and reserve it."""
+        path = Path(base_filename)
+        directory = path.parent
+        taken = self._taken.get(directory)
+        if taken is None:
+            taken = self._taken[directory] = (
+                {entry.name for entry in directory.iterdir()}
+                if directory.is_dir()
+                else set()
+            )
+        for candidate in _filename_candidates(path, self.max_attempts):
+            if candidate.name not in taken:
+                taken.add(candidate.name)
+                return base_filename if candidate == path else str(candidate)
+        msg = f"Could not find available filename after {self.max_attempts} attempts"
+        raise RuntimeError(msg)
+
+
+class _RecordReader(Protocol):
+    """Records of cell text with the line of the last one, like ``csv.reader``."""
+
+    line_num: int
+
+    def __iter__(self) -> Iterator[Sequence[str]]: ...
+
+
+def iter_csv_data(input_file: TextIO) -> Iterator[dict[str, str]]:
+    """Lazily yield CSV rows from file or stdin, one dict per row."""
+    yield from csv.DictReader(input_file)
+
+
 def read_csv_data(input_file: TextIO) -> list[dict[str, str]]:
     """Read CSV data from file or stdin."""
-    reader = csv.DictReader(input_file)
-    return list(reader)
+    return list(iter_csv_data(input_file))
+
+
+def read_csv_header(input_file: TextIO) -> list[str]:
+    """Read the CSV header row, leaving ``input_file`` at the first data row.
+
+    Returns an empty list if the input is empty.
+    """
+    return next(csv.reader(input_file), [])
+
+
+def iter_csv_rows(  # noqa: PLR0913
+    input_file: TextIO,
+    columns: Collection[str] | None = None,
+    *,
+    fieldnames: Sequence[str] | None = None,
+    intern: Collection[str] = (),
+    validator: "RowValidator | None" = None,
+    select: "Mapping[str, Collection[str]] | None" = None,
+) -> Iterator[Row]:
+    """Lazily yield compact CSV rows holding only the named columns.
+
+    Unlike :func:`iter_csv_data`, each row is a :class:`~school_labels.rows.Row`:
+    a tuple of the projected values sharing one column index, rather than a
+    dict of every column. Blank lines are skipped and short rows are padded
+    with empty strings.
+
+    Args:
+        input_file: CSV file or stdin.
+        columns: Columns to keep; others are dropped as each row is read.
+            Columns not in the header are ignored. ``None`` keeps them all.
+        fieldnames: Column names, if the one-line header has already been
+            read, e.g. by :func:`read_csv_header`.
+        intern: Columns whose repeated values, such as group names, should
+            share one string object. Values of these columns are remembered
+            for the whole file, so only name columns with few distinct values.
+        validator: Checks each row as it is read, with its line number.
+            Values it cannot print are replaced in the yielded row.
+        select: Values to pick rows by, by column: only rows with one of
+            the values in any of the columns are yielded, and checked by
+            ``validator``. The columns are kept in the rows.
 
+    Raises:
+        ValueError: If a column of ``select`` is not in the header.
+    """
+    reader = csv.reader(input_file)
+    # Lines read before the reader was created, for reporting line numbers
+    header_lines = 0
+    if fieldnames is None:
+        fieldnames = next(reader, None)
+        if fieldnames is None:
+            return
+    else:
+        header_lines = 1
+    yield from _iter_records(
+        reader,
+        fieldnames,
+        columns=columns,
+        intern=intern,
+        validator=validator,
+        select=select,
+        header_lines=header_lines,
+    )
+
+
+def iter_csv_file_rows(  # noqa: PLR0913
+    path: Path,
+    columns: Collection[str] | None = None,
+    *,
+    intern: Collection[str] = (),
+    validator: "RowValidator | None" = None,
+    jobs: int = 1,
+    select: "Mapping[str, Collection[str]] | None" = None,
+    use_index: bool = False,
+) -> Iterator[Row]:
+    """Lazily yield the compact rows of a CSV file, parsing it on ``jobs`` processes.
+
+    The rows, and the line numbers passed to ``validator``, are those
+    :func:`iter_csv_rows` gives for the file opened with
+    ``open(path, newline="")``. With ``jobs`` above 1, the file is
+    memory-mapped and split into ranges of whole records, which worker
+    processes parse while earlier rows are used; see
+    :mod:`school_labels.chunks`. Files under a few MiB, and files in an
+    encoding that cannot be split at byte offsets, are parsed serially.
+
+    Args:
+        path: CSV file.
+        columns: Columns to keep, as for :func:`iter_csv_rows`.
+        intern: Columns whose repeated values should share one string.
+        validator: Checks each row as it is read, with its line number.
+        jobs: Number of worker processes to parse with.
+        select: Values to pick rows by, by column, as for
+            :func:`iter_csv_rows`.
+        use_index: Read the rows picked by ``select`` through the index
+            kept beside ``path``, building it if it is missing or out of
+            date, instead of parsing the whole file; see
+            :mod:`school_labels.index`. Files that cannot be indexed are
+            parsed as without it.
+
+    Raises:
+        ValueError: If a column of ``select`` is not in the header.
+    """
+    encoding = chunks.default_encoding()
+    if select and use_index:
+        indexed = _iter_indexed_rows(
+            path, columns, select, intern=intern, validator=validator, encoding=encoding
+        )
+        if indexed is not None:
+            yield from indexed
+            return
+    if select and columns is not None:
+        columns = {*columns, *select}
+    if (
+        jobs > 1
+        and path.stat().st_size >= 2 * chunks.MIN_CHUNK_SIZE
+        and chunks.is_splittable(encoding)
+    ):
+        with (
+            path.open("rb") as f,
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data,
+        ):
+            # The header is parsed here, and the records after it by workers
+            start = chunks.record_end(data, 0, 0)
+            reader = csv.reader(io.StringIO(data[:start].decode(encoding), newline=""))
+            fieldnames = next(reader, None)
+            index, positions = _column_positions(fieldnames or [], columns)
+            # Quotes inside a header field can hide its end, and rows of only
+            # dropped columns are not worth sending back from workers
+            if positions and next(reader, None) is None:
+                yield from _iter_csv_chunks(
+                    path,
+                    data,
+                    start,
+                    list(index),
+                    positions,
+                    intern=intern,
+                    validator=validator,
+                    encoding=encoding,
+                    line_num=reader.line_num,
+                    jobs=jobs,
+                    select=select,
+                )
+                return
+    with path.open(newline="") as f:
+        yield from iter_csv_rows(
+            f, columns, intern=intern, validator=validator, select=select
+        )
+
+
+def _iter_indexed_rows(  # noqa: PLR0913
+    path: Path,
+    columns: Collection[str] | None,
+    select: Mapping[str, Collection[str]],
+    *,
+    intern: Collection[str],
+    validator: "RowValidator | None",
+    encoding: str,
+) -> Iterator[Row] | None:
+    """The rows of ``path`` picked by ``select``, read through its index.
+
+    Returns None if the file cannot be indexed.
+    """
+    # Only needed here, and sqlite3 is slow to import for every CLI call
+    from . import index  # noqa: PLC0415
+
+    row_index = index.RowIndex.open(path, select.keys(), encoding=encoding)
+    if row_index is None:
+        return None
+    with row_index:
+        records = row_index.select(select)
+        fieldnames = row_index.fieldnames
+    reader = index.IndexedReader(path, records, encoding=encoding)
+    return _iter_records(
+        reader,
+        fieldnames,
+        columns=columns,
+        intern=intern,
+        validator=validator,
+        select=select,
+    )
+
+
+def _iter_csv_chunks(  # noqa: PLR0913
+    path: Path,
+    data: mmap.mmap,
+    start: int,
+    fieldnames: list[str],
+    positions: list[int],
+    *,
+    intern: Collection[str],
+    validator: "RowValidator | None",
+    encoding: str,
+    line_num: int,
+    jobs: int,
+    select: Mapping[str, Collection[str]] | None,
+) -> Iterator[Row]:
+    """Yield the rows after the header, parsed by a pool of ``jobs`` processes."""
+    # Only needed here, and slow to import for every CLI call
+    from concurrent.futures import ProcessPoolExecutor  # noqa: PLC0415
+
+    pool = ProcessPoolExecutor(jobs)
+    try:
+        reader = chunks.ChunkedReader(
+            pool,
+            jobs,
+            path,
+            data,
+            start,
+            encoding=encoding,
+            positions=positions,
+            width=max(positions) + 1,
+            line_num=line_num,
+        )
+        # Records hold only the kept columns, in the order of fieldnames
+        yield from _iter_records(
+            reader,
+            fieldnames,
+            columns=None,
+            intern=intern,
+            validator=validator,
+            select=select,
+        )
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def iter_xlsx_rows(  # noqa: PLR0913
+    reader: "XlsxReader",
+    columns: Collection[str] | None = None,
+    *,
+    fieldnames: Sequence[str] | None = None,
+    intern: Collection[str] = (),
+    validator: "RowValidator | None" = None,
+    select: "Mapping[str, Collection[str]] | None" = None,
+) -> Iterator[Row]:
+    """Lazily yield compact rows of a worksheet, as :func:`iter_csv_rows` does.
+
+    The first row with a value is the header, unless ``fieldnames`` gives
+    it. Line numbers passed to ``validator`` are the worksheet's row
+    numbers.
+
+    Raises:
+        XlsxError: If the worksheet is damaged.
+        ValueError: If a column of ``select`` is not in the header.
+    """
+    if fieldnames is None:
+        fieldnames = next(reader, None)
+        if fieldnames is None:
+            return
+    yield from _iter_records(
+        reader,
+        fieldnames,
+        columns=columns,
+        intern=intern,
+        validator=validator,
+        select=select,
+    )
+
+
+def _iter_records(  # noqa: PLR0913
+    reader: _RecordReader,
+    fieldnames: Sequence[str],
+    *,
+    columns: Collection[str] | None,
+    intern: Collection[str],
+    validator: "RowValidator | None",
+    select: Mapping[str, Collection[str]] | None = None,
+    header_lines: int = 0,
+) -> Iterator[Row]:
+    """Project, pick, intern and validate the records of a CSV or worksheet reader.
+
+    Raises:
+        ValueError: If a column of ``select`` is not in ``fieldnames``.
+    """
+    if select and columns is not None:
+        columns = {*columns, *select}
+    index, positions = _column_positions(fieldnames, columns)
+    missing = [column for column in select or () if column not in index]
+    if missing:
+        msg = f"Columns not found in CSV: {', '.join(missing)}"
+        raise ValueError(msg)
+    picks = [
+        (index[column], frozenset(values)) for column, values in (select or {}).items()
+    ]
+    width = max(positions, default=-1) + 1
+    project = projector(positions)
+    memos = {index[name]: {} for name in intern if name in index}
+
+    for record in reader:
+        if not record:
+            continue
+        if len(record) < width:
+            values = project([*record, *[""] * (width - len(record))])
+        else:
+            values = project(record)
+        if picks and not any(values[i] in wanted for i, wanted in picks):
+            continue
+        if memos:
+            values = _interned(values, memos)
+        row = Row(index, values)
+        if validator:
+            row = _validated(validator, row, reader.line_num + header_lines)
+        yield row
+
+
+def _column_positions(
+    fieldnames: Sequence[str], columns: Collection[str] | None
+) -> tuple[dict[str, int], list[int]]:
+    """Where each kept column goes in a row, and where it is in a record.
+
+    Columns are kept in header order, the first of any repeated name.
+    """
+    index: dict[str, int] = {}
+    positions = []
+    for position, name in enumerate(fieldnames):
+        if (columns is None or name in columns) and name not in index:
+            index[name] = len(positions)
+            positions.append(position)
+    return index, positions
 
-def validate_columns(data: list[dict[str, str]], template: LabelTemplate) -> list[str]:
+
+def _validated(validator: "RowValidator", row: Row, line: int) -> Row:
+    """Check ``row``, returning it with any unprintable values replaced."""
+    replacements = validator.check(row, line)
+    return row.replace(replacements) if replacements else row
+
+
+def _interned(
+    values: tuple[str, ...], memos: dict[int, dict[str, str]]
+) -> tuple[str, ...]:
+    """Replace the values at the memos' positions with their first occurrence."""
+    interned = list(values)
+    for position, memo in memos.items():
+        interned[position] = memo.setdefault(interned[position], interned[position])
+    return tuple(interned)
+
+
+def validate_columns(
+    data: Sequence[Mapping[str, str]], template: "LabelTemplate"
+) -> list[str]:
     """Check that required columns are present. Returns list of missing columns."""
     if not data:
         return []
@@ -53,42 +492,342 @@ def validate_columns(data: list[dict[str, str]], template: LabelTemplate) -> lis
     return [col for col in template.required_columns if col not in present]
 
 
-def generate_labels(
-    data: list[dict[str, str]], style: str, *, break_column: str | None = None
+def _get_template(
+    style: str, fonts: "Mapping[str, Path | str] | None" = None
+) -> "LabelTemplate":
+    """Look up a template by name, drawing in ``fonts`` if given.
+
+    Raises:
+        ValueError: If the style is unknown, or a font role is unknown or
+            its file is not a TrueType font.
+        OSError: If a font file cannot be read.
+    """
+    template = TEMPLATES.get(style)
+    if template is None:
+        valid = list(TEMPLATES)
+        msg = f"Unknown style {style!r}. Valid styles: {valid}"
+        raise ValueError(msg)
+    return template.with_fonts(fonts) if fonts else template
+
+
+def _check_columns(
+    row: Mapping[str, str], template: "LabelTemplate", break_column: str | None
+) -> None:
+    """Check a sample row has the template's and break columns."""
+    missing = [col for col in template.required_columns if col not in row]
+    if missing:
+        msg = f"CSV is missing required columns: {', '.join(missing)}"
+        raise ValueError(msg)
+    if break_column and break_column not in row:
+        present = list(row.keys())
+        msg = (
+            f"Break column {break_column!r} not found in CSV. "
+            f"Available columns: {present}"
+        )
+        raise ValueError(msg)
+
+
+def generate_labels(  # noqa: PLR0913
+    data: Iterable[Mapping[str, str]] | Mapping[str, Sequence[str]],
+    style: str,
+    *,
+    break_column: str | None = None,
+    jobs: int = 1,
+    page_cache: "PageCache | None" = None,
+    fonts: Mapping[str, Path | str] | None = None,
+    pdf_options: "PdfOptions | None" = None,
+    backend: str = "fpdf",
+    progress: "ProgressCallback | None" = None,
+    cancel: "CancelToken | None" = None,
 ) -> bytes:
     """Generate labels PDF and return as bytes.
 
     Args:
-        data: List of row dicts, one per label.
+        data: Row mappings, one per label, or column-oriented data: a
+            mapping of column name to a sequence of values.
         style: Template name (e.g. ``"email-password"``). Must be a key in
             :data:`TEMPLATES`.
         break_column: Column name that triggers a page break on value change.
+        jobs: Number of worker processes to render with.
+        page_cache: Cache of rendered pages to reuse and fill.
+        fonts: TrueType font files to draw in, by the template's font role,
+            as for :func:`generate_labels_to`.
+        pdf_options: How to compress and lay out the PDF, as for
+            :func:`generate_labels_to`.
+        backend: How labels are drawn, as for :func:`generate_labels_to`.
+        progress: Called after each page, as for :func:`generate_labels_to`.
+        cancel: Token that stops the run, as for :func:`generate_labels_to`.
 
     Returns:
         Raw PDF bytes.
 
     Raises:
         ValueError: If ``style`` is not a recognised template name, required
-            columns are missing, or ``break_column`` is not present in the CSV.
+            columns are missing, ``break_column`` is not present in the CSV,
+            or the template does not offer ``backend``.
+        CancelledError: If ``cancel`` was cancelled.
     """
-    template = TEMPLATES.get(style)
-    if template is None:
-        valid = list(TEMPLATES)
-        msg = f"Unknown style {style!r}. Valid styles: {valid}"
-        raise ValueError(msg)
-    missing = validate_columns(data, template)
-    if missing:
-        msg = f"CSV is missing required columns: {', '.join(missing)}"
-        raise ValueError(msg)
-    if break_column and data and break_column not in data[0]:
-        present = list(data[0].keys())
+    out = io.BytesIO()
+    generate_labels_to(
+        data,
+        style,
+        out,
+        break_column=break_column,
+        jobs=jobs,
+        page_cache=page_cache,
+        fonts=fonts,
+        pdf_options=pdf_options,
+        backend=backend,
+        progress=progress,
+        cancel=cancel,
+    )
+    return out.getvalue()
+
+
+def generate_labels_to(  # noqa: PLR0913
+    rows: Iterable[Mapping[str, str]] | Mapping[str, Sequence[str]],
+    style: str,
+    out: BinaryIO,
+    *,
+    break_column: str | None = None,
+    jobs: int = 1,
+    page_cache: "PageCache | None" = None,
+    fonts: Mapping[str, Path | str] | None = None,
+    pdf_options: "PdfOptions | None" = None,
+    backend: str = "fpdf",
+    progress: "ProgressCallback | None" = None,
+    cancel: "CancelToken | None" = None,
+) -> int:
+    """Stream a labels PDF to a binary file object.
+
+    Rows are consumed lazily and each page is written to ``out`` as soon as
+    it is full, so peak memory does not depend on the number of rows. Only
+    the first row is used to check the columns.
+
+    Args:
+        rows: Iterable of row mappings, one per label, e.g. from
+            :func:`iter_csv_rows`. May also be column-oriented data, a
+            mapping of column name to a sequence of values, which is read
+            through :func:`~school_labels.rows.rows_from_columns` without
+            building a dict per row.
+        style: Template name (e.g. ``"email-password"``). Must be a key in
+            :data:`TEMPLATES`.
+        out: Binary file object the PDF is written to. Need not be seekable.
+        break_column: Column name that triggers a page break on value change.
+        jobs: Number of worker processes to render with. Pages are split into
+            chunks on page boundaries and merged back in order, with the same
+            page content as rendering in one process.
+        page_cache: Cache of rendered pages. Pages whose rows, template and
+            software versions match a cached page are copied from it instead
+            of being laid out again, and new pages are added to it.
+        fonts: TrueType font files to draw in instead of the core fonts, by
+            the template's font role (see ``LabelTemplate.FONTS``, e.g.
+            ``{"sans": "NotoSans-Regular.ttf"}``). Only the glyphs used are
+            embedded.
+        pdf_options: How to encode the PDF: the stream compression level,
+            object streams, or linearized output for printers and viewers
+            that should start on the first page before the rest arrives.
+            See :class:`~school_labels.writer.PdfOptions`.
+        backend: How labels are drawn, one of :data:`BACKENDS`: ``"fpdf"``
+            through FPDF's text cells, or ``"direct"``, which writes the same
+            content stream operators itself and is several times faster.
+            ``"direct"`` is offered by layout templates drawn in core fonts.
+        progress: Called after each page is written with a
+            :class:`~school_labels.progress.Progress`: the labels and pages
+            written so far, the seconds since the run began and their rate.
+        cancel: Token checked after each page; once cancelled, rendering
+            stops and :class:`~school_labels.progress.CancelledError` is
+            raised, leaving ``out`` with an unfinished PDF.
+
+    Returns:
+        Number of pages written.
+
+    Raises:
+        ValueError: If ``style`` is not a recognised template name, a font
+            is not a TrueType font for one of its roles, required columns
+            are missing, ``break_column`` is not present in the CSV, or the
+            template does not offer ``backend``. Raised before anything is
+            written to ``out``.
+        CancelledError: If ``cancel`` was cancelled.
+    """
+    recorder = timings.current()
+    tracker = _tracker(progress, cancel)
+    template = _get_template(style, fonts)
+    template.check_backend(backend)
+    rows = recorder.timed("parse", _as_rows(rows))
+    first = next(rows, None)
+    if first is not None:
+        with recorder.stage("validate"):
+            _check_columns(first, template, break_column)
+        rows = itertools.chain([first], rows)
+    return template.write_pdf(
+        rows,
+        out,
+        break_column,
+        jobs=jobs,
+        page_cache=page_cache,
+        pdf_options=pdf_options,
+        backend=backend,
+        progress=tracker,
+    )
+
+
+def _tracker(
+    callback: "ProgressCallback | None", cancel: "CancelToken | None"
+) -> progress.Tracker | None:
+    """A tracker for a run, if anyone asked to follow or stop it.
+
+    Raises:
+        CancelledError: If ``cancel`` was cancelled before the run began.
+    """
+    if callback is None and cancel is None:
+        return None
+    tracker = progress.Tracker(callback, cancel)
+    tracker.check()
+    return tracker
+
+
+def _as_rows(
+    rows: Iterable[Mapping[str, str]] | Mapping[str, Sequence[str]],
+) -> Iterable[Mapping[str, str]]:
+    """Accept column-oriented data wherever rows are expected."""
+    if is_columnar(rows):
+        return rows_from_columns(rows)
+    return rows
+
+
+def _check_split_pattern(pattern: str) -> None:
+    """Check that an output filename pattern only uses ``{column}`` and ``{value}``.
+
+    Raises:
+        ValueError: If ``pattern`` has any other field, or unbalanced braces.
+    """
+    try:
+        pattern.format(column="", value="")
+    except (KeyError, IndexError, AttributeError, ValueError) as e:
         msg = (
-            f"Break column {break_column!r} not found in CSV. "
+            f"Invalid output pattern {pattern!r}: only {{column}} and {{value}} "
+            f"may appear in braces ({type(e).__name__}: {e})"
+        )
+        raise ValueError(msg) from e
+
+
+def _split_filename(pattern: str, column: str, value: str) -> str:
+    """Fill an output filename pattern for one split value."""
+    safe_value = re.sub(r"[^\w.-]+", "_", value).strip(".") or "_"
+    return pattern.format(column=column, value=safe_value)
+
+
+def generate_labels_split(  # noqa: PLR0913
+    rows: Iterable[Mapping[str, str]] | Mapping[str, Sequence[str]],
+    style: str,
+    split_column: str,
+    output_pattern: str = "labels-{value}.pdf",
+    *,
+    break_column: str | None = None,
+    jobs: int = 1,
+    page_cache: "PageCache | None" = None,
+    fonts: Mapping[str, Path | str] | None = None,
+    pdf_options: "PdfOptions | None" = None,
+    backend: str = "fpdf",
+    progress: "ProgressCallback | None" = None,
+    cancel: "CancelToken | None" = None,
+) -> list[tuple[str, str, int]]:
+    """Write one labels PDF per distinct value of ``split_column``.
+
+    Rows are read in a single pass and routed to their value's document,
+    so the input need not be sorted. While routing, rows are spilled to one
+    temporary file and only their offsets are kept in memory; each document
+    is then streamed from its rows' offsets in input order.
+
+    Args:
+        rows: Iterable of row mappings, one per label, or column-oriented
+            data as for :func:`generate_labels_to`.
+        style: Template name (e.g. ``"email-password"``). Must be a key in
+            :data:`TEMPLATES`.
+        split_column: Column whose value selects the output document.
+        output_pattern: Output filename pattern. ``{value}`` is replaced by
+            the split value (made filename-safe) and ``{column}`` by
+            ``split_column``. Existing files are not overwritten; numbered
+            names are used instead, as with :func:`generate_filename`.
+        break_column: Column name that triggers a page break on value change.
+        jobs: Number of worker processes to render each document with.
+        page_cache: Cache of rendered pages to reuse and fill.
+        fonts: TrueType font files to draw in, by the template's font role,
+            as for :func:`generate_labels_to`.
+        pdf_options: How to encode each PDF, as for :func:`generate_labels_to`.
+        backend: How labels are drawn, as for :func:`generate_labels_to`.
+        progress: Called after each page, as for :func:`generate_labels_to`,
+            counting the pages of all documents together.
+        cancel: Token that stops the run, as for :func:`generate_labels_to`.
+            Documents already written are left in place.
+
+    Returns:
+        ``(value, filename, pages)`` for each document, in order of each
+        value's first appearance.
+
+    Raises:
+        ValueError: If ``style`` is not a recognised template name,
+            required, split or break columns are missing, the template
+            does not offer ``backend``, or ``output_pattern`` has fields
+            other than ``{column}`` and ``{value}``.
+        CancelledError: If ``cancel`` was cancelled.
+    """
+    _check_split_pattern(output_pattern)
+    recorder = timings.current()
+    tracker = _tracker(progress, cancel)
+    template = _get_template(style, fonts)
+    template.check_backend(backend)
+    rows = recorder.timed("parse", _as_rows(rows))
+    first = next(rows, None)
+    if first is None:
+        return []
+    with recorder.stage("validate"):
+        _check_columns(first, template, break_column)
+    if split_column not in first:
+        present = list(first.keys())
+        msg = (
+            f"Split column {split_column!r} not found in CSV. "
             f"Available columns: {present}"
         )
         raise ValueError(msg)
-    raw = template.create_pdf(data, break_column).output()
-    if raw is None:
-        msg = "FPDF.output() unexpectedly returned None"
-        raise RuntimeError(msg)
-    return bytes(raw)
+
+    allocator = FilenameAllocator()
+    results = []
+    with tempfile.TemporaryFile() as spill:
+        offsets: dict[str, list[int]] = {}
+        for row in itertools.chain([first], rows):
+            offsets.setdefault(row[split_column], []).append(spill.tell())
+            pickle.dump(dict(row), spill, protocol=pickle.HIGHEST_PROTOCOL)
+            if tracker is not None:
+                tracker.check()
+
+        for value, value_offsets in offsets.items():
+            filename = allocator.allocate(
+                _split_filename(output_pattern, split_column, value)
+            )
+            try:
+                with Path(filename).open("wb") as out:
+                    pages = template.write_pdf(
+                        _read_spilled(spill, value_offsets),
+                        out,
+                        break_column,
+                        jobs=jobs,
+                        page_cache=page_cache,
+                        pdf_options=pdf_options,
+                        backend=backend,
+                        progress=tracker,
+                    )
+            except BaseException:
+                # Don't leave a truncated PDF behind
+                Path(filename).unlink(missing_ok=True)
+                raise
+            results.append((value, filename, pages))
+    return results
+
+
+def _read_spilled(spill: BinaryIO, offsets: list[int]) -> Iterator[dict[str, str]]:
+    """Yield the rows pickled at ``offsets`` in ``spill``."""
+    for offset in offsets:
+        spill.seek(offset)
+        yield pickle.load(spill)  # noqa: S301 - our own temporary file
@@ -0,0 +1,322 @@
+"""Sidecar index of a CSV file's records by key columns, for selective reprints.
+
+Reprinting a few students from a large roster should not mean parsing all
+of it. The index, an SQLite database kept next to the CSV file, maps the
+values of key columns such as ``admin`` and ``group`` to the byte range and
+line of each record, so the matching records are read with a seek each. It
+holds the size and modification time of the file it was built from, and is
+rebuilt when either has changed or a column is wanted that it lacks.
+"""
+
+import contextlib
+import csv
+import io
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+from collections.abc import Collection, Iterator, Mapping, Sequence
+from pathlib import Path
+from types import TracebackType
+from typing import NamedTuple, Self
+
+from . import chunks
+
+# Added to the CSV file's name to name its index
+SUFFIX = ".labels-index"
+
+# Part of every index. Bump it when the layout changes, so older ones are
+# rebuilt rather than misread
+FORMAT_VERSION = 1
+
+# Records written to the index at a time while building it
+_BATCH_SIZE = 10_000
+
+# Values looked up per query, below SQLite's limit on parameters
+_LOOKUP_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE records (
+    id INTEGER PRIMARY KEY,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    line INTEGER NOT NULL
+);
+CREATE TABLE keys (
+    column INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    record INTEGER NOT NULL,
+    PRIMARY KEY (column, value, record)
+) WITHOUT ROWID;
+"""
+
+# Records with one of some values in a column, given by ? placeholders
+_SELECT = (
+    "SELECT start, end, line FROM keys JOIN records ON id = record "
+    "WHERE column = ? AND value IN ({})"
+)
+
+
+class Record(NamedTuple):
+    """Where a record lies in its file: its bytes and the line it ends on.
+
+    ``start`` may be before blank lines that precede the record.
+    """
+
+    start: int
+    end: int
+    line: int
+
+
+def index_path(path: Path) -> Path:
+    """Where the index of the CSV file ``path`` is kept."""
+    return path.with_name(path.name + SUFFIX)
+
+
+class RowIndex:
+    """The records of a CSV file by the values of some of its columns.
+
+    Use :meth:`open` to get an up-to-date index of a file, building it if
+    need be, and :meth:`select` to find records by their values.
+    """
+
+    def __init__(self, connection: sqlite3.Connection, meta: Mapping[str, str]) -> None:
+        """Wrap an open index database whose ``meta`` table has been read."""
+        self._connection = connection
+        self.fieldnames: list[str] = json.loads(meta["fieldnames"])
+        self.columns: list[str] = json.loads(meta["columns"])
+
+    def __enter__(self) -> Self:
+        """Return the index, closing it on exit."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        """Close the index."""
+        self.close()
+
+    def close(self) -> None:
+        """Close the index database."""
+        self._connection.close()
+
+    @classmethod
+    def open(
+        cls, path: Path, columns: Collection[str], *, encoding: str
+    ) -> Self | None:
+        """The index of ``path`` by ``columns``, built or rebuilt if out of date.
+
+        A rebuilt index keeps the columns of the one it replaces, so that
+        selecting by different columns in turn does not rebuild it each time.
+
+        Returns None if the file cannot be indexed: its ``encoding`` has line
+        ends that are not single bytes, it cannot be parsed a line at a time,
+        as with carriage returns alone for line ends, or no index can be
+        written beside it.
+
+        Raises:
+            OSError: If ``path`` cannot be read.
+        """
+        target = index_path(path)
+        stat = path.stat()
+        wanted = set(columns)
+        existing = cls._load(target, stat, encoding)
+        if existing is not None:
+            if wanted <= set(existing.columns):
+                return existing
+            wanted.update(existing.columns)
+            existing.close()
+        if not chunks.is_splittable(encoding):
+            return None
+        try:
+            _build(path, target, sorted(wanted), encoding=encoding, stat=stat)
+        except (csv.Error, UnicodeDecodeError, sqlite3.Error, OSError):
+            # Reading the file without the index reports any error in it
+            return None
+        return cls._load(target, stat, encoding)
+
+    @classmethod
+    def _load(cls, target: Path, stat: os.stat_result, encoding: str) -> Self | None:
+        """Open the index at ``target`` if it is of the file as it is now."""
+        if not target.exists():
+            return None
+        try:
+            connection = sqlite3.connect(
+                f"{target.resolve().as_uri()}?mode=ro", uri=True
+            )
+        except sqlite3.Error:
+            return None
+        try:
+            meta = dict(connection.execute("SELECT name, value FROM meta"))
+            current = (
+                meta.get("version") == str(FORMAT_VERSION)
+                and meta.get("size") == str(stat.st_size)
+                and meta.get("mtime_ns") == str(stat.st_mtime_ns)
+                and meta.get("encoding") == encoding
+            )
+            if current:
+                return cls(connection, meta)
+        except (sqlite3.Error, KeyError, ValueError):
+            pass
+        connection.close()
+        return None
+
+    def select(self, keys: Mapping[str, Collection[str]]) -> list[Record]:
+        """Records with any of ``keys[column]`` in a column, in file order.
+
+        Raises:
+            ValueError: If a column of ``keys`` is not indexed.
+        """
+        found: set[Record] = set()
+        for column, values in keys.items():
+            if column not in self.columns:
+                msg = f"Column {column!r} is not indexed"
+                raise ValueError(msg)
+            number = self.columns.index(column)
+            for batch in itertools.batched(
+                sorted(set(values)), _LOOKUP_SIZE, strict=False
+            ):
+                query = _SELECT.format(", ".join("?" * len(batch)))
+                rows = self._connection.execute(query, (number, *batch))
+                found.update(itertools.starmap(Record, rows))
+        return sorted(found)
+
+
+def _build(
+    path: Path,
+    target: Path,
+    columns: Sequence[str],
+    *,
+    encoding: str,
+    stat: os.stat_result,
+) -> None:
+    """Read every record of ``path`` and write its index to ``target``.
+
+    ``csv`` is fed the file a line at a time, so the bytes of the lines it
+    took for a record are exactly that record. ``stat`` is of the file
+    before reading, so a file changed while it was read is indexed again.
+    """
+    fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=".tmp-", suffix=SUFFIX)
+    os.close(fd)
+    try:
+        with (
+            path.open("rb") as f,
+            contextlib.closing(sqlite3.connect(tmp)) as connection,
+        ):
+            lines = _Lines(f, encoding)
+            reader = csv.reader(lines)
+            fieldnames = next(reader, [])
+            positions = [
+                (number, fieldnames.index(column))
+                for number, column in enumerate(columns)
+                if column in fieldnames
+            ]
+            connection.executescript(_SCHEMA)
+            records: list[tuple[int, int, int, int]] = []
+            keys: list[tuple[int, str, int]] = []
+            count = 0
+            start = lines.position
+            for record in reader:
+                if not record:
+                    continue
+                records.append((count, start, lines.position, reader.line_num))
+                keys.extend(
+                    (number, record[i] if i < len(record) else "", count)
+                    for number, i in positions
+                )
+                count += 1
+                start = lines.position
+                if len(records) >= _BATCH_SIZE:
+                    _insert(connection, records, keys)
+            _insert(connection, records, keys)
+            connection.executemany(
+                "INSERT INTO meta VALUES (?, ?)",
+                [
+                    ("version", str(FORMAT_VERSION)),
+                    ("size", str(stat.st_size)),
+                    ("mtime_ns", str(stat.st_mtime_ns)),
+                    ("encoding", encoding),
+                    ("fieldnames", json.dumps(fieldnames)),
+                    ("columns", json.dumps(list(columns))),
+                ],
+            )
+            connection.commit()
+        Path(tmp).replace(target)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def _insert(
+    connection: sqlite3.Connection,
+    records: list[tuple[int, int, int, int]],
+    keys: list[tuple[int, str, int]],
+) -> None:
+    """Write a batch of records and their keys, emptying the lists."""
+    connection.executemany("INSERT INTO records VALUES (?, ?, ?, ?)", records)
+    connection.executemany("INSERT OR IGNORE INTO keys VALUES (?, ?, ?)", keys)
+    records.clear()
+    keys.clear()
+
+
+class _Lines:
+    """Lines of a binary file as text, counting the bytes read so far."""
+
+    def __init__(self, f: io.BufferedReader, encoding: str) -> None:
+        self._f = f
+        self._encoding = encoding
+        self.position = 0
+
+    def __iter__(self) -> Iterator[str]:
+        for line in self._f:
+            self.position += len(line)
+            yield line.decode(self._encoding)
+
+
+class IndexedReader:
+    """Selected records of a CSV file, read by seeking to each run of them.
+
+    Like :func:`csv.reader`, iterating gives each record, and
+    :attr:`line_num` is the line the last one ended on. Records next to one
+    another in the file are read and parsed together.
+    """
+
+    def __init__(self, path: Path, records: Sequence[Record], *, encoding: str) -> None:
+        """Read ``records`` of ``path``, which must be in file order."""
+        self.line_num = 0
+        self._path = path
+        self._records = records
+        self._encoding = encoding
+
+    def __iter__(self) -> Iterator[list[str]]:
+        """Yield each selected record's values, in file order.
+
+        Raises:
+            ValueError: If the file no longer holds the records where the
+                index says.
+        """
+        with self._path.open("rb") as f:
+            for run in _runs(self._records):
+                f.seek(run[0].start)
+                text = f.read(run[-1].end - run[0].start).decode(self._encoding)
+                parsed = (r for r in csv.reader(io.StringIO(text, newline="")) if r)
+                for record, values in zip(run, parsed, strict=True):
+                    self.line_num = record.line
+                    yield values
+
+
+def _runs(records: Sequence[Record]) -> Iterator[list[Record]]:
+    """Group records into runs, each starting where the one before ended."""
+    run: list[Record] = []
+    for record in records:
+        if run and record.start != run[-1].end:
+            yield run
+            run = []
+        run.append(record)
+    if run:
+        yield run
@@ -0,0 +1,121 @@
+"""Progress events and cancellation for long label runs.
+
+An application embedding the generator passes a callback, which hears
+after every page how far the run has got, and a :class:`CancelToken`,
+which another thread can cancel to stop the run at the next page::
+
+    token = progress.CancelToken()
+    generate_labels_to(rows, "email-password", out, progress=show, cancel=token)
+
+    # Elsewhere, say when the user clicks Cancel
+    token.cancel()
+"""
+
+import threading
+import time
+from collections.abc import Callable
+from typing import NamedTuple
+
+
+class Progress(NamedTuple):
+    """How far a run has got: labels and pages written, and seconds since it began."""
+
+    rows: int
+    pages: int
+    elapsed: float
+
+    @property
+    def rate(self) -> float:
+        """Labels written per second so far."""
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def eta(self, total_rows: int) -> float | None:
+        """Seconds until ``total_rows`` labels are written at the current rate.
+
+        None until the rate is known.
+        """
+        rate = self.rate
+        if not rate:
+            return None
+        return max(total_rows - self.rows, 0) / rate
+
+
+type ProgressCallback = Callable[[Progress], None]
+
+
+class CancelledError(Exception):
+    """A run stopped because its :class:`CancelToken` was cancelled."""
+
+
+class CancelToken:
+    """Cooperative cancellation of a run, safe to set from another thread.
+
+    The run checks the token between pages, so it stops within a page of
+    :meth:`cancel` being called, raising :class:`CancelledError`.
+    """
+
+    def __init__(self) -> None:
+        """Create a token that is not cancelled."""
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        """Ask the run to stop."""
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether :meth:`cancel` has been called."""
+        return self._event.is_set()
+
+    def check(self) -> None:
+        """Raise :class:`CancelledError` if the token has been cancelled.
+
+        Raises:
+            CancelledError: If :meth:`cancel` has been called.
+        """
+        if self._event.is_set():
+            msg = "Label generation cancelled"
+            raise CancelledError(msg)
+
+
+class Tracker:
+    """Counts the pages of one run, reporting each and checking for cancellation.
+
+    One tracker spans every document of a run that writes several, so the
+    counts keep growing from one to the next.
+    """
+
+    def __init__(
+        self,
+        callback: ProgressCallback | None = None,
+        cancel: CancelToken | None = None,
+    ) -> None:
+        """Start timing a run that reports to ``callback`` and stops on ``cancel``."""
+        self._callback = callback
+        self._cancel = cancel
+        self._start = time.perf_counter()
+        self.rows = 0
+        self.pages = 0
+
+    def check(self) -> None:
+        """Raise :class:`CancelledError` if the run has been cancelled.
+
+        Raises:
+            CancelledError: If the run's token has been cancelled.
+        """
+        if self._cancel is not None:
+            self._cancel.check()
+
+    def page(self, labels: int) -> None:
+        """Count a page of ``labels`` written, report it and check for cancellation.
+
+        Raises:
+            CancelledError: If the run's token has been cancelled.
+        """
+        self.rows += labels
+        self.pages += 1
+        if self._callback is not None:
+            self._callback(
+                Progress(self.rows, self.pages, time.perf_counter() - self._start)
+            )
+        self.check()
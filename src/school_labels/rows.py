@@ -0,0 +1,115 @@
+"""Compact row types that read like ``dict[str, str]``."""
+
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from operator import itemgetter
+from typing import Any, TypeIs, override
+
+
+class Row(Mapping[str, str]):
+    """A row stored as a tuple of values, with a column index shared by all rows.
+
+    Rows read from the same file share one ``{column: position}`` index, so
+    each row costs one small object and one tuple rather than a dict. Rows
+    pickle as plain dicts.
+    """
+
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index: Mapping[str, int], values: Sequence[str]) -> None:
+        """Create a row whose value for ``column`` is ``values[index[column]]``."""
+        self._index = index
+        self._values = values
+
+    @override
+    def __getitem__(self, key: str) -> str:
+        return self._values[self._index[key]]
+
+    @override
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    @override
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @override
+    def __repr__(self) -> str:
+        return f"Row({dict(self)!r})"
+
+    def replace(self, values: Mapping[str, str]) -> "Row":
+        """Return a copy of the row with some of its values replaced."""
+        return Row(
+            self._index,
+            tuple(values.get(column, self[column]) for column in self._index),
+        )
+
+    @override
+    def __reduce__(self) -> tuple[Any, ...]:
+        return dict, (dict(self),)
+
+
+class ColumnRow(Mapping[str, str]):
+    """A view of one row of column-oriented data."""
+
+    __slots__ = ("_columns", "_position")
+
+    def __init__(self, columns: Mapping[str, Sequence[str]], position: int) -> None:
+        """Create a view of row ``position`` of ``columns``."""
+        self._columns = columns
+        self._position = position
+
+    @override
+    def __getitem__(self, key: str) -> str:
+        return self._columns[key][self._position]
+
+    @override
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._columns)
+
+    @override
+    def __len__(self) -> int:
+        return len(self._columns)
+
+    @override
+    def __repr__(self) -> str:
+        return f"ColumnRow({dict(self)!r})"
+
+    @override
+    def __reduce__(self) -> tuple[Any, ...]:
+        return dict, (dict(self),)
+
+
+def is_columnar(
+    data: Iterable[Mapping[str, str]] | Mapping[str, Sequence[str]],
+) -> TypeIs[Mapping[str, Sequence[str]]]:
+    """Whether ``data`` is column-oriented, rather than an iterable of rows."""
+    return isinstance(data, Mapping)
+
+
+def rows_from_columns(columns: Mapping[str, Sequence[str]]) -> Iterator[ColumnRow]:
+    """Yield a row view for each position of column-oriented data.
+
+    ``columns`` maps each column name to its values, all of the same length.
+    No per-row dicts are built; each view reads from the sequences.
+
+    Raises:
+        ValueError: If the columns are not all the same length.
+    """
+    lengths = {len(values) for values in columns.values()}
+    if len(lengths) > 1:
+        msg = f"Columns must all be the same length, got lengths {sorted(lengths)}"
+        raise ValueError(msg)
+    for position in range(lengths.pop() if lengths else 0):
+        yield ColumnRow(columns, position)
+
+
+def projector(
+    positions: Sequence[int],
+) -> Callable[[Sequence[str]], tuple[str, ...]]:
+    """Function picking the values at ``positions`` out of a CSV record."""
+    if len(positions) > 1:
+        return itemgetter(*positions)
+    if positions:
+        position = positions[0]
+        return lambda record: (record[position],)
+    return lambda _: ()
@@ -0,0 +1,701 @@
+"""HTTP service that generates labels in one long-running, warm process.
+
+``POST /labels`` takes a CSV upload (or JSON rows) and streams the PDF
+back. Templates are loaded once at startup, and the text measurement
+caches stay warm from one request to the next, so a request costs only
+its own rendering. Rendering runs on a fixed pool of worker threads
+behind a bounded queue; when both are full, requests are turned away
+with ``503 Service Unavailable`` instead of piling up. ``GET /metrics``
+reports request counts, latency and throughput in the Prometheus text
+format, and ``GET /health`` answers ``ok``.
+"""
+
+import csv
+import io
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from concurrent.futures import Future
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import SimpleQueue
+from typing import TYPE_CHECKING, Any, BinaryIO, NamedTuple, override
+from urllib.parse import parse_qs, urlsplit
+
+from . import generator
+from .rows import rows_from_columns
+from .validation import RowValidator
+
+if TYPE_CHECKING:
+    from .templates import LabelTemplate
+
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_SIZE = 8
+DEFAULT_MAX_BODY = 64 * 2**20
+
+# Upper bounds of the request latency histogram, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Seconds a client turned away with 503 is asked to wait before retrying
+RETRY_AFTER = 1
+
+# PDF bytes buffered into each chunk of a streamed response
+_CHUNK_SIZE = 64 * 1024
+
+# Paths reported in the requests counter; others are counted as "other"
+_PATHS = ("/labels", "/metrics", "/health")
+
+
+class ServerBusyError(RuntimeError):
+    """Raised when the worker pool and its queue are full."""
+
+
+class WorkerPool:
+    """Worker threads running submitted jobs, with a bounded queue in front.
+
+    At most ``workers`` jobs run at once and at most ``queue_size`` more
+    wait for a worker. :meth:`submit` raises :class:`ServerBusyError`
+    rather than queueing beyond that, so callers can shed load.
+    """
+
+    def __init__(self, workers: int, queue_size: int) -> None:
+        """Start ``workers`` threads accepting up to ``queue_size`` waiting jobs."""
+        self.workers = workers
+        self.queue_size = queue_size
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._jobs: SimpleQueue[tuple[Callable[[], Any], Future[Any]] | None] = (
+            SimpleQueue()
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._threads = [
+            threading.Thread(target=self._work, name=f"labels-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def running(self) -> int:
+        """Number of jobs being run."""
+        return self._running
+
+    @property
+    def queued(self) -> int:
+        """Number of jobs waiting for a worker."""
+        return self._pending - self._running
+
+    def submit[T](self, job: Callable[[], T]) -> Future[T]:
+        """Queue ``job`` to run on a worker, returning a future for its result.
+
+        Raises:
+            ServerBusyError: If every worker is busy and the queue is full.
+        """
+        if not self._slots.acquire(blocking=False):
+            msg = "All workers are busy and the queue is full"
+            raise ServerBusyError(msg)
+        future: Future[T] = Future()
+        with self._lock:
+            self._pending += 1
+        self._jobs.put((job, future))
+        return future
+
+    def _work(self) -> None:
+        """Run jobs until :meth:`shutdown` sends None.
+
+        A job's slot is freed before its future is done, so whoever waits
+        for the result can submit again straight away.
+        """
+        while (item := self._jobs.get()) is not None:
+            job, future = item
+            with self._lock:
+                self._running += 1
+            if not future.set_running_or_notify_cancel():
+                self._release()
+                continue
+            try:
+                result = job()
+            except BaseException as e:  # noqa: BLE001 - handed to the caller
+                self._release()
+                future.set_exception(e)
+            else:
+                self._release()
+                future.set_result(result)
+
+    def _release(self) -> None:
+        """Free the slot of a job that is no longer running."""
+        with self._lock:
+            self._running -= 1
+            self._pending -= 1
+        self._slots.release()
+
+    def shutdown(self) -> None:
+        """Stop the workers once the jobs already queued have run."""
+        for _ in self._threads:
+            self._jobs.put(None)
+        for thread in self._threads:
+            thread.join()
+
+
+class LabelStats(NamedTuple):
+    """What one label request produced."""
+
+    rows: int
+    pages: int
+    bytes: int
+    issues: int
+    queue_seconds: float
+
+
+class ServerMetrics:
+    """Request counters and latency for ``/metrics``, shared between threads."""
+
+    def __init__(self) -> None:
+        """Start counting from zero, now."""
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._requests: Counter[tuple[str, int]] = Counter()
+        self._latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self._latency_sum = 0.0
+        self._latency_count = 0
+        self._totals: Counter[str] = Counter()
+        self._queue_seconds = 0.0
+
+    def record_request(self, path: str, status: int, seconds: float | None) -> None:
+        """Count an answered request, and its latency if it was for labels."""
+        path = path if path in _PATHS else "other"
+        with self._lock:
+            self._requests[path, status] += 1
+            if seconds is None:
+                return
+            self._latency_sum += seconds
+            self._latency_count += 1
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    self._latency_buckets[i] += 1
+
+    def record_labels(self, stats: LabelStats) -> None:
+        """Add a finished PDF's rows, pages and bytes to the totals."""
+        with self._lock:
+            self._totals["pdfs"] += 1
+            self._totals["rows"] += stats.rows
+            self._totals["pages"] += stats.pages
+            self._totals["bytes"] += stats.bytes
+            self._totals["issues"] += stats.issues
+            self._queue_seconds += stats.queue_seconds
+
+    def render(self, pool: WorkerPool) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        lines: list[str] = []
+
+        def metric(name: str, kind: str, text: str, *samples: str) -> None:
+            lines.extend(
+                (
+                    f"# HELP school_labels_{name} {text}",
+                    f"# TYPE school_labels_{name} {kind}",
+                    *samples,
+                )
+            )
+
+        with self._lock:
+            requests = sorted(self._requests.items())
+            buckets = list(self._latency_buckets)
+            latency_sum, latency_count = self._latency_sum, self._latency_count
+            totals = Counter(self._totals)
+            queue_seconds = self._queue_seconds
+
+        metric(
+            "requests_total",
+            "counter",
+            "HTTP requests answered, by path and status.",
+            *(
+                f'school_labels_requests_total{{path="{path}",status="{status}"}} '
+                f"{count}"
+                for (path, status), count in requests
+            ),
+        )
+        metric(
+            "request_duration_seconds",
+            "histogram",
+            "Time to answer label requests, including time queued.",
+            *(
+                f'school_labels_request_duration_seconds_bucket{{le="{bound}"}} {count}'
+                for bound, count in zip(LATENCY_BUCKETS, buckets, strict=True)
+            ),
+            f'school_labels_request_duration_seconds_bucket{{le="+Inf"}} '
+            f"{latency_count}",
+            f"school_labels_request_duration_seconds_sum {latency_sum:.6f}",
+            f"school_labels_request_duration_seconds_count {latency_count}",
+        )
+        for name, key, text in (
+            ("pdfs_total", "pdfs", "PDFs generated."),
+            ("rows_total", "rows", "Rows printed as labels."),
+            ("pages_total", "pages", "Pages generated."),
+            ("response_bytes_total", "bytes", "PDF bytes sent."),
+            ("row_issues_total", "issues", "Empty, duplicate or unprintable values."),
+        ):
+            metric(name, "counter", text, f"school_labels_{name} {totals[key]}")
+        metric(
+            "queue_wait_seconds_total",
+            "counter",
+            "Time label requests spent waiting for a worker.",
+            f"school_labels_queue_wait_seconds_total {queue_seconds:.6f}",
+        )
+        for name, value, text in (
+            ("in_progress", pool.running, "Label requests being rendered."),
+            ("queued", pool.queued, "Label requests waiting for a worker."),
+            ("workers", pool.workers, "Worker threads rendering labels."),
+            ("queue_size", pool.queue_size, "Label requests that may wait."),
+        ):
+            metric(name, "gauge", text, f"school_labels_{name} {value}")
+        self._cache_metrics(metric)
+        metric(
+            "uptime_seconds",
+            "gauge",
+            "Seconds since the server started.",
+            f"school_labels_uptime_seconds {time.monotonic() - self._started:.3f}",
+        )
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _cache_metrics(metric: Callable[..., None]) -> None:
+        """Add the text measurement cache statistics."""
+        # Loaded with the templates at startup
+        from .templates.measure import TEXT_MEASURER  # noqa: PLC0415
+
+        info = TEXT_MEASURER.cache_info()
+        for name, field, text in (
+            ("hits", "hits", "Text measurements answered from the cache."),
+            ("misses", "misses", "Text measurements computed."),
+        ):
+            metric(
+                f"measure_cache_{name}_total",
+                "counter",
+                text,
+                *(
+                    f'school_labels_measure_cache_{name}_total{{cache="{cache}"}} '
+                    f"{getattr(stats, field)}"
+                    for cache, stats in info.items()
+                ),
+            )
+
+
+class _BodyReader(io.RawIOBase):
+    """Reads at most ``length`` bytes of a request body from the socket."""
+
+    def __init__(self, rfile: io.BufferedIOBase, length: int) -> None:
+        self._rfile = rfile
+        self.remaining = length
+
+    @override
+    def readable(self) -> bool:
+        return True
+
+    @override
+    def readinto(self, buffer: Any) -> int:
+        if not self.remaining:
+            return 0
+        data = self._rfile.read(min(len(memoryview(buffer)), self.remaining))
+        if not data:
+            msg = "Request body ended early"
+            raise ValueError(msg)
+        memoryview(buffer)[: len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+
+class _PdfResponse(io.RawIOBase):
+    """Streams a PDF response body, sending the headers on the first write.
+
+    Until the first write, an error can still be answered with an error
+    status. HTTP/1.1 clients get the body in chunks; HTTP/1.0 clients get
+    it unframed, ended by closing the connection.
+    """
+
+    def __init__(self, handler: "LabelRequestHandler") -> None:
+        self._handler = handler
+        self._chunked = handler.request_version != "HTTP/1.0"
+        self.started = False
+        self.aborted = False
+        self.size = 0
+
+    @override
+    def writable(self) -> bool:
+        return True
+
+    @override
+    def write(self, b: Any) -> int:
+        data = memoryview(b)
+        if self.aborted or not data:
+            return len(data)
+        wfile = self._handler.wfile
+        if not self.started:
+            self.started = True
+            self._handler.send_response(HTTPStatus.OK)
+            self._handler.send_header("Content-Type", "application/pdf")
+            self._handler.send_header(
+                "Content-Disposition", 'inline; filename="labels.pdf"'
+            )
+            if self._chunked:
+                self._handler.send_header("Transfer-Encoding", "chunked")
+            else:
+                self._handler.close_connection = True
+            self._handler.end_headers()
+        if self._chunked:
+            wfile.write(b"%x\r\n" % len(data))
+            wfile.write(data)
+            wfile.write(b"\r\n")
+        else:
+            wfile.write(data)
+        self.size += len(data)
+        return len(data)
+
+    def finish(self) -> None:
+        """End the response body."""
+        if self._chunked:
+            self._handler.wfile.write(b"0\r\n\r\n")
+
+
+class _LabelRequest(NamedTuple):
+    """A label request, as read from its query string and headers."""
+
+    style: str | None
+    break_column: str | None
+    json: bool
+    encoding: str
+    length: int
+
+
+def _counted[T](rows: Iterable[T], counter: list[int]) -> Iterator[T]:
+    """Yield rows unchanged, counting them in ``counter[0]``."""
+    for row in rows:
+        counter[0] += 1
+        yield row
+
+
+def _json_rows(
+    data: object,
+) -> list[dict[str, str]] | dict[str, list[str]]:
+    """Rows from a JSON body: a list of row objects, or an object of columns.
+
+    Numbers and other scalars are printed as JSON writes them; null is empty.
+
+    Raises:
+        ValueError: If the body is neither.
+    """
+
+    def text(value: object) -> str:
+        if value is None:
+            return ""
+        return value if isinstance(value, str) else json.dumps(value)
+
+    if isinstance(data, list) and all(isinstance(row, dict) for row in data):
+        return [{key: text(value) for key, value in row.items()} for row in data]
+    if isinstance(data, dict) and all(isinstance(col, list) for col in data.values()):
+        return {key: [text(value) for value in col] for key, col in data.items()}
+    msg = "JSON body must be a list of row objects or an object of column lists"
+    raise ValueError(msg)
+
+
+class LabelRequestHandler(BaseHTTPRequestHandler):
+    """Answers label, metrics and health requests for a :class:`LabelServer`."""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "school-labels"
+
+    _status: int = 0
+
+    @property
+    def _server(self) -> "LabelServer":
+        """The server the handler was made by.
+
+        Raises:
+            TypeError: If the handler is used with another kind of server.
+        """
+        if not isinstance(self.server, LabelServer):
+            msg = f"{type(self).__name__} needs a LabelServer"
+            raise TypeError(msg)
+        return self.server
+
+    @override
+    def log_request(self, code: int | str = "-", size: int | str = "-") -> None:
+        if isinstance(code, int):
+            self._status = int(code)
+        if not self._server.quiet:
+            super().log_request(code, size)
+
+    def do_GET(self) -> None:
+        """Answer ``/metrics`` and ``/health``."""
+        self._status = 0
+        path = urlsplit(self.path).path
+        if path == "/metrics":
+            self._send_text(
+                HTTPStatus.OK,
+                self._server.metrics.render(self._server.pool),
+                "text/plain; version=0.0.4",
+            )
+        elif path == "/health":
+            self._send_text(HTTPStatus.OK, "ok\n")
+        else:
+            self._send_text(HTTPStatus.NOT_FOUND, f"No such page: {path}\n")
+        self._server.metrics.record_request(path, self._status, None)
+
+    def do_POST(self) -> None:
+        """Generate labels for ``/labels``."""
+        start = time.perf_counter()
+        self._status = 0
+        url = urlsplit(self.path)
+        if url.path != "/labels":
+            self.close_connection = True
+            self._send_text(HTTPStatus.NOT_FOUND, f"No such page: {url.path}\n")
+            self._server.metrics.record_request(url.path, self._status, None)
+            return
+        try:
+            self._post_labels(url.query)
+        finally:
+            self._server.metrics.record_request(
+                url.path, self._status, time.perf_counter() - start
+            )
+
+    def _post_labels(self, query: str) -> None:
+        """Check a label request and hand it to the worker pool."""
+        request = self._read_request(query)
+        if request is None:
+            return
+        submitted = time.perf_counter()
+        try:
+            future = self._server.pool.submit(
+                lambda: self._generate(request, time.perf_counter() - submitted)
+            )
+        except ServerBusyError as e:
+            self.close_connection = True
+            self._send_text(
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                f"{e}; try again later\n",
+                headers={"Retry-After": str(RETRY_AFTER)},
+            )
+            return
+        future.result()
+
+    def _read_request(self, query: str) -> _LabelRequest | None:
+        """Parse the query and headers, answering with an error if they are bad."""
+        params = {key: values[-1] for key, values in parse_qs(query).items()}
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+            if length < 0:
+                raise ValueError(length)  # noqa: TRY301
+        except ValueError:
+            self.close_connection = True
+            self._send_text(HTTPStatus.LENGTH_REQUIRED, "Content-Length required\n")
+            return None
+        if length > self._server.max_body:
+            self.close_connection = True
+            self._send_text(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                f"Request body over {self._server.max_body} bytes\n",
+            )
+            return None
+        content_type = self.headers.get_content_type()
+        charset = self.headers.get_content_charset("utf-8")
+        return _LabelRequest(
+            style=params.get("style"),
+            break_column=params.get("break"),
+            json=content_type == "application/json",
+            # Spreadsheet exports often start with a byte order mark
+            encoding="utf-8-sig" if charset.lower() in {"utf-8", "utf8"} else charset,
+            length=length,
+        )
+
+    def _generate(self, request: _LabelRequest, queue_seconds: float) -> None:
+        """Read the rows and stream the PDF back. Runs on a worker thread."""
+        body = _BodyReader(self.rfile, request.length)
+        response = _PdfResponse(self)
+        out = io.BufferedWriter(response, _CHUNK_SIZE)
+        counter = [0]
+        try:
+            rows, template, validator = _read_rows(request, io.BufferedReader(body))
+            pages = generator.generate_labels_to(
+                _counted(rows, counter),
+                template.name,
+                out,
+                break_column=request.break_column,
+            )
+            out.flush()
+            response.finish()
+        except (ValueError, LookupError, csv.Error) as e:
+            self._fail(response, HTTPStatus.BAD_REQUEST, str(e))
+            return
+        except OSError as e:
+            # Most likely the client went away
+            self._fail(response, HTTPStatus.INTERNAL_SERVER_ERROR, str(e))
+            return
+        except Exception:
+            self._fail(
+                response,
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+                "Internal error generating labels",
+            )
+            raise
+        finally:
+            if body.remaining:
+                self.close_connection = True
+        self._server.metrics.record_labels(
+            LabelStats(
+                counter[0], pages, response.size, len(validator.issues), queue_seconds
+            )
+        )
+
+    def _fail(self, response: _PdfResponse, status: HTTPStatus, message: str) -> None:
+        """Answer with an error, or cut the response short if the PDF has started."""
+        self.close_connection = True
+        if response.started:
+            # Too late for an error status: stop without ending the body
+            response.aborted = True
+            self.log_error("Labels failed after the response started: %s", message)
+            return
+        response.aborted = True
+        self._send_text(status, message + "\n")
+
+    def _send_text(
+        self,
+        status: HTTPStatus,
+        text: str,
+        content_type: str = "text/plain",
+        headers: Mapping[str, str] | None = None,
+    ) -> None:
+        """Send a complete text response."""
+        data = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _read_rows(
+    request: _LabelRequest, body: BinaryIO
+) -> tuple[Iterator[Mapping[str, str]], "LabelTemplate", RowValidator]:
+    """Rows of a request body, the template to print them with, and their validator.
+
+    Rows are checked as they are read, and values the template's fonts
+    cannot print are replaced.
+
+    Raises:
+        ValueError: If the body cannot be parsed or has no rows, the style
+            is unknown, or no template matches the columns.
+    """
+    text = None
+    if request.json:
+        data = _json_rows(json.load(body))
+        if isinstance(data, dict):
+            columns, records = list(data), rows_from_columns(data)
+        else:
+            columns, records = list(data[0]) if data else [], data
+    else:
+        text = io.TextIOWrapper(body, encoding=request.encoding, newline="")
+        columns = generator.read_csv_header(text)
+    if not columns:
+        msg = "No data found in request"
+        raise ValueError(msg)
+    template = _find_template(request.style, columns)
+    if request.break_column and request.break_column not in columns:
+        msg = (
+            f"Break column {request.break_column!r} not found. "
+            f"Available columns: {columns}"
+        )
+        raise ValueError(msg)
+    validator = RowValidator(
+        template.required_columns,
+        template.unique_columns,
+        template.charset,
+        checks=template.value_checks,
+    )
+    if text is None:
+        rows = iter(validator.validated(records))
+    else:
+        grouping = [request.break_column] if request.break_column else []
+        rows = generator.iter_csv_rows(
+            text,
+            {*template.required_columns, *grouping},
+            fieldnames=columns,
+            intern=grouping,
+            validator=validator,
+        )
+    first = next(rows, None)
+    if first is None:
+        msg = "No data found in request"
+        raise ValueError(msg)
+    return itertools.chain([first], rows), template, validator
+
+
+def _find_template(style: str | None, columns: list[str]) -> "LabelTemplate":
+    """Look up ``style``, or detect the template from the columns.
+
+    Raises:
+        ValueError: If the style is unknown or no template matches.
+    """
+    if style:
+        template = generator.TEMPLATES.get(style)
+        if template is None:
+            msg = f"Unknown style {style!r}. Valid styles: {list(generator.TEMPLATES)}"
+            raise ValueError(msg)
+        return template
+    template = generator.detect_template(columns)
+    if template is None:
+        msg = f"Could not auto-detect template from columns: {columns}"
+        raise ValueError(msg)
+    return template
+
+
+class LabelServer(ThreadingHTTPServer):
+    """HTTP server generating labels on a bounded pool of warm workers."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        *,
+        workers: int = DEFAULT_WORKERS,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        max_body: int = DEFAULT_MAX_BODY,
+        quiet: bool = False,
+    ) -> None:
+        """Bind to ``address`` and load every template.
+
+        Args:
+            address: Host and port to listen on. Port 0 picks a free port.
+            workers: Requests rendered at once.
+            queue_size: Requests that may wait for a worker before more
+                are turned away with 503.
+            max_body: Largest request body accepted, in bytes.
+            quiet: Don't log each request to stderr.
+        """
+        # Load fpdf2 and the templates now rather than on the first request
+        for name in generator.TEMPLATES:
+            generator.TEMPLATES[name]
+        self.metrics = ServerMetrics()
+        self.max_body = max_body
+        self.quiet = quiet
+        # Shut down by server_close(), which also runs if binding fails
+        self.pool = WorkerPool(workers, queue_size)
+        super().__init__(address, LabelRequestHandler)
+
+    @property
+    def url(self) -> str:
+        """Base URL the server is listening on."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @override
+    def server_close(self) -> None:
+        super().server_close()
+        self.pool.shutdown()
@@ -0,0 +1,95 @@
+"""Stable sorting of rows that may not fit in memory."""
+
+import heapq
+import pickle
+import re
+import tempfile
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from contextlib import ExitStack
+from itertools import islice
+from typing import IO, Any
+
+# Rows held in memory at a time. Larger inputs are sorted in runs of this
+# many rows, spilled to temporary files and merged.
+DEFAULT_RUN_SIZE = 50_000
+
+
+# Values compared as numbers rather than as text, e.g. admin numbers
+_NUMBER = re.compile(r"\s*[+-]?(?:\d+(?:\.\d*)?|\.\d+)\s*")
+
+type _ValueKey = tuple[int, float, str]
+
+
+def _value_key(value: str) -> _ValueKey:
+    """Sort key for one value: empty first, then numbers by value, then text."""
+    if not value:
+        return (0, 0.0, "")
+    if _NUMBER.fullmatch(value):
+        return (1, float(value), "")
+    return (2, 0.0, value)
+
+
+def row_key(
+    columns: Sequence[str],
+) -> Callable[[Mapping[str, str]], tuple[_ValueKey, ...]]:
+    """Sort key comparing rows by the values of ``columns``, in order.
+
+    Each value is compared as :func:`_value_key` says: admin numbers sort
+    as numbers (``99`` before ``100``) and names and groups as text.
+    """
+    return lambda row: tuple(_value_key(row.get(column, "")) for column in columns)
+
+
+def sort_rows[R: Mapping[str, str]](
+    rows: Iterable[R],
+    columns: Sequence[str],
+    *,
+    run_size: int = DEFAULT_RUN_SIZE,
+) -> Iterator[R]:
+    """Yield ``rows`` stably sorted by the values of ``columns``.
+
+    Inputs shorter than ``run_size`` rows are sorted in memory. Longer
+    inputs are read in runs of ``run_size`` rows; each run is sorted and
+    pickled to a temporary file, and the runs are then merged lazily, so at
+    most one run and one row per run are in memory at a time. Rows with
+    equal keys keep their input order either way.
+
+    Nothing is yielded until all of ``rows`` has been read.
+    """
+    key = row_key(columns)
+    iterator = iter(rows)
+    run = list(islice(iterator, run_size))
+    if len(run) < run_size:
+        run.sort(key=key)
+        yield from run
+        return
+
+    with ExitStack() as stack:
+        spills = []
+        while run:
+            spill = stack.enter_context(tempfile.TemporaryFile())
+            spills.append(_spill(spill, run, key))
+            run = list(islice(iterator, run_size))
+        # heapq.merge breaks ties in favour of earlier runs, which hold
+        # earlier rows, so the merge is stable
+        yield from heapq.merge(*map(_read_run, spills), key=key)
+
+
+def _spill[R](
+    spill: IO[bytes], run: list[R], key: Callable[[R], tuple[_ValueKey, ...]]
+) -> IO[bytes]:
+    """Write ``run`` sorted to ``spill`` and rewind it."""
+    run.sort(key=key)
+    for row in run:
+        pickle.dump(row, spill, protocol=pickle.HIGHEST_PROTOCOL)
+    spill.seek(0)
+    return spill
+
+
+def _read_run(spill: IO[bytes]) -> Iterator[Any]:
+    """Yield the rows pickled in ``spill``."""
+    while True:
+        try:
+            yield pickle.load(spill)  # noqa: S301 - our own temporary file
+        except EOFError:
+            return
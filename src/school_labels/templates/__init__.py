@@ -3,9 +3,34 @@
 from .avery7160 import Avery7160Template
 from .base import LabelTemplate
 from .email_password import EmailPasswordTemplate
+from .layout import (
+    AVERY_7160,
+    Barcode,
+    Box,
+    Caption,
+    Field,
+    Font,
+    Layout,
+    Rule,
+    Sheet,
+)
+from .layout_template import LayoutTemplate
+from .measure import TEXT_MEASURER, TextMeasurer
 
 __all__ = [
+    "AVERY_7160",
+    "TEXT_MEASURER",
     "Avery7160Template",
+    "Barcode",
+    "Box",
+    "Caption",
     "EmailPasswordTemplate",
+    "Field",
+    "Font",
     "LabelTemplate",
+    "Layout",
+    "LayoutTemplate",
+    "Rule",
+    "Sheet",
+    "TextMeasurer",
 ]
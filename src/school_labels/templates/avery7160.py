@@ -1,65 +1,186 @@
 """Base template for Avery 7160 label sheets."""
 
+import functools
+import itertools
+import json
+import re
 from abc import ABC, abstractmethod
-from typing import override
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import Future, ProcessPoolExecutor
+from importlib.metadata import version
+from typing import BinaryIO, override
 
-from fpdf import FPDF
+from fpdf import FPDF, FPDF_VERSION
+from fpdf.fonts import CoreFont, TTFFont
+from fpdf.output import PDFPage
+
+from school_labels import timings
+from school_labels.cache import CachedPage, PageCache
+from school_labels.progress import Tracker
+from school_labels.writer import PdfOptions, PdfWriter
 
 from .base import LabelTemplate
+from .fonts import GlyphIdFont, add_font
+from .layout import AVERY_7160
+from .measure import TEXT_MEASURER, FitField
+
+# Points per millimetre
+_PT_PER_MM = 72 / 25.4
+
+# Form XObject names for the static layer of one label and of a full sheet
+_LABEL_FORM = "Label"
+_SHEET_FORM = "Sheet"
+
+# Rendered pages with their label counts, the fonts they use by resource name,
+# as (family, style) so they can be registered in another process, and the
+# counters recorded while rendering them
+type _RenderedChunk = tuple[
+    list[tuple[bytes, int]], dict[str, tuple[str, str]], dict[str, int]
+]
+
+# Font selection as emitted by FPDF, on a line of its own
+_FONT_SELECTION = re.compile(rb"^BT /(F\d+) ", re.MULTILINE)
 
 
 class Avery7160Template(LabelTemplate, ABC):
     """Base class for Avery 7160 label templates."""
 
-    # Avery 7160 specifications (in mm)
-    SHEET_WIDTH: float = 210  # A4 width
-    SHEET_HEIGHT: float = 297  # A4 height
-    LABEL_WIDTH: float = 63.5
-    LABEL_HEIGHT: float = 38.1
-    LABELS_PER_ROW: int = 3
-    LABELS_PER_COL: int = 7
-    LEFT_MARGIN: float = 7.25
-    TOP_MARGIN: float = 15.15
-    H_SPACING: float = 2.5
-    V_SPACING: float = 0
-
-    LABELS_PER_PAGE: int = LABELS_PER_ROW * LABELS_PER_COL
-
-    def _setup_pdf(self) -> FPDF:
-        """Setup PDF with A4 page size."""
+    # Avery 7160 specifications (in mm). Templates for other sheets set
+    # these from their own Sheet; see LayoutTemplate.
+    SHEET_WIDTH: float = AVERY_7160.width
+    SHEET_HEIGHT: float = AVERY_7160.height
+    LABEL_WIDTH: float = AVERY_7160.label_width
+    LABEL_HEIGHT: float = AVERY_7160.label_height
+    LABELS_PER_ROW: int = AVERY_7160.across
+    LABELS_PER_COL: int = AVERY_7160.down
+    LEFT_MARGIN: float = AVERY_7160.left_margin
+    TOP_MARGIN: float = AVERY_7160.top_margin
+    H_SPACING: float = AVERY_7160.h_spacing
+    V_SPACING: float = AVERY_7160.v_spacing
+
+    LABELS_PER_PAGE: int = AVERY_7160.labels_per_page
+
+    # Rows whose text fitting is batched ahead of drawing. Kept small enough
+    # that a batch's decisions stay in the measurement cache until drawn.
+    PREFIT_BATCH: int = 256
+
+    # Pages handed to a worker at a time when rendering with several jobs
+    PAGES_PER_CHUNK: int = 32
+
+    # Part of every page cache key. Bump it when a change alters what is
+    # drawn for the same rows, so pages cached by older code are not reused.
+    LAYOUT_VERSION: int = 1
+
+    def _setup_pdf(self, *, streaming: bool = False) -> FPDF:
+        """Setup PDF with A4 page size and the template's TrueType fonts.
+
+        With ``streaming``, the fonts are glyph-id fonts for pages handed to
+        a :class:`PdfWriter`; otherwise they are FPDF's own, so that
+        ``FPDF.output`` can embed them.
+        """
         pdf = FPDF()
         pdf.set_title(self.pdf_title)
         pdf.c_margin = 0
+        for metrics in self.fonts.values():
+            if streaming:
+                add_font(pdf, metrics)
+            elif metrics.family not in pdf.fonts:
+                pdf.add_font(metrics.family, "", metrics.path)
         pdf.add_page()
         pdf.set_auto_page_break(False)
         return pdf
 
-    def _get_label_position(self, label_index: int) -> tuple[float, float]:
-        """Get x, y position for label at given index on current page."""
-        row = label_index // self.LABELS_PER_ROW
-        col = label_index % self.LABELS_PER_ROW
+    def _setup_writer(self, out: BinaryIO, options: PdfOptions | None) -> PdfWriter:
+        """Setup streaming writer with A4 page size."""
+        return PdfWriter(
+            out,
+            title=self.pdf_title,
+            page_size=(self.SHEET_WIDTH * _PT_PER_MM, self.SHEET_HEIGHT * _PT_PER_MM),
+            options=options,
+        )
 
-        x = self.LEFT_MARGIN + col * (self.LABEL_WIDTH + self.H_SPACING)
-        y = self.TOP_MARGIN + row * (self.LABEL_HEIGHT + self.V_SPACING)
+    @functools.cached_property
+    def _label_positions(self) -> tuple[tuple[float, float], ...]:
+        """The x, y position of every label on a page, in label order."""
+        return tuple(
+            (
+                self.LEFT_MARGIN + col * (self.LABEL_WIDTH + self.H_SPACING),
+                self.TOP_MARGIN + row * (self.LABEL_HEIGHT + self.V_SPACING),
+            )
+            for row in range(self.LABELS_PER_COL)
+            for col in range(self.LABELS_PER_ROW)
+        )
 
-        return x, y
+    def _get_label_position(self, label_index: int) -> tuple[float, float]:
+        """Get x, y position for label at given index on current page."""
+        return self._label_positions[label_index]
 
     @abstractmethod
     def _draw_label_content(
-        self, pdf: FPDF, x: float, y: float, data: dict[str, str]
+        self, pdf: FPDF, x: float, y: float, data: Mapping[str, str]
     ) -> None:
         """Draw content for a single label."""
 
-    @override
-    def create_pdf(
-        self, data: list[dict[str, str]], break_column: str | None = None
-    ) -> FPDF:
-        """Create PDF with labels using Avery 7160 layout."""
-        pdf = self._setup_pdf()
+    def _draw_static_content(self, pdf: FPDF, x: float, y: float) -> None:
+        """Draw the parts of a label that are identical for every row.
+
+        Templates override this to declare a static layer such as captions
+        and rules. :meth:`write_pdf` renders it once as a form XObject and
+        paints it per label, while :meth:`create_pdf` draws it inline.
+        """
+
+    def _fit_fields(self) -> list[FitField]:
+        """Text cells whose fit or shrink decisions can be batched ahead of drawing."""
+        return []
+
+    def _prefitted(
+        self, pdf: FPDF, data: Iterable[Mapping[str, str]]
+    ) -> Iterator[Mapping[str, str]]:
+        """Yield rows unchanged, batching their text fitting ahead of drawing."""
+        if not self._fit_fields():
+            yield from data
+            return
+        recorder = timings.current()
+        for batch in itertools.batched(data, self.PREFIT_BATCH, strict=False):
+            with recorder.stage("fit"):
+                self._prefit(pdf, batch)
+            yield from batch
+
+    def _prefitted_pages(
+        self, pdf: FPDF, pages: Iterable[list[Mapping[str, str]]]
+    ) -> Iterator[list[Mapping[str, str]]]:
+        """Yield pages unchanged, batching their text fitting ahead of drawing."""
+        if not self._fit_fields():
+            yield from pages
+            return
+        recorder = timings.current()
+        batch_pages = max(1, self.PREFIT_BATCH // self.LABELS_PER_PAGE)
+        for batch in itertools.batched(pages, batch_pages, strict=False):
+            with recorder.stage("fit"):
+                self._prefit(pdf, itertools.chain.from_iterable(batch))
+            yield from batch
+
+    def _prefit(self, pdf: FPDF, rows: Iterable[Mapping[str, str]]) -> None:
+        """Batch the text fitting of ``rows`` ahead of drawing them."""
+        rows = list(rows)
+        for field in self._fit_fields():
+            TEXT_MEASURER.prefit(pdf, field, rows)
+
+    def _place_labels(
+        self, data: Iterable[Mapping[str, str]], break_column: str | None
+    ) -> Iterator[tuple[bool, int, Mapping[str, str]]]:
+        """Yield ``(new_page, page_label_index, row)`` for each row.
+
+        ``new_page`` is true when the row must start a fresh page, either
+        because the current one is full or because ``break_column`` changed.
+        """
         label_count = 0
         last_break_value = None
 
         for row in data:
+            new_page = False
+
             # Check for page break on column value change
             if break_column and break_column in row:
                 current_break_value = row[break_column]
@@ -67,20 +188,393 @@ class Avery7160Template(LabelTemplate, ABC):
                     last_break_value is not None
                     and current_break_value != last_break_value
                 ):
-                    pdf.add_page()
+                    new_page = True
                     label_count = 0
+                    timings.current().count("break_pages")
                 last_break_value = current_break_value
 
             # Add new page if current page is full
             # (skip if break already added a fresh page)
             if label_count > 0 and label_count % self.LABELS_PER_PAGE == 0:
-                pdf.add_page()
+                new_page = True
 
-            # Get position for current label
-            page_label_index = label_count % self.LABELS_PER_PAGE
-            x, y = self._get_label_position(page_label_index)
+            yield new_page, label_count % self.LABELS_PER_PAGE, row
+            label_count += 1
 
+    @override
+    def create_pdf(
+        self, data: list[dict[str, str]], break_column: str | None = None
+    ) -> FPDF:
+        """Create PDF with labels using Avery 7160 layout."""
+        pdf = self._setup_pdf()
+        timings.current().count("pages")
+
+        for new_page, page_label_index, row in self._place_labels(
+            self._prefitted(pdf, data), break_column
+        ):
+            if new_page:
+                pdf.add_page()
+                timings.current().count("pages")
+            x, y = self._get_label_position(page_label_index)
+            self._draw_static_content(pdf, x, y)
             self._draw_label_content(pdf, x, y, row)
-            label_count += 1
 
         return pdf
+
+    @override
+    def write_pdf(
+        self,
+        data: Iterable[Mapping[str, str]],
+        out: BinaryIO,
+        break_column: str | None = None,
+        *,
+        jobs: int = 1,
+        page_cache: PageCache | None = None,
+        pdf_options: PdfOptions | None = None,
+        backend: str = "fpdf",
+        progress: Tracker | None = None,
+    ) -> int:
+        """Stream PDF with labels using Avery 7160 layout.
+
+        Labels are drawn with the same FPDF calls as :meth:`create_pdf`, but
+        each finished page's content stream is handed to a :class:`PdfWriter`
+        and dropped from the FPDF object, so memory stays flat however many
+        rows ``data`` yields. The static layer is written once as form
+        XObjects and only referenced from each page.
+
+        With ``jobs`` above 1, pages are rendered in chunks of
+        :attr:`PAGES_PER_CHUNK` by a pool of worker processes and written in
+        order. Each page's content does not depend on earlier pages, so the
+        result is the same as rendering serially.
+
+        With a ``page_cache``, pages whose rows were rendered before are
+        reused from the cache instead of being laid out again; see
+        :meth:`_render_cached`.
+
+        ``pdf_options`` choose how the PDF is compressed and laid out; see
+        :class:`PdfOptions`.
+
+        ``backend`` chooses how label content is drawn: ``"fpdf"`` with
+        FPDF calls, or where :attr:`BACKENDS` offers it, ``"direct"`` by
+        writing the content stream operators FPDF would emit.
+
+        ``progress`` counts each page once it is written. Should its run be
+        cancelled, rendering stops there, workers are left no more pages,
+        and :class:`~school_labels.progress.CancelledError` is raised with
+        ``out`` holding an unfinished PDF.
+        """
+        self.check_backend(backend)
+        recorder = timings.current()
+        pdf = self._setup_pdf(streaming=True)
+        writer = self._setup_writer(out, pdf_options)
+        truetype = {
+            font.i: font for font in pdf.fonts.values() if isinstance(font, GlyphIdFont)
+        }
+        for font in truetype.values():
+            writer.add_truetype_font(f"F{font.i}", font.metrics)
+        with recorder.stage("static"):
+            has_static = self._add_static_forms(pdf, writer)
+
+        pages = self._paginate(data, break_column)
+        if page_cache is None:
+            rendered = self._render(pdf, pages, jobs, backend)
+        else:
+            rendered = self._render_cached(pdf, pages, jobs, page_cache, backend)
+
+        for content, labels in rendered:
+            with recorder.stage("write"):
+                if has_static:
+                    writer.add_page(self._paint_static_forms(pdf, labels) + content)
+                else:
+                    writer.add_page(content)
+            recorder.count("pages")
+            if progress is not None:
+                progress.page(labels)
+
+        with recorder.stage("write"):
+            for font in pdf.fonts.values():
+                if font.i not in truetype:
+                    writer.add_font(f"F{font.i}", font.name)
+            writer.close()
+        return writer.pages_count
+
+    def _paginate(
+        self, data: Iterable[Mapping[str, str]], break_column: str | None
+    ) -> Iterator[list[Mapping[str, str]]]:
+        """Group rows into pages, in label order. Always yields one page."""
+        page: list[Mapping[str, str]] = []
+        for new_page, _, row in self._place_labels(data, break_column):
+            if new_page:
+                yield page
+                page = []
+            page.append(row)
+        yield page
+
+    def _render(
+        self,
+        pdf: FPDF,
+        pages: Iterable[list[Mapping[str, str]]],
+        jobs: int,
+        backend: str,
+    ) -> Iterator[tuple[bytes, int]]:
+        """Render pages on ``jobs`` processes, yielding them in order."""
+        if jobs > 1:
+            return self._render_parallel(pdf, pages, jobs, backend)
+        return self._render_serial(pdf, self._prefitted_pages(pdf, pages), backend)
+
+    def _render_cached(
+        self,
+        pdf: FPDF,
+        pages: Iterable[list[Mapping[str, str]]],
+        jobs: int,
+        cache: PageCache,
+        backend: str,
+    ) -> Iterator[tuple[bytes, int]]:
+        """Render pages through ``cache``, yielding them in order.
+
+        Each page is looked up by :meth:`_page_key`. Only the misses are
+        laid out, by :meth:`_render`, and stored; hits have their fonts
+        renamed to match ``pdf`` and are spliced back in order. The cache is
+        pruned to its size bound at the end.
+        """
+        recorder = timings.current()
+        # Pages looked up but not yet yielded: (key, cached page, labels)
+        order: deque[tuple[str, CachedPage | None, int]] = deque()
+
+        def misses() -> Iterator[list[Mapping[str, str]]]:
+            for rows in pages:
+                with recorder.stage("cache"):
+                    key = self._page_key(rows)
+                    cached = cache.get(key)
+                order.append((key, cached, len(rows)))
+                if cached is None:
+                    recorder.count("page_cache_misses")
+                    yield rows
+                else:
+                    recorder.count("page_cache_hits")
+
+        def hits() -> Iterator[tuple[bytes, int]]:
+            while order and (cached := order[0][1]) is not None:
+                _, _, labels = order.popleft()
+                yield from self._merge_chunk(
+                    pdf, ([(cached.content, labels)], cached.fonts, {})
+                )
+
+        for content, labels in self._render(pdf, misses(), jobs, backend):
+            yield from hits()
+            key, _, _ = order.popleft()
+            with recorder.stage("cache"):
+                cache.put(key, CachedPage(content, _fonts_used(pdf, content)))
+            yield content, labels
+        yield from hits()
+        with recorder.stage("cache"):
+            cache.prune()
+
+    def _page_key(self, rows: Sequence[Mapping[str, str]]) -> str:
+        """Page cache key for a page of ``rows`` drawn by this template."""
+        template = type(self)
+        return PageCache.key(
+            f"{template.__module__}.{template.__qualname__}".encode(),
+            self.name.encode(),
+            self._layout_key().encode(),
+            _software_versions().encode(),
+            " ".join(f"{role}={m.digest}" for role, m in self.fonts.items()).encode(),
+            json.dumps([dict(row) for row in rows], sort_keys=True).encode(),
+        )
+
+    def _layout_key(self) -> str:
+        """What identifies this template's drawing in page cache keys."""
+        return str(self.LAYOUT_VERSION)
+
+    def _render_serial(
+        self, pdf: FPDF, pages: Iterable[list[Mapping[str, str]]], backend: str
+    ) -> Iterator[tuple[bytes, int]]:
+        """Render pages in this process, yielding them in order."""
+        recorder = timings.current()
+        render_page = self._page_renderer(backend)
+        for rows in pages:
+            with recorder.stage("layout"):
+                content = render_page(pdf, rows)
+            yield content, len(rows)
+
+    def _page_renderer(
+        self, backend: str
+    ) -> Callable[[FPDF, Sequence[Mapping[str, str]]], bytes]:
+        """The method drawing a page of labels with ``backend``.
+
+        Templates offering more :attr:`BACKENDS` than ``"fpdf"`` override
+        this to return their own.
+        """
+        self.check_backend(backend)
+        return self._render_page
+
+    def _render_page(self, pdf: FPDF, rows: Sequence[Mapping[str, str]]) -> bytes:
+        """Draw one page of labels and return its content stream.
+
+        The content only depends on ``rows``: the previous page's font is not
+        carried over, so pages can be rendered in any process and order.
+        """
+        pdf.font_family = ""
+        pdf.add_page()
+        # The previous page has already been rendered (or was scratch)
+        del pdf.pages[pdf.page - 1]
+        for page_label_index, row in enumerate(rows):
+            x, y = self._get_label_position(page_label_index)
+            self._draw_label_content(pdf, x, y, row)
+        return _page_content(pdf.pages[pdf.page])
+
+    def _render_parallel(
+        self,
+        pdf: FPDF,
+        pages: Iterable[list[Mapping[str, str]]],
+        jobs: int,
+        backend: str,
+    ) -> Iterator[tuple[bytes, int]]:
+        """Render pages in worker processes, yielding them in order.
+
+        At most two chunks per worker are in flight, so memory stays bounded.
+        Fonts are renamed to match ``pdf`` where a worker registered them in
+        a different order. Time spent waiting for workers counts as layout.
+        """
+        recorder = timings.current()
+        with ProcessPoolExecutor(jobs) as pool:
+            pending: deque[Future[_RenderedChunk]] = deque()
+            try:
+                for chunk in itertools.batched(
+                    pages, self.PAGES_PER_CHUNK, strict=False
+                ):
+                    rows = [[dict(row) for row in page] for page in chunk]
+                    pending.append(pool.submit(_render_chunk, self, rows, backend))
+                    if len(pending) >= 2 * jobs:
+                        with recorder.stage("layout"):
+                            done = pending.popleft().result()
+                        yield from self._merge_chunk(pdf, done)
+                while pending:
+                    with recorder.stage("layout"):
+                        done = pending.popleft().result()
+                    yield from self._merge_chunk(pdf, done)
+            finally:
+                # Stopped early: only wait for the chunks already running
+                for future in pending:
+                    future.cancel()
+
+    @staticmethod
+    def _merge_chunk(pdf: FPDF, chunk: _RenderedChunk) -> Iterator[tuple[bytes, int]]:
+        """Yield a worker's pages with fonts renamed to match ``pdf``."""
+        pages, fonts, counters = chunk
+        timings.current().add_counters(counters)
+        renames = {}
+        for name, (family, style) in fonts.items():
+            fontkey = family + style
+            if fontkey not in pdf.fonts:
+                pdf.set_font(family, style)
+            canonical = f"F{pdf.fonts[fontkey].i}"
+            if canonical != name:
+                renames[name.encode()] = canonical.encode()
+
+        if not renames:
+            yield from pages
+            return
+        for content, labels in pages:
+            renamed = _FONT_SELECTION.sub(
+                lambda m: b"BT /%b " % renames.get(m[1], m[1]), content
+            )
+            yield renamed, labels
+
+    def _add_static_forms(self, pdf: FPDF, writer: PdfWriter) -> bool:
+        """Render the static layer into form XObjects on ``writer``.
+
+        The layer is drawn for a label at the top-left corner of a scratch
+        page, so the form shares the page coordinate system and is placed by
+        translation alone. A second form paints it at every position of a
+        full sheet. Returns False if the template has no static layer.
+        """
+        start = len(_page_content(pdf.pages[pdf.page]))
+        self._draw_static_content(pdf, 0, 0)
+        pdf.add_page()
+        content = self._pop_page(pdf, pdf.page - 1)
+        if len(content) == start:
+            return False
+
+        # Pad the box so square line caps at the label edges are not clipped
+        pad = pdf.line_width * pdf.k
+        top = pdf.h_pt + pad
+        writer.add_form(
+            _LABEL_FORM,
+            content,
+            (
+                -pad,
+                pdf.h_pt - self.LABEL_HEIGHT * pdf.k - pad,
+                self.LABEL_WIDTH * pdf.k + pad,
+                top,
+            ),
+        )
+        sheet = b"".join(
+            self._place_form(pdf, _LABEL_FORM, i) for i in range(self.LABELS_PER_PAGE)
+        )
+        writer.add_form(_SHEET_FORM, sheet, (-pad, -pad, pdf.w_pt + pad, top))
+        return True
+
+    def _paint_static_forms(self, pdf: FPDF, labels: int) -> bytes:
+        """Content stream painting the static layer for the first ``labels``."""
+        if labels == self.LABELS_PER_PAGE:
+            return b"/%b Do\n" % _SHEET_FORM.encode()
+        return b"".join(self._place_form(pdf, _LABEL_FORM, i) for i in range(labels))
+
+    def _place_form(self, pdf: FPDF, name: str, label_index: int) -> bytes:
+        """Content stream painting form ``name`` at a label position."""
+        x, y = self._get_label_position(label_index)
+        return b"q 1 0 0 1 %.2f %.2f cm /%b Do Q\n" % (
+            x * pdf.k,
+            -y * pdf.k,
+            name.encode(),
+        )
+
+    @staticmethod
+    def _pop_page(pdf: FPDF, page: int) -> bytes:
+        """Remove a finished page from ``pdf`` and return its content stream."""
+        return _page_content(pdf.pages.pop(page))
+
+
+def _page_content(page: PDFPage) -> bytes:
+    """The content stream drawn on ``page`` so far.
+
+    Raises:
+        TypeError: If FPDF has already wrapped the content for its own output.
+    """
+    contents = page.contents
+    if not isinstance(contents, bytearray):
+        msg = f"Page content already finalised as {type(contents).__name__}"
+        raise TypeError(msg)
+    return bytes(contents)
+
+
+def _render_chunk(
+    template: Avery7160Template, pages: list[list[dict[str, str]]], backend: str
+) -> _RenderedChunk:
+    """Render a chunk of pages in a worker process."""
+    with timings.record() as recorder:
+        pdf = template._setup_pdf(streaming=True)  # noqa: SLF001
+        template._prefit(pdf, itertools.chain.from_iterable(pages))  # noqa: SLF001
+        render_page = template._page_renderer(backend)  # noqa: SLF001
+        rendered = [(render_page(pdf, rows), len(rows)) for rows in pages]
+    fonts = {f"F{font.i}": _font_style(font) for font in pdf.fonts.values()}
+    return rendered, fonts, dict(recorder.counters)
+
+
+def _font_style(font: CoreFont | TTFFont) -> tuple[str, str]:
+    """The ``(family, style)`` that selects ``font`` with ``FPDF.set_font``."""
+    return font.fontkey.removesuffix(font.emphasis.style), font.emphasis.style
+
+
+def _fonts_used(pdf: FPDF, content: bytes) -> dict[str, tuple[str, str]]:
+    """Fonts selected in ``content``, in order of first use, by resource name."""
+    by_name = {f"F{font.i}": font for font in pdf.fonts.values()}
+    names = dict.fromkeys(m.decode() for m in _FONT_SELECTION.findall(content))
+    return {name: _font_style(by_name[name]) for name in names}
+
+
+@functools.cache
+def _software_versions() -> str:
+    """Versions of the code that renders pages, for page cache keys."""
+    return f"school-labels {version('school-labels')}; fpdf2 {FPDF_VERSION}"
@@ -0,0 +1,223 @@
+"""Barcodes and QR codes drawn as vector rectangles.
+
+A symbol is encoded once per distinct value into a PDF path: runs of
+adjacent dark modules along a row are merged into one rectangle, and runs
+repeated on the rows below into a taller one, so a QR code takes a few
+dozen ``re`` operators rather than one per module, filled all at once.
+"""
+
+import re
+from collections.abc import Sequence
+from typing import Literal, NamedTuple
+
+from . import qr
+from .qr import ErrorCorrection
+
+type Symbology = Literal["qr", "code128"]
+
+SYMBOLOGIES: tuple[Symbology, ...] = ("qr", "code128")
+
+# Modules of light space Code 128 needs either side of the bars
+CODE128_QUIET_ZONE = 10
+
+# Bar and space widths of each Code 128 symbol, by value, starting with a bar
+_CODE128_PATTERNS = (
+    "212222", "222122", "222221", "121223", "121322", "131222", "122213",
+    "122312", "132212", "221213", "221312", "231212", "112232", "122132",
+    "122231", "113222", "123122", "123221", "223211", "221132", "221231",
+    "213212", "223112", "312131", "311222", "321122", "321221", "312212",
+    "322112", "322211", "212123", "212321", "232121", "111323", "131123",
+    "131321", "112313", "132113", "132311", "211313", "231113", "231311",
+    "112133", "112331", "132131", "113123", "113321", "133121", "313121",
+    "211331", "231131", "213113", "213311", "213131", "311123", "311321",
+    "331121", "312113", "312311", "332111", "314111", "221411", "431111",
+    "111224", "111422", "121124", "121421", "141122", "141221", "112214",
+    "112412", "122114", "122411", "142112", "142211", "241211", "221114",
+    "413111", "241112", "134111", "111242", "121142", "121241", "114212",
+    "124112", "124211", "411212", "421112", "421211", "212141", "214121",
+    "412121", "111143", "111341", "131141", "114113", "114311", "411113",
+    "411311", "113141", "114131", "311141", "411131", "211412", "211214",
+    "211232",
+)  # fmt: skip
+_CODE128_STOP = "2331112"
+_CODE_C, _CODE_B = 99, 100
+_START_B, _START_C = 104, 105
+
+_DIGITS = re.compile(r"\d*")
+_DARK_RUN = re.compile(r"1+")
+
+
+class Symbol(NamedTuple):
+    """An encoded barcode: filled rectangles on a grid of modules.
+
+    ``width`` and ``height`` count modules, quiet zone included, and
+    ``path`` holds the rectangles as PDF operators in modules from the
+    top-left corner. A linear symbol is one module high, its bars stretched
+    to the height it is drawn at.
+    """
+
+    width: int
+    height: int
+    path: bytes
+    linear: bool
+
+    def operators(self, width: float, height: float) -> bytes:
+        """PDF operators filling a box of ``width`` by ``height`` with the symbol.
+
+        They draw from an origin at the box's top-left corner, in the units
+        the box is given in, with y up as in PDF user space, and end by
+        restoring the graphics state saved with ``q`` before them. A QR code
+        is as large a square as fits, centred in the box.
+        """
+        if self.linear:
+            scale_x, scale_y = width / self.width, height
+        else:
+            scale_x = scale_y = min(width / self.width, height / self.height)
+        left = (width - scale_x * self.width) / 2
+        # Down from the top, where -0.0 would print as "-0.0000"
+        down = (scale_y * self.height - height) / 2 or 0.0
+        return b"%.4f 0 0 %.4f %.4f %.4f cm 0 g\n%b\nf Q" % (
+            scale_x,
+            -scale_y,
+            left,
+            down,
+            self.path,
+        )
+
+
+def encode(
+    text: str, symbology: Symbology, error_correction: ErrorCorrection = "M"
+) -> Symbol:
+    """Encode ``text`` as a symbol; ``error_correction`` applies to QR codes.
+
+    Raises:
+        ValueError: If ``text`` cannot be encoded in the symbology, or the
+            symbology or error correction level is unknown.
+    """
+    if symbology == "qr":
+        rows = qr.encode(text, error_correction)
+        quiet = qr.QUIET_ZONE
+        size = len(rows) + 2 * quiet
+        return Symbol(size, size, _path(_rectangles(rows), quiet, quiet), linear=False)
+    if symbology == "code128":
+        widths = "".join(_CODE128_PATTERNS[v] for v in code128_values(text))
+        widths += _CODE128_STOP
+        x = CODE128_QUIET_ZONE
+        bars = []
+        for i, width in enumerate(map(int, widths)):
+            if i % 2 == 0:
+                bars.append((x, 0, width, 1))
+            x += width
+        size = x + CODE128_QUIET_ZONE
+        return Symbol(size, 1, _path(bars, 0, 0), linear=True)
+    msg = f"Unknown symbology {symbology!r}; choose from {', '.join(SYMBOLOGIES)}"
+    raise ValueError(msg)
+
+
+def problem(
+    text: str, symbology: Symbology, error_correction: ErrorCorrection = "M"
+) -> str | None:
+    """Why :func:`encode` would reject non-empty ``text``, or None if it would not.
+
+    This is checked without encoding the symbol, so input rows can be
+    checked before they are drawn.
+    """
+    if symbology == "code128" and not _code128_encodable(text):
+        return "cannot be encoded in Code 128, which takes printable ASCII only"
+    if symbology == "qr" and not qr.fits(text, error_correction):
+        return f"is too long for a QR code at error correction level {error_correction}"
+    return None
+
+
+def replacement(value: str, symbology: Symbology) -> str:
+    """What to print instead of a column ``value`` in text that has a problem.
+
+    Code 128 gets ``?`` for each character it cannot encode, and a QR code
+    loses the value.
+    """
+    if symbology == "code128":
+        return "".join(c if _code128_encodable(c) else "?" for c in value)
+    return ""
+
+
+def _code128_encodable(text: str) -> bool:
+    return all(" " <= c <= "\x7f" for c in text)
+
+
+def code128_values(text: str) -> list[int]:
+    """Code 128 symbol values for ``text``, from start code to check value.
+
+    Printable ASCII is encoded in code set B, switching to code set C, two
+    digits a symbol, for runs of digits long enough to be shorter that way,
+    as in ISO/IEC 15417 Annex E.
+
+    Raises:
+        ValueError: If ``text`` is empty or not printable ASCII.
+    """
+    if not text or not _code128_encodable(text):
+        msg = f"Code 128 encodes printable ASCII, not {text!r}"
+        raise ValueError(msg)
+    values: list[int] = []
+    code_c = False
+    i = 0
+    while i < len(text):
+        match = _DIGITS.match(text, i)
+        digits = match.end() - i if match else 0
+        if not code_c and _worth_code_c(
+            digits, start=not values, end=i + digits == len(text)
+        ):
+            if digits % 2 and values:
+                # An odd digit goes before the switch, in code set B
+                values.append(ord(text[i]) - 32)
+                i += 1
+            values.append(_CODE_C if values else _START_C)
+            code_c = True
+        if code_c and digits >= 2:  # noqa: PLR2004
+            values.append(int(text[i : i + 2]))
+            i += 2
+            continue
+        if code_c or not values:
+            values.append(_CODE_B if values else _START_B)
+            code_c = False
+        values.append(ord(text[i]) - 32)
+        i += 1
+    check = (values[0] + sum(i * v for i, v in enumerate(values[1:], start=1))) % 103
+    values.append(check)
+    return values
+
+
+def _worth_code_c(digits: int, *, start: bool, end: bool) -> bool:
+    """Whether a run of ``digits`` is shorter in code set C."""
+    if start:
+        return digits >= 4 or (digits == 2 and end)  # noqa: PLR2004
+    return digits >= (4 if end else 6)
+
+
+def _rectangles(rows: Sequence[str]) -> list[tuple[int, int, int, int]]:
+    """Dark modules of ``rows`` as ``(x, y, width, height)`` rectangles.
+
+    Each run of dark modules along a row is one rectangle, extended down
+    over the rows below that have the same run.
+    """
+    done: list[tuple[int, int, int, int]] = []
+    # First row of each run still open, by its start and length
+    open_runs: dict[tuple[int, int], int] = {}
+    for y, row in enumerate(rows):
+        runs = {(m.start(), m.end() - m.start()) for m in _DARK_RUN.finditer(row)}
+        for x, width in open_runs.keys() - runs:
+            top = open_runs.pop((x, width))
+            done.append((x, top, width, y - top))
+        for run in runs - open_runs.keys():
+            open_runs[run] = y
+    done.extend(
+        (x, top, width, len(rows) - top) for (x, width), top in open_runs.items()
+    )
+    return sorted(done, key=lambda r: (r[1], r[0]))
+
+
+def _path(rectangles: Sequence[tuple[int, int, int, int]], x: int, y: int) -> bytes:
+    """``re`` operators for ``rectangles``, moved by ``x`` and ``y`` modules."""
+    return b"\n".join(
+        b"%d %d %d %d re" % (left + x, top + y, width, height)
+        for left, top, width, height in rectangles
+    )
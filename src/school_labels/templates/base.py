@@ -1,13 +1,37 @@
 """Base template classes for label generation."""
 
+import copy
 from abc import ABC, abstractmethod
+from collections.abc import Iterable, Mapping
+from pathlib import Path
+from typing import BinaryIO, ClassVar, Self
 
 from fpdf import FPDF
 
+from school_labels import timings
+from school_labels.cache import PageCache
+from school_labels.fonts import FontMetrics, is_right_to_left, load_font
+from school_labels.progress import Tracker
+from school_labels.validation import ValueCheck
+from school_labels.writer import PdfOptions
+
+from .measure import TEXT_MEASURER
+
 
 class LabelTemplate(ABC):
     """Base class for label templates."""
 
+    # Roles text is drawn in, with the core font each uses unless a
+    # TrueType font is configured for it with with_fonts(); a layout
+    # template sets its own per instance
+    FONTS: Mapping[str, str] = {}
+
+    # TrueType fonts by role, as set by with_fonts()
+    fonts: Mapping[str, FontMetrics] = {}
+
+    # Ways of drawing labels that write_pdf() accepts as its backend
+    BACKENDS: ClassVar[tuple[str, ...]] = ("fpdf",)
+
     @property
     @abstractmethod
     def name(self) -> str:
@@ -23,27 +47,120 @@ class LabelTemplate(ABC):
     def pdf_title(self) -> str:
         """Title for PDF metadata."""
 
+    @property
+    def unique_columns(self) -> list[str]:
+        """Columns whose values should not repeat between rows."""
+        return []
+
+    @property
+    def charset(self) -> str | frozenset[int]:
+        """Characters every printed value must be drawn from.
+
+        Either an encoding, or the code points that all of the template's
+        fonts have glyphs for, less right-to-left letters, which they cannot
+        draw in order.
+        """
+        if not self.fonts:
+            # fpdf2 encodes text for its built-in fonts as latin-1
+            return "latin-1"
+        covered = frozenset.intersection(
+            *(frozenset(metrics.cmap) for metrics in self.fonts.values())
+        )
+        if len(self.fonts) < len(self.FONTS):
+            covered &= frozenset(range(256))
+        return frozenset(code for code in covered if not is_right_to_left(code))
+
+    @property
+    def value_checks(self) -> list[ValueCheck]:
+        """Checks of values made from each row, such as barcode texts."""
+        return []
+
+    def with_fonts(
+        self, fonts: Mapping[str, Path | str], cache_dir: Path | str | None = None
+    ) -> Self:
+        """Return a copy of the template drawing some roles in TrueType fonts.
+
+        Args:
+            fonts: Font file paths by role, a key of :attr:`FONTS`.
+            cache_dir: Where to cache font metrics, as for
+                :func:`~school_labels.fonts.load_font`.
+
+        Raises:
+            ValueError: If a role is unknown or a file is not a TrueType font.
+            OSError: If a font file cannot be read.
+        """
+        unknown = [role for role in fonts if role not in self.FONTS]
+        if unknown:
+            msg = (
+                f"Unknown font roles for {self.name}: {', '.join(unknown)}. "
+                f"Roles: {', '.join(self.FONTS)}"
+            )
+            raise ValueError(msg)
+        template = copy.copy(self)
+        template.fonts = {
+            **self.fonts,
+            **{role: load_font(path, cache_dir) for role, path in fonts.items()},
+        }
+        return template
+
+    def check_backend(self, backend: str) -> None:
+        """Check that labels can be drawn with ``backend``.
+
+        Raises:
+            ValueError: If the template does not offer ``backend``.
+        """
+        if backend not in self.BACKENDS:
+            msg = (
+                f"Backend {backend!r} is not available for {self.name}. "
+                f"Backends: {', '.join(self.BACKENDS)}"
+            )
+            raise ValueError(msg)
+
+    def font_family(self, role: str) -> str:
+        """Family to pass to ``FPDF.set_font`` for text in ``role``."""
+        metrics = self.fonts.get(role)
+        return metrics.family if metrics else self.FONTS[role]
+
     @abstractmethod
     def create_pdf(
         self, data: list[dict[str, str]], break_column: str | None = None
     ) -> FPDF:
         """Create PDF with labels."""
 
+    @abstractmethod
+    def write_pdf(  # noqa: PLR0913
+        self,
+        data: Iterable[Mapping[str, str]],
+        out: BinaryIO,
+        break_column: str | None = None,
+        *,
+        jobs: int = 1,
+        page_cache: PageCache | None = None,
+        pdf_options: PdfOptions | None = None,
+        backend: str = "fpdf",
+        progress: Tracker | None = None,
+    ) -> int:
+        """Stream PDF with labels to ``out`` page by page. Returns page count.
+
+        ``jobs`` is the number of worker processes to render with. Pages
+        found in ``page_cache`` are reused instead of being rendered again.
+        ``pdf_options`` choose how the PDF is encoded, and ``backend`` how
+        labels are drawn; see :meth:`check_backend`. ``progress`` is told
+        of each page written, and may stop the run by raising
+        :class:`~school_labels.progress.CancelledError`.
+        """
+
     @staticmethod
     def _fit_text(pdf: FPDF, text: str, max_width: float) -> str:
-        """Truncate text with ellipsis if it exceeds max_width in the current font."""
-        text_width = pdf.get_string_width(text)
-        if text_width <= max_width:
-            return text
-        ellipsis = "..."
-        ellipsis_width = pdf.get_string_width(ellipsis)
-        if ellipsis_width >= max_width:
-            return ""
-        cut = int(len(text) * (max_width - ellipsis_width) / text_width)
-        text = text[:cut]
-        while text and pdf.get_string_width(text + ellipsis) > max_width:
-            text = text[:-1]
-        return text + ellipsis
+        """Truncate text with ellipsis if it exceeds max_width in the current font.
+
+        Decisions are memoized in :data:`TEXT_MEASURER`, so repeated values are
+        only measured once per font.
+        """
+        fitted = TEXT_MEASURER.fit_text(pdf, text, max_width)
+        if fitted != text:
+            timings.current().count("truncations")
+        return fitted
 
     @staticmethod
     def _shrink_text(pdf: FPDF, text: str, max_width: float) -> str:
@@ -52,8 +169,8 @@ class LabelTemplate(ABC):
         Side effect: if the text is too wide, reduces the active font size on
         ``pdf`` to fit. The caller is responsible for resetting the font afterwards.
         """
-        text_width = pdf.get_string_width(text)
-        if text_width <= max_width:
-            return text
-        pdf.set_font_size(pdf.font_size_pt * max_width / text_width)
+        size = TEXT_MEASURER.shrink_size(pdf, text, max_width)
+        if size != pdf.font_size_pt:
+            pdf.set_font_size(size)
+            timings.current().count("shrinks")
         return text
@@ -1,110 +1,119 @@
-"""Email password labels template for Avery 7160."""
+"""Email password labels templates for Avery 7160."""
 
-from typing import override
+from typing import ClassVar, override
 
-from fpdf import FPDF
+from .layout import AVERY_7160, Barcode, Box, Caption, Field, Font, Layout, Rule
+from .layout_template import LayoutTemplate
 
-from .avery7160 import Avery7160Template
+_H_PADDING = 2.8
+_V_PADDING = 4.2
 
+# Full content width
+_FULL_WIDTH = AVERY_7160.label_width - (2 * _H_PADDING)
 
-class EmailPasswordTemplate(Avery7160Template):
-    """Email password labels template."""
+# Top of each row, from the top of the label
+_NAME = _V_PADDING
+_RULE = _NAME + 4.4
+_CAPTIONS = _RULE + 2.1  # 6pt ≈ 2.1mm
+_VALUES = _CAPTIONS + 3.2  # 9pt ≈ 3.2mm
+_EMAIL_CAPTION = _VALUES + 5.6  # 16pt ≈ 5.6mm
+_EMAIL = _EMAIL_CAPTION + 3.2  # 9pt ≈ 3.2mm
+_PASSWORD_CAPTION = _EMAIL + 5.6  # 16pt ≈ 5.6mm
+_PASSWORD = _PASSWORD_CAPTION + 3.2  # 9pt ≈ 3.2mm
 
-    H_PADDING: float = 2.8
-    V_PADDING: float = 4.2
+_CAPTION_FONT = Font("sans", 7)
+_VALUE_FONT = Font("sans", 11)
 
-    @property
-    @override
-    def name(self) -> str:
-        return "email-password"
+
+def _credentials(width: float) -> tuple[Caption | Rule | Field, ...]:
+    """Name, admin number, group, email and password, ``width`` mm wide.
+
+    The name and the rule under it span the label whatever ``width`` is.
+    """
+    # col1 (admin) sits left, col2 (group) sits right. Each is nudged 1mm
+    # narrower so the gap between them is ~5mm rather than <1mm.
+    col1 = int(width / 3) - 1
+    col2 = (col1 * 2) - 1
+    col2_x = _H_PADDING + width - col2
+    return (
+        # Horizontal line (spans full label width)
+        Rule(0, _RULE, AVERY_7160.label_width, _RULE),
+        # Captions, 8pt high ≈ 2.8mm
+        Caption("Admin no.", Box(_H_PADDING, _CAPTIONS, col1, 2.8), _CAPTION_FONT),
+        Caption("Group", Box(col2_x, _CAPTIONS, col2, 2.8), _CAPTION_FONT),
+        Caption("Email", Box(_H_PADDING, _EMAIL_CAPTION, width, 2.8), _CAPTION_FONT),
+        Caption(
+            "Password",
+            Box(_H_PADDING, _PASSWORD_CAPTION, width, 2.8),
+            _CAPTION_FONT,
+        ),
+        Field(
+            "{first_name} {last_name}",
+            Box(_H_PADDING, _NAME, _FULL_WIDTH, 4.2),
+            _VALUE_FONT,
+        ),
+        Field("{admin}", Box(_H_PADDING, _VALUES, col1, 3.5), _VALUE_FONT),
+        Field("{group}", Box(col2_x, _VALUES, col2, 3.5), _VALUE_FONT),
+        Field(
+            "{email}",
+            Box(_H_PADDING, _EMAIL, width, 4.2),
+            _VALUE_FONT,
+            overflow="shrink",
+        ),
+        # Monospaced, Courier by default, like the Ruby template
+        Field(
+            "{password}",
+            Box(_H_PADDING, _PASSWORD, width, 4.2),
+            Font("mono", 11),
+            overflow="shrink",
+        ),
+    )
+
+
+EMAIL_PASSWORD = Layout(
+    name="email-password",
+    title="Account stickers",
+    sheet=AVERY_7160,
+    fonts={"sans": "Helvetica", "mono": "Courier"},
+    items=_credentials(_FULL_WIDTH),
+    unique_columns=("admin", "email"),
+)
+
+
+class EmailPasswordTemplate(LayoutTemplate):
+    """Email password labels template."""
+
+    LAYOUT: ClassVar[Layout] = EMAIL_PASSWORD
 
     @property
     @override
     def required_columns(self) -> list[str]:
+        # In the order of the export, rather than of the label
         return ["admin", "last_name", "first_name", "group", "email", "password"]
 
-    @property
-    @override
-    def pdf_title(self) -> str:
-        return "Account stickers"
 
-    @override
-    def _draw_label_content(
-        self, pdf: FPDF, x: float, y: float, data: dict[str, str]
-    ) -> None:
-        """Draw email and password labels."""
-        full_width = self.LABEL_WIDTH - (2 * self.H_PADDING)
-        # col1 (admin) sits left, col2 (group) sits right. Each is nudged 1mm
-        # narrower so the gap between them is ~5mm rather than <1mm.
-        col1 = int(full_width / 3) - 1
-        col2 = (col1 * 2) - 1
-
-        # Starting position with padding
-        content_x = x + self.H_PADDING
-        current_y = y + self.V_PADDING
-
-        # Name section
-        pdf.set_xy(content_x, current_y)
-        pdf.set_font("Helvetica", "", 11)
-        name_text = f"{data.get('first_name', '')} {data.get('last_name', '')}"
-        pdf.cell(full_width, 4.2, self._fit_text(pdf, name_text, full_width))
+# A QR code of the email beside the text, above a Code 128 barcode of the
+# admin number, each box holding its symbol's quiet zone
+_CODE_WIDTH = 19.2
+_CODE_X = AVERY_7160.label_width - _H_PADDING - _CODE_WIDTH
+_QR = Box(_CODE_X, _RULE + 1, _CODE_WIDTH, _CODE_WIDTH)
+_BARCODE = Box(_CODE_X, _QR.y + _QR.height + 0.5, _CODE_WIDTH, 5.4)
 
-        # Horizontal line (spans full label width)
-        current_y += 4.4
-        pdf.line(x, current_y, x + self.LABEL_WIDTH, current_y)
-
-        # Move down after line
-        current_y += 2.1  # 6pt ≈ 2.1mm
-
-        # Admin no. and Group labels (7pt font)
-        pdf.set_font("Helvetica", "", 7)
-        pdf.set_xy(content_x, current_y)
-        pdf.cell(col1, 2.8, "Admin no.")  # 8pt height ≈ 2.8mm
-        pdf.set_xy(content_x + full_width - col2, current_y)
-        pdf.cell(col2, 2.8, "Group")
-
-        # Move down for values
-        current_y += 3.2  # 9pt ≈ 3.2mm
-
-        # Admin and Group values
-        pdf.set_font("Helvetica", "", 11)
-        pdf.set_xy(content_x, current_y)
-        admin_text = data.get("admin", "")
-        pdf.cell(col1, 3.5, self._fit_text(pdf, admin_text, col1))
-        pdf.set_xy(content_x + full_width - col2, current_y)
-        group_text = data.get("group", "")
-        pdf.cell(col2, 3.5, self._fit_text(pdf, group_text, col2))
-
-        # Move down
-        current_y += 5.6  # 16pt ≈ 5.6mm
-
-        # Email label
-        pdf.set_font("Helvetica", "", 7)
-        pdf.set_xy(content_x, current_y)
-        pdf.cell(full_width, 2.8, "Email")
-
-        # Move down for email value
-        current_y += 3.2  # 9pt ≈ 3.2mm
-
-        # Email value
-        pdf.set_font("Helvetica", "", 11)
-        pdf.set_xy(content_x, current_y)
-        email_text = data.get("email", "")
-        pdf.cell(full_width, 4.2, self._shrink_text(pdf, email_text, full_width))
-
-        # Move down
-        current_y += 5.6  # 16pt ≈ 5.6mm
-
-        # Password label
-        pdf.set_font("Helvetica", "", 7)
-        pdf.set_xy(content_x, current_y)
-        pdf.cell(full_width, 2.8, "Password")
-
-        # Move down for password value
-        current_y += 3.2  # 9pt ≈ 3.2mm
-
-        # Password value (using Courier font like Ruby template)
-        pdf.set_font("Courier", "", 11)
-        pdf.set_xy(content_x, current_y)
-        password_text = data.get("password", "")
-        pdf.cell(full_width, 4.2, self._shrink_text(pdf, password_text, full_width))
+EMAIL_PASSWORD_CODES = EMAIL_PASSWORD._replace(
+    name="email-password-codes",
+    items=(
+        *_credentials(_CODE_X - _H_PADDING - 1.5),
+        Barcode("{email}", _QR),
+        Barcode("{admin}", _BARCODE, "code128"),
+    ),
+)
+
+
+class EmailPasswordCodesTemplate(EmailPasswordTemplate):
+    """Email password labels with codes for scanners.
+
+    A QR code of the email and a Code 128 barcode of the admin number sit
+    to the right of the text, which is narrower to make room.
+    """
+
+    LAYOUT: ClassVar[Layout] = EMAIL_PASSWORD_CODES
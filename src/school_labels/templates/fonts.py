@@ -0,0 +1,126 @@
+"""TrueType fonts for FPDF that are built from cached metrics."""
+
+from collections import defaultdict
+from pathlib import Path
+from typing import override
+
+from fpdf import FPDF
+from fpdf.enums import FontDescriptorFlags, TextEmphasis
+from fpdf.fonts import PDFFontDescriptor, TTFFont
+from fpdf.util import escape_parens
+
+from school_labels.fonts import FontMetrics, is_right_to_left
+
+
+class GlyphIdFont(TTFFont):
+    """A TrueType font for FPDF that encodes text as the font's own glyph ids.
+
+    FPDF numbers the glyphs of a TrueType font in the order a document first
+    uses them, so the same text is encoded differently on different pages,
+    processes and runs. This font writes each character as its glyph id in
+    the font file instead, so a page's content only depends on its own text
+    and can be rendered in any process or reused from the page cache.
+    :class:`~school_labels.writer.PdfWriter` embeds one subset of the font
+    per document, keeping the glyph ids of every glyph the pages used.
+
+    The font is built from :class:`~school_labels.fonts.FontMetrics`, so the
+    font file is not parsed. It is only for content handed to a
+    :class:`~school_labels.writer.PdfWriter`; ``FPDF.output`` cannot embed it.
+
+    Skipping ``TTFFont.__init__`` means setting every attribute it sets,
+    which are fpdf2 internals: the dependency is pinned to the fpdf2
+    releases this matches.
+    """
+
+    def __init__(
+        self, index: int, fontkey: str, style: str, metrics: FontMetrics
+    ) -> None:
+        """Create font number ``index`` of a document from its metrics."""
+        # TTFFont.__init__ parses the font file, which the metrics replace
+        self.i = index
+        self.type = "TTF"
+        self.ttffile = Path(metrics.path)
+        self.fontkey = fontkey
+        self.name = metrics.name
+        self.emphasis = TextEmphasis.coerce(style)
+        self.scale = 1.0
+        self.desc = PDFFontDescriptor(
+            ascent=metrics.ascent,
+            descent=metrics.descent,
+            cap_height=metrics.cap_height,
+            flags=FontDescriptorFlags(metrics.flags),
+            font_b_box="[{} {} {} {}]".format(*metrics.bbox),
+            italic_angle=metrics.italic_angle,
+            stem_v=metrics.stem_v,
+            missing_width=metrics.default_width,
+        )
+        widths = metrics.widths
+        self.cw = defaultdict(
+            lambda: metrics.default_width,
+            {code: widths[gid] for code, gid in metrics.cmap.items()},
+        )
+        # Glyph names are not kept: characters map straight to glyph ids
+        self.cmap = {}
+        self.glyph_ids = metrics.cmap
+        self.missing_glyphs = []
+        self.up = metrics.underline_position
+        self.ut = metrics.underline_thickness
+        self.sp = metrics.strikeout_position
+        self.ss = metrics.strikeout_size
+        self.subset = _GlyphIds(self)
+        self.biggest_size_pt = 0
+        self.ttfont = None
+        self._hbfont = None
+        self.color_font = None
+        self.palette_index = 0
+        self.unicode_range = None
+        self.is_compressed = False
+        self.is_cff = False
+        self.is_cid_keyed = False
+        self.is_symbol = False
+        self.cff_ros = None
+        self.collection_font_number = 0
+        self.metrics = metrics
+
+    @override
+    def escape_text(self, text: str) -> str:
+        # Two bytes per glyph id, for the Identity-H encoding
+        return escape_parens(
+            "".join(chr(gid >> 8) + chr(gid & 0xFF) for gid in map(ord, text))
+        )
+
+    @override
+    def close(self) -> None:
+        pass
+
+
+class _GlyphIds:
+    """Stands in for FPDF's subset map, picking glyph ids from the font's cmap."""
+
+    def __init__(self, font: GlyphIdFont) -> None:
+        self._font = font
+
+    def pick(self, unicode: int) -> int | None:
+        """Glyph id for a character, or None if the font lacks it.
+
+        Raises:
+            ValueError: If the character is a right-to-left letter, which
+                would be drawn out of order and unjoined.
+        """
+        if is_right_to_left(unicode):
+            msg = (
+                f"{chr(unicode)!r} (U+{unicode:04X}) is written right to left, "
+                "which TrueType fonts cannot draw here: text is not shaped"
+            )
+            raise ValueError(msg)
+        gid = self._font.glyph_ids.get(unicode)
+        if gid is None and unicode not in self._font.missing_glyphs:
+            self._font.missing_glyphs.append(unicode)
+        return gid
+
+
+def add_font(pdf: FPDF, metrics: FontMetrics, style: str = "") -> None:
+    """Register a :class:`GlyphIdFont` with ``pdf`` as family ``metrics.family``."""
+    fontkey = f"{metrics.family}{style}"
+    if fontkey not in pdf.fonts:
+        pdf.fonts[fontkey] = GlyphIdFont(len(pdf.fonts) + 1, fontkey, style, metrics)
@@ -0,0 +1,369 @@
+"""Declarative label layouts and their compilation into draw programs.
+
+A :class:`Layout` describes a label as data: the sheet it is printed on,
+the fonts it uses by role, and the captions, rules, fields and barcodes
+drawn on each label. :func:`compile_layout` turns it into a :class:`DrawProgram`
+once per template, with every offset, font change and text getter worked
+out ahead of time, so drawing a row is a loop over precomputed operations.
+"""
+
+import string
+from collections.abc import Callable, Iterable, Mapping
+from typing import Literal, NamedTuple
+
+from school_labels.validation import ValueCheck
+
+from . import barcode
+from .barcode import Symbology
+from .measure import DEFAULT_MAXSIZE, FitField, LRUCache
+from .qr import ERROR_CORRECTION_LEVELS, ErrorCorrection
+
+type Overflow = Literal["truncate", "shrink"]
+
+
+class Sheet(NamedTuple):
+    """A sheet of equally sized labels in a grid. Lengths are in mm."""
+
+    width: float
+    height: float
+    label_width: float
+    label_height: float
+    across: int
+    down: int
+    left_margin: float
+    top_margin: float
+    h_spacing: float = 0
+    v_spacing: float = 0
+
+    @property
+    def labels_per_page(self) -> int:
+        """Number of labels on one sheet."""
+        return self.across * self.down
+
+
+# A4 sheet of 21 labels, 63.5 x 38.1mm
+AVERY_7160 = Sheet(
+    width=210,
+    height=297,
+    label_width=63.5,
+    label_height=38.1,
+    across=3,
+    down=7,
+    left_margin=7.25,
+    top_margin=15.15,
+    h_spacing=2.5,
+    v_spacing=0,
+)
+
+
+class Box(NamedTuple):
+    """A cell on a label, from the label's top-left corner. Lengths are in mm."""
+
+    x: float
+    y: float
+    width: float
+    height: float
+
+
+class Font(NamedTuple):
+    """Font for text on a label: a role of :attr:`Layout.fonts` and a size in pt."""
+
+    role: str
+    size: float
+    style: str = ""
+
+
+class Caption(NamedTuple):
+    """Text that is the same on every label."""
+
+    text: str
+    box: Box
+    font: Font
+
+
+class Rule(NamedTuple):
+    """A line drawn on every label, from ``(x1, y1)`` to ``(x2, y2)`` in mm."""
+
+    x1: float
+    y1: float
+    x2: float
+    y2: float
+
+
+class Field(NamedTuple):
+    """Text taken from each row.
+
+    ``text`` is a format string naming columns, such as ``"{email}"`` or
+    ``"{first_name} {last_name}"``. Missing columns are drawn as empty.
+    Text wider than the box is cut short with an ellipsis, or with
+    ``overflow="shrink"``, drawn in a smaller font size.
+    """
+
+    text: str
+    box: Box
+    font: Font
+    overflow: Overflow = "truncate"
+
+
+class Barcode(NamedTuple):
+    """A QR code or Code 128 barcode of text from each row.
+
+    ``text`` is a format string naming columns, as for :class:`Field`, such
+    as ``"{admin}"`` or ``"https://portal.example.org/login?user={email}"``.
+    The symbol fills ``box``, quiet zone included: a QR code as the largest
+    square that fits, centred, and Code 128 bars across its whole width and
+    height. Rows whose text is empty get no symbol. ``error_correction`` is
+    the QR code's level, from ``"L"`` (7% of it may be lost) to ``"H"``
+    (30%); higher levels need more modules.
+    """
+
+    text: str
+    box: Box
+    symbology: Symbology = "qr"
+    error_correction: ErrorCorrection = "M"
+
+    def check(self) -> ValueCheck:
+        """Check that each row's text can be encoded, before it is drawn."""
+        return ValueCheck(
+            "barcode",
+            tuple(dict.fromkeys(_columns(self.text))),
+            _field_text(self.text),
+            lambda text: barcode.problem(text, self.symbology, self.error_correction),
+            lambda value: barcode.replacement(value, self.symbology),
+        )
+
+
+class Layout(NamedTuple):
+    """A label template described as data.
+
+    ``fonts`` gives the core font for each role text is drawn in; see
+    :attr:`~school_labels.templates.LabelTemplate.FONTS`. ``items`` are
+    drawn in order: captions and rules form the static layer, painted once
+    per label, fields are filled in from each row, and barcodes are drawn
+    after the fields.
+    """
+
+    name: str
+    title: str
+    sheet: Sheet
+    fonts: Mapping[str, str]
+    items: tuple[Caption | Rule | Field | Barcode, ...]
+    unique_columns: tuple[str, ...] = ()
+
+    @property
+    def columns(self) -> list[str]:
+        """Columns the fields and barcodes read, in order of first use."""
+        names = (
+            name
+            for item in self.items
+            if isinstance(item, Field | Barcode)
+            for name in _columns(item.text)
+        )
+        return list(dict.fromkeys(names))
+
+
+class LineOp(NamedTuple):
+    """Draw a line, offset from the label's top-left corner."""
+
+    x1: float
+    y1: float
+    x2: float
+    y2: float
+
+
+class CellOp(NamedTuple):
+    """Draw fixed text in a cell, offset from the label's top-left corner.
+
+    ``set_font`` is false when the previous operation left the font active.
+    """
+
+    dx: float
+    dy: float
+    width: float
+    height: float
+    text: str
+    family: str
+    style: str
+    size: float
+    set_font: bool
+
+
+class FieldOp(NamedTuple):
+    """Draw text from a row in a cell, fitted or shrunk to its width."""
+
+    dx: float
+    dy: float
+    width: float
+    height: float
+    text: Callable[[Mapping[str, str]], str]
+    family: str
+    style: str
+    size: float
+    set_font: bool
+    shrink: bool
+
+
+class BarcodeOp(NamedTuple):
+    """Draw a barcode of text from a row in a cell.
+
+    ``symbol`` gives the PDF operators drawing a value's symbol to fill the
+    cell, from its top-left corner in mm, as :meth:`barcode.Symbol.operators`
+    does; it caches them per distinct value.
+    """
+
+    dx: float
+    dy: float
+    width: float
+    height: float
+    text: Callable[[Mapping[str, str]], str]
+    symbol: Callable[[str], bytes]
+
+
+class DrawProgram(NamedTuple):
+    """A layout compiled for one template's fonts."""
+
+    static: tuple[LineOp | CellOp, ...]
+    fields: tuple[FieldOp, ...]
+    fit_fields: tuple[FitField, ...]
+    codes: tuple[BarcodeOp, ...] = ()
+
+
+def compile_layout(layout: Layout, family: Callable[[str], str]) -> DrawProgram:
+    """Resolve a layout into the operations that draw it.
+
+    Args:
+        layout: Layout to compile.
+        family: Font family to draw a font role in, as passed to
+            ``FPDF.set_font``.
+
+    Raises:
+        ValueError: If an item uses a font role the layout does not define,
+            a field's or barcode's text is not a format string of column
+            names, or its overflow, symbology or error correction level is
+            unknown.
+    """
+    static: list[LineOp | CellOp] = []
+    fields: list[FieldOp] = []
+    codes: list[BarcodeOp] = []
+    for item in layout.items:
+        if isinstance(item, Rule):
+            static.append(LineOp(*item))
+            continue
+        if isinstance(item, Barcode):
+            codes.append(_barcode_op(item))
+            continue
+        if item.font.role not in layout.fonts:
+            msg = f"Unknown font role {item.font.role!r} in layout {layout.name}"
+            raise ValueError(msg)
+        font = (family(item.font.role), item.font.style, item.font.size)
+        if isinstance(item, Caption):
+            static.append(CellOp(*item.box, item.text, *font, set_font=True))
+        elif item.overflow in {"truncate", "shrink"}:
+            shrink = item.overflow == "shrink"
+            text = _field_text(item.text)
+            fields.append(FieldOp(*item.box, text, *font, set_font=True, shrink=shrink))
+        else:
+            msg = f"Unknown overflow {item.overflow!r} for field {item.text!r}"
+            raise ValueError(msg)
+
+    return DrawProgram(
+        tuple(
+            op if isinstance(op, LineOp) else op._replace(set_font=set_font)
+            for op, set_font in zip(static, _sets_font(static), strict=True)
+        ),
+        tuple(
+            op._replace(set_font=set_font)
+            for op, set_font in zip(fields, _sets_font(fields), strict=True)
+        ),
+        tuple(
+            FitField(op.text, op.family, op.style, op.size, op.width, op.shrink)
+            for op in fields
+        ),
+        tuple(codes),
+    )
+
+
+def _barcode_op(item: Barcode) -> BarcodeOp:
+    """Compile a barcode, with a cache of the operators drawing each value."""
+    if item.symbology not in barcode.SYMBOLOGIES:
+        msg = f"Unknown symbology {item.symbology!r} for barcode {item.text!r}"
+        raise ValueError(msg)
+    if item.error_correction not in ERROR_CORRECTION_LEVELS:
+        msg = (
+            f"Unknown error correction level {item.error_correction!r} "
+            f"for barcode {item.text!r}"
+        )
+        raise ValueError(msg)
+    box = item.box
+    symbols: LRUCache[str, bytes] = LRUCache(DEFAULT_MAXSIZE)
+
+    def operators(value: str) -> bytes:
+        symbol = barcode.encode(value, item.symbology, item.error_correction)
+        return symbol.operators(box.width, box.height)
+
+    return BarcodeOp(
+        *box,
+        _field_text(item.text),
+        lambda value: symbols.get_or_compute(value, lambda: operators(value)),
+    )
+
+
+def _sets_font(ops: Iterable[LineOp | CellOp | FieldOp]) -> list[bool]:
+    """Whether each operation must set its font, as it is not already active.
+
+    The first text always sets its font, as nothing is known of what was
+    drawn before, and so does text after a shrunk field, which leaves a
+    smaller size active. Lines never set one.
+    """
+    sets = []
+    active = None
+    for op in ops:
+        if isinstance(op, LineOp):
+            sets.append(False)
+            continue
+        font = (op.family, op.style, op.size)
+        sets.append(font != active)
+        active = None if isinstance(op, FieldOp) and op.shrink else font
+    return sets
+
+
+def _columns(text: str) -> list[str]:
+    """Column names in a field's format string."""
+    return [
+        name for _, name, _, _ in string.Formatter().parse(text) if name is not None
+    ]
+
+
+def _field_text(text: str) -> Callable[[Mapping[str, str]], str]:
+    """Compile a field's format string into a function of a row."""
+    parsed = list(string.Formatter().parse(text))
+    for _, name, spec, conversion in parsed:
+        if name is None:
+            continue
+        # Positional, attribute and index fields would not look up a column
+        if (
+            not name
+            or name.isdigit()
+            or "." in name
+            or "[" in name
+            or spec
+            or conversion
+        ):
+            msg = f"Field text must name columns like '{{email}}', got {text!r}"
+            raise ValueError(msg)
+    if len(parsed) == 1 and parsed[0][0] == "" and parsed[0][1] is not None:
+        column = parsed[0][1]
+        return lambda row: row.get(column, "")
+    return lambda row: text.format_map(_BlankMissing(row))
+
+
+class _BlankMissing:
+    """Row lookup for ``str.format_map`` giving missing columns as empty."""
+
+    __slots__ = ("row",)
+
+    def __init__(self, row: Mapping[str, str]) -> None:
+        self.row = row
+
+    def __getitem__(self, key: str) -> str:
+        return self.row.get(key, "")
@@ -0,0 +1,230 @@
+"""Label template drawn from a declarative layout."""
+
+import functools
+from collections.abc import Callable, Iterator, Mapping, Sequence
+from typing import Any, ClassVar, override
+
+from fpdf import FPDF
+from fpdf.util import escape_parens
+
+from school_labels.validation import ValueCheck
+
+from .avery7160 import Avery7160Template
+from .layout import Barcode, DrawProgram, Layout, LineOp, compile_layout
+from .measure import FitField
+
+
+class LayoutTemplate(Avery7160Template):
+    """Template for any grid sheet, drawn from a :class:`Layout`.
+
+    The layout is compiled into a :class:`DrawProgram` the first time a
+    label is drawn, for the fonts the template then has, so each row is
+    drawn by a loop over precomputed cell offsets and font changes.
+
+    A new template is a layout, not a subclass::
+
+        template = LayoutTemplate(Layout(name="name-badge", ...))
+
+    Subclasses can instead set :attr:`LAYOUT` and be created without
+    arguments, as the template registry does.
+
+    With core fonts, labels can also be drawn by the ``"direct"`` backend,
+    which writes each text's operators straight into the page's content
+    stream rather than going through ``FPDF.set_xy`` and ``FPDF.cell``.
+
+    Barcodes have no FPDF equivalent, so both backends write their paths
+    into the content stream, placed by a translation of operators encoded
+    once per distinct value.
+    """
+
+    LAYOUT: ClassVar[Layout]
+
+    BACKENDS: ClassVar[tuple[str, ...]] = ("fpdf", "direct")
+
+    def __init__(self, layout: Layout | None = None) -> None:
+        """Create a template drawing ``layout``, or the class's :attr:`LAYOUT`."""
+        self.layout = layout or self.LAYOUT
+        sheet = self.layout.sheet
+        # Instance attributes shadow the Avery 7160 geometry of the base class
+        self.FONTS = self.layout.fonts
+        self.SHEET_WIDTH, self.SHEET_HEIGHT = sheet.width, sheet.height
+        self.LABEL_WIDTH, self.LABEL_HEIGHT = sheet.label_width, sheet.label_height
+        self.LABELS_PER_ROW, self.LABELS_PER_COL = sheet.across, sheet.down
+        self.LEFT_MARGIN, self.TOP_MARGIN = sheet.left_margin, sheet.top_margin
+        self.H_SPACING, self.V_SPACING = sheet.h_spacing, sheet.v_spacing
+        self.LABELS_PER_PAGE = sheet.labels_per_page
+
+    def __getstate__(self) -> dict[str, Any]:
+        """State for copies and worker processes, without the compiled program.
+
+        The program holds functions that cannot be pickled, and a copy made
+        by :meth:`with_fonts` must compile its own for its fonts.
+        """
+        state = self.__dict__.copy()
+        state.pop("_program", None)
+        return state
+
+    @property
+    @override
+    def name(self) -> str:
+        return self.layout.name
+
+    @property
+    @override
+    def required_columns(self) -> list[str]:
+        return self.layout.columns
+
+    @property
+    @override
+    def unique_columns(self) -> list[str]:
+        return list(self.layout.unique_columns)
+
+    @property
+    @override
+    def value_checks(self) -> list[ValueCheck]:
+        return [item.check() for item in self.layout.items if isinstance(item, Barcode)]
+
+    @property
+    @override
+    def pdf_title(self) -> str:
+        return self.layout.title
+
+    @functools.cached_property
+    def _program(self) -> DrawProgram:
+        return compile_layout(self.layout, self.font_family)
+
+    @override
+    def check_backend(self, backend: str) -> None:
+        super().check_backend(backend)
+        if backend == "direct" and self.fonts:
+            msg = "The direct backend only draws core fonts, not TrueType fonts"
+            raise ValueError(msg)
+
+    @override
+    def _page_renderer(
+        self, backend: str
+    ) -> Callable[[FPDF, Sequence[Mapping[str, str]]], bytes]:
+        if backend == "direct":
+            self.check_backend(backend)
+            return self._render_page_direct
+        return super()._page_renderer(backend)
+
+    def _render_page_direct(
+        self, pdf: FPDF, rows: Sequence[Mapping[str, str]]
+    ) -> bytes:
+        """Draw one page of labels as :meth:`_render_page` does, without FPDF cells.
+
+        ``pdf`` still selects fonts and fits text, so that font changes and
+        measurements are tracked exactly as on the FPDF path, but each
+        non-empty text is written as the operators ``FPDF.cell`` would emit
+        for it: a font selection when one is due, then one positioned
+        ``Tj``. The content is the same, byte for byte.
+        """
+        # An empty page starts the content as FPDF does, and resets its font
+        parts = [self._render_page(pdf, ())]
+        k, page_height = pdf.k, pdf.h
+        encoding = pdf.core_fonts_encoding
+        fields = self._program.fields
+        for (x, y), row in zip(self._label_positions, rows, strict=False):
+            for op in fields:
+                if op.set_font:
+                    pdf.set_font(op.family, op.style, op.size)
+                if op.shrink:
+                    text = self._shrink_text(pdf, op.text(row), op.width)
+                else:
+                    text = self._fit_text(pdf, op.text(row), op.width)
+                if not text:
+                    continue
+                # Fitting measured it, so FPDF has raised for text the font's
+                # encoding cannot represent
+                encoded = text.encode(encoding)
+                if not pdf.current_font_is_set_on_page:
+                    # The program's first field always selects a font
+                    font = pdf.current_font
+                    if font is None:
+                        msg = "No font selected before drawing text"
+                        raise RuntimeError(msg)
+                    parts.append(b"BT /F%d %.2f Tf ET\n" % (font.i, pdf.font_size_pt))
+                    pdf.current_font_is_set_on_page = True
+                # Same arithmetic as FPDF: text sits on a baseline 0.3 of the
+                # font size below the middle of the cell
+                top = page_height - (y + op.dy) - 0.5 * op.height
+                parts.append(
+                    b"BT %.2f %.2f Td (%b) Tj ET\n"
+                    % (
+                        (x + op.dx) * k,
+                        (top - 0.3 * pdf.font_size) * k,
+                        escape_parens(encoded),
+                    )
+                )
+            if self._program.codes:
+                # Each on its own line, as FPDF writes operators
+                parts.extend(c + b"\n" for c in self._barcode_content(pdf, x, y, row))
+        return b"".join(parts)
+
+    def _barcode_content(
+        self, pdf: FPDF, x: float, y: float, row: Mapping[str, str]
+    ) -> Iterator[bytes]:
+        """Operators drawing each barcode with text of a label at ``(x, y)``."""
+        k, page_height = pdf.k, pdf.h
+        for op in self._program.codes:
+            value = op.text(row)
+            if not value:
+                continue
+            yield b"q %.4f 0 0 %.4f %.2f %.2f cm %b" % (
+                k,
+                k,
+                (x + op.dx) * k,
+                (page_height - y - op.dy) * k,
+                op.symbol(value),
+            )
+
+    @override
+    def _layout_key(self) -> str:
+        return f"{self.LAYOUT_VERSION} {self.layout!r}"
+
+    @override
+    def _fit_fields(self) -> list[FitField]:
+        return list(self._program.fit_fields)
+
+    @override
+    def _draw_static_content(self, pdf: FPDF, x: float, y: float) -> None:
+        for op in self._program.static:
+            if isinstance(op, LineOp):
+                pdf.line(x + op.x1, y + op.y1, x + op.x2, y + op.y2)
+                continue
+            if op.set_font:
+                pdf.set_font(op.family, op.style, op.size)
+            pdf.set_xy(x + op.dx, y + op.dy)
+            pdf.cell(op.width, op.height, op.text)
+
+    @override
+    def _draw_label_content(
+        self, pdf: FPDF, x: float, y: float, data: Mapping[str, str]
+    ) -> None:
+        for op in self._program.fields:
+            if op.set_font:
+                pdf.set_font(op.family, op.style, op.size)
+            if op.shrink:
+                text = self._shrink_text(pdf, op.text(data), op.width)
+            else:
+                text = self._fit_text(pdf, op.text(data), op.width)
+            pdf.set_xy(x + op.dx, y + op.dy)
+            pdf.cell(op.width, op.height, text)
+        if self._program.codes:
+            _extend_page(
+                pdf, b"".join(c + b"\n" for c in self._barcode_content(pdf, x, y, data))
+            )
+
+
+def _extend_page(pdf: FPDF, content: bytes) -> None:
+    """Append operators to the content stream of ``pdf``'s current page.
+
+    Raises:
+        TypeError: If FPDF has already wrapped the content for its own output.
+    """
+    contents = pdf.pages[pdf.page].contents
+    if not isinstance(contents, bytearray):
+        msg = f"Page content already finalised as {type(contents).__name__}"
+        raise TypeError(msg)
+    contents.extend(content)
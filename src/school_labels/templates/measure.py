@@ -0,0 +1,280 @@
+"""Memoized text measurement and fitting for label templates."""
+
+from bisect import bisect_right
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable, Mapping
+from itertools import accumulate
+from typing import NamedTuple
+
+from fpdf import FPDF
+from fpdf.fonts import CORE_FONTS_CHARWIDTHS, TTFFont
+
+from school_labels import timings
+
+DEFAULT_MAXSIZE = 8192
+
+ELLIPSIS = "..."
+
+
+class CacheInfo(NamedTuple):
+    """Hit/miss statistics for one cache, like ``functools.lru_cache``."""
+
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class LRUCache[K: Hashable, V]:
+    """Bounded mapping that evicts the least recently used entry.
+
+    Safe to share between threads: each operation on the underlying dict is
+    atomic, and an entry evicted by one thread while another reads it is
+    simply computed again. Statistics may miss a count under contention.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE) -> None:
+        """Create an empty cache holding at most ``maxsize`` entries."""
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[K, V] = OrderedDict()
+
+    def get_or_compute(self, key: K, compute: Callable[[], V]) -> V:
+        """Return the cached value for ``key``, computing and storing it on a miss."""
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            value = self._data[key] = compute()
+            self._evict()
+        else:
+            self.hits += 1
+            self._touch(key)
+        return value
+
+    def __contains__(self, key: K) -> bool:
+        """Whether ``key`` is cached, without touching statistics or recency."""
+        return key in self._data
+
+    def put(self, key: K, value: V) -> None:
+        """Store a precomputed value, evicting the oldest entry if full."""
+        self._data[key] = value
+        self._touch(key)
+        self._evict()
+
+    def _touch(self, key: K) -> None:
+        """Mark ``key`` as most recently used."""
+        # The key may have been evicted by another thread since it was read.
+        # A plain try costs less than contextlib.suppress on this hot path.
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return
+
+    def _evict(self) -> None:
+        """Drop least recently used entries while over ``maxsize``."""
+        while len(self._data) > self.maxsize:
+            try:
+                self._data.popitem(last=False)
+            except KeyError:
+                # Emptied by another thread
+                return
+
+    def cache_info(self) -> CacheInfo:
+        """Return hit/miss statistics."""
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+    def cache_clear(self) -> None:
+        """Drop all entries and reset statistics."""
+        self._data.clear()
+        self.hits = self.misses = 0
+
+
+class FitField(NamedTuple):
+    """A text cell whose fit or shrink decision can be made before drawing.
+
+    ``text`` extracts the cell text from a row. ``family`` and ``style`` are
+    as passed to ``FPDF.set_font``; ``max_width`` is in user units.
+    """
+
+    text: Callable[[Mapping[str, str]], str]
+    family: str
+    style: str
+    size: float
+    max_width: float
+    shrink: bool = False
+
+
+def _font_key(pdf: FPDF) -> tuple[str, str, float]:
+    """Identify the active font by family, style and size in points."""
+    return pdf.font_family, pdf.font_style, pdf.font_size_pt
+
+
+class TextMeasurer:
+    """Cache string widths and fit/shrink decisions per font.
+
+    Widths are keyed on ``(family, style, size, text)``. Fit and shrink
+    decisions are additionally keyed on the target width, so repeated values
+    such as group names cost one dictionary lookup instead of a glyph walk.
+    Each cache is bounded and evicts least recently used entries.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE) -> None:
+        """Create empty caches holding at most ``maxsize`` entries each."""
+        self.widths: LRUCache[tuple[str, str, float, str], float] = LRUCache(maxsize)
+        self.fits: LRUCache[tuple[str, str, float, str, float], str] = LRUCache(maxsize)
+        self.shrinks: LRUCache[tuple[str, str, float, str, float], float] = LRUCache(
+            maxsize
+        )
+
+    def string_width(self, pdf: FPDF, text: str) -> float:
+        """Width of ``text`` in the active font of ``pdf``, in user units."""
+        return self.widths.get_or_compute(
+            (*_font_key(pdf), text), lambda: _get_string_width(pdf, text)
+        )
+
+    def fit_text(self, pdf: FPDF, text: str, max_width: float) -> str:
+        """Truncate text with ellipsis if it exceeds max_width in the current font."""
+        return self.fits.get_or_compute(
+            (*_font_key(pdf), text, max_width),
+            lambda: self._compute_fit(pdf, text, max_width),
+        )
+
+    def shrink_size(self, pdf: FPDF, text: str, max_width: float) -> float:
+        """Font size in points at which text fits within max_width.
+
+        Returns the active font size unchanged when the text already fits.
+        """
+        return self.shrinks.get_or_compute(
+            (*_font_key(pdf), text, max_width),
+            lambda: self._compute_shrink(pdf, text, max_width),
+        )
+
+    def _compute_fit(self, pdf: FPDF, text: str, max_width: float) -> str:
+        text_width = self.string_width(pdf, text)
+        if text_width <= max_width:
+            return text
+        ellipsis_width = self.string_width(pdf, ELLIPSIS)
+        if ellipsis_width >= max_width:
+            return ""
+        cut = int(len(text) * (max_width - ellipsis_width) / text_width)
+        text = text[:cut]
+        # Trimmed candidates are one-offs, so measure them without caching
+        while text and _get_string_width(pdf, text + ELLIPSIS) > max_width:
+            text = text[:-1]
+        return text + ELLIPSIS
+
+    def _compute_shrink(self, pdf: FPDF, text: str, max_width: float) -> float:
+        text_width = self.string_width(pdf, text)
+        if text_width <= max_width:
+            return pdf.font_size_pt
+        return pdf.font_size_pt * max_width / text_width
+
+    def prefit(
+        self, pdf: FPDF, field: FitField, rows: Iterable[Mapping[str, str]]
+    ) -> None:
+        """Make fit or shrink decisions for a batch of rows and cache them.
+
+        Each distinct text is measured once from the font's glyph-width
+        table: prefix sums over the glyph widths give the width of every
+        prefix, and the truncation point is found by bisection instead of
+        trimming one character at a time. The results match
+        :meth:`fit_text` and :meth:`shrink_size` exactly, so rendering the
+        batch afterwards only hits the cache.
+
+        Fields in TrueType fonts not added to ``pdf``, or with text a core
+        font's encoding cannot represent, are left for the per-cell path to
+        handle.
+        """
+        family = field.family.lower()
+        char_widths = _char_widths(pdf, family + field.style.upper())
+        if (
+            char_widths is None
+            or pdf.font_stretching != 100  # noqa: PLR2004
+            or pdf.char_spacing != 0
+        ):
+            return
+        # Keys are alike, but a shrink cache holds sizes and a fit cache texts
+        done = self.shrinks if field.shrink else self.fits
+
+        def width(units: float) -> float:
+            # Same operation order as FPDF.get_string_width
+            return units * field.size * 0.001 / pdf.k
+
+        ellipsis_units = sum(char_widths(ELLIPSIS))
+        recorder = timings.current()
+        for text in {field.text(row) for row in rows}:
+            key = (family, field.style, field.size, text, field.max_width)
+            if key in done:
+                continue
+            recorder.count("prefit_measurements")
+            try:
+                prefix = list(accumulate(char_widths(text), initial=0))
+            except UnicodeEncodeError:
+                continue
+            text_width = width(prefix[-1])
+            if field.shrink:
+                self.shrinks.put(
+                    key,
+                    field.size
+                    if text_width <= field.max_width
+                    else field.size * field.max_width / text_width,
+                )
+            elif text_width <= field.max_width:
+                self.fits.put(key, text)
+            elif (ellipsis_width := width(ellipsis_units)) >= field.max_width:
+                self.fits.put(key, "")
+            else:
+                cut = int(len(text) * (field.max_width - ellipsis_width) / text_width)
+                fits = bisect_right(
+                    prefix,
+                    field.max_width,
+                    hi=cut + 1,
+                    key=lambda units: width(units + ellipsis_units),
+                )
+                self.fits.put(key, text[: fits - 1] + ELLIPSIS)
+
+    def cache_info(self) -> dict[str, CacheInfo]:
+        """Return hit/miss statistics for each cache."""
+        return {
+            "widths": self.widths.cache_info(),
+            "fits": self.fits.cache_info(),
+            "shrinks": self.shrinks.cache_info(),
+        }
+
+    def cache_clear(self) -> None:
+        """Drop all cached measurements and reset statistics."""
+        self.widths.cache_clear()
+        self.fits.cache_clear()
+        self.shrinks.cache_clear()
+
+
+def _char_widths(pdf: FPDF, fontkey: str) -> Callable[[str], list[float]] | None:
+    """Function giving the width of each character of a text in a font.
+
+    Widths are in thousandths of the font size. Returns None if the font
+    is neither a core font nor a TrueType font added to ``pdf``. For core
+    fonts, the function raises UnicodeEncodeError for text outside their
+    encoding.
+    """
+    core = CORE_FONTS_CHARWIDTHS.get(fontkey)
+    if core is not None:
+        encoding = pdf.core_fonts_encoding
+        latin1 = core
+        return lambda text: [latin1[c] for c in text.encode(encoding).decode("latin-1")]
+    font = pdf.fonts.get(fontkey)
+    if isinstance(font, TTFFont):
+        widths = font.cw
+        return lambda text: [widths[ord(c)] for c in text]
+    return None
+
+
+def _get_string_width(pdf: FPDF, text: str) -> float:
+    """Measure ``text`` with FPDF, counting the call."""
+    timings.current().count("get_string_width")
+    return pdf.get_string_width(text)
+
+
+# Shared by all templates so measurements stay warm across documents
+TEXT_MEASURER = TextMeasurer()
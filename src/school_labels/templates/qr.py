@@ -0,0 +1,533 @@
+"""QR code encoder (ISO/IEC 18004), giving the symbol as a grid of modules.
+
+Text is encoded in a single segment: numeric or alphanumeric mode when
+every character allows it, otherwise bytes in ISO 8859-1 or UTF-8. The
+smallest version that holds the data at the chosen error correction level
+is used, with the mask scoring lowest on the standard's penalty rules.
+"""
+
+import functools
+import itertools
+import operator
+from collections.abc import Callable, Iterator, Sequence
+from typing import Literal, NamedTuple
+
+type ErrorCorrection = Literal["L", "M", "Q", "H"]
+
+ERROR_CORRECTION_LEVELS: tuple[ErrorCorrection, ...] = ("L", "M", "Q", "H")
+
+# Modules of light border the standard asks for around the symbol
+QUIET_ZONE = 4
+
+_ALPHANUMERIC = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:"
+
+# Format information bits of each level
+_FORMAT_BITS = {"L": 1, "M": 0, "Q": 3, "H": 2}
+
+# fmt: off
+# Error correction codewords per block, by level and version (index 0 unused)
+_ECC_PER_BLOCK = {
+    "L": (0, 7, 10, 15, 20, 26, 18, 20, 24, 30, 18, 20, 24, 26, 30, 22, 24, 28, 30,
+          28, 28, 28, 28, 30, 30, 26, 28, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30,
+          30, 30, 30),
+    "M": (0, 10, 16, 26, 18, 24, 16, 18, 22, 22, 26, 30, 22, 22, 24, 24, 28, 28, 26,
+          26, 26, 26, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28,
+          28, 28, 28),
+    "Q": (0, 13, 22, 18, 26, 18, 24, 18, 22, 20, 24, 28, 26, 24, 20, 30, 24, 28, 28,
+          26, 30, 28, 30, 30, 30, 30, 28, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30,
+          30, 30, 30),
+    "H": (0, 17, 28, 22, 16, 22, 28, 26, 26, 24, 28, 24, 28, 22, 24, 24, 30, 28, 28,
+          26, 28, 30, 24, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30,
+          30, 30, 30),
+}
+
+# Error correction blocks, by level and version (index 0 unused)
+_BLOCKS = {
+    "L": (0, 1, 1, 1, 1, 1, 2, 2, 2, 2, 4, 4, 4, 4, 4, 6, 6, 6, 6, 7, 8, 8, 9, 9, 10,
+          12, 12, 12, 13, 14, 15, 16, 17, 18, 19, 19, 20, 21, 22, 24, 25),
+    "M": (0, 1, 1, 1, 2, 2, 4, 4, 4, 5, 5, 5, 8, 9, 9, 10, 10, 11, 13, 14, 16, 17, 17,
+          18, 20, 21, 23, 25, 26, 28, 29, 31, 33, 35, 37, 38, 40, 43, 45, 47, 49),
+    "Q": (0, 1, 1, 2, 2, 4, 4, 6, 6, 8, 8, 8, 10, 12, 16, 12, 17, 16, 18, 21, 20, 23,
+          23, 25, 27, 29, 34, 34, 35, 38, 40, 43, 45, 48, 51, 53, 56, 59, 62, 65, 68),
+    "H": (0, 1, 1, 2, 4, 4, 4, 5, 6, 8, 8, 11, 11, 16, 16, 18, 16, 19, 21, 25, 25, 25,
+          34, 30, 32, 35, 37, 40, 42, 45, 48, 51, 54, 57, 60, 63, 66, 70, 74, 77, 81),
+}
+# fmt: on
+
+
+def _galois_tables() -> tuple[list[int], list[int]]:
+    """Powers of 2 in GF(256) modulo x^8 + x^4 + x^3 + x^2 + 1, and their logs.
+
+    Powers run on past 255 so that the sum of two logs can index them.
+    """
+    exp, log = [0] * 510, [0] * 256
+    value = 1
+    for power in range(255):
+        exp[power] = exp[power + 255] = value
+        log[value] = power
+        value <<= 1
+        if value & 0x100:
+            value ^= 0x11D
+    return exp, log
+
+
+_EXP, _LOG = _galois_tables()
+
+
+def encode(text: str, error_correction: ErrorCorrection = "M") -> list[str]:
+    """Encode ``text`` as a QR code.
+
+    Returns:
+        Rows of modules, top to bottom, each a string of ``"1"`` for a dark
+        module and ``"0"`` for a light one, without the quiet zone.
+
+    Raises:
+        ValueError: If ``text`` is too long for any version at the level, or
+            the level is unknown.
+    """
+    if error_correction not in _FORMAT_BITS:
+        msg = f"Unknown QR error correction level {error_correction!r}"
+        raise ValueError(msg)
+    mode, count, bits = _segment(text)
+    version = _version(mode, len(bits), error_correction)
+    if version is None:
+        msg = f"Text too long for a QR code: {len(text)} characters"
+        raise ValueError(msg)
+    capacity = _data_codewords(version, error_correction) * 8
+    count_bits = _count_bits(mode, version)
+
+    # Mode, character count and data, then a terminator of up to four zero
+    # bits, zeros to a whole byte and alternating pad bytes
+    stream = f"{mode:04b}{count:0{count_bits}b}{bits}"
+    stream += "0" * min(4, capacity - len(stream))
+    stream += "0" * (-len(stream) % 8)
+    data = [int(stream[i : i + 8], 2) for i in range(0, len(stream), 8)]
+    pad = itertools.cycle((0xEC, 0x11))
+    data.extend(next(pad) for _ in range(capacity // 8 - len(data)))
+    return _place(
+        _interleave(data, version, error_correction), version, error_correction
+    )
+
+
+def fits(text: str, error_correction: ErrorCorrection = "M") -> bool:
+    """Whether ``text`` fits in a QR code at a known error correction level."""
+    mode, _, bits = _segment(text)
+    return _version(mode, len(bits), error_correction) is not None
+
+
+def _version(mode: int, bits: int, error_correction: ErrorCorrection) -> int | None:
+    """Smallest version holding ``bits`` bits of data in ``mode``, if any."""
+    for version in range(1, 41):
+        capacity = _data_codewords(version, error_correction) * 8
+        if 4 + _count_bits(mode, version) + bits <= capacity:
+            return version
+    return None
+
+
+def _segment(text: str) -> tuple[int, int, str]:
+    """Mode indicator, character count and data bits of ``text``."""
+    if text.isascii() and text.isdigit():
+        groups = (text[i : i + 3] for i in range(0, len(text), 3))
+        bits = "".join(f"{int(g):0{len(g) * 3 + 1}b}" for g in groups)
+        return 0b0001, len(text), bits
+    if all(c in _ALPHANUMERIC for c in text):
+        values = [_ALPHANUMERIC.index(c) for c in text]
+        pairs = (values[i : i + 2] for i in range(0, len(values), 2))
+        bits = "".join(
+            f"{p[0] * 45 + p[1]:011b}" if len(p) == 2 else f"{p[0]:06b}"  # noqa: PLR2004
+            for p in pairs
+        )
+        return 0b0010, len(text), bits
+    # Bytes are read as ISO 8859-1 unless they are not, so text it cannot
+    # hold is given in UTF-8, which readers detect
+    try:
+        data = text.encode("latin-1")
+    except UnicodeEncodeError:
+        data = text.encode()
+    return 0b0100, len(data), "".join(f"{b:08b}" for b in data)
+
+
+def _count_bits(mode: int, version: int) -> int:
+    """Length of the character count field for ``mode`` in ``version``."""
+    sizes = {0b0001: (10, 12, 14), 0b0010: (9, 11, 13), 0b0100: (8, 16, 16)}[mode]
+    return sizes[(version > 9) + (version > 26)]  # noqa: PLR2004
+
+
+def _raw_modules(version: int) -> int:
+    """Modules of ``version`` left for data and error correction codewords."""
+    result = (16 * version + 128) * version + 64
+    if version >= 2:  # noqa: PLR2004
+        aligns = version // 7 + 2
+        result -= (25 * aligns - 10) * aligns - 55
+        if version >= 7:  # noqa: PLR2004
+            result -= 36
+    return result
+
+
+def _data_codewords(version: int, level: ErrorCorrection) -> int:
+    """Data codewords ``version`` holds at error correction ``level``."""
+    return (
+        _raw_modules(version) // 8
+        - _ECC_PER_BLOCK[level][version] * _BLOCKS[level][version]
+    )
+
+
+def _alignment_positions(version: int) -> list[int]:
+    """Centre coordinates of the alignment patterns of ``version``."""
+    if version == 1:
+        return []
+    aligns = version // 7 + 2
+    step = (version * 8 + aligns * 3 + 5) // (aligns * 4 - 4) * 2
+    size = version * 4 + 17
+    return [6, *reversed([size - 7 - i * step for i in range(aligns - 1)])]
+
+
+def _generator(degree: int) -> list[int]:
+    """Reed-Solomon generator polynomial, highest power first, without its 1."""
+    poly = [1]
+    for power in range(degree):
+        root = _EXP[power]
+        poly = [
+            a ^ _multiply(b, root) for a, b in zip([*poly, 0], [0, *poly], strict=True)
+        ]
+    return poly[1:]
+
+
+def _multiply(a: int, b: int) -> int:
+    return _EXP[_LOG[a] + _LOG[b]] if a and b else 0
+
+
+@functools.cache
+def _products(degree: int) -> tuple[int, ...]:
+    """The generator of ``degree`` times each byte, as one integer of its bytes."""
+    generator = _generator(degree)
+    return tuple(
+        int.from_bytes(bytes(_multiply(c, factor) for c in generator))
+        for factor in range(256)
+    )
+
+
+def _remainder(data: Sequence[int], degree: int) -> list[int]:
+    """The ``degree`` error correction codewords of ``data``.
+
+    The remainder is held as one integer of its bytes, so each step of the
+    division is a shift and a lookup.
+    """
+    products = _products(degree)
+    top = 8 * (degree - 1)
+    mask = (1 << 8 * degree) - 1
+    remainder = 0
+    for byte in data:
+        remainder = remainder << 8 & mask ^ products[byte ^ remainder >> top]
+    return list(remainder.to_bytes(degree))
+
+
+def _interleave(data: list[int], version: int, level: ErrorCorrection) -> list[int]:
+    """Split data codewords into blocks, add their error correction and interleave.
+
+    The last blocks hold one more data codeword than the first ones.
+    """
+    blocks = _BLOCKS[level][version]
+    degree = _ECC_PER_BLOCK[level][version]
+    short_length, long_blocks = divmod(len(data), blocks)
+    short_blocks = blocks - long_blocks
+    data_blocks, ecc_blocks = [], []
+    start = 0
+    for i in range(blocks):
+        end = start + short_length + (i >= short_blocks)
+        data_blocks.append(data[start:end])
+        ecc_blocks.append(_remainder(data[start:end], degree))
+        start = end
+    interleaved = [
+        byte
+        for column in itertools.zip_longest(*data_blocks)
+        for byte in column
+        if byte is not None
+    ]
+    interleaved.extend(
+        byte for column in zip(*ecc_blocks, strict=True) for byte in column
+    )
+    return interleaved
+
+
+def _place(codewords: list[int], version: int, level: ErrorCorrection) -> list[str]:
+    """Lay out a symbol's codewords with its patterns, masked by the best mask.
+
+    Masks are applied to rows held as integers, the leftmost module in the
+    highest bit, and scored on the whole symbol laid out in one integer.
+    """
+    grid = _grid(version)
+    # Modules past the last codeword are remainder bits, left light. The
+    # two characters after them are the patterns' light and dark modules
+    bits = f"{int.from_bytes(bytes(codewords)):0{len(codewords) * 8}b}"
+    modules = bits.ljust(grid.data_modules, "0") + "01"
+    lines = ["".join(pick(modules)) for pick in grid.rows]
+    laid_out = _lay_out(lines)
+    best = min(
+        range(8),
+        key=lambda mask: _penalty(
+            laid_out ^ grid.mask_lines[mask] ^ _format(version, level, mask)[1], grid
+        ),
+    )
+    format_rows = _format(version, level, best)[0]
+    return [
+        format(int(line, 2) ^ mask ^ info, f"0{grid.size}b")
+        for line, mask, info in zip(lines, grid.masks[best], format_rows, strict=True)
+    ]
+
+
+def _lay_out(lines: list[str]) -> int:
+    """Every row and then every column of a symbol, end to end in one integer.
+
+    ``lines`` are the rows, as strings of ``"1"`` and ``"0"``. Four light
+    modules follow each line, so that rules looking along a line see the
+    quiet zone at its ends and never run on into the next line.
+    """
+    columns = ["".join(column) for column in zip(*lines, strict=True)]
+    return int("0000".join(lines + columns) + "0000", 2)
+
+
+def _row_lines(rows: Sequence[int], size: int) -> int:
+    """:func:`_lay_out` of rows given as integers."""
+    return _lay_out([format(row, f"0{size}b") for row in rows])
+
+
+class _Grid(NamedTuple):
+    """What every symbol of one version shares.
+
+    A module is given as its row and the bit of the row integer it is.
+    Integers of all lines are as laid out by :func:`_lay_out`.
+    """
+
+    size: int
+    data_modules: int
+    """Number of modules free for codewords."""
+    rows: tuple[Callable[[str], tuple[str, ...]], ...]
+    """For each row, picks its modules from the codeword bits of a symbol,
+    padded to :attr:`data_modules`, then ``"0"`` and ``"1"``, which are the
+    modules of the finder, timing and alignment patterns and version bits."""
+    masks: tuple[tuple[int, ...], ...]
+    """For each mask, rows of the data modules it inverts."""
+    mask_lines: tuple[int, ...]
+    """For each mask, all lines of the data modules it inverts."""
+    format_positions: tuple[tuple[tuple[int, int], tuple[int, int]], ...]
+    """For each format information bit, the two modules showing it."""
+    joined: int
+    """Modules of all lines followed by another module of the same line."""
+    below: int
+    """Modules of all lines that are in a row below another row."""
+    in_rows: int
+    """Modules of all lines that are in a row."""
+
+
+@functools.cache
+def _grid(version: int) -> _Grid:
+    return _GridBuilder(version).build()
+
+
+@functools.cache
+def _format(
+    version: int, level: ErrorCorrection, mask: int
+) -> tuple[tuple[int, ...], int]:
+    """Rows and all lines of the format information modules that are dark."""
+    grid = _grid(version)
+    data = _FORMAT_BITS[level] << 3 | mask
+    bits = (data << 10 | _bch(data, 0x537, 10)) ^ 0x5412
+    rows = [0] * grid.size
+    for i, positions in enumerate(grid.format_positions):
+        if bits >> i & 1:
+            for y, bit in positions:
+                rows[y] |= bit
+    return tuple(rows), _row_lines(rows, grid.size)
+
+
+class _GridBuilder:
+    """Works out the :class:`_Grid` of one version, module by module."""
+
+    def __init__(self, version: int) -> None:
+        self.version = version
+        self.size = size = version * 4 + 17
+        self.modules = [[False] * size for _ in range(size)]
+        self.reserved = [[False] * size for _ in range(size)]
+
+    def build(self) -> _Grid:
+        size = self.size
+        self._draw_patterns()
+        format_positions = tuple(self._format_positions())
+        for copies in format_positions:
+            for x, y in copies:
+                self.reserved[y][x] = True
+        # Always dark, beside the format information
+        self._set(8, size - 8, True)  # noqa: FBT003
+        self._draw_version()
+
+        def bit(x: int) -> int:
+            return 1 << (size - 1 - x)
+
+        free = [[not reserved for reserved in row] for row in self.reserved]
+        masks = tuple(
+            tuple(
+                sum(bit(x) for x in range(size) if free[y][x] and condition(x, y))
+                for y in range(size)
+            )
+            for condition in _MASKS
+        )
+        # Each module's index in the padded codeword bits, or past them
+        data = {position: i for i, position in enumerate(self._data_positions())}
+        light, dark = len(data), len(data) + 1
+        rows = tuple(
+            operator.itemgetter(
+                *(
+                    (dark if self.modules[y][x] else light)
+                    if self.reserved[y][x]
+                    else data[x, y]
+                    for x in range(size)
+                )
+            )
+            for y in range(size)
+        )
+        return _Grid(
+            size,
+            len(data),
+            rows,
+            masks,
+            tuple(_row_lines(rows, size) for rows in masks),
+            tuple(
+                ((y1, bit(x1)), (y2, bit(x2)))
+                for (x1, y1), (x2, y2) in format_positions
+            ),
+            joined=_lines(size, "0" + "1" * (size - 1), [True] * size * 2),
+            below=_lines(size, "1" * size, [False, *[True] * (size - 1)]),
+            in_rows=_lines(size, "1" * size, [True] * size),
+        )
+
+    def _set(self, x: int, y: int, dark: bool) -> None:  # noqa: FBT001
+        self.modules[y][x] = dark
+        self.reserved[y][x] = True
+
+    def _draw_patterns(self) -> None:
+        """Draw the finder, timing and alignment patterns."""
+        size = self.size
+        for i in range(size):
+            self._set(6, i, i % 2 == 0)
+            self._set(i, 6, i % 2 == 0)
+        for cx, cy in ((3, 3), (size - 4, 3), (3, size - 4)):
+            # The separator ring of light modules is drawn with the finder
+            for dy, dx in itertools.product(range(-4, 5), repeat=2):
+                x, y = cx + dx, cy + dy
+                if 0 <= x < size and 0 <= y < size:
+                    self._set(x, y, max(abs(dx), abs(dy)) not in {2, 4})
+        positions = _alignment_positions(self.version)
+        last = len(positions) - 1
+        for i, j in itertools.product(range(len(positions)), repeat=2):
+            # Corners taken by finder patterns have none
+            if (i, j) in {(0, 0), (0, last), (last, 0)}:
+                continue
+            for dy, dx in itertools.product(range(-2, 3), repeat=2):
+                self._set(
+                    positions[i] + dx, positions[j] + dy, max(abs(dx), abs(dy)) != 1
+                )
+
+    def _format_positions(self) -> Iterator[tuple[tuple[int, int], tuple[int, int]]]:
+        """Both modules of each format information bit, lowest bit first."""
+        size = self.size
+        for i in range(15):
+            # Around the top-left finder, skipping the timing pattern
+            if i < 6:  # noqa: PLR2004
+                first = (8, i)
+            elif i < 8:  # noqa: PLR2004
+                first = (8, i + 1)
+            elif i == 8:  # noqa: PLR2004
+                first = (7, 8)
+            else:
+                first = (14 - i, 8)
+            # Split between the other two finders
+            second = (size - 1 - i, 8) if i < 8 else (8, size - 15 + i)  # noqa: PLR2004
+            yield first, second
+
+    def _draw_version(self) -> None:
+        """Draw both copies of the version, from version 7."""
+        if self.version < 7:  # noqa: PLR2004
+            return
+        bits = self.version << 12 | _bch(self.version, 0x1F25, 12)
+        for i in range(18):
+            dark = bool(bits >> i & 1)
+            a, b = self.size - 11 + i % 3, i // 3
+            self._set(a, b, dark)
+            self._set(b, a, dark)
+
+    def _data_positions(self) -> Iterator[tuple[int, int]]:
+        """Free modules, in pairs of columns from the right, up then down."""
+        size = self.size
+        right = size - 1
+        while right >= 1:
+            # The vertical timing pattern shifts the columns to its left
+            if right == 6:  # noqa: PLR2004
+                right = 5
+            upward = (right + 1) & 2 == 0
+            for vertical in range(size):
+                y = size - 1 - vertical if upward else vertical
+                for x in (right, right - 1):
+                    if not self.reserved[y][x]:
+                        yield x, y
+            right -= 2
+
+
+_MASKS = (
+    lambda x, y: (x + y) % 2 == 0,
+    lambda _, y: y % 2 == 0,
+    lambda x, _: x % 3 == 0,
+    lambda x, y: (x + y) % 3 == 0,
+    lambda x, y: (x // 3 + y // 2) % 2 == 0,
+    lambda x, y: x * y % 2 + x * y % 3 == 0,
+    lambda x, y: (x * y % 2 + x * y % 3) % 2 == 0,
+    lambda x, y: ((x + y) % 2 + x * y % 3) % 2 == 0,
+)
+
+
+def _bch(data: int, generator: int, length: int) -> int:
+    """Remainder of ``data`` shifted by ``length`` bits, divided by ``generator``."""
+    remainder = data
+    for _ in range(length):
+        remainder = remainder << 1 ^ (remainder >> (length - 1)) * generator
+    return remainder
+
+
+def _lines(size: int, line: str, used: list[bool]) -> int:
+    """All lines laid out as by :func:`_lay_out`, as ``line`` where ``used``.
+
+    Lines after those in ``used`` are left light.
+    """
+    blank = "0" * size
+    lines = [line if use else blank for use in used]
+    lines.extend([blank] * (2 * size - len(lines)))
+    return int("0000".join(lines) + "0000", 2)
+
+
+def _penalty(lines: int, grid: _Grid) -> int:
+    """Penalty score of a masked symbol, given as all its lines.
+
+    The mask scoring lowest is used. Each rule is worked out for every
+    module at once, by comparing the lines with themselves shifted.
+    """
+    light = ~lines
+    # Runs of five or more modules of one colour score the run's length
+    # less 2: one for each five modules in a row, and two more per run
+    same = ~(lines ^ lines >> 1) & grid.joined
+    fives = same & same >> 1 & same >> 2 & same >> 3
+    penalty = fives.bit_count() + 2 * (fives & ~(fives >> 1)).bit_count()
+    # 2x2 blocks of one colour: modules equal to the one above and beside,
+    # with the module beside also equal to the one above it
+    vertical = ~(lines ^ lines >> (grid.size + 4)) & grid.below
+    penalty += 3 * (vertical & vertical >> 1 & same).bit_count()
+    # Patterns that look like finders, with four light modules on either
+    # side; the quiet zone counts as light
+    finders = (
+        lines & light >> 1 & lines >> 2 & lines >> 3 & lines >> 4 & light >> 5
+    ) & lines >> 6
+    four_light = light & light >> 1 & light >> 2 & light >> 3
+    penalty += 40 * (finders & (four_light << 4 | four_light >> 7)).bit_count()
+    # Imbalance between dark and light, in steps of 5%
+    dark = (lines & grid.in_rows).bit_count()
+    total = grid.size**2
+    return penalty + 10 * (abs(dark * 20 - total * 10) // total)
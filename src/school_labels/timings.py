@@ -0,0 +1,177 @@
+"""Stage timings and hot-path counters for label generation.
+
+Wrap a run in :func:`record` to find out where its time went::
+
+    with timings.record() as recorder:
+        generate_labels_to(rows, "email-password", out)
+    print(recorder.format())
+
+Stages are exclusive: each second of the run is attributed to at most one
+of them, so they add up to no more than the total.
+"""
+
+import resource
+import sys
+import time
+from collections import Counter
+from collections.abc import Generator, Iterable, Iterator, Mapping
+from contextlib import contextmanager
+from typing import Any, NamedTuple, override
+
+# Stages in pipeline order, for reporting
+STAGES = ["parse", "validate", "static", "cache", "fit", "layout", "write"]
+
+
+class StageTiming(NamedTuple):
+    """Accumulated cost of one stage."""
+
+    seconds: float
+    calls: int
+    rss_growth_kb: int
+
+
+def _max_rss_kb() -> int:
+    """Peak resident set size of this process so far, in KiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+class Timings:
+    """Wall time and peak memory growth per stage, plus event counters.
+
+    Memory is reported as how much each stage raised the process's peak
+    resident set size, which points at the stage that holds the most data.
+    """
+
+    def __init__(self) -> None:
+        """Create an empty recorder, starting the total clock now."""
+        self.stages: dict[str, StageTiming] = {}
+        self.counters: Counter[str] = Counter()
+        self._start = time.perf_counter()
+        self.total_seconds = 0.0
+
+    def _add(self, name: str, seconds: float, rss_growth_kb: int) -> None:
+        previous = self.stages.get(name, StageTiming(0.0, 0, 0))
+        self.stages[name] = StageTiming(
+            previous.seconds + seconds,
+            previous.calls + 1,
+            previous.rss_growth_kb + rss_growth_kb,
+        )
+
+    @contextmanager
+    def stage(self, name: str) -> Generator[None]:
+        """Attribute the time spent in the ``with`` block to stage ``name``."""
+        rss = _max_rss_kb()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(name, time.perf_counter() - start, _max_rss_kb() - rss)
+
+    def timed[T](self, name: str, items: Iterable[T]) -> Iterator[T]:
+        """Yield ``items``, attributing the time spent producing them to ``name``.
+
+        Only the producer's time is counted, not the consumer's work between
+        items. Use it for lazy inputs such as CSV rows.
+        """
+        iterator = iter(items)
+        while True:
+            rss = _max_rss_kb()
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._add(name, time.perf_counter() - start, _max_rss_kb() - rss)
+            yield item
+
+    def count(self, name: str, n: int = 1) -> None:
+        """Add ``n`` to event counter ``name``."""
+        self.counters[name] += n
+
+    def add_counters(self, counters: Mapping[str, int]) -> None:
+        """Add counters recorded elsewhere, such as in a worker process."""
+        self.counters.update(counters)
+
+    def stop(self) -> None:
+        """Stop the total clock."""
+        self.total_seconds = time.perf_counter() - self._start
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the timings as JSON-serializable data."""
+        return {
+            "total_seconds": round(self.total_seconds, 6),
+            "peak_rss_kb": _max_rss_kb(),
+            "stages": {
+                name: stage._asdict() | {"seconds": round(stage.seconds, 6)}
+                for name, stage in self._ordered_stages()
+            },
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def format(self) -> str:
+        """Return a human-readable report, one line per stage and counter."""
+        lines = [f"{'stage':<10} {'seconds':>9} {'share':>6} {'calls':>8} {'rss+':>9}"]
+        for name, stage in self._ordered_stages():
+            share = stage.seconds / self.total_seconds if self.total_seconds else 0
+            lines.append(
+                f"{name:<10} {stage.seconds:>9.3f} {share:>6.1%} {stage.calls:>8} "
+                f"{stage.rss_growth_kb / 1024:>7.1f}MB"
+            )
+        lines.append(
+            f"{'total':<10} {self.total_seconds:>9.3f} "
+            f"(peak RSS {_max_rss_kb() / 1024:.1f}MB)"
+        )
+        lines.extend(
+            f"{name}: {value}" for name, value in sorted(self.counters.items())
+        )
+        return "\n".join(lines) + "\n"
+
+    def _ordered_stages(self) -> list[tuple[str, StageTiming]]:
+        order = {name: i for i, name in enumerate(STAGES)}
+        return sorted(self.stages.items(), key=lambda item: order.get(item[0], 99))
+
+
+class _NullTimings(Timings):
+    """Recorder used when nobody is recording, so instrumentation is cheap."""
+
+    @override
+    @contextmanager
+    def stage(self, name: str) -> Generator[None]:
+        yield
+
+    @override
+    def timed[T](self, name: str, items: Iterable[T]) -> Iterator[T]:
+        return iter(items)
+
+    @override
+    def count(self, name: str, n: int = 1) -> None:
+        pass
+
+    @override
+    def add_counters(self, counters: Mapping[str, int]) -> None:
+        pass
+
+
+_NULL = _NullTimings()
+_current: Timings = _NULL
+
+
+def current() -> Timings:
+    """Return the active recorder, or one that discards everything."""
+    return _current
+
+
+@contextmanager
+def record() -> Generator[Timings]:
+    """Record timings and counters for everything run in the ``with`` block."""
+    global _current  # noqa: PLW0603
+    previous = _current
+    recorder = _current = Timings()
+    try:
+        yield recorder
+    finally:
+        recorder.stop()
+        _current = previous
@@ -0,0 +1,201 @@
+"""Checks on input rows, made as the rows are read."""
+
+import csv
+from collections.abc import (
+    Callable,
+    Collection,
+    Container,
+    Iterable,
+    Iterator,
+    Mapping,
+)
+from typing import NamedTuple, TextIO
+
+from .fonts import is_right_to_left
+
+
+class Issue(NamedTuple):
+    """A problem with one value of one input row.
+
+    ``row`` counts data rows from 1, not including the header. ``line`` is
+    the input line the row ends on, or None when the rows did not come from
+    a file.
+    """
+
+    row: int
+    line: int | None
+    column: str
+    problem: str
+    detail: str
+
+    def format(self) -> str:
+        """Describe the issue in one line."""
+        where = f"row {self.row}" if self.line is None else f"line {self.line}"
+        return f"{where}, {self.column}: {self.detail}"
+
+
+class ValueCheck(NamedTuple):
+    """A check of a value made from a row's columns, such as a barcode's text.
+
+    ``value`` makes the value from a row, and ``problem`` says why it cannot
+    be printed, or returns None if it can; empty values are not checked.
+    A value that cannot be printed is reported as a ``kind`` issue, and
+    each of ``columns`` is replaced by what ``replace`` gives for it.
+    """
+
+    kind: str
+    columns: tuple[str, ...]
+    value: Callable[[Mapping[str, str]], str]
+    problem: Callable[[str], str | None]
+    replace: Callable[[str], str]
+
+
+class ValidationError(ValueError):
+    """Raised by a strict :class:`RowValidator` at the first issue."""
+
+    def __init__(self, issue: Issue) -> None:
+        """Create an error for ``issue``."""
+        super().__init__(issue.format())
+        self.issue = issue
+
+
+class RowValidator:
+    """Finds empty, duplicate and unprintable values in rows as they stream past.
+
+    Each row is checked once, when it is read, so validating adds no second
+    pass over the input. Duplicates are found with one hash index per unique
+    column, mapping each value seen to the row it was first seen on.
+
+    Values with characters outside ``charset`` are reported, and the row
+    is passed on with those characters replaced by ``?`` so that the rest of
+    the input can still be printed. The same goes for values that fail one
+    of the ``checks``, such as barcodes that cannot be encoded. A ``strict``
+    validator raises :class:`ValidationError` at the first issue instead.
+    """
+
+    def __init__(
+        self,
+        required: Collection[str] = (),
+        unique: Collection[str] = (),
+        charset: str | Container[int] | None = None,
+        *,
+        checks: Iterable[ValueCheck] = (),
+        strict: bool = False,
+    ) -> None:
+        """Create a validator.
+
+        Args:
+            required: Columns that must not be empty. Their values are also
+                checked against ``charset``.
+            unique: Columns whose values must not repeat, ignoring case and
+                surrounding whitespace.
+            charset: Encoding that values must be representable in, or the
+                code points they may use, or None to skip the check.
+            checks: Further checks of values made from each row.
+            strict: Raise at the first issue rather than collecting them.
+        """
+        self.required = list(required)
+        self.charset = charset
+        self.checks = list(checks)
+        self.strict = strict
+        self.issues: list[Issue] = []
+        self.rows = 0
+        self._seen: dict[str, dict[str, int]] = {column: {} for column in unique}
+
+    def check(self, row: Mapping[str, str], line: int | None = None) -> dict[str, str]:
+        """Check the next row.
+
+        Args:
+            row: The row.
+            line: The input line the row ends on, if known.
+
+        Returns:
+            Printable replacements for the row's values that cannot be
+            encoded in the charset or fail a check, by column. Usually
+            empty.
+
+        Raises:
+            ValidationError: If the validator is strict and the row has an
+                issue.
+        """
+        self.rows += 1
+        replacements = {}
+        for column in self.required:
+            value = row.get(column, "")
+            if not value.strip():
+                self._report(line, column, "empty", "value is empty")
+            elif self.charset is not None and not _printable(value, self.charset):
+                self._report(line, column, "charset", self._unprintable(value))
+                replacements[column] = _replace_unprintable(value, self.charset)
+        for value_check in self.checks:
+            checked = {**row, **replacements} if replacements else row
+            value = value_check.value(checked)
+            problem = value_check.problem(value) if value else None
+            if problem:
+                columns = ", ".join(value_check.columns)
+                self._report(line, columns, value_check.kind, f"{value!r} {problem}")
+                for column in value_check.columns:
+                    replacements[column] = value_check.replace(checked.get(column, ""))
+        for column, seen in self._seen.items():
+            key = row.get(column, "").strip().casefold()
+            if not key:
+                continue
+            first = seen.setdefault(key, self.rows)
+            if first != self.rows:
+                self._report(
+                    line,
+                    column,
+                    "duplicate",
+                    f"{row[column]!r} duplicates row {first}",
+                )
+        return replacements
+
+    def _unprintable(self, value: str) -> str:
+        """Detail of a charset issue with ``value``."""
+        if isinstance(self.charset, str):
+            where = self.charset
+        elif any(is_right_to_left(ord(char)) for char in value):
+            return f"{value!r} is written right to left, which is not supported"
+        else:
+            where = "the fonts"
+        return f"{value!r} has characters that cannot be printed in {where}"
+
+    def validated(
+        self, rows: Iterable[Mapping[str, str]]
+    ) -> Iterator[Mapping[str, str]]:
+        """Lazily check ``rows``, which have no line numbers."""
+        for row in rows:
+            replacements = self.check(row)
+            yield {**row, **replacements} if replacements else row
+
+    def write_report(self, out: TextIO) -> None:
+        """Write the issues found so far to ``out`` as CSV."""
+        writer = csv.writer(out)
+        writer.writerow(Issue._fields)
+        writer.writerows(self.issues)
+
+    def _report(self, line: int | None, column: str, problem: str, detail: str) -> None:
+        issue = Issue(self.rows, line, column, problem, detail)
+        if self.strict:
+            raise ValidationError(issue)
+        self.issues.append(issue)
+
+
+def _printable(value: str, charset: str | Container[int]) -> bool:
+    """Whether every character of ``value`` is in ``charset``."""
+    if isinstance(charset, str):
+        if value.isascii():
+            return True
+        try:
+            value.encode(charset)
+        except UnicodeEncodeError:
+            return False
+        return True
+    return all(ord(char) in charset for char in value)
+
+
+def _replace_unprintable(value: str, charset: str | Container[int]) -> str:
+    """``value`` with each character not in ``charset`` replaced by ``?``."""
+    if isinstance(charset, str):
+        return value.encode(charset, "replace").decode(charset)
+    return "".join(char if ord(char) in charset else "?" for char in value)
@@ -0,0 +1,341 @@
+"""Watch a folder and turn the CSV and .xlsx files dropped into it into PDFs."""
+
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from pathlib import Path
+from typing import NamedTuple
+
+from . import batch, generator
+from .cache import write_atomic
+
+# Seconds a file's size and modification time must stay the same before
+# it is read, so files still being copied in are left alone
+DEFAULT_SETTLE = 2.0
+
+# Seconds the folder must be quiet before stable files are processed, so
+# a burst of files dropped together is handled as one batch
+DEFAULT_DEBOUNCE = 1.0
+
+DEFAULT_INTERVAL = 1.0
+
+DONE_DIR = "done"
+FAILED_DIR = "failed"
+
+# Digests of processed inputs, kept in the output folder across restarts
+STATE_FILE = ".school-labels-watch.json"
+
+
+class WatchResult(NamedTuple):
+    """Outcome of one input file dropped into the watched folder."""
+
+    input_path: Path
+    moved_to: Path | None
+    output_path: Path | None
+    rows: int
+    pages: int
+    seconds: float
+    error: str | None = None
+    unchanged: bool = False
+
+
+class _Signature(NamedTuple):
+    """What polling sees of a file: its size and modification time."""
+
+    size: int
+    mtime_ns: int
+
+
+class _Seen(NamedTuple):
+    """A file's signature and when polling first saw it."""
+
+    signature: _Signature
+    since: float
+
+
+class _Job(NamedTuple):
+    """A stable file handed to a worker."""
+
+    path: Path
+    signature: _Signature
+    key: str
+
+
+class FolderWatcher:
+    """Find stable CSV and .xlsx files in a folder and generate labels for them.
+
+    The folder is polled with one directory listing per pass. A file is
+    picked up once its size and modification time have not changed for
+    ``settle`` seconds and nothing in the folder has changed for
+    ``debounce`` seconds. Labels are generated as by ``school-labels
+    batch``: the template is detected from the columns unless ``style``
+    is given, and existing PDFs are never overwritten. Each input is then
+    moved to ``done/`` or ``failed/`` inside the watched folder.
+
+    A file whose content (with the same options) was processed before,
+    and whose PDF is still in the output folder, is moved to ``done/``
+    without generating it again. Digests are kept in the output folder,
+    so this holds across restarts.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        in_dir: Path,
+        out_dir: Path,
+        *,
+        style: str | None = None,
+        break_column: str | None = None,
+        settle: float = DEFAULT_SETTLE,
+        debounce: float = DEFAULT_DEBOUNCE,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Watch ``in_dir``, writing PDFs to ``out_dir``.
+
+        Raises:
+            OSError: If the ``done/``, ``failed/`` or output folders cannot
+                be created.
+        """
+        self.in_dir = in_dir
+        self.out_dir = out_dir
+        self.style = style
+        self.break_column = break_column
+        self.settle = settle
+        self.debounce = debounce
+        self._clock = clock
+        self._seen: dict[Path, _Seen] = {}
+        # Files handed to a worker, and files already handled at their
+        # current signature (e.g. because they could not be moved)
+        self._in_flight: set[Path] = set()
+        self._handled: dict[Path, _Signature] = {}
+        self._last_change = clock()
+        for directory in (out_dir, in_dir / DONE_DIR, in_dir / FAILED_DIR):
+            directory.mkdir(parents=True, exist_ok=True)
+        self._state_path = out_dir / STATE_FILE
+        self._outputs = self._load_state()
+
+    def _load_state(self) -> dict[str, str]:
+        """Output filenames by input key, from earlier runs."""
+        with contextlib.suppress(OSError, ValueError):
+            state = json.loads(self._state_path.read_bytes())
+            if isinstance(state, dict):
+                return {str(key): str(value) for key, value in state.items()}
+        return {}
+
+    def _save_state(self) -> None:
+        """Keep the processed digests for the next run."""
+        with contextlib.suppress(OSError):
+            write_atomic(self._state_path, json.dumps(self._outputs).encode())
+
+    def poll(self) -> list[Path]:
+        """List the files that are ready to be processed, in name order.
+
+        Files that are new or changed since the last poll start their
+        ``settle`` time again.
+        """
+        now = self._clock()
+        current = {}
+        with os.scandir(self.in_dir) as entries:
+            for entry in entries:
+                if not _is_input(entry):
+                    continue
+                with contextlib.suppress(OSError):
+                    stat = entry.stat()
+                    current[Path(entry.path)] = _Signature(
+                        stat.st_size, stat.st_mtime_ns
+                    )
+
+        for path in self._seen.keys() - current.keys():
+            del self._seen[path]
+            self._handled.pop(path, None)
+        for path, signature in current.items():
+            seen = self._seen.get(path)
+            if seen is None or seen.signature != signature:
+                self._seen[path] = _Seen(signature, now)
+                self._last_change = now
+
+        if now - self._last_change < self.debounce:
+            return []
+        return sorted(
+            path
+            for path, seen in self._seen.items()
+            if now - seen.since >= self.settle
+            and path not in self._in_flight
+            and self._handled.get(path) != seen.signature
+        )
+
+    @property
+    def busy(self) -> bool:
+        """Whether files are being processed or waiting to settle."""
+        return bool(self._in_flight) or any(
+            self._handled.get(path) != seen.signature
+            for path, seen in self._seen.items()
+        )
+
+    def run(
+        self,
+        executor: Executor | None = None,
+        *,
+        interval: float = DEFAULT_INTERVAL,
+        stop: threading.Event | None = None,
+        once: bool = False,
+    ) -> Iterator[WatchResult]:
+        """Process files as they become ready, yielding each outcome.
+
+        Args:
+            executor: Pool to generate labels on, e.g. a
+                ``ProcessPoolExecutor``. Without one, files are processed
+                one at a time between polls.
+            interval: Seconds between polls.
+            stop: Stop once it is set and the files in progress are done.
+            once: Stop when every file in the folder has been processed.
+        """
+        stop = stop or threading.Event()
+        pending: dict[Future[batch.BatchResult], _Job] = {}
+        while True:
+            for path in [] if stop.is_set() else self.poll():
+                job = self._prepare(path)
+                if job is None:
+                    continue
+                if any(other.key == job.key for other in pending.values()):
+                    # A copy of a file in progress: look again once it is done
+                    continue
+                if job.key in self._outputs and (
+                    (self.out_dir / self._outputs[job.key]).exists()
+                ):
+                    yield self._finish_unchanged(job)
+                    continue
+                self._in_flight.add(path)
+                output_path = self.out_dir / path.with_suffix(".pdf").name
+                options = {"style": self.style, "break_column": self.break_column}
+                if executor is None:
+                    result = _generate_file(path, output_path, **options)
+                    yield self._finish(job, result)
+                else:
+                    future = executor.submit(
+                        batch.generate_file, path, output_path, **options
+                    )
+                    pending[future] = job
+            if pending:
+                done, _ = wait(pending, timeout=interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = pending.pop(future)
+                    yield self._finish(job, _future_result(future, job.path))
+            elif stop.is_set() or (once and not self.busy):
+                return
+            else:
+                stop.wait(interval)
+
+    def _prepare(self, path: Path) -> _Job | None:
+        """Hash a ready file, or return None if it has gone or changed."""
+        seen = self._seen[path]
+        try:
+            with path.open("rb") as f:
+                digest = hashlib.file_digest(f, "sha256").hexdigest()
+            signature = _signature(path)
+        except OSError:
+            return None
+        if signature != seen.signature:
+            # Written to while being hashed: wait for it to settle again
+            self._seen[path] = _Seen(signature, self._clock())
+            return None
+        key = f"{digest} {self.style or '-'} {self.break_column or '-'}"
+        return _Job(path, signature, key)
+
+    def _finish(self, job: _Job, result: batch.BatchResult) -> WatchResult:
+        """Record the PDF and move the input to ``done/`` or ``failed/``."""
+        self._in_flight.discard(job.path)
+        if result.error is None and result.output_path is not None:
+            self._outputs[job.key] = result.output_path.name
+            self._save_state()
+        changed = _signature_or_none(job.path) != job.signature
+        moved_to, error = None, result.error
+        if not changed:
+            # A file written to while it was processed is picked up again
+            folder = DONE_DIR if result.error is None else FAILED_DIR
+            moved_to, move_error = self._move(job, folder)
+            error = error or move_error
+        return WatchResult(
+            job.path,
+            moved_to,
+            result.output_path,
+            result.rows,
+            result.pages,
+            result.seconds,
+            error,
+        )
+
+    def _finish_unchanged(self, job: _Job) -> WatchResult:
+        """Move an input that was processed before to ``done/``."""
+        moved_to, error = self._move(job, DONE_DIR)
+        output = self.out_dir / self._outputs[job.key]
+        return WatchResult(job.path, moved_to, output, 0, 0, 0.0, error, unchanged=True)
+
+    def _move(self, job: _Job, folder: str) -> tuple[Path | None, str | None]:
+        """Move an input into ``folder``, returning where, or the error."""
+        target = self.in_dir / folder / job.path.name
+        try:
+            target = Path(generator.generate_filename(str(target)))
+            job.path.replace(target)
+        except (OSError, RuntimeError) as e:
+            # Left in place, but not processed again until it changes
+            self._handled[job.path] = job.signature
+            return None, f"Could not move to {folder}/: {e}"
+        self._seen.pop(job.path, None)
+        return target, None
+
+
+def _generate_file(
+    input_path: Path, output_path: Path, **options: str | None
+) -> batch.BatchResult:
+    """Generate labels as ``batch.generate_file`` does, never raising.
+
+    One bad file must not stop the watcher: it would crash again on the
+    same file after every restart.
+    """
+    try:
+        return batch.generate_file(input_path, output_path, **options)
+    except Exception as e:  # noqa: BLE001 - moved to failed/ with its error
+        return _failed(input_path, e)
+
+
+def _future_result(
+    future: Future[batch.BatchResult], input_path: Path
+) -> batch.BatchResult:
+    """The result of a file processed by a worker, or its error as a result."""
+    try:
+        return future.result()
+    except Exception as e:  # noqa: BLE001 - moved to failed/ with its error
+        return _failed(input_path, e)
+
+
+def _failed(input_path: Path, error: Exception) -> batch.BatchResult:
+    return batch.BatchResult(
+        input_path, None, 0, 0, 0.0, str(error) or type(error).__name__
+    )
+
+
+def _is_input(entry: os.DirEntry[str]) -> bool:
+    """Whether a folder entry is a CSV file or workbook to process."""
+    # Hidden files include partial downloads and editors' lock files
+    return (
+        Path(entry.name).suffix.lower() in batch.INPUT_SUFFIXES
+        and not entry.name.startswith((".", "~$"))
+        and entry.is_file()
+    )
+
+
+def _signature(path: Path) -> _Signature:
+    stat = path.stat()
+    return _Signature(stat.st_size, stat.st_mtime_ns)
+
+
+def _signature_or_none(path: Path) -> _Signature | None:
+    try:
+        return _signature(path)
+    except OSError:
+        return None
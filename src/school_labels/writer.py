@@ -0,0 +1,912 @@
+"""Streaming PDF writer that flushes each page as soon as it is finished."""
+
+import hashlib
+import itertools
+import os
+import re
+import tempfile
+import zlib
+from collections.abc import Iterable
+from datetime import UTC, datetime
+from typing import BinaryIO, NamedTuple
+
+from .fonts import FontMetrics, subset_font
+
+# zlib's own default, and what PDFs were compressed with before it was an option
+DEFAULT_COMPRESS_LEVEL = 6
+
+# Core fonts that carry their own built-in encoding
+_SYMBOLIC_FONTS = frozenset({"Symbol", "ZapfDingbats"})
+
+# Object numbers reserved for objects written last but referenced early.
+# A linearized PDF numbers them when it is assembled instead.
+_PAGES_OBJ = 1
+_RESOURCES_OBJ = 2
+
+# A font selection or a shown string in FPDF's content streams. Matching
+# both in one pass keeps the contents of strings from being read as
+# operators.
+_TEXT_TOKENS = re.compile(
+    rb"^BT /(F\d+) |\(((?:[^\\()]|\\.)*)\) Tj", re.MULTILINE | re.DOTALL
+)
+_ESCAPE = re.compile(rb"\\(.)", re.DOTALL)
+
+# Entries per bfchar block of a ToUnicode CMap, the most PDF allows
+_BFCHAR_BLOCK = 100
+
+# Objects packed into one object stream. Larger streams compress a little
+# better, but are held in memory until they are full.
+_OBJECTS_PER_STREAM = 100
+
+# The largest offset a cross-reference table can hold. The linearization
+# dictionary and first-page trailer are padded to their length with values
+# this large, as their values depend on everything written after them.
+_MAX_OFFSET = 10**10 - 1
+
+_STREAM_END = b"\nendstream\nendobj\n"
+
+# Bytes copied from the spool at a time when assembling a linearized PDF
+_COPY_CHUNK = 1 << 20
+
+
+class PdfOptions(NamedTuple):
+    """How a PDF is encoded, trading file size against time to write and read.
+
+    ``compress_level`` is the Flate level for streams, from 1 (fastest) to
+    9 (smallest), or 0 to leave them uncompressed. ``object_streams`` packs
+    the objects that are not streams, such as page dictionaries, into
+    compressed object streams indexed by a cross-reference stream (PDF
+    1.5). ``linearize`` writes a linearized ("fast web view") PDF, whose
+    first page can be shown or printed before the rest has arrived. It
+    cannot be combined with ``object_streams``.
+    """
+
+    compress_level: int = DEFAULT_COMPRESS_LEVEL
+    object_streams: bool = False
+    linearize: bool = False
+
+
+class _Spooled(NamedTuple):
+    """Encoded stream data kept in a linearized PDF's spool until it is numbered."""
+
+    offset: int
+    length: int
+    # The /Filter entry for the data, if it is compressed
+    entries: bytes
+
+
+def pdf_string(text: str) -> bytes:
+    """Encode text as a PDF literal string, escaping delimiters."""
+    escaped = (
+        text.replace("\\", "\\\\")
+        .replace("(", "\\(")
+        .replace(")", "\\)")
+        .replace("\r", "\\r")
+    )
+    return b"(" + escaped.encode("latin-1", errors="replace") + b")"
+
+
+class PdfWriter:
+    """Write a PDF to a binary file object one page at a time.
+
+    Page content streams are written to ``out`` as soon as they are added, so
+    memory use does not grow with page count beyond one object offset per
+    object. Fonts, the page tree, the catalog and the cross-reference table
+    are written by :meth:`close`.
+
+    A linearized PDF must start with its first page and a table of where
+    every page is, so it is written to a temporary file first and
+    assembled into ``out`` by :meth:`close`. Memory use stays as flat.
+    """
+
+    def __init__(
+        self,
+        out: BinaryIO,
+        *,
+        title: str,
+        page_size: tuple[float, float],
+        options: PdfOptions | None = None,
+        creation_date: datetime | None = None,
+    ) -> None:
+        """Write the PDF header to ``out``.
+
+        Args:
+            out: Binary file object to write to. Need not be seekable.
+            title: Title for PDF metadata.
+            page_size: Page width and height in points.
+            options: How to encode the PDF. Defaults to ``PdfOptions()``.
+            creation_date: Creation date for PDF metadata. Defaults to
+                ``SOURCE_DATE_EPOCH`` from the environment if set, so that
+                identical input gives identical bytes, and otherwise now.
+
+        Raises:
+            ValueError: If the options are out of range or conflict.
+        """
+        options = options or PdfOptions()
+        if (
+            not zlib.Z_NO_COMPRESSION
+            <= options.compress_level
+            <= zlib.Z_BEST_COMPRESSION
+        ):
+            msg = f"Compression level must be 0 to 9, got {options.compress_level}"
+            raise ValueError(msg)
+        if options.object_streams and options.linearize:
+            msg = "Object streams cannot be combined with linearized output"
+            raise ValueError(msg)
+        self._out = out
+        self._title = title
+        self._media_box = b"[0 0 %.2f %.2f]" % page_size
+        self._options = options
+        self._creation_date = creation_date or _default_creation_date()
+        self._offsets: dict[int, int] = {}
+        self._next_obj = _RESOURCES_OBJ + 1
+        self._pages_obj = _PAGES_OBJ
+        self._resources_obj = _RESOURCES_OBJ
+        self._pos = 0
+        self._page_objs: list[int] = []
+        self._fonts: dict[str, str] = {}
+        self._truetype: dict[str, tuple[FontMetrics, set[int]]] = {}
+        self._forms: dict[str, int] = {}
+        # Objects waiting to be packed into an object stream, and the
+        # (stream, index) of each object already packed
+        self._unpacked: list[tuple[int, bytes]] = []
+        self._packed: dict[int, tuple[int, int]] = {}
+        # When linearizing, ``_out`` is the spool and pages and forms are
+        # kept there as encoded stream data until close() numbers them
+        self._linearized_out: BinaryIO | None = None
+        self._spooled_pages: list[_Spooled] = []
+        self._spooled_forms: list[tuple[str, tuple[float, ...], _Spooled]] = []
+        if options.linearize:
+            self._linearized_out = out
+            self._out = tempfile.TemporaryFile()  # noqa: SIM115 - closed by close()
+        else:
+            self._write(self._header())
+
+    @property
+    def pages_count(self) -> int:
+        """Number of pages written so far."""
+        return len(self._page_objs) + len(self._spooled_pages)
+
+    def _header(self) -> bytes:
+        """The PDF header, with the version the options need."""
+        version = b"1.5" if self._options.object_streams else b"1.3"
+        return b"%%PDF-%b\n%%\xe9\xeb\xf1\xbf\n" % version
+
+    def _write(self, data: bytes) -> None:
+        self._out.write(data)
+        self._pos += len(data)
+
+    def _reserve(self) -> int:
+        obj = self._next_obj
+        self._next_obj += 1
+        return obj
+
+    def _write_obj(self, obj: int, body: bytes) -> None:
+        """Write an object that is not a stream, or queue it for an object stream."""
+        if self._options.object_streams:
+            self._unpacked.append((obj, body))
+            if len(self._unpacked) == _OBJECTS_PER_STREAM:
+                self._write_object_stream()
+            return
+        self._offsets[obj] = self._pos
+        self._write(_obj_bytes(obj, body))
+
+    def _encode(self, content: bytes) -> tuple[bytes, bytes]:
+        """Compress stream content. Returns the data and its /Filter entry."""
+        if self._options.compress_level:
+            data = zlib.compress(content, self._options.compress_level)
+            return data, b"/Filter /FlateDecode\n"
+        return content, b""
+
+    def _write_stream(self, obj: int, content: bytes, entries: bytes = b"") -> None:
+        """Write a stream object, with extra dictionary ``entries`` if given."""
+        data, filter_entry = self._encode(content)
+        self._write_encoded(obj, data, entries + filter_entry)
+
+    def _write_encoded(self, obj: int, data: bytes, entries: bytes) -> None:
+        """Write a stream object whose data is already encoded."""
+        self._offsets[obj] = self._pos
+        self._write(_stream_start(obj, entries, len(data)) + data + _STREAM_END)
+
+    def _write_object_stream(self) -> None:
+        """Pack the queued objects into an object stream."""
+        stream_obj = self._reserve()
+        index, bodies, offset = [], [], 0
+        for position, (obj, body) in enumerate(self._unpacked):
+            self._packed[obj] = (stream_obj, position)
+            index.append(b"%d %d" % (obj, offset))
+            bodies.append(body)
+            offset += len(body) + 1
+        header = b" ".join(index) + b"\n"
+        self._write_stream(
+            stream_obj,
+            header + b"\n".join(bodies),
+            b"/First %d\n/N %d\n/Type /ObjStm\n" % (len(header), len(bodies)),
+        )
+        self._unpacked.clear()
+
+    def _spool(self, content: bytes) -> _Spooled:
+        """Encode stream content into the spool of a linearized PDF."""
+        data, filter_entry = self._encode(content)
+        spooled = _Spooled(self._pos, len(data), filter_entry)
+        self._write(data)
+        return spooled
+
+    def _write_spooled(self, obj: int, spooled: _Spooled, entries: bytes = b"") -> None:
+        """Write a stream object with data from the spool, at the spool's end."""
+        self._out.seek(spooled.offset)
+        data = self._out.read(spooled.length)
+        self._out.seek(0, os.SEEK_END)
+        self._write_encoded(obj, data, entries + spooled.entries)
+
+    def add_font(self, resource_name: str, base_font: str) -> None:
+        """Register a core font under the resource name used by page content."""
+        self._fonts[resource_name] = base_font
+
+    def add_truetype_font(self, resource_name: str, metrics: FontMetrics) -> None:
+        """Register a TrueType font whose text is encoded as glyph ids.
+
+        Must be called before any page or form using the font is added.
+        Strings shown in the font are read from content as it is added, and
+        :meth:`close` embeds a subset of the font with just those glyphs.
+        """
+        self._truetype[resource_name] = (metrics, set())
+
+    def _record_glyphs(self, content: bytes) -> None:
+        """Note the glyphs of TrueType fonts that ``content`` shows."""
+        font = None
+        for match in _TEXT_TOKENS.finditer(content):
+            if match[1] is not None:
+                font = self._truetype.get(match[1].decode())
+            elif font is not None:
+                codes = _ESCAPE.sub(_unescape, match[2])
+                font[1].update(
+                    hi << 8 | lo for hi, lo in zip(codes[::2], codes[1::2], strict=True)
+                )
+
+    def add_form(
+        self, name: str, content: bytes, bbox: tuple[float, float, float, float]
+    ) -> None:
+        """Write a form XObject that page content can paint with ``/name Do``.
+
+        Forms share the document resources, so their content may use the
+        same fonts as pages and paint other forms.
+        """
+        if self._truetype:
+            self._record_glyphs(content)
+        if self._linearized_out:
+            self._spooled_forms.append((name, bbox, self._spool(content)))
+            return
+        form_obj = self._reserve()
+        self._forms[name] = form_obj
+        self._write_stream(form_obj, content, self._form_entries(bbox))
+
+    def _form_entries(self, bbox: tuple[float, ...]) -> bytes:
+        """Dictionary entries of a form XObject."""
+        return (
+            b"/BBox [%.2f %.2f %.2f %.2f]\n/Resources %d 0 R\n"
+            b"/Subtype /Form\n/Type /XObject\n" % (*bbox, self._resources_obj)
+        )
+
+    def add_page(self, content: bytes) -> None:
+        """Write one page with the given content stream."""
+        if self._truetype:
+            self._record_glyphs(content)
+        if self._linearized_out:
+            self._spooled_pages.append(self._spool(content))
+            return
+        contents_obj = self._reserve()
+        page_obj = self._reserve()
+        self._write_stream(contents_obj, content)
+        self._write_obj(page_obj, self._page_dict(contents_obj))
+        self._page_objs.append(page_obj)
+
+    def _page_dict(self, contents_obj: int) -> bytes:
+        """The dictionary of the page whose content is ``contents_obj``."""
+        # A linearized PDF's page tree comes last, so pages do not inherit
+        # the media box from it, or the first page could not be shown early
+        media_box = b"/MediaBox %b\n" % self._media_box if self._linearized_out else b""
+        return (
+            b"<<\n/Contents %d 0 R\n%b/Parent %d 0 R\n/Resources %d 0 R\n"
+            b"/Type /Page\n>>"
+            % (
+                contents_obj,
+                media_box,
+                self._pages_obj,
+                self._resources_obj,
+            )
+        )
+
+    def close(self) -> None:
+        """Write fonts, page tree, catalog and trailer. Does not close ``out``."""
+        if self._linearized_out:
+            self._close_linearized(self._linearized_out)
+            return
+        self._write_resources()
+        self._write_page_tree(self._page_objs)
+        catalog_obj = self._reserve()
+        self._write_catalog(catalog_obj)
+        info_obj = self._reserve()
+        self._write_info(info_obj)
+        if self._options.object_streams:
+            self._write_xref_stream(catalog_obj, info_obj)
+        else:
+            self._write_xref_table(catalog_obj, info_obj)
+
+    def _write_resources(self) -> None:
+        """Write the fonts and the resource dictionary all pages share."""
+        font_refs = []
+        for resource_name, base_font in sorted(self._fonts.items()):
+            font_obj = self._reserve()
+            encoding = (
+                b"" if base_font in _SYMBOLIC_FONTS else b"/Encoding /WinAnsiEncoding\n"
+            )
+            self._write_obj(
+                font_obj,
+                b"<<\n/BaseFont /%b\n%b/Subtype /Type1\n/Type /Font\n>>"
+                % (base_font.encode(), encoding),
+            )
+            font_refs.append(b"/%b %d 0 R" % (resource_name.encode(), font_obj))
+        for resource_name, (metrics, glyphs) in sorted(self._truetype.items()):
+            font_obj = self._write_truetype_font(metrics, glyphs)
+            font_refs.append(b"/%b %d 0 R" % (resource_name.encode(), font_obj))
+        font_refs.sort()
+        form_refs = [
+            b"/%b %d 0 R" % (name.encode(), obj) for name, obj in self._forms.items()
+        ]
+        xobjects = b"/XObject <<%b>>\n" % b"\n".join(form_refs) if form_refs else b""
+        self._write_obj(
+            self._resources_obj,
+            b"<<\n/Font <<%b>>\n/ProcSet [/PDF /Text]\n%b>>"
+            % (b"\n".join(font_refs), xobjects),
+        )
+
+    def _write_page_tree(self, page_objs: list[int]) -> None:
+        kids = b" ".join(b"%d 0 R" % obj for obj in page_objs)
+        self._write_obj(
+            self._pages_obj,
+            b"<<\n/Count %d\n/Kids [%b]\n/MediaBox %b\n/Type /Pages\n>>"
+            % (len(page_objs), kids, self._media_box),
+        )
+
+    def _write_catalog(self, catalog_obj: int) -> None:
+        self._write_obj(
+            catalog_obj,
+            b"<<\n/PageLayout /OneColumn\n/Pages %d 0 R\n/Type /Catalog\n>>"
+            % self._pages_obj,
+        )
+
+    def _write_info(self, info_obj: int) -> None:
+        creation_date = self._creation_date.astimezone(UTC)
+        self._write_obj(
+            info_obj,
+            b"<<\n/CreationDate %b\n/Title %b\n>>"
+            % (
+                pdf_string(creation_date.strftime("D:%Y%m%d%H%M%SZ")),
+                pdf_string(self._title),
+            ),
+        )
+
+    def _write_xref_table(self, catalog_obj: int, info_obj: int) -> None:
+        xref_pos = self._pos
+        lines = [b"xref\n0 %d\n" % self._next_obj, b"0000000000 65535 f \n"]
+        lines.extend(
+            b"%010d 00000 n \n" % self._offsets[obj] for obj in range(1, self._next_obj)
+        )
+        self._write(b"".join(lines))
+        self._write(
+            b"trailer\n<<\n/Size %d\n/Root %d 0 R\n/Info %d 0 R\n>>\n"
+            b"startxref\n%d\n%%%%EOF\n"
+            % (self._next_obj, catalog_obj, info_obj, xref_pos)
+        )
+
+    def _write_xref_stream(self, catalog_obj: int, info_obj: int) -> None:
+        """Write the last object stream and a cross-reference stream indexing it."""
+        if self._unpacked:
+            self._write_object_stream()
+        xref_obj = self._reserve()
+        xref_pos = self._offsets[xref_obj] = self._pos
+        # Wide enough for the largest offset or object stream number
+        width = max(1, (max(xref_pos, self._next_obj).bit_length() + 7) // 8)
+        rows = [b"\x00" + bytes(width) + b"\xff\xff"]
+        for obj in range(1, self._next_obj):
+            if obj in self._packed:
+                stream_obj, position = self._packed[obj]
+                rows.append(b"\x02" + stream_obj.to_bytes(width) + position.to_bytes(2))
+            else:
+                rows.append(b"\x01" + self._offsets[obj].to_bytes(width) + b"\x00\x00")
+        self._write_stream(
+            xref_obj,
+            b"".join(rows),
+            b"/Info %d 0 R\n/Root %d 0 R\n/Size %d\n/Type /XRef\n/W [1 %d 2]\n"
+            % (info_obj, catalog_obj, self._next_obj, width),
+        )
+        self._write(b"startxref\n%d\n%%%%EOF\n" % xref_pos)
+
+    def _close_linearized(self, out: BinaryIO) -> None:
+        """Number the spooled objects and write the linearized PDF to ``out``.
+
+        Pages after the first, then the page tree and info dictionary, take
+        the low object numbers. The first page, the resources all pages
+        share and the catalog are numbered after them, so each of the two
+        cross-reference tables covers one run of numbers.
+        """
+        if not self._spooled_pages:
+            msg = "A linearized PDF needs at least one page"
+            raise ValueError(msg)
+        first_page, *later_pages = self._spooled_pages
+        later_objs = [(2 * i + 1, 2 * i + 2) for i in range(len(later_pages))]
+        self._pages_obj = 2 * len(later_pages) + 1
+        info_obj = self._pages_obj + 1
+        self._next_obj = info_obj + 1
+        linearization_obj = self._reserve()
+        catalog_obj = self._reserve()
+        page_obj = self._reserve()
+        contents_obj = self._reserve()
+        self._resources_obj = self._reserve()
+
+        # Append the objects numbered here to the spool, part by part
+        parts = [self._pos]
+        self._write_catalog(catalog_obj)
+        parts.append(self._pos)
+        self._write_obj(page_obj, self._page_dict(contents_obj))
+        self._write_spooled(contents_obj, first_page)
+        for name, bbox, form in self._spooled_forms:
+            self._forms[name] = self._reserve()
+            self._write_spooled(self._forms[name], form, self._form_entries(bbox))
+        self._write_resources()
+        parts.append(self._pos)
+        self._write_page_tree([page_obj, *(page for page, _ in later_objs)])
+        self._write_info(info_obj)
+        parts.append(self._pos)
+
+        layout = _LinearizedLayout(
+            linearization_obj,
+            catalog_obj,
+            info_obj,
+            page_obj,
+            self._reserve(),
+            self._next_obj,
+            len(self._spooled_pages),
+        )
+        later = [
+            (page, contents, self._page_dict(contents), spooled)
+            for (page, contents), spooled in zip(later_objs, later_pages, strict=True)
+        ]
+        spool = self._out
+        try:
+            self._write_linearized(out, layout, parts, later)
+        finally:
+            spool.close()
+
+    def _write_linearized(
+        self,
+        out: BinaryIO,
+        layout: "_LinearizedLayout",
+        parts: list[int],
+        later: list[tuple[int, int, bytes, _Spooled]],
+    ) -> None:
+        """Lay out the parts of a linearized PDF and copy them to ``out``.
+
+        The order is that of the PDF specification's Annex F: the
+        linearization dictionary and first-page cross-reference table, the
+        catalog (``parts[0:2]`` of the spool), the hint stream, the first
+        page and shared resources (``parts[1:3]``), the later pages, the page
+        tree and info dictionary (``parts[2:4]``), and the main
+        cross-reference table.
+        """
+        spool = self._out
+        header = self._header()
+        first_xref_at = len(header) + len(
+            _obj_bytes(layout.first, layout.linearization_dict(0, (0, 0), 0, 0))
+        )
+        catalog_at = first_xref_at + len(
+            layout.first_page_xref([0] * (layout.size - layout.first))
+        )
+        hint_at = catalog_at + parts[1] - parts[0]
+
+        # The first page's section is written in object number order, which
+        # the shared object hint table relies on: (object, offset, length)
+        ends = dict(itertools.pairwise(sorted([*self._offsets.values(), parts[3]])))
+        first_section = sorted(
+            (obj, offset, ends[offset] - offset)
+            for obj, offset in self._offsets.items()
+            if parts[1] <= offset < parts[2]
+        )
+        later_lengths = [
+            (
+                len(_obj_bytes(page, page_dict)),
+                len(_obj_bytes(page, page_dict))
+                + len(_stream_start(contents, spooled.entries, spooled.length))
+                + spooled.length
+                + len(_STREAM_END),
+            )
+            for page, contents, page_dict, spooled in later
+        ]
+        # Later pages share all of the first page's section but the first
+        # page's own page and content objects, which are numbered first
+        shared = list(range(2, len(first_section)))
+        # The hint tables give offsets as if the hint stream were not there
+        page_hints = _page_offset_hints(
+            hint_at,
+            [
+                (len(first_section), parts[2] - parts[1]),
+                *((2, length) for _, length in later_lengths),
+            ],
+            [[], *itertools.repeat(shared, len(later))],
+            len(first_section),
+        )
+        data, filter_entry = self._encode(
+            page_hints
+            + _shared_object_hints([length for _, _, length in first_section])
+        )
+        hint = (
+            _stream_start(
+                layout.hint, b"/S %d\n%b" % (len(page_hints), filter_entry), len(data)
+            )
+            + data
+            + _STREAM_END
+        )
+
+        offsets = {
+            layout.first: len(header),
+            layout.catalog: catalog_at,
+            layout.hint: hint_at,
+        }
+        position = hint_at + len(hint)
+        for obj, _, length in first_section:
+            offsets[obj] = position
+            position += length
+        first_page_end = position
+        for (page, contents, _, _), (page_len, length) in zip(
+            later, later_lengths, strict=True
+        ):
+            offsets[page] = position
+            offsets[contents] = position + page_len
+            position += length
+        for obj in (self._pages_obj, layout.info):
+            offsets[obj] = self._offsets[obj] - parts[2] + position
+        main_xref_at = position + parts[3] - parts[2]
+
+        main_xref_head = b"xref\n0 %d" % layout.first
+        main_xref = b"".join(
+            [
+                main_xref_head,
+                b"\n0000000000 65535 f \n",
+                *(b"%010d 00000 n \n" % offsets[obj] for obj in range(1, layout.first)),
+                b"trailer\n<<\n/Size %d\n>>\nstartxref\n%d\n%%%%EOF\n"
+                % (layout.first, first_xref_at),
+            ]
+        )
+        linearization = layout.linearization_dict(
+            main_xref_at + len(main_xref),
+            (hint_at, len(hint)),
+            first_page_end,
+            # The end of line before the main table's first entry
+            main_xref_at + len(main_xref_head),
+        )
+
+        out.write(header)
+        out.write(_obj_bytes(layout.first, linearization))
+        out.write(
+            layout.first_page_xref(
+                [offsets[obj] for obj in range(layout.first, layout.size)],
+                main_xref_at,
+            )
+        )
+        _copy(spool, parts[0], parts[1], out)
+        out.write(hint)
+        for _, offset, length in first_section:
+            _copy(spool, offset, offset + length, out)
+        for page, contents, page_dict, spooled in later:
+            out.write(
+                _obj_bytes(page, page_dict)
+                + _stream_start(contents, spooled.entries, spooled.length)
+            )
+            _copy(spool, spooled.offset, spooled.offset + spooled.length, out)
+            out.write(_STREAM_END)
+        _copy(spool, parts[2], parts[3], out)
+        out.write(main_xref)
+
+    def _write_truetype_font(self, metrics: FontMetrics, glyphs: set[int]) -> int:
+        """Embed a subset of a TrueType font as a Type 0 font. Returns its object.
+
+        Character codes are glyph ids (Identity-H), and the subset keeps
+        glyph ids, so no code-to-glyph map is needed.
+        """
+        glyphs = {0, *glyphs}
+        # Subset fonts are named with a tag derived from the glyphs they hold
+        tag_hash = hashlib.sha256(str(sorted(glyphs)).encode()).digest()
+        tag = bytes(65 + byte % 26 for byte in tag_hash[:6])
+        base_font = b"%b+%b" % (tag, metrics.name.encode())
+
+        font_file_obj = self._reserve()
+        program = subset_font(metrics, glyphs)
+        self._write_stream(font_file_obj, program, b"/Length1 %d\n" % len(program))
+
+        descriptor_obj = self._reserve()
+        self._write_obj(
+            descriptor_obj,
+            b"<<\n/Ascent %d\n/CapHeight %d\n/Descent %d\n/Flags %d\n"
+            b"/FontBBox [%d %d %d %d]\n/FontFile2 %d 0 R\n/FontName /%b\n"
+            b"/ItalicAngle %d\n/MissingWidth %d\n/StemV %d\n/Type /FontDescriptor\n>>"
+            % (
+                metrics.ascent,
+                metrics.cap_height,
+                metrics.descent,
+                metrics.flags,
+                *metrics.bbox,
+                font_file_obj,
+                base_font,
+                metrics.italic_angle,
+                metrics.default_width,
+                metrics.stem_v,
+            ),
+        )
+
+        cid_font_obj = self._reserve()
+        self._write_obj(
+            cid_font_obj,
+            b"<<\n/BaseFont /%b\n/CIDSystemInfo <<\n/Ordering (Identity)\n"
+            b"/Registry (Adobe)\n/Supplement 0\n>>\n/CIDToGIDMap /Identity\n"
+            b"/DW %d\n/FontDescriptor %d 0 R\n/Subtype /CIDFontType2\n"
+            b"/Type /Font\n/W [%b]\n>>"
+            % (
+                base_font,
+                metrics.default_width,
+                descriptor_obj,
+                _glyph_widths(metrics, glyphs),
+            ),
+        )
+
+        to_unicode_obj = self._reserve()
+        self._write_stream(to_unicode_obj, _to_unicode_cmap(metrics, glyphs))
+
+        font_obj = self._reserve()
+        self._write_obj(
+            font_obj,
+            b"<<\n/BaseFont /%b\n/DescendantFonts [%d 0 R]\n/Encoding /Identity-H\n"
+            b"/Subtype /Type0\n/ToUnicode %d 0 R\n/Type /Font\n>>"
+            % (base_font, cid_font_obj, to_unicode_obj),
+        )
+        return font_obj
+
+
+class _LinearizedLayout(NamedTuple):
+    """Object numbers a linearized PDF's first-page trailer refers to."""
+
+    # The linearization dictionary, the lowest number in the first-page section
+    first: int
+    catalog: int
+    info: int
+    page: int
+    hint: int
+    size: int
+    pages: int
+
+    def linearization_dict(
+        self,
+        length: int,
+        hint: tuple[int, int],
+        first_page_end: int,
+        main_xref: int,
+    ) -> bytes:
+        """The linearization parameter dictionary, padded to a fixed length.
+
+        Its values depend on where everything after it goes, so its own
+        length must not.
+        """
+
+        def body(*values: int) -> bytes:
+            return (
+                b"<<\n/E %d\n/H [%d %d]\n/L %d\n/Linearized 1\n/N %d\n/O %d\n"
+                b"/T %d\n>>" % values
+            )
+
+        values = (first_page_end, *hint, length, self.pages, self.page, main_xref)
+        return body(*values).ljust(len(body(*[_MAX_OFFSET] * len(values))))
+
+    def first_page_xref(self, offsets: list[int], main_xref: int = 0) -> bytes:
+        """The first-page cross-reference table and trailer.
+
+        ``offsets`` are those of objects ``first`` up to ``size``. The
+        trailer is padded so that its length does not depend on
+        ``main_xref``, the offset of the main table.
+        """
+
+        def trailer(prev: int) -> bytes:
+            return b"<<\n/Info %d 0 R\n/Prev %d\n/Root %d 0 R\n/Size %d\n>>" % (
+                self.info,
+                prev,
+                self.catalog,
+                self.size,
+            )
+
+        return b"".join(
+            [
+                b"xref\n%d %d\n" % (self.first, self.size - self.first),
+                *(b"%010d 00000 n \n" % offset for offset in offsets),
+                b"trailer\n",
+                trailer(main_xref).ljust(len(trailer(_MAX_OFFSET))),
+                b"\nstartxref\n0\n%%EOF\n",
+            ]
+        )
+
+
+def _obj_bytes(obj: int, body: bytes) -> bytes:
+    """An object that is not a stream, as written to the file."""
+    return b"%d 0 obj\n%b\nendobj\n" % (obj, body)
+
+
+def _stream_start(obj: int, entries: bytes, length: int) -> bytes:
+    """A stream object up to its data, which ``_STREAM_END`` follows."""
+    return b"%d 0 obj\n<<\n%b/Length %d\n>>\nstream\n" % (obj, entries, length)
+
+
+def _copy(src: BinaryIO, start: int, end: int, out: BinaryIO) -> None:
+    """Copy bytes ``start`` to ``end`` of ``src`` to ``out``."""
+    src.seek(start)
+    while start < end:
+        chunk = src.read(min(_COPY_CHUNK, end - start))
+        out.write(chunk)
+        start += len(chunk)
+
+
+class _BitWriter:
+    """Pack unsigned integers into bytes, most significant bit first."""
+
+    def __init__(self) -> None:
+        self.data = bytearray()
+        self._bits = 0
+        self._count = 0
+
+    def write(self, value: int, width: int) -> None:
+        """Append ``value`` in ``width`` bits."""
+        self._bits = self._bits << width | value
+        self._count += width
+        while self._count >= 8:  # noqa: PLR2004 - bits per byte
+            self._count -= 8
+            self.data.append(self._bits >> self._count & 0xFF)
+        self._bits &= (1 << self._count) - 1
+
+    def write_all(self, values: Iterable[int], width: int) -> None:
+        """Append each of ``values`` in ``width`` bits, then pad to a byte."""
+        for value in values:
+            self.write(value, width)
+        if self._count:
+            self.write(0, 8 - self._count)
+
+
+def _page_offset_hints(
+    first_page_offset: int,
+    pages: list[tuple[int, int]],
+    shared: list[list[int]],
+    shared_objects: int,
+) -> bytes:
+    """A page offset hint table (PDF specification, Annex F.4.1).
+
+    ``pages`` holds the number of objects and length in bytes of each page,
+    and ``shared`` the entries of the shared object hint table, which has
+    ``shared_objects`` of them, that each page uses. As Acrobat does, each
+    page's content stream is given as starting at the page and being as long
+    as it.
+    """
+    counts = [count for count, _ in pages]
+    lengths = [length for _, length in pages]
+    least_count, least_length = min(counts), min(lengths)
+    count_bits = (max(counts) - least_count).bit_length()
+    length_bits = (max(lengths) - least_length).bit_length()
+    shared_count_bits = max(map(len, shared)).bit_length()
+    identifier_bits = shared_objects.bit_length()
+
+    bits = _BitWriter()
+    for value, width in [
+        (least_count, 32),
+        (first_page_offset, 32),
+        (count_bits, 16),
+        (least_length, 32),
+        (length_bits, 16),
+        (0, 32),  # least content stream offset
+        (0, 16),  # bits for content stream offsets
+        (least_length, 32),
+        (length_bits, 16),
+        (shared_count_bits, 16),
+        (identifier_bits, 16),
+        (0, 16),  # bits for shared object numerators
+        (1, 16),  # shared object denominator
+    ]:
+        bits.write(value, width)
+    bits.write_all((count - least_count for count in counts), count_bits)
+    bits.write_all((length - least_length for length in lengths), length_bits)
+    bits.write_all(map(len, shared), shared_count_bits)
+    bits.write_all(itertools.chain.from_iterable(shared), identifier_bits)
+    # Numerators and content stream offsets take no bits
+    bits.write_all((length - least_length for length in lengths), length_bits)
+    return bytes(bits.data)
+
+
+def _shared_object_hints(lengths: list[int]) -> bytes:
+    """A shared object hint table (PDF specification, Annex F.4.2).
+
+    Every shared object is in the first page's section, whose objects have
+    ``lengths``. Each is a group of its own.
+    """
+    least_length = min(lengths)
+    length_bits = (max(lengths) - least_length).bit_length()
+    bits = _BitWriter()
+    for value, width in [
+        (0, 32),  # first object after the first page's section: none
+        (0, 32),  # and its offset
+        (len(lengths), 32),
+        (len(lengths), 32),
+        (0, 16),  # bits for the number of objects in a group
+        (least_length, 32),
+        (length_bits, 16),
+    ]:
+        bits.write(value, width)
+    bits.write_all((length - least_length for length in lengths), length_bits)
+    bits.write_all((0 for _ in lengths), 1)  # no MD5 signatures
+    return bytes(bits.data)
+
+
+def _unescape(match: re.Match[bytes]) -> bytes:
+    """Undo :func:`fpdf.util.escape_parens` for one escape sequence."""
+    return b"\r" if match[1] == b"r" else match[1]
+
+
+def _glyph_widths(metrics: FontMetrics, glyphs: set[int]) -> bytes:
+    """A CIDFont ``/W`` array body giving the widths of ``glyphs``.
+
+    Runs of consecutive glyph ids share one entry.
+    """
+    runs: list[list[int]] = []
+    previous = -2
+    for gid in sorted(glyphs):
+        if gid != previous + 1:
+            runs.append([gid])
+        runs[-1].append(metrics.widths[gid])
+        previous = gid
+    return b" ".join(
+        b"%d [%b]" % (first, b" ".join(b"%d" % width for width in widths))
+        for first, *widths in runs
+    )
+
+
+def _to_unicode_cmap(metrics: FontMetrics, glyphs: set[int]) -> bytes:
+    """A ToUnicode CMap mapping each of ``glyphs`` to its character.
+
+    Where several characters share a glyph, the lowest code point is used.
+    """
+    # Later entries win, so iterate from the highest code point down
+    chars = {
+        gid: code
+        for code, gid in sorted(metrics.cmap.items(), reverse=True)
+        if gid in glyphs
+    }
+    entries = [
+        b"<%04X> <%b>" % (gid, chr(code).encode("utf-16-be").hex().upper().encode())
+        for gid, code in sorted(chars.items())
+    ]
+    blocks = [
+        b"%d beginbfchar\n%b\nendbfchar\n" % (len(block), b"\n".join(block))
+        for block in (
+            entries[i : i + _BFCHAR_BLOCK]
+            for i in range(0, len(entries), _BFCHAR_BLOCK)
+        )
+    ]
+    return (
+        b"/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n"
+        b"/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n"
+        b"/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n"
+        b"1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n"
+        b"%bendcmap\nCMapName currentdict /CMap defineresource pop\nend\nend"
+        % b"".join(blocks)
+    )
+
+
+def _default_creation_date() -> datetime:
+    """``SOURCE_DATE_EPOCH`` if set to a valid timestamp, otherwise now."""
+    epoch = os.environ.get("SOURCE_DATE_EPOCH", "")
+    if epoch.isdigit():
+        return datetime.fromtimestamp(int(epoch), UTC)
+    return datetime.now(UTC)
@@ -0,0 +1,383 @@
+"""Streaming reader for Excel ``.xlsx`` workbooks.
+
+Reads the cells of one worksheet as text, like :func:`csv.reader` reads a
+CSV file, without a spreadsheet library: the workbook is a zip archive of
+XML parts, which are parsed incrementally so memory does not grow with the
+number of rows.
+"""
+
+import re
+import zipfile
+import zlib
+from collections.abc import Iterator
+from pathlib import Path, PurePosixPath
+from types import TracebackType
+from typing import BinaryIO, Self, override
+from xml.parsers import expat
+
+# Suffixes of workbooks read as .xlsx whatever their first bytes
+SUFFIXES = frozenset({".xlsx", ".xlsm"})
+
+# Every zip archive, and so every workbook, starts with a local file header
+ZIP_MAGIC = b"PK\x03\x04"
+
+_WORKBOOK = "xl/workbook.xml"
+_WORKBOOK_RELS = "xl/_rels/workbook.xml.rels"
+_SHARED_STRINGS = "xl/sharedStrings.xml"
+
+# Bytes of a part decompressed and parsed at a time
+_CHUNK_SIZE = 64 * 1024
+
+# Characters XML cannot carry, such as carriage returns, written as _xHHHH_
+_ESCAPED_CHAR = re.compile(r"_x([0-9A-Fa-f]{4})_")
+
+_BOOLEANS = {"0": "FALSE", "1": "TRUE"}
+
+
+class XlsxError(ValueError):
+    """A workbook that cannot be read."""
+
+
+def is_xlsx(path: Path) -> bool:
+    """Whether ``path`` names a workbook, by its suffix or its first bytes.
+
+    Raises:
+        OSError: If a file without a workbook suffix cannot be read.
+    """
+    if path.suffix.lower() in SUFFIXES:
+        return True
+    with path.open("rb") as f:
+        return f.read(len(ZIP_MAGIC)) == ZIP_MAGIC
+
+
+class XlsxReader:
+    """Iterate over the rows of one worksheet as lists of cell text.
+
+    Like :func:`csv.reader`, each row is a list of strings and
+    :attr:`line_num` is the number of the row last read, here the row
+    number Excel shows. Empty cells before the last value of a row are
+    empty strings, and rows without any value are skipped.
+
+    Cells are read as Excel stores them: text as written, so leading zeros
+    survive in text cells; numbers in their shortest form, up to Excel's 15
+    significant digits (dates are numbers of days); booleans as ``TRUE`` or
+    ``FALSE``; and formulas as their last calculated value.
+
+    The shared strings table, which holds each distinct text once, is read
+    up front; the worksheet is parsed one row at a time.
+    """
+
+    def __init__(self, source: Path | str | BinaryIO, sheet: str | None = None) -> None:
+        """Open the workbook ``source`` at the sheet named ``sheet``, or the first.
+
+        Raises:
+            XlsxError: If ``source`` is not a workbook or has no such sheet.
+            OSError: If ``source`` cannot be read.
+        """
+        try:
+            self._zip = zipfile.ZipFile(source)
+        except zipfile.BadZipFile as e:
+            msg = f"Not an .xlsx workbook: {e}"
+            raise XlsxError(msg) from e
+        try:
+            self._sheet_part = self._find_sheet(sheet)
+            self._strings = self._read_shared_strings()
+        except BaseException:
+            self._zip.close()
+            raise
+        self.line_num = 0
+        self._rows: Iterator[list[str]] | None = None
+
+    def __enter__(self) -> Self:
+        """Return the reader, closing the workbook on exit."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        """Close the workbook."""
+        self.close()
+
+    def close(self) -> None:
+        """Close the workbook."""
+        self._zip.close()
+
+    def __iter__(self) -> Self:
+        """Return the reader, which iterates over its rows once."""
+        return self
+
+    def __next__(self) -> list[str]:
+        """Read the next row with a value.
+
+        Raises:
+            XlsxError: If the worksheet is damaged.
+        """
+        if self._rows is None:
+            self._rows = self._read_rows()
+        try:
+            return next(self._rows)
+        except (expat.ExpatError, zipfile.BadZipFile, zlib.error, EOFError) as e:
+            msg = f"Damaged worksheet {self._sheet_part}: {e}"
+            raise XlsxError(msg) from e
+
+    def _parse(self, part: str, handler: "_Handler") -> Iterator[None]:
+        """Feed an XML part to ``handler`` a chunk at a time, yielding after each.
+
+        Raises:
+            XlsxError: If the workbook has no such part.
+        """
+        # Python's expat expands no external entities and limits entity
+        # amplification, so untrusted workbooks are safe to parse
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        parser.StartElementHandler = handler.start
+        parser.EndElementHandler = handler.end
+        parser.CharacterDataHandler = handler.data
+        try:
+            f = self._zip.open(part)
+        except KeyError as e:
+            msg = f"Not an .xlsx workbook: no {part}"
+            raise XlsxError(msg) from e
+        with f:
+            while chunk := f.read(_CHUNK_SIZE):
+                parser.Parse(chunk, False)  # noqa: FBT003
+                yield
+            parser.Parse(b"", True)  # noqa: FBT003
+        yield
+
+    def _find_sheet(self, name: str | None) -> str:
+        """Path in the archive of the worksheet called ``name``, or the first."""
+        workbook = _WorkbookHandler()
+        try:
+            for part in (_WORKBOOK, _WORKBOOK_RELS):
+                for _ in self._parse(part, workbook):
+                    pass
+        except expat.ExpatError as e:
+            msg = f"Damaged workbook: {e}"
+            raise XlsxError(msg) from e
+        sheets = workbook.sheets
+        if not sheets:
+            msg = "Workbook has no sheets"
+            raise XlsxError(msg)
+        if name is None:
+            relationship = next(iter(sheets.values()))
+        elif name in sheets:
+            relationship = sheets[name]
+        else:
+            msg = f"Sheet {name!r} not found. Sheets: {', '.join(sheets)}"
+            raise XlsxError(msg)
+        target = workbook.targets.get(relationship)
+        if not target:
+            msg = f"Damaged workbook: sheet {relationship!r} has no part"
+            raise XlsxError(msg)
+        # Targets are relative to xl/, unless absolute within the archive
+        if target.startswith("/"):
+            return target.lstrip("/")
+        return str(PurePosixPath("xl", target))
+
+    def _read_shared_strings(self) -> list[str]:
+        """The workbook's table of distinct texts, by index."""
+        if _SHARED_STRINGS not in self._zip.NameToInfo:
+            return []
+        handler = _SharedStringsHandler()
+        try:
+            for _ in self._parse(_SHARED_STRINGS, handler):
+                pass
+        except (expat.ExpatError, zlib.error) as e:
+            msg = f"Damaged shared strings: {e}"
+            raise XlsxError(msg) from e
+        return handler.strings
+
+    def _read_rows(self) -> Iterator[list[str]]:
+        """Yield the worksheet's rows with a value, setting :attr:`line_num`."""
+        handler = _SheetHandler(self._strings)
+        for _ in self._parse(self._sheet_part, handler):
+            for line, values in handler.rows:
+                self.line_num = line
+                yield values
+            handler.rows.clear()
+
+
+class _LocalNames(dict[str, str]):
+    """Element names without their prefix, worked out once per name.
+
+    Prefixes differ between workbooks, and Strict ones use other namespaces.
+    """
+
+    def __missing__(self, name: str) -> str:
+        local = self[name] = name.rpartition(":")[2]
+        return local
+
+
+class _Handler:
+    """Expat callbacks for one XML part, gathering the text of elements."""
+
+    def __init__(self) -> None:
+        self.tags = _LocalNames()
+        self.texts: list[str] = []
+        self.collecting = False
+
+    def start(self, name: str, attrs: dict[str, str]) -> None:
+        """Handle the start of an element."""
+
+    def end(self, name: str) -> None:
+        """Handle the end of an element."""
+
+    def data(self, text: str) -> None:
+        if self.collecting:
+            self.texts.append(text)
+
+
+class _WorkbookHandler(_Handler):
+    """Sheets by name, and the parts of relationships, of a workbook."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.sheets: dict[str, str] = {}
+        self.targets: dict[str, str] = {}
+
+    @override
+    def start(self, name: str, attrs: dict[str, str]) -> None:
+        tag = self.tags[name]
+        if tag == "sheet":
+            # The relationship is r:id, under a prefix that may differ
+            relationship = next(
+                (v for k, v in attrs.items() if self.tags[k] == "id"), ""
+            )
+            self.sheets[attrs.get("name", "")] = relationship
+        elif tag == "Relationship":
+            self.targets[attrs.get("Id", "")] = attrs.get("Target", "")
+
+
+class _SharedStringsHandler(_Handler):
+    """The texts of a shared strings table, each plain or rich text.
+
+    Phonetic guides (``rPh``) are left out, as Excel does when showing text.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.strings: list[str] = []
+        self._phonetic = False
+
+    @override
+    def start(self, name: str, attrs: dict[str, str]) -> None:
+        tag = self.tags[name]
+        if tag == "t":
+            self.collecting = not self._phonetic
+        elif tag == "si":
+            self.texts.clear()
+        elif tag == "rPh":
+            self._phonetic = True
+
+    @override
+    def end(self, name: str) -> None:
+        tag = self.tags[name]
+        if tag == "t":
+            self.collecting = False
+        elif tag == "si":
+            self.strings.append(_unescape("".join(self.texts)))
+        elif tag == "rPh":
+            self._phonetic = False
+
+
+class _SheetHandler(_Handler):
+    """Rows of a worksheet with a value, with their row numbers.
+
+    A cell's text is its value (``v``) or, for inline strings, its text
+    (``t``) without phonetic guides.
+    """
+
+    def __init__(self, strings: list[str]) -> None:
+        super().__init__()
+        self.strings = strings
+        self.rows: list[tuple[int, list[str]]] = []
+        self._line = 0
+        self._values: list[str] = []
+        self._kind = "n"
+        self._reference = ""
+        self._phonetic = False
+
+    @override
+    def start(self, name: str, attrs: dict[str, str]) -> None:
+        tag = self.tags[name]
+        if tag == "c":
+            self._kind = attrs.get("t", "n")
+            self._reference = attrs.get("r", "")
+            self.texts.clear()
+        elif tag == "v":
+            self.collecting = True
+        elif tag == "row":
+            self._line = int(attrs.get("r", self._line + 1))
+            self._values = []
+        elif tag == "t":
+            self.collecting = not self._phonetic
+        elif tag == "rPh":
+            self._phonetic = True
+
+    @override
+    def end(self, name: str) -> None:
+        tag = self.tags[name]
+        if tag in {"v", "t"}:
+            self.collecting = False
+        elif tag == "c":
+            values = self._values
+            if self._reference:
+                # Cells without a value are often left out, so place each by
+                # its column letters
+                column = _column_index(self._reference)
+                if column > len(values):
+                    values.extend([""] * (column - len(values)))
+            values.append(self._value() if self.texts else "")
+        elif tag == "row":
+            values = self._values
+            while values and not values[-1]:
+                values.pop()
+            if values:
+                self.rows.append((self._line, values))
+        elif tag == "rPh":
+            self._phonetic = False
+
+    def _value(self) -> str:
+        """The current cell's value as text."""
+        value = "".join(self.texts)
+        kind = self._kind
+        if kind == "s":
+            try:
+                return self.strings[int(value)]
+            except (IndexError, ValueError) as e:
+                msg = f"Damaged cell {self._reference}: no shared string {value}"
+                raise XlsxError(msg) from e
+        if kind == "n":
+            return _number(value)
+        if kind == "b":
+            return _BOOLEANS.get(value, value)
+        # Inline and formula text, errors such as #N/A ("e") and ISO dates ("d")
+        return _unescape(value)
+
+
+def _unescape(text: str) -> str:
+    if "_x" not in text:
+        return text
+    return _ESCAPED_CHAR.sub(lambda m: chr(int(m[1], 16)), text)
+
+
+def _number(value: str) -> str:
+    """A stored number as Excel's General format would show it."""
+    if value.lstrip("-").isdigit():
+        return value
+    try:
+        return format(float(value), ".15g")
+    except ValueError:
+        return value
+
+
+def _column_index(reference: str) -> int:
+    """Zero-based column of a cell reference such as ``"AB12"``."""
+    index = 0
+    for char in reference.rstrip("0123456789"):
+        index = index * 26 + ord(char) - ord("A") + 1
+    return index - 1
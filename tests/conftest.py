@@ -25,3 +25,51 @@ def email_csv_path(tmp_path):
 @pytest.fixture
 def bad_csv_path(tmp_path):
     return _write_csv(tmp_path / "bad.csv", "foo,bar,baz", ["1,2,3"])
+
+
+# Characters the test font has glyphs for
+FONT_CHARS = "".join(map(chr, range(0x20, 0x7F))) + "ŁłąęśćżźńóäöüßĐđươạịễệ"
+
+
+def _build_font(path: Path, chars: str = FONT_CHARS) -> Path:
+    """Write a TrueType font with a box glyph for each of ``chars``."""
+    from fontTools.fontBuilder import FontBuilder  # noqa: PLC0415
+    from fontTools.pens.ttGlyphPen import TTGlyphPen  # noqa: PLC0415
+
+    names = [".notdef", *(f"uni{ord(char):04X}" for char in chars)]
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder(names)
+    builder.setupCharacterMap({ord(char): f"uni{ord(char):04X}" for char in chars})
+    glyphs = {}
+    for name in names:
+        pen = TTGlyphPen(None)
+        pen.moveTo((50, 0))
+        pen.lineTo((50, 700))
+        pen.lineTo((450, 700))
+        pen.lineTo((450, 0))
+        pen.closePath()
+        glyphs[name] = pen.glyph()
+    builder.setupGlyf(glyphs)
+    # Varied widths, so that measuring with the wrong font shows
+    builder.setupHorizontalMetrics(
+        {name: (500 + 10 * (index % 7), 50) for index, name in enumerate(names)}
+    )
+    builder.setupHorizontalHeader(ascent=800, descent=-200)
+    builder.setupNameTable({"familyName": "Test Sans", "styleName": "Regular"})
+    builder.setupOS2(sTypoAscender=800, usWinAscent=800, usWinDescent=200)
+    builder.setupPost()
+    builder.save(str(path))
+    return path
+
+
+@pytest.fixture(scope="session")
+def font_path(tmp_path_factory):
+    return _build_font(tmp_path_factory.mktemp("fonts") / "TestSans.ttf")
+
+
+@pytest.fixture(autouse=True)
+def font_cache_dir(tmp_path, monkeypatch):
+    """Keep cached font metrics out of the user's cache directory."""
+    cache_dir = tmp_path / "xdg-cache"
+    monkeypatch.setenv("XDG_CACHE_HOME", str(cache_dir))
+    return cache_dir / "school-labels" / "fonts"
@@ -0,0 +1,249 @@
+"""Tests for QR codes, Code 128 barcodes and barcode fields."""
+
+import io
+import re
+import zlib
+from typing import ClassVar
+
+import pytest
+
+from school_labels.cli import main
+from school_labels.templates import Barcode, Box, LayoutTemplate, barcode, qr
+from school_labels.templates.email_password import EmailPasswordCodesTemplate
+from school_labels.templates.layout import compile_layout
+from school_labels.validation import RowValidator
+
+from .conftest import EMAIL_CSV_HEADER, EMAIL_CSV_ROWS, _write_csv
+from .test_templates import BADGE
+
+
+def _format_bits(level: int, mask: int) -> int:
+    """Format information of a QR code, BCH-coded and masked, as in the standard."""
+    data = level << 3 | mask
+    remainder = data << 10
+    for shift in range(4, -1, -1):
+        if remainder >> shift + 10 & 1:
+            remainder ^= 0b10100110111 << shift
+    return (data << 10 | remainder) ^ 0b101010000010010
+
+
+def _read_format(rows: list[str]) -> tuple[int, int]:
+    """Both copies of a QR code's format information, bit 0 first."""
+    size = len(rows)
+    first = [(i, 8) for i in range(6)] + [(7, 8), (8, 8), (8, 7)]
+    first += [(8, 14 - i) for i in range(9, 15)]
+    second = [(8, size - 1 - i) for i in range(8)]
+    second += [(size - 15 + i, 8) for i in range(8, 15)]
+
+    def read(copy: list[tuple[int, int]]) -> int:
+        return sum(int(rows[y][x]) << i for i, (y, x) in enumerate(copy))
+
+    return read(first), read(second)
+
+
+class TestQr:
+    def test_error_correction_codewords(self):
+        # The worked example of "HELLO WORLD" at level M
+        data = [32, 91, 11, 120, 209, 114, 220, 77, 67, 64, 236, 17, 236, 17, 236, 17]
+        ecc = [196, 35, 39, 119, 235, 215, 231, 226, 93, 23]
+        assert qr._remainder(data, 10) == ecc
+
+    @pytest.mark.parametrize(
+        ("level", "bits"), [("L", 1), ("M", 0), ("Q", 3), ("H", 2)]
+    )
+    def test_format_information(self, level, bits):
+        rows = qr.encode("HELLO WORLD", level)
+        first, second = _read_format(rows)
+        assert first == second
+        assert first in {_format_bits(bits, mask) for mask in range(8)}
+
+    def test_finder_and_timing_patterns(self):
+        rows = qr.encode("https://school.org/sign-in")
+        size = len(rows)
+        finder = ["1111111", "1000001", "1011101", "1011101", "1011101", "1000001"]
+        for top, left in [(0, 0), (0, size - 7), (size - 7, 0)]:
+            assert [row[left : left + 7] for row in rows[top : top + 6]] == finder
+        assert rows[6][8 : size - 8] == ("10" * size)[: size - 16]
+        assert "".join(row[6] for row in rows[8 : size - 8]) == rows[6][8 : size - 8]
+
+    @pytest.mark.parametrize(
+        ("text", "size"),
+        [
+            ("01234567", 21),
+            ("HELLO WORLD", 21),
+            ("john.smith@school.org", 25),
+            ("Zoë", 21),
+            ("x" * 100, 41),
+        ],
+    )
+    def test_smallest_version(self, text, size):
+        rows = qr.encode(text)
+        assert len(rows) == size
+        assert all(len(row) == size for row in rows)
+
+    def test_too_long(self):
+        assert not qr.fits("x" * 3000, "H")
+        assert qr.fits("x" * 1000, "H")
+        with pytest.raises(ValueError, match="too long"):
+            qr.encode("x" * 3000, "H")
+
+    def test_unknown_level(self):
+        with pytest.raises(ValueError, match="level 'X'"):
+            qr.encode("x", "X")  # ty: ignore[invalid-argument-type]
+
+
+class TestCode128:
+    @pytest.mark.parametrize(
+        ("text", "values"),
+        [
+            ("AB", [104, 33, 34, 102]),
+            ("1001", [105, 10, 1, 14]),
+            ("123", [104, 17, 18, 19, 8]),
+            ("A12345", [104, 33, 17, 99, 23, 45, 64]),
+        ],
+    )
+    def test_values(self, text, values):
+        assert barcode.code128_values(text) == values
+
+    @pytest.mark.parametrize("text", ["", "tab\there", "café"])
+    def test_unencodable(self, text):
+        with pytest.raises(ValueError, match="printable ASCII"):
+            barcode.code128_values(text)
+
+    def test_bars(self):
+        symbol = barcode.encode("1001", "code128")
+        # Quiet zones, start, two digit pairs, check and the 13-module stop
+        assert symbol.width == 10 + 11 * 4 + 13 + 10
+        assert symbol.linear
+        assert symbol.path.startswith(b"10 0 2 1 re\n13 0 1 1 re\n")
+
+
+class TestSymbol:
+    def test_rectangles_cover_dark_modules(self):
+        rows = qr.encode("john.smith@school.org")
+        painted = [[0] * len(rows) for _ in rows]
+        for x, y, width, height in barcode._rectangles(rows):
+            for row in painted[y : y + height]:
+                for column in range(x, x + width):
+                    row[column] += 1
+        assert ["".join(map(str, row)) for row in painted] == rows
+
+    def test_qr_centred_in_box(self):
+        symbol = barcode.encode("HELLO WORLD", "qr")
+        assert symbol.width == symbol.height == 21 + 8
+        assert symbol.operators(29, 39).startswith(
+            b"1.0000 0 0 -1.0000 0.0000 -5.0000 cm 0 g\n4 4 7 1 re\n"
+        )
+
+    def test_linear_stretched_to_box(self):
+        symbol = barcode.encode("1001", "code128")
+        assert symbol.operators(7.7, 5).startswith(
+            b"0.1000 0 0 -5.0000 0.0000 0.0000 cm"
+        )
+
+    def test_unknown_symbology(self):
+        with pytest.raises(ValueError, match="Unknown symbology 'ean13'"):
+            barcode.encode("1", "ean13")  # ty: ignore[invalid-argument-type]
+
+
+def _content(pdf: bytes) -> bytes:
+    return b"".join(
+        zlib.decompress(m)
+        for m in re.findall(rb"stream\n(.*?)\nendstream", pdf, re.DOTALL)
+    )
+
+
+class TestBarcodeField:
+    ROWS: ClassVar = [
+        {
+            "admin": str(1000 + i),
+            "last_name": f"Smith{i}",
+            "first_name": "John",
+            "group": "7A",
+            "email": f"john.smith{i % 5}@school.org",
+            "password": f"Pass{i}",
+        }
+        for i in range(30)
+    ]
+
+    def test_columns(self):
+        layout = BADGE._replace(
+            items=(*BADGE.items, Barcode("{admin}", Box(0, 0, 9, 9)))
+        )
+        assert LayoutTemplate(layout).required_columns[-1] == "admin"
+
+    @pytest.mark.parametrize(
+        ("item", "message"),
+        [
+            (
+                Barcode("{admin}", Box(0, 0, 9, 9), "ean13"),  # ty: ignore[invalid-argument-type]
+                "Unknown symbology",
+            ),
+            (
+                Barcode("{admin}", Box(0, 0, 9, 9), "qr", "X"),  # ty: ignore[invalid-argument-type]
+                "error correction",
+            ),
+            (Barcode("{}", Box(0, 0, 9, 9)), "must name columns"),
+        ],
+    )
+    def test_invalid(self, item, message):
+        with pytest.raises(ValueError, match=message):
+            compile_layout(BADGE._replace(items=(item,)), str)
+
+    def test_symbols_encoded_once_per_value(self):
+        program = compile_layout(EmailPasswordCodesTemplate().layout, str)
+        qr_op = program.codes[0]
+        first = qr_op.symbol("john.smith0@school.org")
+        assert qr_op.symbol("john.smith0@school.org") is first
+
+    def test_backends_write_same_pdf(self):
+        template = EmailPasswordCodesTemplate()
+        fpdf, direct = io.BytesIO(), io.BytesIO()
+        template.write_pdf(self.ROWS, fpdf)
+        template.write_pdf(self.ROWS, direct, backend="direct")
+        assert fpdf.getvalue() == direct.getvalue()
+        content = _content(fpdf.getvalue())
+        assert content.count(b"cm 0 g\n") == 2 * len(self.ROWS)
+
+    def test_empty_value_draws_nothing(self):
+        rows = [{**row, "email": ""} for row in self.ROWS[:3]]
+        out = io.BytesIO()
+        EmailPasswordCodesTemplate().write_pdf(rows, out)
+        assert _content(out.getvalue()).count(b"cm 0 g\n") == 3
+
+    def test_unencodable_values_replaced(self):
+        template = EmailPasswordCodesTemplate()
+        validator = RowValidator(checks=template.value_checks)
+        rows = [
+            {**self.ROWS[0], "admin": "10é1"},
+            {**self.ROWS[1], "email": "x" * 3000},
+        ]
+        checked = list(validator.validated(rows))
+        assert [(i.row, i.column, i.problem) for i in validator.issues] == [
+            (1, "admin", "barcode"),
+            (2, "email", "barcode"),
+        ]
+        assert "cannot be encoded in Code 128" in validator.issues[0].detail
+        assert "too long for a QR code" in validator.issues[1].detail
+        assert checked[0]["admin"] == "10?1"
+        assert checked[1]["email"] == ""
+        # Each row now draws its Code 128 barcode, but no QR code for the email
+        out = io.BytesIO()
+        template.write_pdf(checked, out)
+        assert _content(out.getvalue()).count(b"cm 0 g\n") == 3
+
+    def test_cli_reports_unencodable_value(self, tmp_path, capsys):
+        rows = [*EMAIL_CSV_ROWS, "10é1,Smith,José,7B,jose@school.org,Pass1"]
+        csv_path = _write_csv(tmp_path / "codes.csv", EMAIL_CSV_HEADER, rows)
+        out = tmp_path / "codes.pdf"
+        argv = [str(csv_path), "--style", "email-password-codes", "-o", str(out)]
+        assert main(argv) == 0
+        assert out.exists()
+        err = capsys.readouterr().err
+        assert "line 5, admin: '10é1' cannot be encoded in Code 128" in err
+
+    def test_cli(self, email_csv_path, tmp_path):
+        out = tmp_path / "codes.pdf"
+        argv = [str(email_csv_path), "--style", "email-password-codes", "-o", str(out)]
+        assert main(argv) == 0
+        assert _content(out.read_bytes()).count(b" re\n") > 100
@@ -0,0 +1,94 @@
+"""Tests for batch generation."""
+
+from pathlib import Path
+
+from school_labels import batch
+from school_labels.cli import main
+
+from .conftest import EMAIL_CSV_HEADER, EMAIL_CSV_ROWS, _write_csv
+
+
+def _inputs(tmp_path: Path) -> Path:
+    src = tmp_path / "in"
+    src.mkdir()
+    _write_csv(src / "a.csv", EMAIL_CSV_HEADER, EMAIL_CSV_ROWS)
+    _write_csv(src / "b.csv", "foo,bar", ["1,2"])
+    _write_csv(src / "c.csv", EMAIL_CSV_HEADER, EMAIL_CSV_ROWS * 10)
+    (src / "notes.txt").write_text("ignored")
+    return src
+
+
+class TestFindInputs:
+    def test_directory(self, tmp_path):
+        src = _inputs(tmp_path)
+        assert [p.name for p in batch.find_inputs(src)] == ["a.csv", "b.csv", "c.csv"]
+
+    def test_manifest(self, tmp_path):
+        src = _inputs(tmp_path)
+        manifest = tmp_path / "manifest.txt"
+        manifest.write_text("# term 1\nin/c.csv\n\nin/a.csv\n")
+        assert batch.find_inputs(manifest) == [src / "c.csv", src / "a.csv"]
+
+
+class TestGenerateBatch:
+    def test_bad_file_does_not_abort(self, tmp_path):
+        src = _inputs(tmp_path)
+        out = tmp_path / "out"
+        out.mkdir()
+        results = list(batch.generate_batch(batch.find_inputs(src), out))
+        assert [r.error is None for r in results] == [True, False, True]
+        assert results[0].rows == 3
+        assert results[0].pages == 1
+        assert results[2].rows == 30
+        assert results[2].pages == 2
+        error = results[1].error
+        assert error is not None
+        assert "auto-detect" in error
+        assert sorted(p.name for p in out.iterdir()) == ["a.pdf", "c.pdf"]
+
+    def test_unprintable_value_does_not_abort(self, tmp_path):
+        src = tmp_path / "in"
+        src.mkdir()
+        row = "1001,Nowak,Łukasz,7A,lukasz.nowak@school.org,Pass1234"
+        _write_csv(src / "a.csv", EMAIL_CSV_HEADER, [row])
+        _write_csv(src / "b.csv", EMAIL_CSV_HEADER, EMAIL_CSV_ROWS)
+        results = list(batch.generate_batch(batch.find_inputs(src)))
+        assert [r.error for r in results] == [None, None]
+        [issue] = results[0].issues
+        assert (issue.row, issue.column, issue.problem) == (1, "first_name", "charset")
+        assert not results[1].issues
+        assert sorted(p.name for p in src.glob("*.pdf")) == ["a.pdf", "b.pdf"]
+
+    def test_workers(self, tmp_path):
+        src = _inputs(tmp_path)
+        results = list(batch.generate_batch(batch.find_inputs(src), workers=2))
+        assert [r.input_path.name for r in results] == ["a.csv", "b.csv", "c.csv"]
+        assert (src / "c.pdf").read_bytes()[:5] == b"%PDF-"
+
+
+class TestBatchCli:
+    def test_summary(self, tmp_path, capsys):
+        src = _inputs(tmp_path)
+        result = main(["batch", str(src), "--output-dir", str(tmp_path / "out")])
+        assert result == 1
+        stdout = capsys.readouterr().out
+        assert "3 rows, 1 pages" in stdout
+        assert "b.csv: FAILED" in stdout
+        assert "3 files: 2 ok, 1 failed" in stdout
+
+    def test_issues_listed(self, tmp_path, capsys):
+        src = tmp_path / "in"
+        src.mkdir()
+        row = "1001,Nowak,Łukasz,7A,lukasz.nowak@school.org,Pass1234"
+        _write_csv(src / "a.csv", EMAIL_CSV_HEADER, [row, row.replace("1001", "1002")])
+        assert main(["batch", str(src)]) == 0
+        stdout = capsys.readouterr().out
+        assert "2 rows, 1 pages" in stdout
+        assert "  3 problems found in input:\n" in stdout
+        assert "row 2, email: 'lukasz.nowak@school.org' duplicates row 1" in stdout
+
+    def test_all_ok(self, tmp_path, capsys):
+        src = _inputs(tmp_path)
+        (src / "b.csv").unlink()
+        assert main(["batch", str(src)]) == 0
+        assert (src / "a.pdf").exists()
@@ -0,0 +1,117 @@
+"""Tests for the page cache."""
+
+import errno
+import io
+import os
+
+import pytest
+
+from school_labels import cache as cache_module
+from school_labels.cache import CachedPage, PageCache
+from school_labels.cli import main
+from school_labels.generator import generate_labels_to
+
+from .conftest import EMAIL_CSV_HEADER, EMAIL_CSV_ROWS, _write_csv
+
+
+def _rows(n: int) -> list[dict[str, str]]:
+    return [
+        {
+            "admin": str(i),
+            "last_name": "Smith",
+            "first_name": "John",
+            "group": "7A",
+            "email": f"j{i}@school.org",
+            "password": f"Pass{i}",
+        }
+        for i in range(n)
+    ]
+
+
+class TestPageCache:
+    def test_round_trip(self, tmp_path):
+        cache = PageCache(tmp_path / "cache")
+        key = PageCache.key(b"a", b"b")
+        assert cache.get(key) is None
+        page = CachedPage(b"BT /F1 11.00 Tf\n(x) Tj ET\n", {"F1": ("helvetica", "")})
+        cache.put(key, page)
+        assert cache.get(key) == page
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_key_separates_parts(self):
+        assert PageCache.key(b"ab", b"c") != PageCache.key(b"a", b"bc")
+
+    def test_corrupt_entry_is_a_miss(self, tmp_path):
+        cache = PageCache(tmp_path)
+        key = PageCache.key(b"a")
+        cache.put(key, CachedPage(b"x", {}))
+        cache._path(key).write_bytes(b"not json")
+        assert cache.get(key) is None
+
+    def test_prune_evicts_least_recently_used(self, tmp_path):
+        cache = PageCache(tmp_path, max_bytes=250)
+        keys = [PageCache.key(bytes([i])) for i in range(3)]
+        for age, key in enumerate(keys):
+            cache.put(key, CachedPage(b"x" * 100, {}))
+            os.utime(cache._path(key), (age, age))
+        # Reading the oldest entry makes it the most recently used
+        assert cache.get(keys[0]) is not None
+        assert cache.prune() == 1
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[0]) is not None
+        assert cache.get(keys[2]) is not None
+
+
+class TestCachedRendering:
+    @pytest.fixture(autouse=True)
+    def _fixed_date(self, monkeypatch):
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", "1725179400")
+
+    def _generate(self, rows, cache, **kwargs) -> bytes:
+        out = io.BytesIO()
+        generate_labels_to(rows, "email-password", out, page_cache=cache, **kwargs)
+        return out.getvalue()
+
+    def test_reuses_unchanged_pages(self, tmp_path):
+        rows = _rows(50)
+        uncached = self._generate(rows, None)
+        cache = PageCache(tmp_path)
+        assert self._generate(rows, cache) == uncached
+        assert (cache.hits, cache.misses) == (0, 3)
+
+        rows[30]["email"] = "reset@school.org"
+        changed = self._generate(rows, cache)
+        assert (cache.hits, cache.misses) == (2, 4)
+        assert changed == self._generate(rows, None)
+
+    def test_parallel(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(
+            "school_labels.templates.EmailPasswordTemplate.PAGES_PER_CHUNK", 1
+        )
+        rows = _rows(50)
+        cache = PageCache(tmp_path)
+        self._generate(rows[:21], cache)
+        assert self._generate(rows, cache, jobs=2) == self._generate(rows, None)
+        assert (cache.hits, cache.misses) == (1, 3)
+
+    def test_unwritable_cache_warns_and_carries_on(self, tmp_path, monkeypatch):
+        def disk_full(*_):
+            raise OSError(errno.ENOSPC, "No space left on device")
+
+        monkeypatch.setattr(cache_module, "write_atomic", disk_full)
+        rows = _rows(50)
+        cache = PageCache(tmp_path)
+        with pytest.warns(RuntimeWarning, match="No space left") as caught:
+            assert self._generate(rows, cache) == self._generate(rows, None)
+        assert len(caught) == 1
+        assert isinstance(cache.write_error, OSError)
+
+    def test_cli(self, tmp_path):
+        csv_path = _write_csv(tmp_path / "in.csv", EMAIL_CSV_HEADER, EMAIL_CSV_ROWS)
+        cache_dir = tmp_path / "cache"
+        first, second = tmp_path / "a.pdf", tmp_path / "b.pdf"
+        for output in (first, second):
+            args = [str(csv_path), "-o", str(output), "--cache-dir", str(cache_dir)]
+            assert main(args) == 0
+        assert first.read_bytes() == second.read_bytes()
+        assert list(cache_dir.glob("*/*"))
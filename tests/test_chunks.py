@@ -0,0 +1,146 @@
+"""Tests for parsing CSV files in parallel ranges."""
+
+import csv
+from collections.abc import Generator
+from pathlib import Path
+
+import pytest
+
+from school_labels import chunks, generator
+from school_labels.cli import main
+from school_labels.validation import RowValidator
+
+from .conftest import EMAIL_CSV_HEADER
+
+NOTES = ["", "plain", 'multi\nline "quoted"', "comma, here", "crlf\r\ninside"]
+
+
+def _write_roster(path: Path, rows: int) -> Path:
+    """A roster with quoted fields spanning lines, blank lines and short rows."""
+    with path.open("w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([*EMAIL_CSV_HEADER.split(","), "notes"])
+        for i in range(rows):
+            if i % 97 == 0:
+                f.write("\r\n")
+            record = [
+                str(1000 + i),
+                f"Last{i}",
+                f"First{i}",
+                f"7{i % 3}",
+                f"user{i % 500}@school.org",
+                f"Pass{i}",
+                NOTES[i % len(NOTES)],
+            ]
+            writer.writerow(record[: 5 if i % 89 == 0 else 7])
+    return path
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    """Split files of a few KiB into many ranges."""
+    monkeypatch.setattr(chunks, "MIN_CHUNK_SIZE", 512)
+    monkeypatch.setattr(chunks, "MAX_CHUNK_SIZE", 2048)
+
+
+def _read(path: Path, jobs: int, columns=None) -> tuple[list[dict], list]:
+    validator = RowValidator(["admin"], ["email"], "ascii")
+    rows = generator.iter_csv_file_rows(
+        path, columns, intern=["group"], validator=validator, jobs=jobs
+    )
+    return [dict(row) for row in rows], validator.issues
+
+
+class TestSplit:
+    def test_ranges_hold_whole_records(self):
+        data = b'a,b\n1,"x\ny"\n2,"""q""\n"\n3,z\n'
+        ranges = list(chunks.split(data, 4, 1))
+        assert ranges[0][0] == 4
+        assert ranges[-1][1] == len(data)
+        pieces = [data[begin:end] for begin, end in ranges]
+        assert pieces == [b'1,"x\ny"\n', b'2,"""q""\n"\n', b"3,z\n"]
+
+    def test_record_end_without_line_end(self):
+        assert chunks.record_end(b'a,"b\nc', 0, 0) == len(b'a,"b\nc')
+
+    def test_splittable_encodings(self):
+        assert chunks.is_splittable("utf-8")
+        assert chunks.is_splittable("cp1252")
+        assert not chunks.is_splittable("utf-16")
+        assert not chunks.is_splittable("iso2022_jp")
+
+
+class TestParseChunk:
+    def test_range_ending_in_quotes_is_incomplete(self, tmp_path):
+        path = tmp_path / "in.csv"
+        path.write_bytes(b'1,"open\n2,x\n')
+        chunk = chunks.parse_chunk(
+            path, 0, 8, encoding="utf-8", positions=[0, 1], width=2
+        )
+        assert not chunk.complete
+
+    def test_records(self, tmp_path):
+        path = tmp_path / "in.csv"
+        path.write_bytes(b'1,"a\nb",x\n\n2\n')
+        chunk = chunks.parse_chunk(
+            path, 0, path.stat().st_size, encoding="utf-8", positions=[2, 0], width=3
+        )
+        assert chunk.complete
+        assert list(chunk.records(2)) == [(2, ("x", "1")), (4, ("", "2"))]
+        assert chunk.line_count == 4
+
+
+class TestIterCsvFileRows:
+    def test_same_rows_and_issues_as_serial(self, tmp_path, small_chunks):
+        path = _write_roster(tmp_path / "roster.csv", 600)
+        assert _read(path, jobs=3) == _read(path, jobs=1)
+
+    def test_projected_columns(self, tmp_path, small_chunks):
+        path = _write_roster(tmp_path / "roster.csv", 300)
+        columns = {"email", "admin"}
+        parallel, _ = _read(path, jobs=2, columns=columns)
+        serial, _ = _read(path, jobs=1, columns=columns)
+        assert parallel == serial
+        assert list(parallel[0]) == ["admin", "email"]
+
+    def test_stray_quote_falls_back_to_serial(self, tmp_path, small_chunks):
+        # A quote inside an unquoted field is data to csv, but it throws the
+        # quote count off, so a range ends inside the quoted field after it
+        path = tmp_path / "heights.csv"
+        lines = [f"{i},1.{i % 90},note\n" for i in range(400)]
+        lines[100] = "100,5'10\",note\n"
+        lines[101] = '101,"long\n' + "x\n" * 300 + 'end",note\n'
+        path.write_text("admin,height,notes\n" + "".join(lines))
+        fallbacks = []
+        parse_serially = chunks.ChunkedReader._parse_serially
+
+        def spy(reader, begin):
+            fallbacks.append(begin)
+            return parse_serially(reader, begin)
+
+        with pytest.MonkeyPatch.context() as m:
+            m.setattr(chunks.ChunkedReader, "_parse_serially", spy)
+            parallel = _read(path, jobs=3)
+        assert fallbacks
+        assert parallel == _read(path, jobs=1)
+
+    def test_small_file_is_read_serially(self, tmp_path):
+        path = _write_roster(tmp_path / "roster.csv", 20)
+        assert _read(path, jobs=4) == _read(path, jobs=1)
+
+    def test_stops_early(self, tmp_path, small_chunks):
+        path = _write_roster(tmp_path / "roster.csv", 600)
+        rows = generator.iter_csv_file_rows(path, jobs=2)
+        assert isinstance(rows, Generator)
+        assert next(rows)["admin"] == "1000"
+        rows.close()
+
+
+class TestCli:
+    def test_parse_jobs(self, tmp_path, small_chunks):
+        path = _write_roster(tmp_path / "roster.csv", 200)
+        serial, parallel = tmp_path / "serial.pdf", tmp_path / "parallel.pdf"
+        assert main([str(path), "-o", str(serial)]) == 0
+        argv = [str(path), "-o", str(parallel), "--parse-jobs", "2"]
+        assert main(argv) == 0
+        assert len(parallel.read_bytes()) == len(serial.read_bytes())
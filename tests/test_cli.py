@@ -1,8 +1,14 @@
 """Tests for CLI integration."""
 
 import io
+import os
+import subprocess
+import sys
 from pathlib import Path
 
+import pytest
+
+import school_labels
 from school_labels.cli import main
 
 
@@ -26,6 +32,13 @@ class TestCli:
         assert result == 0
         assert Path(output).exists()
 
+    def test_direct_backend(self, email_csv_path, tmp_path):
+        fpdf, direct = tmp_path / "fpdf.pdf", tmp_path / "direct.pdf"
+        assert main([str(email_csv_path), "-o", str(fpdf)]) == 0
+        argv = [str(email_csv_path), "-o", str(direct), "--backend", "direct"]
+        assert main(argv) == 0
+        assert len(direct.read_bytes()) == len(fpdf.read_bytes())
+
     def test_missing_file(self, capsys):
         result = main(["nonexistent.csv", "-o", "/dev/null"])
         assert result == 1
@@ -68,3 +81,137 @@ class TestCli:
         result = main([str(email_csv_path), "-o", str(output)])
         assert result == 0
         assert "original filename existed" in capsys.readouterr().err
+
+    def test_missing_break_column_leaves_no_output(self, email_csv_path, tmp_path):
+        output = tmp_path / "out.pdf"
+        result = main([str(email_csv_path), "--break", "house", "-o", str(output)])
+        assert result == 1
+        assert not output.exists()
+
+    def test_stdin(self, email_csv_path, tmp_path, monkeypatch):
+        monkeypatch.setattr("sys.stdin", io.StringIO(email_csv_path.read_text()))
+        output = tmp_path / "out.pdf"
+        result = main(["-o", str(output)])
+        assert result == 0
+        assert output.read_bytes()[:5] == b"%PDF-"
+
+    def test_jobs(self, email_csv_path, tmp_path):
+        output = tmp_path / "out.pdf"
+        result = main([str(email_csv_path), "--jobs", "2", "-o", str(output)])
+        assert result == 0
+        assert output.read_bytes()[:5] == b"%PDF-"
+
+    def test_jobs_must_be_positive(self, email_csv_path, capsys):
+        with pytest.raises(SystemExit):
+            main([str(email_csv_path), "--jobs", "0"])
+        assert "positive integer" in capsys.readouterr().err
+
+    def test_split_by(self, email_csv_path, tmp_path, capsys):
+        output = tmp_path / "out.pdf"
+        result = main([str(email_csv_path), "--split-by", "group", "-o", str(output)])
+        assert result == 0
+        assert (tmp_path / "out-7A.pdf").exists()
+        assert (tmp_path / "out-7B.pdf").exists()
+        assert "group=7B" in capsys.readouterr().err
+
+    def test_split_by_invalid_pattern(self, email_csv_path, tmp_path, capsys):
+        output = tmp_path / "labels-{value}-{term}.pdf"
+        result = main([str(email_csv_path), "--split-by", "group", "-o", str(output)])
+        assert result == 1
+        assert "Invalid output pattern" in capsys.readouterr().err
+        assert not list(tmp_path.glob("*.pdf"))
+
+    def test_extra_columns_are_ignored(self, tmp_path):
+        csv_path = tmp_path / "wide.csv"
+        csv_path.write_text(
+            "notes,admin,last_name,first_name,group,email,password,house\n"
+            "x,1001,Smith,John,7A,john.smith@school.org,Pass1234,Red\n"
+        )
+        output = tmp_path / "out.pdf"
+        assert main([str(csv_path), "-o", str(output)]) == 0
+        assert output.read_bytes()[:5] == b"%PDF-"
+
+    def test_missing_option_column(self, email_csv_path, tmp_path, capsys):
+        output = tmp_path / "out.pdf"
+        result = main([str(email_csv_path), "--sort-by", "house", "-o", str(output)])
+        assert result == 1
+        err = capsys.readouterr().err
+        assert "house" in err
+        assert "Available columns" in err
+
+    def test_split_by_stdout(self, email_csv_path, capsys):
+        result = main([str(email_csv_path), "--split-by", "group", "-o", "-"])
+        assert result == 1
+        assert "stdout" in capsys.readouterr().err
+
+    def test_linearize(self, email_csv_path, tmp_path):
+        output = tmp_path / "out.pdf"
+        result = main([str(email_csv_path), "--linearize", "-o", str(output)])
+        assert result == 0
+        assert b"/Linearized 1" in output.read_bytes()[:1024]
+
+    def test_object_streams(self, email_csv_path, tmp_path):
+        output = tmp_path / "out.pdf"
+        argv = [str(email_csv_path), "--object-streams", "--compress-level", "9"]
+        assert main([*argv, "-o", str(output)]) == 0
+        assert output.read_bytes().startswith(b"%PDF-1.5")
+
+    def test_linearize_excludes_object_streams(self, email_csv_path, capsys):
+        with pytest.raises(SystemExit):
+            main([str(email_csv_path), "--linearize", "--object-streams"])
+        assert "not allowed with" in capsys.readouterr().err
+
+    def test_compress_level_range(self, email_csv_path, capsys):
+        with pytest.raises(SystemExit):
+            main([str(email_csv_path), "--compress-level", "10"])
+        assert "invalid choice" in capsys.readouterr().err
+
+
+# Generous enough for a slow machine, but well below the cost of importing fpdf2
+STARTUP_IMPORT_BUDGET_US = 250_000
+
+
+def _run_isolated(argv: list[str]) -> tuple[set[str], int]:
+    """Run the CLI in a fresh interpreter.
+
+    Returns the modules it imported and its cumulative import time for
+    ``school_labels.cli``, in microseconds.
+    """
+    script = (
+        "import sys\n"
+        "from school_labels.cli import main\n"
+        "try:\n"
+        f"    main({argv!r})\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print(' '.join(sys.modules))\n"
+    )
+    src = str(Path(school_labels.__file__).parents[1])
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", script],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": src},
+    )
+    modules = set(result.stdout.split("\n")[-2].split())
+    cumulative = next(
+        int(line.split("|")[1])
+        for line in result.stderr.splitlines()
+        if line.split("|")[-1].strip() == "school_labels.cli"
+    )
+    return modules, cumulative
+
+
+class TestStartup:
+    @pytest.mark.parametrize("flag", ["--version", "--help"])
+    def test_does_not_import_fpdf(self, flag):
+        modules, _ = _run_isolated([flag])
+        assert "fpdf" not in modules
+        assert "school_labels.templates" not in modules
+        assert "http.server" not in modules
+
+    def test_import_budget(self):
+        # Best of a few runs, so a busy machine does not fail the test
+        best = min(_run_isolated(["--version"])[1] for _ in range(3))
+        assert best < STARTUP_IMPORT_BUDGET_US
@@ -0,0 +1,258 @@
+"""Tests for TrueType fonts, their metrics cache and subsetting."""
+
+import io
+import json
+import re
+
+import pytest
+from fontTools.ttLib import TTFont
+from fpdf import FPDF
+from fpdf.fonts import TTFFont
+
+from school_labels import fonts
+from school_labels.cache import PageCache
+from school_labels.cli import main
+from school_labels.generator import TEMPLATES, generate_labels
+from school_labels.templates import TEXT_MEASURER, EmailPasswordTemplate
+from school_labels.templates.fonts import GlyphIdFont, add_font
+from school_labels.templates.measure import FitField, TextMeasurer
+from school_labels.writer import PdfWriter
+
+from .conftest import EMAIL_CSV_HEADER, FONT_CHARS, _build_font, _write_csv
+
+ROWS = [
+    {
+        "admin": str(1000 + i),
+        "last_name": "Wójcik-Szczęśniak" if i % 2 else "Smith",
+        "first_name": "Łucja",
+        "group": "7A" if i < 30 else "7B",
+        "email": f"student{i}@school.org",
+        "password": "Pass(1)\\",
+    }
+    for i in range(50)
+]
+
+
+def _uncompressed(pdf: bytes) -> bytes:
+    """The PDF with every Flate stream decompressed, for searching."""
+    import zlib  # noqa: PLC0415
+
+    return re.sub(
+        rb"stream\n(.*?)\nendstream",
+        lambda m: b"stream\n" + zlib.decompress(m[1]) + b"\nendstream",
+        pdf,
+        flags=re.DOTALL,
+    )
+
+
+class TestLoadFont:
+    def setup_method(self):
+        fonts._load_font.cache_clear()
+
+    def test_metrics(self, font_path):
+        metrics = fonts.load_font(font_path)
+        assert metrics.name == "TestSans"
+        assert metrics.widths[metrics.cmap[ord("Ł")]] > 0
+        assert metrics.family.startswith("ttf-")
+
+    def test_cached_on_disk(self, font_path, font_cache_dir, monkeypatch):
+        parsed = fonts.load_font(font_path)
+        (entry,) = font_cache_dir.iterdir()
+        assert entry.name == f"{parsed.digest}.json"
+
+        fonts._load_font.cache_clear()
+        monkeypatch.setattr(fonts, "_parse", None)
+        assert fonts.load_font(font_path) == parsed
+
+    def test_stale_entry_is_reparsed(self, font_path, font_cache_dir):
+        parsed = fonts.load_font(font_path)
+        entry = font_cache_dir / f"{parsed.digest}.json"
+        data = json.loads(entry.read_text())
+        entry.write_text(json.dumps({**data, "version": 0}))
+        fonts._load_font.cache_clear()
+        assert fonts.load_font(font_path) == parsed
+
+    def test_changed_file_is_reread(self, tmp_path):
+        path = _build_font(tmp_path / "a.ttf", "abc")
+        first = fonts.load_font(path)
+        _build_font(path, "abcd")
+        assert ord("d") in fonts.load_font(path).cmap
+        assert fonts.load_font(path).digest != first.digest
+
+    def test_not_a_font(self, tmp_path):
+        path = tmp_path / "notes.ttf"
+        path.write_text("not a font")
+        with pytest.raises(ValueError, match="not a font file"):
+            fonts.load_font(path)
+
+    def test_unwritable_cache(self, font_path, tmp_path):
+        blocker = tmp_path / "file"
+        blocker.write_text("")
+        assert fonts.load_font(font_path, blocker / "cache").name == "TestSans"
+
+
+class TestSubsetFont:
+    def test_keeps_glyph_ids(self, font_path):
+        metrics = fonts.load_font(font_path)
+        gid = metrics.cmap[ord("Ł")]
+        font = TTFont(io.BytesIO(fonts.subset_font(metrics, {gid})))
+        assert font.getGlyphID(font.getGlyphOrder()[gid]) == gid
+        glyf = font["glyf"]
+        assert glyf[font.getGlyphOrder()[gid]].numberOfContours == 1
+        other = font.getGlyphOrder()[metrics.cmap[ord("A")]]
+        assert glyf[other].numberOfContours == 0
+
+
+class TestWriter:
+    def test_records_glyphs_from_escaped_strings(self, font_path):
+        metrics = fonts.load_font(font_path)
+        writer = PdfWriter(io.BytesIO(), title="T", page_size=(100, 100))
+        writer.add_truetype_font("F2", metrics)
+        writer.add_page(
+            b"BT /F1 11.00 Tf ET\nBT (\\(\\)) Tj ET\n"
+            b"BT /F2 11.00 Tf ET\nBT (\x00\\(\x00\\)\x00\\r\x00\n) Tj ET\n"
+        )
+        assert writer._truetype["F2"][1] == {0x28, 0x29, 0x0D, 0x0A}
+
+
+class TestTemplateFonts:
+    def setup_method(self):
+        TEXT_MEASURER.cache_clear()
+
+    def test_embeds_subset(self, font_path):
+        pdf = _uncompressed(
+            generate_labels(ROWS, "email-password", fonts={"sans": font_path})
+        )
+        assert pdf.count(b"/Subtype /Type0") == 1
+        assert b"/BaseFont /Courier" in pdf
+        assert b"/FontFile2" in pdf
+        # ToUnicode maps the glyph drawn for "Ł" back to it
+        assert b"<0141>" in pdf
+
+    def test_unknown_role(self, font_path):
+        with pytest.raises(ValueError, match="Roles: sans, mono"):
+            generate_labels(ROWS, "email-password", fonts={"serif": font_path})
+
+    def test_charset(self, font_path):
+        template = TEMPLATES["email-password"]
+        assert template.charset == "latin-1"
+        both = template.with_fonts({"sans": font_path, "mono": font_path}).charset
+        sans = template.with_fonts({"sans": font_path}).charset
+        assert isinstance(both, frozenset)
+        assert isinstance(sans, frozenset)
+        assert ord("ễ") in both
+        assert ord("ễ") not in sans
+
+    def test_right_to_left_is_not_drawn(self, tmp_path):
+        font_path = _build_font(tmp_path / "Arabic.ttf", "abc سلام")
+        template = TEMPLATES["email-password"]
+        charset = template.with_fonts({"sans": font_path, "mono": font_path}).charset
+        assert isinstance(charset, frozenset)
+        assert ord("a") in charset
+        assert ord("س") not in charset
+        rows = [{**ROWS[0], "last_name": "سلام"}]
+        with pytest.raises(ValueError, match="right to left"):
+            generate_labels(rows, "email-password", fonts={"sans": font_path})
+
+    def test_sets_every_fpdf_font_attribute(self, font_path):
+        # GlyphIdFont skips TTFFont.__init__, so a new fpdf2 attribute would
+        # be missing: check it against the pinned release's slots
+        pdf = FPDF()
+        add_font(pdf, fonts.load_font(font_path))
+        font = next(iter(pdf.fonts.values()))
+        assert isinstance(font, GlyphIdFont)
+        missing = [name for name in TTFFont.__slots__ if not hasattr(font, name)]
+        assert not missing
+
+    def test_parallel_and_cached_output_match(self, font_path, tmp_path, monkeypatch):
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", "1725179400")
+        monkeypatch.setattr(EmailPasswordTemplate, "PAGES_PER_CHUNK", 1)
+        font_map = {"sans": font_path, "mono": font_path}
+        serial = generate_labels(ROWS, "email-password", fonts=font_map)
+        assert generate_labels(ROWS, "email-password", fonts=font_map, jobs=2) == serial
+
+        cache = PageCache(tmp_path / "pages")
+        generate_labels(ROWS, "email-password", fonts=font_map, page_cache=cache)
+        cached = generate_labels(
+            ROWS, "email-password", fonts=font_map, page_cache=cache
+        )
+        assert cached == serial
+        assert cache.hits == 3
+
+    def test_font_is_part_of_page_cache_key(self, font_path, tmp_path):
+        cache = PageCache(tmp_path / "pages")
+        rows = [{**row, "first_name": "Lucja", "last_name": "Smith"} for row in ROWS]
+        generate_labels(rows, "email-password", page_cache=cache)
+        generate_labels(
+            rows, "email-password", fonts={"sans": font_path}, page_cache=cache
+        )
+        assert cache.hits == 0
+
+    def test_prefit_matches_per_cell(self, font_path):
+        metrics = fonts.load_font(font_path)
+        texts = ["Łucja Wójcik-Szczęśniak", "Smith", "ễ not in font", "Pass(1)\\", ""]
+        rows = [{"t": t} for t in texts]
+        pdf = FPDF()
+        pdf.add_page()
+        add_font(pdf, metrics)
+        pdf.set_font(metrics.family, "", 11)
+        for width in (10.0, 30.0):
+            for shrink in (False, True):
+                field = FitField(
+                    lambda row: row["t"], metrics.family, "", 11, width, shrink
+                )
+                batched, per_cell = TextMeasurer(), TextMeasurer()
+                batched.prefit(pdf, field, rows)
+                method = "shrink_size" if shrink else "fit_text"
+                for text in texts:
+                    expected = getattr(per_cell, method)(pdf, text, width)
+                    assert getattr(batched, method)(pdf, text, width) == expected
+                cache = batched.shrinks if shrink else batched.fits
+                assert cache.cache_info().misses == 0
+
+    def test_create_pdf(self, font_path):
+        template = TEMPLATES["email-password"].with_fonts({"sans": font_path})
+        assert template.create_pdf(ROWS).output()[:5] == b"%PDF-"
+
+
+class TestCliFonts:
+    def test_font_for_all_roles(self, font_path, tmp_path, capsys):
+        csv_path = _write_csv(
+            tmp_path / "in.csv",
+            EMAIL_CSV_HEADER,
+            ["1001,Wójcik,Łucja,7A,l@school.org,Pass1234"],
+        )
+        output = tmp_path / "out.pdf"
+        assert main([str(csv_path), "--font", str(font_path), "-o", str(output)]) == 0
+        assert _uncompressed(output.read_bytes()).count(b"/Subtype /Type0") == 1
+        assert "problems" not in capsys.readouterr().err
+
+    def test_without_font_reports_unprintable(self, tmp_path, capsys):
+        csv_path = _write_csv(
+            tmp_path / "in.csv",
+            EMAIL_CSV_HEADER,
+            ["1001,Wójcik,Łucja,7A,l@school.org,Pass1234"],
+        )
+        assert main([str(csv_path), "-o", str(tmp_path / "out.pdf")]) == 0
+        assert "first_name: 'Łucja'" in capsys.readouterr().err
+
+    def test_right_to_left_reported_unprintable(self, tmp_path, capsys):
+        font_path = _build_font(tmp_path / "Arabic.ttf", FONT_CHARS + "سلام")
+        csv_path = _write_csv(
+            tmp_path / "in.csv",
+            EMAIL_CSV_HEADER,
+            ["1001,سلام,Sam,7A,s@school.org,Pass1234"],
+        )
+        args = [str(csv_path), "--font", str(font_path), "-o", str(tmp_path / "o.pdf")]
+        assert main(args) == 0
+        assert "'سلام' is written right to left" in capsys.readouterr().err
+
+    def test_unknown_role(self, email_csv_path, font_path, capsys):
+        args = [str(email_csv_path), "--font", f"serif={font_path}", "-o", "-"]
+        assert main(args) == 1
+        assert "Unknown font roles for email-password: serif" in capsys.readouterr().err
+
+    def test_bad_font(self, email_csv_path, tmp_path, capsys):
+        args = [str(email_csv_path), "--font", str(email_csv_path), "-o", "-"]
+        assert main(args) == 1
+        assert "Error loading font" in capsys.readouterr().err
@@ -1,6 +1,7 @@
 """Tests for generator module."""
 
 import io
+import re
 from pathlib import Path
 from typing import ClassVar
 
@@ -8,6 +9,7 @@ import pytest
 
 from school_labels import generator
 from school_labels.templates import EmailPasswordTemplate
+from school_labels.writer import PdfOptions
 
 
 class TestDetectTemplate:
@@ -34,6 +36,29 @@ class TestDetectTemplate:
         assert isinstance(result, EmailPasswordTemplate)
 
 
+class TestTemplateRegistry:
+    def test_names_without_loading(self):
+        registry = generator.TemplateRegistry(
+            {"email-password": ".templates.email_password:EmailPasswordTemplate"}
+        )
+        assert list(registry) == ["email-password"]
+        assert len(registry) == 1
+        assert not registry._loaded
+
+    def test_loads_once(self):
+        registry = generator.TemplateRegistry(
+            {"email-password": ".templates.email_password:EmailPasswordTemplate"}
+        )
+        template = registry["email-password"]
+        assert isinstance(template, EmailPasswordTemplate)
+        assert registry["email-password"] is template
+
+    def test_unknown(self):
+        assert generator.TEMPLATES.get("nope") is None
+        with pytest.raises(KeyError):
+            generator.TEMPLATES["nope"]
+
+
 class TestReadCsvData:
     def test_reads_rows(self):
         csv_text = "name,age\nAlice,30\nBob,25\n"
@@ -48,6 +73,45 @@ class TestReadCsvData:
         assert data == []
 
 
+class TestIterCsvData:
+    def test_lazy(self):
+        csv_text = "name,age\nAlice,30\nBob,25\n"
+        rows = generator.iter_csv_data(io.StringIO(csv_text))
+        assert next(rows) == {"name": "Alice", "age": "30"}
+        assert next(rows) == {"name": "Bob", "age": "25"}
+        assert next(rows, None) is None
+
+
+class TestIterCsvRows:
+    def test_projects_columns(self):
+        f = io.StringIO("a,b,c,d\n1,2,3,4\n\n5,6\n")
+        rows = list(generator.iter_csv_rows(f, {"b", "d", "missing"}))
+        assert rows == [{"b": "2", "d": "4"}, {"b": "6", "d": ""}]
+
+    def test_all_columns(self):
+        f = io.StringIO("a,b\n1,2\n")
+        assert list(generator.iter_csv_rows(f)) == [{"a": "1", "b": "2"}]
+
+    def test_single_column(self):
+        f = io.StringIO("a,b\n1,2\n")
+        assert list(generator.iter_csv_rows(f, {"b"})) == [{"b": "2"}]
+
+    def test_header_read_separately(self):
+        f = io.StringIO("a,b\n1,2\n")
+        header = generator.read_csv_header(f)
+        rows = generator.iter_csv_rows(f, {"a"}, fieldnames=header)
+        assert list(rows) == [{"a": "1"}]
+
+    def test_empty(self):
+        assert generator.read_csv_header(io.StringIO("")) == []
+        assert list(generator.iter_csv_rows(io.StringIO(""))) == []
+
+    def test_interns_values(self):
+        f = io.StringIO("group,name\n" + "".join(f"7A,n{i}\n" for i in range(3)))
+        rows = list(generator.iter_csv_rows(f, intern=["group"]))
+        assert rows[0]["group"] is rows[2]["group"]
+
+
 class TestValidateColumns:
     def test_valid(self):
         template = EmailPasswordTemplate()
@@ -109,6 +173,167 @@ class TestGenerateLabels:
         assert result[:5] == b"%PDF-"
 
 
+class TestColumnarInput:
+    def test_matches_rows(self, monkeypatch):
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", "1725179400")
+        rows = [
+            {
+                "admin": str(i),
+                "last_name": "Smith",
+                "first_name": "John",
+                "group": "7A" if i < 3 else "7B",
+                "email": f"j{i}@school.org",
+                "password": "Pass1234",
+            }
+            for i in range(5)
+        ]
+        columns = {key: [row[key] for row in rows] for key in rows[0]}
+        expected = generator.generate_labels(
+            rows, "email-password", break_column="group"
+        )
+        result = generator.generate_labels(
+            columns, "email-password", break_column="group"
+        )
+        assert result == expected
+
+
+class TestGenerateLabelsTo:
+    _row: ClassVar[dict[str, str]] = TestGenerateLabels._row
+
+    def test_writes_pdf(self):
+        out = io.BytesIO()
+        pages = generator.generate_labels_to(
+            (self._row for _ in range(43)), "email-password", out
+        )
+        assert pages == 3
+        assert out.getvalue()[:5] == b"%PDF-"
+        assert out.getvalue().rstrip().endswith(b"%%EOF")
+
+    def test_matches_generate_labels_page_count(self):
+        out = io.BytesIO()
+        pages = generator.generate_labels_to([self._row] * 21, "email-password", out)
+        assert pages == 1
+        assert b"/Count 1" in generator.generate_labels([self._row], "email-password")
+
+    def test_missing_columns_writes_nothing(self):
+        out = io.BytesIO()
+        with pytest.raises(ValueError, match="missing required columns"):
+            generator.generate_labels_to(iter([{"admin": "1"}]), "email-password", out)
+        assert out.getvalue() == b""
+
+    def test_missing_break_column(self):
+        with pytest.raises(ValueError, match="Break column"):
+            generator.generate_labels_to(
+                [self._row], "email-password", io.BytesIO(), break_column="house"
+            )
+
+
+class TestParallelRendering:
+    def _rows(self):
+        return [
+            {
+                **TestGenerateLabels._row,
+                "admin": str(i),
+                "group": "7A" if i < 50 else "7B",
+            }
+            for i in range(100)
+        ]
+
+    @staticmethod
+    def _strip_date(pdf: bytes) -> bytes:
+        return re.sub(rb"/CreationDate \(.*?\)", b"", pdf)
+
+    def test_matches_serial(self, monkeypatch):
+        monkeypatch.setattr(EmailPasswordTemplate, "PAGES_PER_CHUNK", 2)
+        serial = generator.generate_labels(
+            self._rows(), "email-password", break_column="group"
+        )
+        parallel = generator.generate_labels(
+            self._rows(), "email-password", break_column="group", jobs=3
+        )
+        assert b"/Count 6" in parallel
+        assert self._strip_date(parallel) == self._strip_date(serial)
+
+    def test_merge_renames_fonts(self):
+        pdf = EmailPasswordTemplate()._setup_pdf()
+        pdf.set_font("Helvetica", "", 11)
+        content = b"BT /F1 11.00 Tf ET\nBT /F2 7.00 Tf ET\nBT 1 2 Td (BT /F1 ) Tj ET\n"
+        fonts = {"F1": ("courier", ""), "F2": ("helvetica", "")}
+        merged = list(
+            EmailPasswordTemplate._merge_chunk(pdf, ([(content, 1)], fonts, {}))
+        )
+        assert merged == [
+            (b"BT /F2 11.00 Tf ET\nBT /F1 7.00 Tf ET\nBT 1 2 Td (BT /F1 ) Tj ET\n", 1)
+        ]
+
+
+class TestPdfOptions:
+    def test_linearized(self):
+        rows = TestParallelRendering()._rows()
+        result = generator.generate_labels(
+            rows,
+            "email-password",
+            break_column="group",
+            pdf_options=PdfOptions(linearize=True),
+        )
+        assert b"/Linearized 1" in result[:1024]
+        assert re.search(rb"/N 6\b", result)
+
+    def test_object_streams_in_parallel(self, monkeypatch):
+        monkeypatch.setattr(EmailPasswordTemplate, "PAGES_PER_CHUNK", 2)
+        result = generator.generate_labels(
+            TestParallelRendering()._rows(),
+            "email-password",
+            jobs=2,
+            pdf_options=PdfOptions(compress_level=9, object_streams=True),
+        )
+        assert result.startswith(b"%PDF-1.5")
+        assert b"/Type /XRef" in result
+
+    def test_uncompressed(self):
+        result = generator.generate_labels(
+            [TestGenerateLabels._row],
+            "email-password",
+            pdf_options=PdfOptions(compress_level=0),
+        )
+        assert b"/FlateDecode" not in result
+        assert b"(Password) Tj" in result
+
+
+class TestBackends:
+    def test_direct_matches_fpdf(self, monkeypatch):
+        monkeypatch.setattr(EmailPasswordTemplate, "PAGES_PER_CHUNK", 2)
+        rows = TestParallelRendering()._rows()
+        fpdf = generator.generate_labels(rows, "email-password", break_column="group")
+        for jobs in (1, 3):
+            direct = generator.generate_labels(
+                rows,
+                "email-password",
+                break_column="group",
+                jobs=jobs,
+                backend="direct",
+            )
+            strip = TestParallelRendering._strip_date
+            assert strip(direct) == strip(fpdf)
+
+    def test_unknown_backend(self):
+        out = io.BytesIO()
+        with pytest.raises(ValueError, match="Backend 'nope' is not available"):
+            generator.generate_labels_to(
+                [TestGenerateLabels._row], "email-password", out, backend="nope"
+            )
+        assert out.getvalue() == b""
+
+    def test_direct_needs_core_fonts(self, font_path):
+        with pytest.raises(ValueError, match="only draws core fonts"):
+            generator.generate_labels(
+                [TestGenerateLabels._row],
+                "email-password",
+                fonts={"sans": font_path},
+                backend="direct",
+            )
+
+
 class TestGenerateFilename:
     def test_no_conflict(self, tmp_path):
         path = str(tmp_path / "labels.pdf")
@@ -127,3 +352,85 @@ class TestGenerateFilename:
             (tmp_path / f"labels-{i}.pdf").touch()
         with pytest.raises(RuntimeError):
             generator.generate_filename(path, max_attempts=3)
+
+
+class TestFilenameAllocator:
+    def test_scans_directory_once(self, tmp_path, monkeypatch):
+        (tmp_path / "labels.pdf").touch()
+        (tmp_path / "labels-1.pdf").touch()
+        allocator = generator.FilenameAllocator()
+        calls = []
+        iterdir = Path.iterdir
+        monkeypatch.setattr(
+            Path, "iterdir", lambda self: calls.append(self) or iterdir(self)
+        )
+        path = str(tmp_path / "labels.pdf")
+        assert allocator.allocate(path) == str(tmp_path / "labels-2.pdf")
+        assert allocator.allocate(path) == str(tmp_path / "labels-3.pdf")
+        other = str(tmp_path / "other.pdf")
+        assert allocator.allocate(other) == other
+        assert calls == [tmp_path]
+
+    def test_max_attempts(self, tmp_path):
+        (tmp_path / "labels.pdf").touch()
+        (tmp_path / "labels-1.pdf").touch()
+        allocator = generator.FilenameAllocator(max_attempts=1)
+        with pytest.raises(RuntimeError):
+            allocator.allocate(str(tmp_path / "labels.pdf"))
+
+
+class TestGenerateLabelsSplit:
+    def test_one_pdf_per_value(self, tmp_path):
+        rows = [
+            {**TestGenerateLabels._row, "admin": str(i), "group": group}
+            for i, group in enumerate(["7A", "7B", "7A", "7 C/D", "7B"] * 10)
+        ]
+        pattern = str(tmp_path / "{column}-{value}.pdf")
+        results = generator.generate_labels_split(
+            rows, "email-password", "group", pattern
+        )
+        assert [(value, pages) for value, _, pages in results] == [
+            ("7A", 1),
+            ("7B", 1),
+            ("7 C/D", 1),
+        ]
+        assert [Path(filename).name for _, filename, _ in results] == [
+            "group-7A.pdf",
+            "group-7B.pdf",
+            "group-7_C_D.pdf",
+        ]
+
+    def test_rows_keep_input_order(self, tmp_path, monkeypatch):
+        seen = []
+        template = generator.TEMPLATES["email-password"]
+        write_pdf = template.write_pdf
+
+        def spy(data, out, break_column=None, **kwargs):
+            data = list(data)
+            seen.append([row["admin"] for row in data])
+            return write_pdf(data, out, break_column, **kwargs)
+
+        monkeypatch.setattr(template, "write_pdf", spy)
+        rows = [
+            {**TestGenerateLabels._row, "admin": str(i), "group": "AB"[i % 2]}
+            for i in range(6)
+        ]
+        generator.generate_labels_split(
+            rows, "email-password", "group", str(tmp_path / "{value}.pdf")
+        )
+        assert seen == [["0", "2", "4"], ["1", "3", "5"]]
+
+    @pytest.mark.parametrize(
+        "pattern", ["labels-{value}-{term}.pdf", "labels-{0}.pdf", "{value.x}", "{"]
+    )
+    def test_invalid_pattern(self, pattern):
+        with pytest.raises(ValueError, match="Invalid output pattern"):
+            generator.generate_labels_split(
+                [TestGenerateLabels._row], "email-password", "group", pattern
+            )
+
+    def test_missing_split_column(self, tmp_path):
+        with pytest.raises(ValueError, match="Split column"):
+            generator.generate_labels_split(
+                [TestGenerateLabels._row], "email-password", "house"
+            )
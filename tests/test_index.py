@@ -0,0 +1,120 @@
+"""Tests for selecting rows, and the sidecar index that finds them."""
+
+import os
+from pathlib import Path
+
+import pytest
+
+from school_labels import generator, index
+from school_labels.cli import main
+from school_labels.validation import RowValidator
+
+from .test_chunks import _write_roster
+
+# Admin numbers of records with a line end in a quoted field, one with a
+# blank line before it, a short row and an ordinary run, plus one not there
+ADMINS = {"1002", "1097", "1089", "1090", "1091", "1092", "1500", "9999"}
+
+
+def _read(path: Path, select, *, use_index: bool) -> tuple[list[dict], list]:
+    validator = RowValidator(["admin", "password"], ["email"], "ascii")
+    rows = generator.iter_csv_file_rows(
+        path, intern=["group"], validator=validator, select=select, use_index=use_index
+    )
+    return [dict(row) for row in rows], validator.issues
+
+
+class TestSelect:
+    def test_filters_rows_before_validation(self, tmp_path):
+        path = _write_roster(tmp_path / "roster.csv", 200)
+        rows, issues = _read(path, {"admin": ADMINS}, use_index=False)
+        assert [row["admin"] for row in rows] == sorted(ADMINS - {"1500", "9999"})
+        # Only the short row selected, 1089, is missing its password
+        assert [issue.line for issue in issues] == [127]
+
+    def test_any_selector_matches(self, tmp_path):
+        path = _write_roster(tmp_path / "roster.csv", 30)
+        select = {"admin": ["1000"], "group": ["72"]}
+        rows, _ = _read(path, select, use_index=False)
+        assert [row["admin"] for row in rows] == [
+            "1000", "1002", "1005", "1008", "1011", "1014", "1017", "1020",
+            "1023", "1026", "1029",
+        ]  # fmt: skip
+
+    def test_unknown_column(self, tmp_path):
+        path = _write_roster(tmp_path / "roster.csv", 10)
+        with pytest.raises(ValueError, match="not found in CSV: room"):
+            _read(path, {"room": ["12"]}, use_index=False)
+
+
+class TestIndex:
+    def test_same_rows_and_issues_as_scan(self, tmp_path):
+        path = _write_roster(tmp_path / "roster.csv", 600)
+        select = {"admin": ADMINS, "group": ["71"]}
+        indexed = _read(path, select, use_index=True)
+        assert index.index_path(path).exists()
+        assert indexed == _read(path, select, use_index=False)
+        assert len(indexed[0]) > 200
+
+    def test_reused_until_file_changes(self, tmp_path, monkeypatch):
+        path = _write_roster(tmp_path / "roster.csv", 100)
+        builds = []
+        build = index._build
+        monkeypatch.setattr(
+            index, "_build", lambda *a, **kw: builds.append(a) or build(*a, **kw)
+        )
+        select = {"admin": ["1005"]}
+        for _ in range(2):
+            assert _read(path, select, use_index=True)[0][0]["last_name"] == "Last5"
+        assert len(builds) == 1
+        # Same size, new contents: the modification time gives it away
+        path.write_bytes(path.read_bytes().replace(b"Last5,", b"Lost5,"))
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        assert _read(path, select, use_index=True)[0][0]["last_name"] == "Lost5"
+        assert len(builds) == 2
+
+    def test_new_column_extends_index(self, tmp_path):
+        path = _write_roster(tmp_path / "roster.csv", 50)
+        _read(path, {"admin": ["1001"]}, use_index=True)
+        _read(path, {"group": ["70"]}, use_index=True)
+        row_index = index.RowIndex.open(path, ["admin"], encoding="utf-8")
+        assert row_index is not None
+        with row_index:
+            assert row_index.columns == ["admin", "group"]
+            with pytest.raises(ValueError, match="'email' is not indexed"):
+                row_index.select({"email": ["user1@school.org"]})
+
+    def test_lone_carriage_returns_fall_back_to_scan(self, tmp_path):
+        path = tmp_path / "mac.csv"
+        path.write_bytes(b"admin,group\r1001,7A\r1002,7B\r")
+        rows, _ = _read(path, {"admin": ["1002"]}, use_index=True)
+        assert rows == [{"admin": "1002", "group": "7B"}]
+        assert not index.index_path(path).exists()
+
+
+class TestCli:
+    def test_only_admin_and_group(self, tmp_path):
+        path = _write_roster(tmp_path / "roster.csv", 300)
+        out = tmp_path / "out.pdf"
+        argv = [str(path), "-o", str(out), "--only-admin", "1001,1002"]
+        assert main([*argv, "--only-group", "70", "--index"]) == 0
+        assert index.index_path(path).exists()
+
+    def test_rows_from(self, tmp_path, capsys):
+        path = _write_roster(tmp_path / "roster.csv", 30)
+        wanted = tmp_path / "reprint.csv"
+        wanted.write_text("admin,reason\n1003,lost\n\n1004\n")
+        out = tmp_path / "out.pdf"
+        assert main([str(path), "-o", str(out), "--rows-from", str(wanted)]) == 0
+        assert not index.index_path(path).exists()
+        wanted.write_text("admin\n")
+        assert main([str(path), "-o", str(out), "--rows-from", str(wanted)]) == 1
+        assert "No rows match" in capsys.readouterr().err
+
+    def test_selector_column_missing(self, tmp_path, capsys):
+        path = tmp_path / "in.csv"
+        path.write_text("admin,email,password\n1001,a@school.org,Pass1234\n")
+        out = tmp_path / "out.pdf"
+        assert main([str(path), "-o", str(out), "--only-group", "7A"]) == 1
+        assert "group" in capsys.readouterr().err
@@ -0,0 +1,136 @@
+"""Tests for progress events and cancellation."""
+
+import io
+import itertools
+
+import pytest
+
+from school_labels import cli
+from school_labels.cli import main
+from school_labels.generator import (
+    generate_labels,
+    generate_labels_split,
+    generate_labels_to,
+)
+from school_labels.progress import CancelledError, CancelToken, Progress
+
+
+def _rows(n: int) -> list[dict[str, str]]:
+    return [
+        {
+            "admin": str(i),
+            "last_name": "Smith",
+            "first_name": "John",
+            "group": "7A" if i < 30 else "7B",
+            "email": f"j{i}@school.org",
+            "password": "Pass1234",
+        }
+        for i in range(n)
+    ]
+
+
+class TestProgress:
+    def test_rate_and_eta(self):
+        event = Progress(rows=42, pages=2, elapsed=2.0)
+        assert event.rate == 21
+        assert event.eta(84) == 2
+        assert event.eta(10) == 0
+        assert Progress(0, 0, 0.0).eta(10) is None
+
+    def test_token(self):
+        token = CancelToken()
+        token.check()
+        token.cancel()
+        assert token.cancelled
+        with pytest.raises(CancelledError):
+            token.check()
+
+
+class TestEvents:
+    def test_one_per_page(self):
+        events: list[Progress] = []
+        pages = generate_labels_to(
+            _rows(50), "email-password", io.BytesIO(), progress=events.append
+        )
+        assert pages == 3
+        assert [(e.rows, e.pages) for e in events] == [(21, 1), (42, 2), (50, 3)]
+        assert all(a.elapsed <= b.elapsed for a, b in itertools.pairwise(events))
+
+    @pytest.mark.parametrize("jobs", [1, 2])
+    def test_cancel_stops_rendering(self, jobs):
+        token = CancelToken()
+        events: list[Progress] = []
+
+        def cancel_after_two(event: Progress) -> None:
+            events.append(event)
+            if event.pages == 2:
+                token.cancel()
+
+        with pytest.raises(CancelledError):
+            generate_labels(
+                _rows(500),
+                "email-password",
+                jobs=jobs,
+                progress=cancel_after_two,
+                cancel=token,
+            )
+        assert [e.pages for e in events] == [1, 2]
+
+    def test_cancelled_before_start(self):
+        token = CancelToken()
+        token.cancel()
+        out = io.BytesIO()
+        with pytest.raises(CancelledError):
+            generate_labels_to(_rows(5), "email-password", out, cancel=token)
+        assert not out.getvalue()
+
+    def test_split_counts_all_documents(self, tmp_path):
+        events: list[Progress] = []
+        generate_labels_split(
+            _rows(50),
+            "email-password",
+            "group",
+            str(tmp_path / "labels-{value}.pdf"),
+            progress=events.append,
+        )
+        assert [(e.rows, e.pages) for e in events] == [(21, 1), (30, 2), (50, 3)]
+
+    def test_cancelled_split_leaves_no_partial_document(self, tmp_path):
+        token = CancelToken()
+        # The first document, 7A, has two pages: stop after its first
+        with pytest.raises(CancelledError):
+            generate_labels_split(
+                _rows(50),
+                "email-password",
+                "group",
+                str(tmp_path / "labels-{value}.pdf"),
+                progress=lambda _: token.cancel(),
+                cancel=token,
+            )
+        assert not list(tmp_path.iterdir())
+
+
+class TestCli:
+    def test_progress(self, tmp_path, capsys):
+        path = tmp_path / "in.csv"
+        header = "admin,last_name,first_name,group,email,password"
+        lines = [",".join(row.values()) for row in _rows(50)]
+        path.write_text("\n".join([header, *lines]) + "\n")
+        out = tmp_path / "out.pdf"
+        assert main([str(path), "-o", str(out), "--progress"]) == 0
+        err = capsys.readouterr().err
+        assert "labels/s" in err
+        # Logged, not redrawn, when stderr is not a terminal
+        assert err.splitlines()[-1].startswith("50 labels, 3 pages, ")
+        assert ", 100%, 0:00 left" in err
+
+    def test_estimate_rows(self, tmp_path):
+        path = tmp_path / "in.csv"
+        args = cli.create_parser().parse_args([str(path)])
+        path.write_bytes(b"header\n1\n2")
+        assert cli._estimate_rows(args) == 2
+        # Scaled from the first MiB of a larger file, not counted in full
+        path.write_bytes(b"header\n" + b"1001,Smith\n" * 300_000)
+        estimate = cli._estimate_rows(args)
+        assert estimate is not None
+        assert abs(estimate - 300_000) < 10
@@ -0,0 +1,58 @@
+"""Tests for compact row types."""
+
+import pickle
+
+import pytest
+
+from school_labels.rows import ColumnRow, Row, rows_from_columns
+
+
+class TestRow:
+    def test_mapping(self):
+        row = Row({"admin": 0, "group": 1}, ("1001", "7A"))
+        assert row["group"] == "7A"
+        assert row.get("email", "") == ""
+        assert list(row) == ["admin", "group"]
+        assert len(row) == 2
+        assert row == {"admin": "1001", "group": "7A"}
+
+    def test_no_instance_dict(self):
+        row = Row({"admin": 0}, ("1001",))
+        with pytest.raises(AttributeError):
+            row.extra = 1  # ty: ignore[unresolved-attribute]
+
+    def test_pickles_as_dict(self):
+        row = Row({"admin": 0, "group": 1}, ("1001", "7A"))
+        restored = pickle.loads(pickle.dumps(row))  # noqa: S301
+        assert restored == {"admin": "1001", "group": "7A"}
+
+    def test_replace(self):
+        row = Row({"admin": 0, "group": 1}, ("1001", "7A"))
+        replaced = row.replace({"group": "7B"})
+        assert isinstance(replaced, Row)
+        assert replaced == {"admin": "1001", "group": "7B"}
+        assert row["group"] == "7A"
+
+
+class TestRowsFromColumns:
+    def test_views(self):
+        columns = {"admin": ["1001", "1002"], "group": ("7A", "7B")}
+        rows = list(rows_from_columns(columns))
+        assert all(isinstance(row, ColumnRow) for row in rows)
+        assert rows == [
+            {"admin": "1001", "group": "7A"},
+            {"admin": "1002", "group": "7B"},
+        ]
+
+    def test_reads_through(self):
+        columns = {"admin": ["1001"]}
+        (row,) = rows_from_columns(columns)
+        columns["admin"][0] = "2002"
+        assert row["admin"] == "2002"
+
+    def test_empty(self):
+        assert list(rows_from_columns({})) == []
+
+    def test_unequal_lengths(self):
+        with pytest.raises(ValueError, match="same length"):
+            list(rows_from_columns({"a": ["1"], "b": []}))
@@ -0,0 +1,246 @@
+"""Tests for the HTTP label server."""
+
+import http.client
+import json
+import re
+import threading
+import time
+
+import pytest
+
+from school_labels import server
+from school_labels.cli import main
+
+from .conftest import EMAIL_CSV_HEADER, EMAIL_CSV_ROWS
+
+CSV_BODY = (EMAIL_CSV_HEADER + "\n" + "\n".join(EMAIL_CSV_ROWS) + "\n").encode()
+
+
+@pytest.fixture
+def label_server():
+    httpd = server.LabelServer(("127.0.0.1", 0), workers=1, queue_size=1, quiet=True)
+    thread = threading.Thread(
+        target=httpd.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+    thread.join()
+
+
+def _request(
+    httpd: server.LabelServer,
+    method: str,
+    path: str,
+    body: bytes | None = None,
+    headers: dict[str, str] | None = None,
+) -> tuple[http.client.HTTPResponse, bytes]:
+    """Send a request, returning the response and its body."""
+    host, port = httpd.server_address[:2]
+    assert isinstance(host, str)
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    conn.request(method, path, body, headers or {})
+    response = conn.getresponse()
+    return response, response.read()
+
+
+def _metrics(httpd: server.LabelServer, expected: str) -> str:
+    """Metrics text, once it shows ``expected``.
+
+    Requests are counted after their response is sent, so a client can
+    ask for metrics before its previous request has been counted.
+    """
+    deadline = time.monotonic() + 10
+    while True:
+        text = _request(httpd, "GET", "/metrics")[1].decode()
+        if expected in text or time.monotonic() > deadline:
+            return text
+        time.sleep(0.01)
+
+
+def _block_worker(pool: server.WorkerPool) -> threading.Event:
+    """Occupy a worker until the returned event is set."""
+    started, release = threading.Event(), threading.Event()
+
+    def job() -> None:
+        started.set()
+        release.wait(10)
+
+    pool.submit(job)
+    started.wait(10)
+    return release
+
+
+class TestWorkerPool:
+    def test_runs_jobs(self):
+        pool = server.WorkerPool(2, 2)
+        try:
+            futures = [pool.submit(lambda i=i: i * 2) for i in range(4)]
+            assert [f.result(10) for f in futures] == [0, 2, 4, 6]
+        finally:
+            pool.shutdown()
+
+    def test_exception_is_passed_on(self):
+        pool = server.WorkerPool(1, 0)
+        try:
+            future = pool.submit(lambda: 1 / 0)
+            with pytest.raises(ZeroDivisionError):
+                future.result(10)
+        finally:
+            pool.shutdown()
+
+    def test_busy_when_full(self):
+        pool = server.WorkerPool(1, 1)
+        try:
+            release = _block_worker(pool)
+            queued = pool.submit(lambda: "queued")
+            assert (pool.running, pool.queued) == (1, 1)
+            with pytest.raises(server.ServerBusyError):
+                pool.submit(lambda: "rejected")
+            release.set()
+            assert queued.result(10) == "queued"
+            # The slots are free again, as soon as the last result is
+            assert (pool.running, pool.queued) == (0, 0)
+            assert pool.submit(lambda: "later").result(10) == "later"
+        finally:
+            pool.shutdown()
+
+
+class TestLabels:
+    def test_csv(self, label_server):
+        response, body = _request(label_server, "POST", "/labels?break=group", CSV_BODY)
+        assert response.status == 200
+        assert response.getheader("Content-Type") == "application/pdf"
+        assert response.getheader("Transfer-Encoding") == "chunked"
+        assert body.startswith(b"%PDF-")
+        assert body.endswith(b"%%EOF\n")
+        # One page per group
+        assert re.search(rb"/Count 2\b", body)
+
+    def test_byte_order_mark(self, label_server):
+        response, _ = _request(
+            label_server, "POST", "/labels", b"\xef\xbb\xbf" + CSV_BODY
+        )
+        assert response.status == 200
+
+    def test_json_rows(self, label_server):
+        values = EMAIL_CSV_ROWS[0].split(",")
+        rows: list[dict[str, object]] = [
+            dict(zip(EMAIL_CSV_HEADER.split(","), values, strict=True))
+        ]
+        rows[0]["admin"] = 1001
+        response, body = _request(
+            label_server,
+            "POST",
+            "/labels?style=email-password",
+            json.dumps(rows).encode(),
+            {"Content-Type": "application/json"},
+        )
+        assert response.status == 200
+        assert body.startswith(b"%PDF-")
+
+    def test_json_columns(self, label_server):
+        columns = {name: ["x"] for name in EMAIL_CSV_HEADER.split(",")}
+        response, _ = _request(
+            label_server,
+            "POST",
+            "/labels",
+            json.dumps(columns).encode(),
+            {"Content-Type": "application/json"},
+        )
+        assert response.status == 200
+
+    @pytest.mark.parametrize(
+        ("path", "data", "message"),
+        [
+            ("/labels?style=nope", CSV_BODY, "Unknown style"),
+            ("/labels?break=house", CSV_BODY, "Break column 'house'"),
+            ("/labels", b"foo,bar\n1,2\n", "auto-detect"),
+            ("/labels", EMAIL_CSV_HEADER.encode() + b"\n", "No data"),
+            ("/labels", b"", "No data"),
+        ],
+    )
+    def test_bad_request(self, label_server, path, data, message):
+        response, body = _request(label_server, "POST", path, data)
+        assert response.status == 400
+        assert message in body.decode()
+
+    def test_bad_json(self, label_server):
+        response, _ = _request(
+            label_server,
+            "POST",
+            "/labels",
+            b'{"admin": "1"}',
+            {"Content-Type": "application/json"},
+        )
+        assert response.status == 400
+
+    def test_body_too_large(self, label_server):
+        label_server.max_body = 10
+        response, _ = _request(label_server, "POST", "/labels", CSV_BODY)
+        assert response.status == 413
+
+    def test_length_required(self, label_server):
+        host, port = label_server.server_address[:2]
+        conn = http.client.HTTPConnection(host, port, timeout=10)
+        conn.putrequest("POST", "/labels")
+        conn.endheaders()
+        assert conn.getresponse().status == 411
+
+    def test_busy(self, label_server):
+        release = _block_worker(label_server.pool)
+        try:
+            queued = label_server.pool.submit(lambda: None)
+            response, _ = _request(label_server, "POST", "/labels", CSV_BODY)
+            assert response.status == 503
+            assert response.getheader("Retry-After") == str(server.RETRY_AFTER)
+        finally:
+            release.set()
+        # Both slots are free once the queued job is done
+        queued.result(10)
+        assert _request(label_server, "POST", "/labels", CSV_BODY)[0].status == 200
+
+    def test_keep_alive(self, label_server):
+        host, port = label_server.server_address[:2]
+        conn = http.client.HTTPConnection(host, port, timeout=10)
+        for _ in range(2):
+            conn.request("POST", "/labels", CSV_BODY)
+            response = conn.getresponse()
+            assert response.status == 200
+            assert response.read().startswith(b"%PDF-")
+
+    def test_not_found(self, label_server):
+        assert _request(label_server, "POST", "/elsewhere", b"")[0].status == 404
+        assert _request(label_server, "GET", "/labels")[0].status == 404
+
+
+class TestMetrics:
+    def test_counts_requests(self, label_server):
+        _request(label_server, "POST", "/labels", CSV_BODY)
+        _request(label_server, "POST", "/labels?style=nope", CSV_BODY)
+        text = _metrics(label_server, "school_labels_request_duration_seconds_count 2")
+        assert 'school_labels_requests_total{path="/labels",status="200"} 1' in text
+        assert 'school_labels_requests_total{path="/labels",status="400"} 1' in text
+        assert "school_labels_request_duration_seconds_count 2" in text
+        assert "school_labels_rows_total 3" in text
+        assert "school_labels_pages_total 1" in text
+        assert "school_labels_workers 1" in text
+        assert "school_labels_measure_cache_hits_total{" in text
+
+    def test_health(self, label_server):
+        response, body = _request(label_server, "GET", "/health")
+        assert response.status == 200
+        assert body == b"ok\n"
+
+
+class TestServeCli:
+    def test_port_in_use(self, label_server, capsys):
+        port = label_server.server_address[1]
+        assert main(["serve", "--port", str(port), "--quiet"]) == 1
+        assert "Error listening" in capsys.readouterr().err
+
+    def test_queue_size_not_negative(self, capsys):
+        with pytest.raises(SystemExit):
+            main(["serve", "--queue-size", "-1"])
+        assert "must not be negative" in capsys.readouterr().err
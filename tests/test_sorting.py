@@ -0,0 +1,84 @@
+"""Tests for row sorting."""
+
+import random
+
+from school_labels.cli import main
+from school_labels.sorting import sort_rows
+
+from .conftest import EMAIL_CSV_HEADER, _write_csv
+
+
+def _rows(n: int) -> list[dict[str, str]]:
+    rng = random.Random(7160)  # noqa: S311
+    return [
+        {"group": rng.choice("ABCDE"), "name": rng.choice("pqrs"), "seq": str(i)}
+        for i in range(n)
+    ]
+
+
+def _stable(rows, columns):
+    return sorted(rows, key=lambda row: tuple(row[c] for c in columns))
+
+
+class TestSortRows:
+    def test_in_memory(self):
+        rows = _rows(100)
+        assert list(sort_rows(rows, ["group"])) == _stable(rows, ["group"])
+
+    def test_external_merge(self):
+        rows = _rows(1000)
+        columns = ["group", "name"]
+        assert list(sort_rows(rows, columns, run_size=64)) == _stable(rows, columns)
+
+    def test_exact_run_size(self):
+        rows = _rows(128)
+        assert list(sort_rows(rows, ["group"], run_size=64)) == _stable(rows, ["group"])
+
+    def test_stable(self):
+        rows = _rows(500)
+        result = list(sort_rows(rows, ["group"], run_size=50))
+        for group in "ABCDE":
+            seqs = [int(row["seq"]) for row in result if row["group"] == group]
+            assert seqs == sorted(seqs)
+
+    def test_empty(self):
+        assert list(sort_rows([], ["group"])) == []
+
+    def test_missing_column_sorts_first(self):
+        rows = [{"group": "B"}, {}, {"group": "A"}]
+        assert list(sort_rows(rows, ["group"])) == [{}, {"group": "A"}, {"group": "B"}]
+
+    def test_numbers_sort_by_value(self):
+        rows = [{"admin": a} for a in ["100", "7A", "99", "", "-3", "007", "2.5"]]
+        result = [row["admin"] for row in sort_rows(rows, ["admin"])]
+        assert result == ["", "-3", "2.5", "007", "99", "100", "7A"]
+
+
+class TestCliGroupBy:
+    ROWS: tuple[str, ...] = (
+        "1003,Brown,Bob,7B,bob.brown@school.org,Pass9012",
+        "1001,Smith,John,7A,john.smith@school.org,Pass1234",
+        "1004,Adams,Amy,7B,amy.adams@school.org,Pass3456",
+        "1002,Jones,Jane,7A,jane.jones@school.org,Pass5678",
+    )
+
+    def test_group_by_matches_presorted_break(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", "1725179400")
+        unsorted = _write_csv(tmp_path / "in.csv", EMAIL_CSV_HEADER, list(self.ROWS))
+        presorted = _write_csv(
+            tmp_path / "sorted.csv",
+            EMAIL_CSV_HEADER,
+            [self.ROWS[3], self.ROWS[1], self.ROWS[2], self.ROWS[0]],
+        )
+        grouped, expected = tmp_path / "grouped.pdf", tmp_path / "expected.pdf"
+        args = ["--group-by", "group", "--sort-by", "last_name", "-o", str(grouped)]
+        assert main([str(unsorted), *args]) == 0
+        assert main([str(presorted), "--break", "group", "-o", str(expected)]) == 0
+        assert grouped.read_bytes() == expected.read_bytes()
+
+    def test_unknown_sort_column(self, tmp_path, capsys):
+        csv_path = _write_csv(tmp_path / "in.csv", EMAIL_CSV_HEADER, list(self.ROWS))
+        output = tmp_path / "out.pdf"
+        assert main([str(csv_path), "--sort-by", "nope", "-o", str(output)]) == 1
+        assert "nope" in capsys.readouterr().err
+        assert not output.exists()
@@ -1,12 +1,30 @@
 """Tests for label templates."""
 
+import io
+import re
+import zlib
+from typing import ClassVar
+
+import pytest
 from fpdf import FPDF
+from fpdf.errors import FPDFUnicodeEncodingException
 
 from school_labels.templates import (
     Avery7160Template,
+    Box,
+    Caption,
     EmailPasswordTemplate,
+    Field,
+    Font,
     LabelTemplate,
+    Layout,
+    LayoutTemplate,
+    Rule,
+    Sheet,
+    TextMeasurer,
 )
+from school_labels.templates.layout import compile_layout
+from school_labels.templates.measure import FitField, LRUCache
 
 
 class TestLabelTemplateTextHelpers:
@@ -54,6 +72,89 @@ class TestLabelTemplateTextHelpers:
         assert pdf.get_string_width(long_email) <= 30.0
 
 
+class TestLRUCache:
+    def test_hits_and_misses(self):
+        cache = LRUCache(maxsize=4)
+        assert cache.get_or_compute("a", lambda: 1) == 1
+        assert cache.get_or_compute("a", lambda: 2) == 1
+        assert cache.cache_info() == (1, 1, 4, 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.get_or_compute("a", lambda: 1)
+        cache.get_or_compute("b", lambda: 2)
+        cache.get_or_compute("a", lambda: 1)
+        cache.get_or_compute("c", lambda: 3)
+        assert cache.get_or_compute("a", lambda: 0) == 1
+        assert cache.get_or_compute("b", lambda: 0) == 0
+
+
+class TestTextMeasurer:
+    def _pdf(self, size=11):
+        pdf = FPDF()
+        pdf.add_page()
+        pdf.set_font("Helvetica", "", size)
+        return pdf
+
+    def test_fit_memoized(self):
+        measurer = TextMeasurer()
+        pdf = self._pdf()
+        long_name = "Bartholomew Wolfeschlegelsteinhausenbergerdorff"
+        first = measurer.fit_text(pdf, long_name, 30.0)
+        assert measurer.fit_text(pdf, long_name, 30.0) == first
+        assert measurer.fits.cache_info().hits == 1
+        assert measurer.fits.cache_info().misses == 1
+
+    def test_keyed_on_font_size(self):
+        measurer = TextMeasurer()
+        small = measurer.string_width(self._pdf(7), "Maple")
+        large = measurer.string_width(self._pdf(11), "Maple")
+        assert small < large
+        assert measurer.widths.cache_info().misses == 2
+
+    def test_shrink_size(self):
+        measurer = TextMeasurer()
+        pdf = self._pdf()
+        assert measurer.shrink_size(pdf, "Short", 60.0) == 11
+        size = measurer.shrink_size(pdf, "a.very.long.email@example.org.uk", 30.0)
+        assert size < 11
+        pdf.set_font_size(size)
+        assert pdf.get_string_width(
+            "a.very.long.email@example.org.uk"
+        ) == pytest.approx(30.0)
+
+    def test_prefit_matches_per_cell(self):
+        texts = [
+            "Maple",
+            "Bartholomew Wolfeschlegelsteinhausenbergerdorff",
+            "Zoë O'Brien-Åkesson",
+            "a.very.long.email@example.org.uk",
+            "",
+        ]
+        rows = [{"t": t} for t in texts]
+        for family, width in [("Helvetica", 30.0), ("Courier", 17.0), ("Times", 2.0)]:
+            for shrink in (False, True):
+                field = FitField(lambda row: row["t"], family, "", 11, width, shrink)
+                batched, per_cell = TextMeasurer(), TextMeasurer()
+                pdf = FPDF()
+                pdf.add_page()
+                pdf.set_font(family, "", 11)
+                batched.prefit(pdf, field, rows)
+                method = "shrink_size" if shrink else "fit_text"
+                for text in texts:
+                    expected = getattr(per_cell, method)(pdf, text, width)
+                    assert getattr(batched, method)(pdf, text, width) == expected
+                cache = batched.shrinks if shrink else batched.fits
+                assert cache.cache_info().misses == 0
+
+    def test_bounded(self):
+        measurer = TextMeasurer(maxsize=3)
+        pdf = self._pdf()
+        for i in range(10):
+            measurer.string_width(pdf, str(i))
+        assert measurer.widths.cache_info().currsize == 3
+
+
 class TestAvery7160Layout:
     template = EmailPasswordTemplate()
 
@@ -174,3 +275,231 @@ class TestEmailPasswordTemplate:
         data = [row_a, row_b]
         pdf = self.template.create_pdf(data, break_column="group")
         assert pdf.pages_count == 2
+
+    def test_write_pdf_matches_create_pdf(self):
+        rows = [
+            {
+                "admin": str(i),
+                "last_name": "S",
+                "first_name": "J",
+                "group": "7A" if i < 5 else "7B",
+                "email": "e@x",
+                "password": "p",
+            }
+            for i in range(30)
+        ]
+        out = io.BytesIO()
+        pages = self.template.write_pdf(iter(rows), out, break_column="group")
+        assert pages == self.template.create_pdf(rows, "group").pages_count == 3
+
+    def test_write_pdf_flushes_pages(self):
+        row = {
+            "admin": "1",
+            "last_name": "S",
+            "first_name": "J",
+            "group": "7A",
+            "email": "e@x",
+            "password": "p",
+        }
+        sizes = []
+        out = io.BytesIO()
+
+        def rows():
+            for _ in range(40):
+                yield from [row] * 21
+                sizes.append(len(out.getvalue()))
+
+        self.template.write_pdf(rows(), out)
+        # Finished pages reach the output while later rows are still unread
+        assert sizes == sorted(sizes)
+        assert sizes[0] < sizes[19] < sizes[-1]
+
+    def test_write_pdf_static_layer_rendered_once(self):
+        row = {
+            "admin": "1",
+            "last_name": "S",
+            "first_name": "J",
+            "group": "7A",
+            "email": "e@x",
+            "password": "p",
+        }
+        out = io.BytesIO()
+        self.template.write_pdf([row] * 30, out)
+        streams = [
+            zlib.decompress(m)
+            for m in re.findall(rb"stream\n(.*?)\nendstream", out.getvalue(), re.DOTALL)
+        ]
+        content = b"".join(streams)
+        assert content.count(b"(Admin no.)") == 1
+        assert content.count(b"(J S)") == 30
+        # Full first page paints the whole sheet, the second places 9 labels
+        assert content.count(b"/Sheet Do") == 1
+        assert content.count(b"/Label Do") == 21 + 9
+
+    def test_create_pdf_draws_static_layer_inline(self):
+        row = {
+            "admin": "1",
+            "last_name": "S",
+            "first_name": "J",
+            "group": "7A",
+            "email": "e@x",
+            "password": "p",
+        }
+        pdf = self.template.create_pdf([row] * 2)
+        pdf.compress = False
+        output = pdf.output()
+        assert output.count(b"(Admin no.)") == 2
+        assert b"Do" not in output
+
+
+# Two labels across, three down, on a small sheet
+BADGE_SHEET = Sheet(
+    width=150,
+    height=120,
+    label_width=70,
+    label_height=40,
+    across=2,
+    down=3,
+    left_margin=5,
+    top_margin=0,
+    h_spacing=0,
+    v_spacing=0,
+)
+
+BADGE = Layout(
+    name="badge",
+    title="Name badges",
+    sheet=BADGE_SHEET,
+    fonts={"sans": "Helvetica", "serif": "Times"},
+    items=(
+        Caption("Hello, my name is", Box(2, 2, 66, 4), Font("sans", 8)),
+        Rule(0, 8, 70, 8),
+        Field("{first_name} {last_name}", Box(2, 10, 66, 8), Font("serif", 18)),
+        Field("{house}", Box(2, 20, 66, 6), Font("serif", 18), overflow="shrink"),
+        Field("{group}", Box(2, 28, 66, 6), Font("serif", 18)),
+        Field("{email}", Box(2, 34, 66, 4), Font("sans", 8)),
+    ),
+    unique_columns=("email",),
+)
+
+
+class TestLayout:
+    def test_columns(self):
+        assert BADGE.columns == ["first_name", "last_name", "house", "group", "email"]
+
+    def test_compiled_font_changes(self):
+        program = compile_layout(
+            BADGE, {"sans": "Helvetica", "serif": "Times"}.__getitem__
+        )
+        # The first field always sets its font, and so does a field after a
+        # shrunk one, whose font size may have changed
+        assert [op.set_font for op in program.fields] == [True, False, True, True]
+        assert [op.shrink for op in program.fields] == [False, True, False, False]
+        assert [f.family for f in program.fit_fields] == ["Times"] * 3 + ["Helvetica"]
+
+    def test_field_text(self):
+        program = compile_layout(BADGE, str)
+        row = {"first_name": "Ada", "last_name": "Lovelace"}
+        assert [op.text(row) for op in program.fields] == ["Ada Lovelace", "", "", ""]
+
+    @pytest.mark.parametrize("text", ["{}", "{0}", "{name.upper}", "{name:>9}"])
+    def test_bad_field_text(self, text):
+        layout = BADGE._replace(items=(Field(text, Box(0, 0, 1, 1), Font("sans", 8)),))
+        with pytest.raises(ValueError, match="must name columns"):
+            compile_layout(layout, str)
+
+    def test_unknown_font_role(self):
+        layout = BADGE._replace(items=(Caption("x", Box(0, 0, 1, 1), Font("mono", 8)),))
+        with pytest.raises(ValueError, match="Unknown font role 'mono'"):
+            compile_layout(layout, str)
+
+
+class TestLayoutTemplate:
+    template = LayoutTemplate(BADGE)
+
+    def test_from_layout(self):
+        assert self.template.name == "badge"
+        assert self.template.pdf_title == "Name badges"
+        assert self.template.unique_columns == ["email"]
+        assert self.template.LABELS_PER_PAGE == 6
+        assert self.template._get_label_position(3) == (5 + 70, 40)
+
+    def test_email_password_is_a_layout(self):
+        template = EmailPasswordTemplate()
+        assert template.layout.sheet.labels_per_page == template.LABELS_PER_PAGE
+        assert template.FONTS == {"sans": "Helvetica", "mono": "Courier"}
+
+    @pytest.mark.parametrize("jobs", [1, 2])
+    def test_write_pdf(self, jobs):
+        rows = [
+            {"first_name": "Ada", "last_name": str(i), "group": "7A", "house": "Ash"}
+            for i in range(7)
+        ]
+        out = io.BytesIO()
+        assert self.template.write_pdf(rows, out, jobs=jobs) == 2
+        streams = b"".join(
+            zlib.decompress(m)
+            for m in re.findall(rb"stream\n(.*?)\nendstream", out.getvalue(), re.DOTALL)
+        )
+        assert streams.count(b"(Hello, my name is)") == 1
+        assert streams.count(b"(Ash)") == 7
+        assert re.search(rb"/MediaBox \[0 0 425\.20 340\.16\]", out.getvalue())
+
+    def test_with_fonts_recompiles(self, font_path):
+        template = LayoutTemplate(BADGE)
+        assert template._program.fields[0].family == "Times"
+        with_font = template.with_fonts({"serif": font_path})
+        assert with_font._program.fields[0].family != "Times"
+        assert template._program.fields[0].family == "Times"
+
+
+def _text_runs(pdf: bytes) -> list[tuple[bytes, bytes, bytes, bytes]]:
+    """Font selections and positioned texts in page content, in order."""
+    content = b"".join(
+        zlib.decompress(m)
+        for m in re.findall(rb"stream\n(.*?)\nendstream", pdf, re.DOTALL)
+    )
+    return re.findall(
+        rb"BT (?:/(F\d+) ([\d.]+) Tf|([\d.]+ [\d.]+) Td \((.*?)\) Tj) ET", content
+    )
+
+
+class TestDirectBackend:
+    ROWS: ClassVar = [
+        {
+            "first_name": first,
+            "last_name": last,
+            "house": house,
+            "group": "7A",
+            "email": email,
+        }
+        for first, last, house, email in [
+            ("Ada", "Lovelace", "Ash", "ada@school.org"),
+            ("Zoë", "O'Brien-Åkesson (twin)", "Beech and Birch House", ""),
+            ("", "", "", "back\\slash@school.org"),
+            ("Bartholomew", "Wolfeschlegelsteinhausenbergerdorff", "Cedar", "b@x"),
+        ]
+        * 4
+    ]
+
+    @pytest.mark.parametrize(
+        "template", [LayoutTemplate(BADGE), EmailPasswordTemplate()], ids=str
+    )
+    def test_same_text_and_positions(self, template):
+        rows = [{"admin": "1", "password": row["house"], **row} for row in self.ROWS]
+        fpdf, direct = io.BytesIO(), io.BytesIO()
+        template.write_pdf(rows, fpdf)
+        template.write_pdf(rows, direct, backend="direct")
+        runs = _text_runs(direct.getvalue())
+        assert b"Lovelace" in b"".join(text for *_, text in runs)
+        assert runs == _text_runs(fpdf.getvalue())
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError, match="Backends: fpdf, direct"):
+            LayoutTemplate(BADGE).write_pdf(self.ROWS, io.BytesIO(), backend="nope")
+
+    @pytest.mark.parametrize("backend", ["fpdf", "direct"])
+    def test_unprintable_text(self, backend):
+        rows = [{**self.ROWS[0], "first_name": "Łukasz"}]
+        with pytest.raises(FPDFUnicodeEncodingException):
+            LayoutTemplate(BADGE).write_pdf(rows, io.BytesIO(), backend=backend)
@@ -0,0 +1,117 @@
+"""Tests for stage timings and counters."""
+
+import io
+import json
+
+import pytest
+
+from school_labels import timings
+from school_labels.cli import main
+from school_labels.generator import generate_labels_to
+from school_labels.templates import TEXT_MEASURER, EmailPasswordTemplate
+
+
+def _rows(n: int, group_size: int = 5) -> list[dict[str, str]]:
+    return [
+        {
+            "admin": str(i),
+            "last_name": "Wolfeschlegelsteinhausenbergerdorff" if i % 2 else "Smith",
+            "first_name": "John",
+            "group": f"7{'ABCDEFGHIJ'[i // group_size]}",
+            "email": f"j{i}@school.org",
+            "password": "Pass1234",
+        }
+        for i in range(n)
+    ]
+
+
+class TestTimings:
+    def test_not_recording_by_default(self):
+        timings.current().count("pages")
+        assert not timings.current().counters
+
+    def test_record_restores_previous(self):
+        with timings.record() as outer:
+            with timings.record() as inner:
+                assert timings.current() is inner
+            assert timings.current() is outer
+        assert outer.total_seconds > 0
+
+    def test_timed_counts_producer_calls(self):
+        with timings.record() as recorder:
+            assert list(recorder.timed("parse", "abc")) == ["a", "b", "c"]
+        # One call per item plus the one that finds the end
+        assert recorder.stages["parse"].calls == 4
+
+    def test_stage_records_on_error(self):
+        with (
+            timings.record() as recorder,
+            pytest.raises(ValueError, match="boom"),
+            recorder.stage("fit"),
+        ):
+            raise ValueError("boom")  # noqa: EM101
+        assert recorder.stages["fit"].calls == 1
+
+
+class TestInstrumentation:
+    def setup_method(self):
+        TEXT_MEASURER.cache_clear()
+
+    def test_counters(self):
+        with timings.record() as recorder:
+            pages = generate_labels_to(
+                _rows(30), "email-password", io.BytesIO(), break_column="group"
+            )
+        assert recorder.counters["pages"] == pages == 6
+        assert recorder.counters["break_pages"] == 5
+        assert recorder.counters["truncations"] == 15
+        assert recorder.counters["prefit_measurements"] > 0
+        assert set(recorder.stages) == {
+            "parse",
+            "validate",
+            "static",
+            "fit",
+            "layout",
+            "write",
+        }
+        total = sum(stage.seconds for stage in recorder.stages.values())
+        assert total <= recorder.total_seconds
+
+    def test_parallel_merges_worker_counters(self, monkeypatch):
+        monkeypatch.setattr(EmailPasswordTemplate, "PAGES_PER_CHUNK", 1)
+        with timings.record() as recorder:
+            generate_labels_to(_rows(30), "email-password", io.BytesIO(), jobs=2)
+        assert recorder.counters["pages"] == 2
+        assert recorder.counters["truncations"] == 15
+
+    def test_create_pdf_counts_pages(self):
+        with timings.record() as recorder:
+            EmailPasswordTemplate().create_pdf(_rows(30), "group")
+        assert recorder.counters["pages"] == 6
+        assert recorder.counters["break_pages"] == 5
+
+
+class TestCliTimings:
+    def test_timings_report(self, email_csv_path, tmp_path, capsys):
+        out = tmp_path / "out.pdf"
+        assert main([str(email_csv_path), "-o", str(out), "--timings"]) == 0
+        err = capsys.readouterr().err
+        assert "layout" in err
+        assert "pages: 1" in err
+
+    def test_timings_json(self, email_csv_path, tmp_path):
+        out = tmp_path / "out.pdf"
+        report = tmp_path / "timings.json"
+        args = [str(email_csv_path), "-o", str(out), "--timings-json", str(report)]
+        assert main(args) == 0
+        data = json.loads(report.read_text())
+        assert data["counters"]["pages"] == 1
+        assert data["stages"]["parse"]["calls"] == 4
+        assert data["total_seconds"] > 0
+
+    def test_profile(self, email_csv_path, tmp_path):
+        out = tmp_path / "out.pdf"
+        profile = tmp_path / "run.prof"
+        args = [str(email_csv_path), "-o", str(out), "--profile", str(profile)]
+        assert main(args) == 0
+        assert profile.stat().st_size > 0
@@ -0,0 +1,127 @@
+"""Tests for streaming row validation."""
+
+import io
+
+import pytest
+
+from school_labels.cli import main
+from school_labels.generator import iter_csv_rows
+from school_labels.validation import Issue, RowValidator, ValidationError
+
+from .conftest import EMAIL_CSV_HEADER, EMAIL_CSV_ROWS, _write_csv
+
+
+def _validator(**kwargs) -> RowValidator:
+    return RowValidator(["admin", "name"], ["admin"], "latin-1", **kwargs)
+
+
+class TestRowValidator:
+    def test_valid_rows(self):
+        validator = _validator()
+        rows = [{"admin": "1", "name": "Zoë"}, {"admin": "2", "name": "Bob"}]
+        assert list(validator.validated(rows)) == rows
+        assert validator.issues == []
+        assert validator.rows == 2
+
+    def test_empty_value(self):
+        validator = _validator()
+        list(validator.validated([{"admin": "1", "name": "  "}, {"admin": "2"}]))
+        assert [(i.row, i.column, i.problem) for i in validator.issues] == [
+            (1, "name", "empty"),
+            (2, "name", "empty"),
+        ]
+
+    def test_duplicate_ignores_case_and_whitespace(self):
+        validator = RowValidator(unique=["email"])
+        rows = [{"email": "A@school.org"}, {"email": "b@x"}, {"email": " a@school.org"}]
+        list(validator.validated(rows))
+        assert validator.issues == [
+            Issue(3, None, "email", "duplicate", "' a@school.org' duplicates row 1")
+        ]
+
+    def test_unprintable_value_is_replaced(self):
+        validator = _validator()
+        (row,) = validator.validated([{"admin": "1", "name": "Łukasz"}])
+        assert row == {"admin": "1", "name": "?ukasz"}
+        assert validator.issues[0].problem == "charset"
+
+    def test_strict_raises_at_first_issue(self):
+        validator = _validator(strict=True)
+        rows = validator.validated([{"admin": "1", "name": "A"}, {"admin": "1"}])
+        assert next(rows) == {"admin": "1", "name": "A"}
+        with pytest.raises(ValidationError, match="row 2, name") as info:
+            next(rows)
+        assert info.value.issue.problem == "empty"
+
+    def test_write_report(self):
+        validator = _validator()
+        list(validator.validated([{"admin": "1"}]))
+        out = io.StringIO()
+        validator.write_report(out)
+        assert out.getvalue().splitlines() == [
+            "row,line,column,problem,detail",
+            "1,,name,empty,value is empty",
+        ]
+
+
+class TestCsvValidation:
+    def test_line_numbers_count_quoted_newlines(self):
+        source = io.StringIO('admin,name\n1,"two\nlines"\n\n1,\n')
+        validator = _validator()
+        rows = list(iter_csv_rows(source, validator=validator))
+        assert len(rows) == 2
+        assert [(i.row, i.line, i.problem) for i in validator.issues] == [
+            (2, 5, "empty"),
+            (2, 5, "duplicate"),
+        ]
+
+    def test_replacement_keeps_compact_row(self):
+        source = io.StringIO("admin,name\n1,Łukasz\n")
+        (row,) = iter_csv_rows(source, validator=_validator())
+        assert dict(row) == {"admin": "1", "name": "?ukasz"}
+
+
+def _bad_csv(tmp_path):
+    rows = [*EMAIL_CSV_ROWS, "1001,Łukasz,Jan,7B,jan@school.org,Pass0000"]
+    return _write_csv(tmp_path / "dupes.csv", EMAIL_CSV_HEADER, rows)
+
+
+class TestCliValidation:
+    def test_clean_input_has_no_warning(self, email_csv_path, tmp_path, capsys):
+        assert main([str(email_csv_path), "-o", str(tmp_path / "out.pdf")]) == 0
+        assert "problems" not in capsys.readouterr().err
+
+    def test_warns_and_prints(self, tmp_path, capsys):
+        output = tmp_path / "out.pdf"
+        assert main([str(_bad_csv(tmp_path)), "-o", str(output)]) == 0
+        assert output.exists()
+        err = capsys.readouterr().err
+        assert "2 problems" in err
+        assert "line 5, last_name" in err
+        assert "line 5, admin: '1001' duplicates row 1" in err
+
+    def test_report(self, tmp_path, capsys):
+        output = tmp_path / "out.pdf"
+        report = tmp_path / "report.csv"
+        args = [str(_bad_csv(tmp_path)), "-o", str(output), "--report", str(report)]
+        assert main(args) == 0
+        assert output.exists()
+        assert f"listed in {report}" in capsys.readouterr().err
+        lines = report.read_text().splitlines()
+        assert lines[0] == "row,line,column,problem,detail"
+        assert [line.split(",")[:4] for line in lines[1:]] == [
+            ["4", "5", "last_name", "charset"],
+            ["4", "5", "admin", "duplicate"],
+        ]
+
+    def test_strict_leaves_no_output(self, tmp_path, capsys):
+        output = tmp_path / "out.pdf"
+        assert main([str(_bad_csv(tmp_path)), "-o", str(output), "--strict"]) == 1
+        assert not output.exists()
+        assert "line 5, last_name" in capsys.readouterr().err
+
+    def test_strict_first_row(self, tmp_path, capsys):
+        csv_path = _write_csv(tmp_path / "empty.csv", EMAIL_CSV_HEADER, [",,,,,"])
+        output = tmp_path / "out.pdf"
+        assert main([str(csv_path), "-o", str(output), "--strict"]) == 1
+        assert "line 2, admin: value is empty" in capsys.readouterr().err
@@ -0,0 +1,196 @@
+"""Tests for watching a folder for CSV files."""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from school_labels import watch
+from school_labels.cli import main
+
+from .conftest import EMAIL_CSV_HEADER, EMAIL_CSV_ROWS
+
+CSV_TEXT = EMAIL_CSV_HEADER + "\n" + "\n".join(EMAIL_CSV_ROWS) + "\n"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def folders(tmp_path):
+    in_dir, out_dir = tmp_path / "in", tmp_path / "out"
+    in_dir.mkdir()
+    return in_dir, out_dir
+
+
+def _watcher(in_dir, out_dir, *, settle=0, debounce=0, **kwargs):
+    return watch.FolderWatcher(
+        in_dir, out_dir, settle=settle, debounce=debounce, **kwargs
+    )
+
+
+def _run_once(watcher, executor=None):
+    return list(watcher.run(executor, interval=0.01, once=True))
+
+
+class TestFolderWatcher:
+    def test_done_and_failed(self, folders):
+        in_dir, out_dir = folders
+        (in_dir / "7a.csv").write_text(CSV_TEXT)
+        (in_dir / "bad.csv").write_text("foo,bar\n1,2\n")
+        results = _run_once(_watcher(in_dir, out_dir))
+
+        assert [r.input_path.name for r in results] == ["7a.csv", "bad.csv"]
+        good, bad = results
+        assert good.error is None
+        assert (good.rows, good.pages) == (3, 1)
+        assert good.output_path == out_dir / "7a.pdf"
+        assert good.output_path.read_bytes().startswith(b"%PDF-")
+        assert good.moved_to == in_dir / watch.DONE_DIR / "7a.csv"
+        assert bad.output_path is None
+        assert "auto-detect" in bad.error
+        assert bad.moved_to == in_dir / watch.FAILED_DIR / "bad.csv"
+        assert not list(in_dir.glob("*.csv"))
+
+    def test_unexpected_error_moves_to_failed(self, folders, monkeypatch):
+        in_dir, out_dir = folders
+        (in_dir / "7a.csv").write_text(CSV_TEXT)
+        (in_dir / "7b.csv").write_text(CSV_TEXT)
+        generate_file = watch.batch.generate_file
+
+        def crash_on_7a(input_path, output_path, **options):
+            if input_path.name == "7a.csv":
+                message = "no such glyph"
+                raise LookupError(message)
+            return generate_file(input_path, output_path, **options)
+
+        monkeypatch.setattr(watch.batch, "generate_file", crash_on_7a)
+        watcher = _watcher(in_dir, out_dir)
+        crashed, good = _run_once(watcher)
+        assert crashed.error == "no such glyph"
+        assert crashed.moved_to == in_dir / watch.FAILED_DIR / "7a.csv"
+        assert good.error is None
+        assert good.moved_to == in_dir / watch.DONE_DIR / "7b.csv"
+        # Keeps polling, and does not pick up the failed file again
+        assert _run_once(watcher) == []
+
+    def test_waits_for_file_to_settle(self, folders):
+        in_dir, out_dir = folders
+        clock = FakeClock()
+        watcher = _watcher(in_dir, out_dir, settle=2, clock=clock)
+        path = in_dir / "7a.csv"
+        path.write_text(CSV_TEXT[:20])
+        assert watcher.poll() == []
+        clock.now = 1.5
+        # Still being written: the settle time starts again
+        with path.open("a") as f:
+            f.write(CSV_TEXT[20:])
+        os.utime(path, ns=(0, 10**9))
+        assert watcher.poll() == []
+        clock.now = 3
+        assert watcher.poll() == []
+        clock.now = 3.5
+        assert watcher.poll() == [path]
+
+    def test_debounce(self, folders):
+        in_dir, out_dir = folders
+        clock = FakeClock()
+        watcher = _watcher(in_dir, out_dir, debounce=1, clock=clock)
+        (in_dir / "a.csv").write_text(CSV_TEXT)
+        assert watcher.poll() == []
+        clock.now = 0.8
+        (in_dir / "b.csv").write_text(CSV_TEXT)
+        assert watcher.poll() == []
+        clock.now = 1.5
+        assert watcher.poll() == []
+        clock.now = 1.8
+        assert [path.name for path in watcher.poll()] == ["a.csv", "b.csv"]
+
+    def test_ignores_hidden_and_other_files(self, folders):
+        in_dir, out_dir = folders
+        for name in (".7a.csv", "~$7a.csv", "notes.txt"):
+            (in_dir / name).write_text(CSV_TEXT)
+        assert _watcher(in_dir, out_dir).poll() == []
+
+    def test_unchanged_file_is_not_regenerated(self, folders):
+        in_dir, out_dir = folders
+        (in_dir / "7a.csv").write_text(CSV_TEXT)
+        _run_once(_watcher(in_dir, out_dir))
+
+        # Dropped again, and seen by a new watcher
+        (in_dir / "7a.csv").write_text(CSV_TEXT)
+        (result,) = _run_once(_watcher(in_dir, out_dir))
+        assert result.unchanged
+        assert result.output_path == out_dir / "7a.pdf"
+        assert result.moved_to == in_dir / watch.DONE_DIR / "7a-1.csv"
+        assert [path.name for path in out_dir.glob("*.pdf")] == ["7a.pdf"]
+
+    def test_regenerated_when_output_is_gone(self, folders):
+        in_dir, out_dir = folders
+        watcher = _watcher(in_dir, out_dir)
+        (in_dir / "7a.csv").write_text(CSV_TEXT)
+        _run_once(watcher)
+        (out_dir / "7a.pdf").unlink()
+
+        (in_dir / "7a.csv").write_text(CSV_TEXT)
+        (result,) = _run_once(watcher)
+        assert not result.unchanged
+        assert (out_dir / "7a.pdf").exists()
+
+    def test_copies_are_generated_once(self, folders):
+        in_dir, out_dir = folders
+        (in_dir / "a.csv").write_text(CSV_TEXT)
+        (in_dir / "b.csv").write_text(CSV_TEXT)
+        results = _run_once(_watcher(in_dir, out_dir))
+        assert [r.unchanged for r in results] == [False, True]
+        assert results[1].output_path == out_dir / "a.pdf"
+
+    def test_changed_options_regenerate(self, folders):
+        in_dir, out_dir = folders
+        (in_dir / "7a.csv").write_text(CSV_TEXT)
+        _run_once(_watcher(in_dir, out_dir))
+
+        (in_dir / "7a.csv").write_text(CSV_TEXT)
+        (result,) = _run_once(_watcher(in_dir, out_dir, break_column="group"))
+        assert not result.unchanged
+        assert result.pages == 2
+        # The earlier PDF is not overwritten
+        assert result.output_path == out_dir / "7a-1.pdf"
+
+    def test_workers(self, folders):
+        in_dir, out_dir = folders
+        for name in ("a", "b", "c"):
+            (in_dir / f"{name}.csv").write_text(CSV_TEXT.replace("7A", name))
+        with ProcessPoolExecutor(2) as executor:
+            results = _run_once(_watcher(in_dir, out_dir), executor)
+        assert sorted(r.input_path.name for r in results) == ["a.csv", "b.csv", "c.csv"]
+        assert all(r.error is None and not r.unchanged for r in results)
+        assert len(list(out_dir.glob("*.pdf"))) == 3
+
+
+class TestWatchCli:
+    def test_once(self, folders, capsys):
+        in_dir, out_dir = folders
+        (in_dir / "7a.csv").write_text(CSV_TEXT)
+        (in_dir / "bad.csv").write_text("foo,bar\n1,2\n")
+        argv = ["watch", str(in_dir), str(out_dir), "--once"]
+        assert main([*argv, "--settle", "0", "--debounce", "0"]) == 0
+        out = capsys.readouterr().out
+        assert "7a.csv -> " in out
+        assert "3 rows, 1 pages" in out
+        assert "bad.csv: FAILED:" in out
+
+    def test_missing_folder(self, tmp_path, capsys):
+        assert main(["watch", str(tmp_path / "nope"), str(tmp_path / "out")]) == 1
+        assert "is not a folder" in capsys.readouterr().err
+
+    def test_negative_settle(self, folders, capsys):
+        in_dir, out_dir = folders
+        with pytest.raises(SystemExit):
+            main(["watch", str(in_dir), str(out_dir), "--settle", "-1"])
+        assert "must be a number of seconds" in capsys.readouterr().err
@@ -0,0 +1,178 @@
+"""Tests for the streaming PDF writer."""
+
+import io
+import re
+import zlib
+from datetime import UTC, datetime
+
+import pytest
+
+from school_labels.writer import PdfOptions, PdfWriter, pdf_string
+
+_UNCOMPRESSED = PdfOptions(compress_level=0)
+_LINEARIZED = PdfOptions(compress_level=0, linearize=True)
+
+
+def _write(pages: list[bytes], options: PdfOptions = _UNCOMPRESSED, **kwargs) -> bytes:
+    out = io.BytesIO()
+    writer = PdfWriter(
+        out, title="Test", page_size=(595.28, 841.89), options=options, **kwargs
+    )
+    writer.add_font("F1", "Helvetica")
+    for content in pages:
+        writer.add_page(content)
+    writer.close()
+    return out.getvalue()
+
+
+class TestPdfString:
+    def test_escapes_delimiters(self):
+        assert pdf_string("a(b)c\\d") == b"(a\\(b\\)c\\\\d)"
+
+
+class TestPdfWriter:
+    def test_structure(self):
+        output = _write([b"BT (one) Tj ET", b"BT (two) Tj ET"])
+        assert output.startswith(b"%PDF-1.3")
+        assert output.endswith(b"%%EOF\n")
+        assert b"/Count 2" in output
+        assert b"(one) Tj" in output
+        assert b"(two) Tj" in output
+        assert b"/F1 " in output
+        assert b"/BaseFont /Helvetica" in output
+
+    def test_xref_offsets(self):
+        output = _write([b"BT (one) Tj ET"] * 3)
+        startxref = int(output.rsplit(b"startxref\n", 1)[1].split(b"\n")[0])
+        table = output[startxref:].split(b"trailer")[0].splitlines()[3:]
+        for obj, line in enumerate(table, start=1):
+            offset = int(line[:10])
+            assert output[offset:].startswith(b"%d 0 obj" % obj)
+
+    def test_creation_date(self):
+        date = datetime(2024, 9, 1, 8, 30, tzinfo=UTC)
+        output = _write([b""], creation_date=date)
+        assert b"/CreationDate (D:20240901083000Z)" in output
+
+    def test_source_date_epoch(self, monkeypatch):
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", "1725179400")
+        output = _write([b""])
+        assert b"/CreationDate (D:20240901083000Z)" in output
+        assert _write([b""]) == output
+
+    def test_compressed(self):
+        out = io.BytesIO()
+        writer = PdfWriter(out, title="Test", page_size=(595.28, 841.89))
+        writer.add_page(b"BT (hidden) Tj ET")
+        writer.close()
+        assert b"/FlateDecode" in out.getvalue()
+        assert b"(hidden)" not in out.getvalue()
+        assert re.search(rb"/Count 1\b", out.getvalue())
+
+
+def _search(pattern: bytes, output: bytes) -> re.Match[bytes]:
+    match = re.search(pattern, output)
+    assert match is not None, pattern
+    return match
+
+
+def _object_offsets(output: bytes) -> dict[int, int]:
+    return {
+        int(m.group(1)): m.start() for m in re.finditer(rb"(?m)^(\d+) 0 obj", output)
+    }
+
+
+class TestPdfOptions:
+    def test_compress_levels(self):
+        pages = [b"BT (%d) Tj ET " % i * 200 for i in range(5)]
+        fastest = _write(pages, PdfOptions(compress_level=1))
+        smallest = _write(pages, PdfOptions(compress_level=9))
+        assert b"/FlateDecode" not in _write(pages)
+        assert len(smallest) <= len(fastest) < len(_write(pages))
+
+    def test_invalid_compress_level(self):
+        with pytest.raises(ValueError, match="0 to 9"):
+            _write([b""], PdfOptions(compress_level=10))
+
+    def test_object_streams_conflict_with_linearize(self):
+        with pytest.raises(ValueError, match="cannot be combined"):
+            _write([b""], PdfOptions(object_streams=True, linearize=True))
+
+
+class TestObjectStreams:
+    def test_structure(self):
+        output = _write([b"BT (one) Tj ET"] * 3, PdfOptions(object_streams=True))
+        assert output.startswith(b"%PDF-1.5")
+        assert b"/Type /ObjStm" in output
+        assert b"/Type /XRef" in output
+        assert b"\nxref\n" not in output
+        # Page dictionaries are packed away
+        assert b"/Type /Page\n" not in output
+
+    def test_xref_stream(self):
+        output = _write([b"BT (one) Tj ET"] * 3, PdfOptions(object_streams=True))
+        startxref = int(output.rsplit(b"startxref\n", 1)[1].split(b"\n")[0])
+        header, rest = output[startxref:].split(b"stream\n", 1)
+        width = int(_search(rb"/W \[1 (\d+) 2\]", header).group(1))
+        size = int(_search(rb"/Size (\d+)", header).group(1))
+        length = int(_search(rb"/Length (\d+)", header).group(1))
+        rows = zlib.decompress(rest[:length])
+        row_size = 1 + width + 2
+        assert len(rows) == size * row_size
+
+        offsets = _object_offsets(output)
+        packed = 0
+        for obj in range(1, size):
+            row = rows[obj * row_size : (obj + 1) * row_size]
+            kind, field = row[0], int.from_bytes(row[1 : 1 + width])
+            if kind == 1:
+                assert offsets[obj] == field
+            else:
+                assert kind == 2
+                assert b"/Type /ObjStm" in output[offsets[field] :].split(b"stream")[0]
+                packed += 1
+        assert packed
+
+
+class TestLinearized:
+    def test_structure(self):
+        output = _write([b"BT (%d) Tj ET" % i for i in range(3)], _LINEARIZED)
+        # The linearization dictionary is the first object in the file
+        first_obj = _search(rb"(?s)\d+ 0 obj\n<<.*?>>", output).group()
+        assert b"/Linearized 1\n" in first_obj
+        length = int(_search(rb"/L (\d+)", output).group(1))
+        assert length == len(output)
+        count = int(_search(rb"/N (\d+)", output).group(1))
+        assert count == 3
+        assert output.endswith(b"%%EOF\n")
+
+    def test_first_page_comes_first(self):
+        output = _write([b"BT (%d) Tj ET" % i for i in range(3)], _LINEARIZED)
+        end_of_first_page = int(_search(rb"/E (\d+)", output).group(1))
+        assert b"(0) Tj" in output[:end_of_first_page]
+        assert b"(1) Tj" in output[end_of_first_page:]
+        assert b"(2) Tj" in output[end_of_first_page:]
+
+    def test_xref_offsets(self):
+        output = _write([b"BT (%d) Tj ET" % i for i in range(3)], _LINEARIZED)
+        offsets = _object_offsets(output)
+        # The first-page table, then the main table at the end of the file
+        tables = re.findall(rb"xref\n(\d+) (\d+)\n((?:\d{10} \d{5} [nf] \n)+)", output)
+        assert len(tables) == 2
+        seen = set()
+        for start, count, table in tables:
+            lines = table.splitlines()
+            assert len(lines) == int(count)
+            for obj, line in enumerate(lines, start=int(start)):
+                if line.endswith(b"n "):
+                    assert offsets[obj] == int(line[:10])
+                    seen.add(obj)
+        assert seen == set(offsets)
+
+    def test_no_pages(self):
+        out = io.BytesIO()
+        writer = PdfWriter(
+            out, title="Test", page_size=(595.28, 841.89), options=_LINEARIZED
+        )
+        with pytest.raises(ValueError, match="page"):
+            writer.close()
@@ -0,0 +1,232 @@
+"""Tests for reading .xlsx workbooks."""
+
+import io
+import zipfile
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+import pytest
+
+from school_labels import batch, generator
+from school_labels.cli import main
+from school_labels.validation import RowValidator
+from school_labels.xlsx import XlsxError, XlsxReader, is_xlsx
+
+from .conftest import EMAIL_CSV_HEADER, EMAIL_CSV_ROWS
+
+_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_RELS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+type Cell = str | float | None
+
+
+def _column(index: int) -> str:
+    letters = ""
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = chr(ord("A") + rest) + letters
+    return letters
+
+
+def _sheet_xml(rows: Sequence[Sequence[Cell]], strings: dict[str, int]) -> str:
+    """Worksheet XML as Excel writes it: text in shared strings, no empty cells."""
+    xml_rows = []
+    for number, row in enumerate(rows, start=1):
+        cells = []
+        for index, value in enumerate(row):
+            ref = f"{_column(index)}{number}"
+            if value is None:
+                continue
+            if isinstance(value, str):
+                position = strings.setdefault(value, len(strings))
+                cells.append(f'<c r="{ref}" t="s"><v>{position}</v></c>')
+            else:
+                cells.append(f'<c r="{ref}"><v>{value!r}</v></c>')
+        xml_rows.append(f'<row r="{number}">{"".join(cells)}</row>')
+    data = "".join(xml_rows)
+    return f'<worksheet xmlns="{_MAIN}"><sheetData>{data}</sheetData></worksheet>'
+
+
+def _write_xlsx(
+    target: Path | io.BytesIO,
+    sheets: Mapping[str, Sequence[Sequence[Cell]] | str],
+) -> Path | io.BytesIO:
+    """Write a minimal workbook. A sheet given as a string is its raw XML."""
+    strings: dict[str, int] = {}
+    with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as z:
+        entries, rels = [], []
+        for number, (name, sheet) in enumerate(sheets.items(), start=1):
+            xml = sheet if isinstance(sheet, str) else _sheet_xml(sheet, strings)
+            z.writestr(f"xl/worksheets/sheet{number}.xml", xml)
+            entries.append(
+                f'<sheet name="{escape(name)}" sheetId="{number}" r:id="rId{number}"/>'
+            )
+            rels.append(
+                f'<Relationship Id="rId{number}" Target="worksheets/sheet{number}.xml"'
+                ' Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                'relationships/worksheet"/>'
+            )
+        z.writestr(
+            "xl/workbook.xml",
+            f'<workbook xmlns="{_MAIN}" xmlns:r="{_RELS}">'
+            f"<sheets>{''.join(entries)}</sheets></workbook>",
+        )
+        z.writestr(
+            "xl/_rels/workbook.xml.rels",
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/'
+            f'relationships">{"".join(rels)}</Relationships>',
+        )
+        if strings:
+            items = "".join(f"<si><t>{escape(s)}</t></si>" for s in strings)
+            z.writestr("xl/sharedStrings.xml", f'<sst xmlns="{_MAIN}">{items}</sst>')
+    return target
+
+
+def _email_rows() -> list[Sequence[Cell]]:
+    """The email CSV fixture as worksheet rows, with admin numbers as numbers."""
+    rows: list[Sequence[Cell]] = [EMAIL_CSV_HEADER.split(",")]
+    for line in EMAIL_CSV_ROWS:
+        admin, *rest = line.split(",")
+        rows.append([int(admin), *rest])
+    return rows
+
+
+@pytest.fixture
+def email_xlsx_path(tmp_path):
+    return _write_xlsx(tmp_path / "email.xlsx", {"Pupils": _email_rows()})
+
+
+def _read(path: Path | io.BytesIO, sheet: str | None = None) -> list[list[str]]:
+    with XlsxReader(path, sheet) as reader:
+        return list(reader)
+
+
+class TestXlsxReader:
+    def test_rows(self, email_xlsx_path):
+        rows = _read(email_xlsx_path)
+        assert rows[0] == EMAIL_CSV_HEADER.split(",")
+        assert rows[1:] == [line.split(",") for line in EMAIL_CSV_ROWS]
+
+    def test_values_as_text(self, tmp_path):
+        path = _write_xlsx(
+            tmp_path / "values.xlsx", {"Sheet1": [["0012", 12, 0.1 + 0.2, -3.5]]}
+        )
+        # Leading zeros survive in text; floats print as Excel shows them
+        assert _read(path) == [["0012", "12", "0.3", "-3.5"]]
+
+    def test_sparse_cells_and_blank_rows(self, tmp_path):
+        sheet = (
+            f'<worksheet xmlns="{_MAIN}"><sheetData>'
+            '<row r="1"><c r="A1" t="inlineStr"><is><t>a</t></is></c>'
+            '<c r="C1" t="inlineStr"><is><t>c</t></is></c></row>'
+            '<row r="2"><c r="B2" s="1"/></row>'
+            '<row r="4"><c r="B4"><v>2</v></c></row>'
+            "</sheetData></worksheet>"
+        )
+        path = _write_xlsx(tmp_path / "sparse.xlsx", {"Sheet1": sheet})
+        with XlsxReader(path) as reader:
+            assert next(reader) == ["a", "", "c"]
+            assert reader.line_num == 1
+            # Row 2 only has formatting, so it is skipped like a blank line
+            assert next(reader) == ["", "2"]
+            assert reader.line_num == 4
+            assert next(reader, None) is None
+
+    def test_cell_types(self, tmp_path):
+        sheet = (
+            f'<worksheet xmlns="{_MAIN}"><sheetData><row>'
+            '<c t="inlineStr"><is><r><t>Zo</t></r><r><t>ë</t></r>'
+            "<rPh><t>ignored</t></rPh></is></c>"
+            '<c t="b"><v>1</v></c>'
+            '<c t="str"><f>A1&amp;"!"</f><v>Zoë!</v></c>'
+            '<c t="e"><v>#N/A</v></c>'
+            '<c t="inlineStr"><is><t>line_x000D_break</t></is></c>'
+            "</row></sheetData></worksheet>"
+        )
+        path = _write_xlsx(tmp_path / "types.xlsx", {"Sheet1": sheet})
+        assert _read(path) == [["Zoë", "TRUE", "Zoë!", "#N/A", "line\rbreak"]]
+
+    def test_named_sheet(self, tmp_path):
+        path = _write_xlsx(
+            tmp_path / "two.xlsx", {"Staff": [["x"]], "Pupils": [["y"], ["z"]]}
+        )
+        assert _read(path) == [["x"]]
+        assert _read(path, "Pupils") == [["y"], ["z"]]
+
+    def test_unknown_sheet(self, email_xlsx_path):
+        with pytest.raises(XlsxError, match=r"'Staff' not found\. Sheets: Pupils"):
+            XlsxReader(email_xlsx_path, "Staff")
+
+    def test_not_a_workbook(self, tmp_path):
+        path = tmp_path / "fake.xlsx"
+        path.write_text("admin,email\n")
+        with pytest.raises(XlsxError, match=r"Not an \.xlsx workbook"):
+            XlsxReader(path)
+
+    def test_damaged_worksheet(self, tmp_path):
+        path = _write_xlsx(tmp_path / "bad.xlsx", {"Sheet1": "<worksheet><row>"})
+        with XlsxReader(path) as reader, pytest.raises(XlsxError, match="Damaged"):
+            next(reader)
+
+    def test_is_xlsx(self, tmp_path, email_xlsx_path, email_csv_path):
+        renamed = email_xlsx_path.rename(tmp_path / "export")
+        assert is_xlsx(Path("missing.XLSX"))
+        assert is_xlsx(renamed)
+        assert not is_xlsx(email_csv_path)
+
+
+class TestIterXlsxRows:
+    def test_projects_columns(self, email_xlsx_path):
+        with XlsxReader(email_xlsx_path) as reader:
+            rows = generator.iter_xlsx_rows(reader, ["admin", "email"])
+            first = dict(next(rows))
+        assert first == {
+            "admin": "1001",
+            "email": "john.smith@school.org",
+        }
+
+    def test_validator_gets_row_numbers(self, tmp_path):
+        rows = [["admin", "email"], ["1", "a@x"], [], ["1", "b@x"]]
+        path = _write_xlsx(tmp_path / "dup.xlsx", {"Sheet1": rows})
+        validator = RowValidator(["admin", "email"], ["admin"], None)
+        with XlsxReader(path) as reader:
+            list(generator.iter_xlsx_rows(reader, validator=validator))
+        assert [issue.line for issue in validator.issues] == [4]
+
+
+class TestCli:
+    def test_same_labels_as_csv(self, email_xlsx_path, email_csv_path, tmp_path):
+        from_csv, from_xlsx = tmp_path / "csv.pdf", tmp_path / "xlsx.pdf"
+        assert main([str(email_csv_path), "-o", str(from_csv)]) == 0
+        assert main([str(email_xlsx_path), "-o", str(from_xlsx)]) == 0
+        assert len(from_xlsx.read_bytes()) == len(from_csv.read_bytes())
+
+    def test_stdin(self, email_xlsx_path, tmp_path, monkeypatch):
+        stdin = io.BufferedReader(io.BytesIO(email_xlsx_path.read_bytes()))
+        monkeypatch.setattr(
+            "sys.stdin",
+            type("FakeStdin", (), {"buffer": stdin, "isatty": lambda _: False})(),
+        )
+        output = tmp_path / "out.pdf"
+        assert main(["-o", str(output)]) == 0
+        assert output.read_bytes()[:5] == b"%PDF-"
+
+    def test_unknown_sheet(self, email_xlsx_path, tmp_path, capsys):
+        argv = [str(email_xlsx_path), "--sheet", "Staff", "-o", str(tmp_path / "o.pdf")]
+        assert main(argv) == 1
+        assert "Error reading spreadsheet: Sheet 'Staff' not found" in (
+            capsys.readouterr().err
+        )
+
+
+class TestBatch:
+    def test_directory_with_workbook(self, tmp_path, email_xlsx_path, email_csv_path):
+        (tmp_path / "~$email.xlsx").write_bytes(b"lock")
+        inputs = batch.find_inputs(tmp_path)
+        assert inputs == [email_csv_path, email_xlsx_path]
+        out = tmp_path / "out"
+        out.mkdir()
+        results = list(batch.generate_batch(inputs, out))
+        assert [(r.error, r.rows) for r in results] == [(None, 3), (None, 3)]